@@ -1,8 +1,14 @@
-from sqlmodel import SQLModel, create_engine, Session
-from typing import Generator
+from sqlmodel import SQLModel, Session
+from typing import Generator, Optional
 import os
 from dotenv import load_dotenv
 
+from sqlalchemy.engine import Engine
+
+from .services import db_pool
+from .services.db_routing import RoutingSession
+from .services.query_profiler import instrument_engine
+
 load_dotenv()
 
 # Obtener URL de base de datos o usar SQLite por defecto
@@ -12,63 +18,122 @@ DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./database.db")
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-# Configuración del motor
-connect_args = {}
-if "sqlite" in DATABASE_URL:
-    connect_args["check_same_thread"] = False
-elif "pgbouncer=true" in DATABASE_URL:
-    # Connection Pooler requiere prepared statements deshabilitados
-    connect_args["prepare_threshold"] = 0
-
-engine = create_engine(
-    DATABASE_URL, 
-    connect_args=connect_args, 
-    pool_pre_ping=True,
-    pool_recycle=3600  # Reciclar conexiones cada hora para evitar timeouts de Supabase
-)
-
-def create_db_and_tables():
+# Migraciones: `python -m app.migrate` como paso de release. Al arrancar solo se corren si
+# MIGRATE_ON_STARTUP=true (por defecto únicamente con SQLite local, donde son instantáneas)
+MIGRATE_ON_STARTUP = os.getenv(
+    "MIGRATE_ON_STARTUP", "true" if DATABASE_URL.startswith("sqlite") else "false"
+).lower() == "true"
+
+# Motor con el modo de pool según DB_POOL_MODE (ver services/db_pool.py)
+read_engine: Optional[Engine] = None
+if db_pool.SQLITE_READ_WRITE_SPLIT and db_pool.resolve_pool_mode(DATABASE_URL) == "sqlite":
+    # Escritor único + lectores de solo lectura; las sesiones se enrutan con RoutingSession
+    engine, read_engine = db_pool.create_sqlite_engines(DATABASE_URL)
+    instrument_engine(read_engine)
+else:
+    engine = db_pool.create_configured_engine(DATABASE_URL)
+
+# Conteo y duración de consultas por request / job (ver services/query_profiler.py)
+instrument_engine(engine)
+
+# Réplica de lectura (Postgres): lecturas de requests GET, ver services/db_routing.py
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+if DATABASE_REPLICA_URL and DATABASE_REPLICA_URL.startswith("postgres://"):
+    DATABASE_REPLICA_URL = DATABASE_REPLICA_URL.replace("postgres://", "postgresql://", 1)
+replica_engine: Optional[Engine] = None
+if DATABASE_REPLICA_URL:
+    replica_engine = db_pool.create_configured_engine(DATABASE_REPLICA_URL, label="replica")
+    instrument_engine(replica_engine)
+
+def new_session() -> Session:
+    if replica_engine is not None:
+        return RoutingSession(engine, replica_engine, lagging=True)
+    if read_engine is not None:
+        return RoutingSession(engine, read_engine)
+    return Session(engine)
+
+def create_db_and_tables(raise_errors: bool = False):
     # En producción con Supabase, las tablas ya deberían existir por el script SQL.
     # SQLModel solo creará las que falten, pero es mejor confiar en las migraciones/scripts SQL.
     SQLModel.metadata.create_all(engine)
-    migrate_db_schema()
+    migrate_db_schema(raise_errors=raise_errors)
+
+# Columnas agregadas después de la creación inicial de cada tabla: (tabla, columna, tipo y default)
+# Sin defaults no constantes: SQLite no los admite en ADD COLUMN, los timestamps se rellenan aparte
+ADDED_COLUMNS = [
+    # 1. Tabla User: 'color'
+    ("user", "color", "VARCHAR DEFAULT '#3B82F6'"),
+    # 2. Tabla NotificationLog: 'title', 'body', 'status'
+    ("notificationlog", "title", "VARCHAR DEFAULT 'Notificación'"),
+    ("notificationlog", "body", "VARCHAR DEFAULT ''"),
+    ("notificationlog", "status", "VARCHAR DEFAULT 'pending'"),
+    # 3. Tabla Task: created_by_id es NOT NULL en el modelo, pero en una tabla existente se
+    # permite NULL temporalmente para no romper datos existentes
+    ("task", "created_by_id", 'INTEGER REFERENCES "user"(id)'),
+    ("task", "completed_by_id", 'INTEGER REFERENCES "user"(id)'),
+    # 4. Tabla NotificationToken: 'device_info'
+    ("notificationtoken", "device_info", "VARCHAR"),
+    # 5. Tabla Event: sincronización con calendarios externos
+    ("event", "external_id", "VARCHAR"),
+    ("event", "updated_at", "TIMESTAMP"),
+    # 6. Sincronización delta: updated_at en tareas, shares, membresías y ocurrencias (la tabla tombstone la crea create_all)
+    ("task", "updated_at", "TIMESTAMP"),
+    ("eventshare", "updated_at", "TIMESTAMP"),
+    ("familymember", "updated_at", "TIMESTAMP"),
+    ("recurrenceexception", "updated_at", "TIMESTAMP"),
+    # 7. Borrados locales de eventos de Google Calendar que el push debe enviar
+    ("tombstone", "external_id", "VARCHAR"),
+]
 
-def migrate_db_schema():
+MIGRATION_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_event_external_id ON event (external_id)",
+    "CREATE INDEX IF NOT EXISTS ix_event_updated_at ON event (updated_at)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_event_owner_external_id ON event (owner_id, external_id)",
+    "CREATE INDEX IF NOT EXISTS ix_task_updated_at ON task (updated_at)",
+    "CREATE INDEX IF NOT EXISTS ix_eventshare_updated_at ON eventshare (updated_at)",
+    "CREATE INDEX IF NOT EXISTS ix_familymember_updated_at ON familymember (updated_at)",
+    "CREATE INDEX IF NOT EXISTS ix_recurrenceexception_updated_at ON recurrenceexception (updated_at)",
+]
+
+def migrate_db_schema(bind: Optional[Engine] = None, raise_errors: bool = False) -> bool:
     """
     Función simple de migración para agregar columnas faltantes en producción.
     Esto es necesario porque SQLModel.metadata.create_all no altera tablas existentes.
+    Inspecciona las columnas existentes y usa SQL común a PostgreSQL y SQLite (sin
+    ADD COLUMN IF NOT EXISTS ni NOW()). Retorna False si falla; con raise_errors relanza.
     """
-    from sqlalchemy import text
+    from sqlalchemy import inspect, text
     
-    with Session(engine) as session:
-        try:
-            # 1. Tabla User: agregar 'color'
-            session.exec(text("ALTER TABLE \"user\" ADD COLUMN IF NOT EXISTS color VARCHAR DEFAULT '#3B82F6'"))
-            
-            # 2. Tabla NotificationLog: agregar 'title', 'body', 'status'
-            session.exec(text("ALTER TABLE notificationlog ADD COLUMN IF NOT EXISTS title VARCHAR DEFAULT 'Notificación'"))
-            session.exec(text("ALTER TABLE notificationlog ADD COLUMN IF NOT EXISTS body VARCHAR DEFAULT ''"))
-            session.exec(text("ALTER TABLE notificationlog ADD COLUMN IF NOT EXISTS status VARCHAR DEFAULT 'pending'"))
-            
-            # 3. Tabla Task: agregar 'created_by_id', 'completed_by_id'
-            # Nota: created_by_id es NOT NULL en el modelo, pero al agregarla a tabla existente debe permitir NULL o tener default
-            # Aquí permitimos NULL temporalmente para no romper datos existentes
-            session.exec(text("ALTER TABLE task ADD COLUMN IF NOT EXISTS created_by_id INTEGER REFERENCES \"user\"(id)"))
-            session.exec(text("ALTER TABLE task ADD COLUMN IF NOT EXISTS completed_by_id INTEGER REFERENCES \"user\"(id)"))
-            
-            # 4. Tabla NotificationToken: agregar 'device_info'
-            session.exec(text("ALTER TABLE notificationtoken ADD COLUMN IF NOT EXISTS device_info VARCHAR"))
-            
-            session.commit()
-            print("✅ Schema migration completed successfully")
-        except Exception as e:
-            print(f"⚠️ Schema migration failed (might be already applied): {e}")
-            session.rollback()
+    bind = bind or engine
+    try:
+        with bind.begin() as connection:
+            inspector = inspect(connection)
+            tables = set(inspector.get_table_names())
+            existing = {
+                table: {column["name"] for column in inspector.get_columns(table)}
+                for table in {table for table, _, _ in ADDED_COLUMNS} & tables
+            }
+            added = []
+            for table, column, ddl in ADDED_COLUMNS:
+                if table in existing and column not in existing[table]:
+                    connection.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl}'))
+                    added.append(f"{table}.{column}")
+                    if ddl == "TIMESTAMP":
+                        connection.execute(text(f'UPDATE "{table}" SET {column} = CURRENT_TIMESTAMP WHERE {column} IS NULL'))
+            for statement in MIGRATION_INDEXES:
+                connection.execute(text(statement))
+        print(f"✅ Schema migration completed successfully ({len(added)} columnas agregadas)")
+        return True
+    except Exception as e:
+        print(f"⚠️ Schema migration failed: {e}")
+        if raise_errors:
+            raise
+        return False
 
 def get_session() -> Generator[Session, None, None]:
-    with Session(engine) as session:
+    with new_session() as session:
         yield session
 
 def SessionLocal():
     """Factory function for creating sessions in background tasks"""
-    return Session(engine)
+    return new_session()
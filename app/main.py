@@ -1,32 +1,45 @@
 from fastapi import FastAPI, Request, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.exceptions import RequestValidationError
 from fastapi.encoders import jsonable_encoder
 from contextlib import asynccontextmanager
-from starlette.middleware.base import BaseHTTPMiddleware
-import time
 import asyncio
+import os
 
 from sqlmodel import Session, select
-from .database import create_db_and_tables, engine, SessionLocal
+from .database import MIGRATE_ON_STARTUP, create_db_and_tables, engine, replica_engine, SessionLocal
 from .models import User, Family, FamilyMember, Event, Task, ChatMessage, NotificationLog, NotificationToken, EventShare, TaskAssignmentHistory
 from .security import get_password_hash
+from .middleware import CompressionMiddleware, ConditionalGetMiddleware, InstrumentationMiddleware, ReplicaRoutingMiddleware
+from .services import query_profiler, telemetry
 from .notification_service import initialize_firebase_app
-from .routers import auth, ai, notifications, events, tasks, sharing, chat, metrics
+from .routers import auth, ai, notifications, events, tasks, sharing, chat, metrics, availability, integrations, sync
 from apscheduler.schedulers.background import BackgroundScheduler
 from .services.background_tasks import check_upcoming_tasks
-from .services.notification_scheduler import process_pending_notifications
+from .services.notification_scheduler import process_pending_notifications, roll_forward_recurring_events
+from .services.presence import presence
+from .services.serialization import DefaultResponse
+from .services.google_sync import sync_all_integrations
+from .services.delta_sync import prune_tombstones
+from .services.family_versions import conditional_get_enabled
+
+STARTUP_LOG_ROUTES = os.getenv("STARTUP_LOG_ROUTES", "false").lower() == "true"
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Crear tablas (opcional si DB no está disponible)
-    try:
-        create_db_and_tables()
-        print("✅ Database tables verified/created")
-    except Exception as e:
-        print(f"⚠️  Database connection failed: {e}")
-        print("   Backend will start without database (API endpoints available)")
+    # Log de requests asíncrono (un hilo escribe la cola)
+    telemetry.start_request_logging()
+    
+    # Crear tablas (opcional si DB no está disponible). En producción las corre
+    # `python -m app.migrate` antes del deploy, no cada cold start
+    if MIGRATE_ON_STARTUP:
+        try:
+            create_db_and_tables()
+            print("✅ Database tables verified/created")
+        except Exception as e:
+            print(f"⚠️  Database connection failed: {e}")
+            print("   Backend will start without database (API endpoints available)")
     
     # Inicializar Firebase (si hay credenciales)
     try:
@@ -49,8 +62,9 @@ async def lifespan(app: FastAPI):
     # Tarea cada 5 minutos: procesar notificaciones pendientes
     def notification_job():
         try:
-            with SessionLocal() as session:
+            with SessionLocal() as session, query_profiler.profiling() as profile:
                 process_pending_notifications(session)
+            query_profiler.report_n_plus_one("process_pending_notifications", profile)
         except Exception as e:
             print(f"Error en background task: {e}")
     
@@ -62,6 +76,60 @@ async def lifespan(app: FastAPI):
         name="Process Pending Notifications"
     )
     
+    # Tarea nocturna: próxima ocurrencia de todos los eventos recurrentes (en bloque)
+    def roll_forward_job():
+        try:
+            with SessionLocal() as session:
+                created = roll_forward_recurring_events(session)
+                print(f"✅ Recurring events rolled forward ({created} notifications scheduled)")
+        except Exception as e:
+            print(f"Error en roll forward de eventos recurrentes: {e}")
+    
+    scheduler.add_job(
+        func=roll_forward_job,
+        trigger="cron",
+        hour=3,
+        minute=0,
+        id="roll_forward_recurring",
+        name="Roll Forward Recurring Events"
+    )
+    
+    # Tarea cada 10 minutos: sincronización incremental con Google Calendar
+    def google_sync_job():
+        try:
+            with SessionLocal() as session:
+                synced = sync_all_integrations(session)
+                if synced:
+                    print(f"✅ Google Calendar sync ({synced} integrations)")
+        except Exception as e:
+            print(f"Error en sincronización con Google Calendar: {e}")
+    
+    scheduler.add_job(
+        func=google_sync_job,
+        trigger="interval",
+        minutes=10,
+        id="google_calendar_sync",
+        name="Google Calendar Incremental Sync"
+    )
+    
+    # Tarea nocturna: borrar tombstones vencidos de la sincronización delta
+    def prune_tombstones_job():
+        try:
+            with SessionLocal() as session:
+                pruned = prune_tombstones(session)
+                print(f"✅ Tombstones pruned ({pruned})")
+        except Exception as e:
+            print(f"Error al limpiar tombstones: {e}")
+    
+    scheduler.add_job(
+        func=prune_tombstones_job,
+        trigger="cron",
+        hour=3,
+        minute=30,
+        id="prune_tombstones",
+        name="Prune Delta Sync Tombstones"
+    )
+    
     scheduler.start()
     print("✅ Notification scheduler started (every 5 minutes)")
     
@@ -72,20 +140,27 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"⚠️  Background tasks failed: {e}")
     
+    # Presencia del chat: un frame agrupado por familia cada segundo como máximo
+    presence_task = asyncio.create_task(presence.run())
+    print("✅ Presence service started")
+    
     print("\n🚀 FamilIAgenda API lista para operar")
     print("   Docs: http://localhost:8000/docs\n")
     
-    # Debug: Imprimir todas las rutas registradas
-    print("--- Rutas Registradas ---")
-    for route in app.routes:
-        if hasattr(route, "path"):
-            methods = getattr(route, "methods", "N/A")
-            print(f"{methods} {route.path}")
-    print("-------------------------")
+    # Debug: Imprimir todas las rutas registradas (STARTUP_LOG_ROUTES=true)
+    if STARTUP_LOG_ROUTES:
+        print("--- Rutas Registradas ---")
+        for route in app.routes:
+            if hasattr(route, "path"):
+                methods = getattr(route, "methods", "N/A")
+                print(f"{methods} {route.path}")
+        print("-------------------------")
     
     yield
     # Shutdown
+    presence_task.cancel()
     scheduler.shutdown()
+    telemetry.stop_request_logging()
     print("Cerrando FamilIAgenda...")
 
 # Crear instancia de FastAPI
@@ -93,24 +168,27 @@ app = FastAPI(
     title="FamilIAgenda API",
     description="API para gestión familiar inteligente",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=DefaultResponse  # ORJSONResponse si orjson está instalado
 )
 
-# Middleware de Logging
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
-        print(f"➡️  INCOMING: {request.method} {request.url.path}")
-        try:
-            response = await call_next(request)
-            process_time = time.time() - start_time
-            print(f"⬅️  RESPONSE: {response.status_code} (took {process_time:.4f}s)")
-            return response
-        except Exception as e:
-            print(f"❌  ERROR processing request: {e}")
-            raise
 
-app.add_middleware(LoggingMiddleware)
+# Lecturas GET desde la réplica (si hay), con lectura de las propias escrituras
+if replica_engine is not None:
+    app.add_middleware(ReplicaRoutingMiddleware)
+
+# ETag / 304 en las lecturas que los clientes consultan periódicamente.
+# Las versiones son de este proceso: con varios workers o instancias se desactiva
+if conditional_get_enabled():
+    app.add_middleware(ConditionalGetMiddleware)
+else:
+    print("⚠️ ETag/304 desactivado: las versiones en memoria no se comparten entre procesos")
+
+# Brotli/gzip negociado para las respuestas grandes (no websockets ni SSE)
+app.add_middleware(CompressionMiddleware)
+
+# Métricas y log de requests (incluye también las respuestas 304)
+app.add_middleware(InstrumentationMiddleware)
 
 # Configurar CORS - Permitir todos los subdominios de Vercel y Render
 origins = [
@@ -153,6 +231,13 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 async def root():
     return {"message": "FamilIAgenda API - Funcionando correctamente"}
 
+# Métricas en formato Prometheus (con METRICS_TOKEN; abiertas solo con METRICS_PUBLIC=true)
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics(request: Request):
+    if not telemetry.metrics_authorized(request.headers.get("authorization")):
+        raise HTTPException(status_code=401, detail="No autorizado", headers={"WWW-Authenticate": "Bearer"})
+    return PlainTextResponse(telemetry.registry.render(), media_type="text/plain; version=0.0.4")
+
 # --- Inclusión de Routers ---
 app.include_router(auth.router, prefix="/api/auth", tags=["Autenticación"])
 app.include_router(ai.router, prefix="/api/ai", tags=["Inteligencia Artificial"])
@@ -161,3 +246,6 @@ app.include_router(metrics.router, prefix="/api/events", tags=["Métricas"])
 app.include_router(events.router, prefix="/api/events", tags=["Eventos"])
 app.include_router(tasks.router, prefix="/api/tasks", tags=["Tareas"])
 app.include_router(chat.router, prefix="/api/chat", tags=["Chat"])
+app.include_router(availability.router, prefix="/api/availability", tags=["Disponibilidad"])
+app.include_router(integrations.router, prefix="/api/integrations", tags=["Integraciones"])
+app.include_router(sync.router, prefix="/api/sync", tags=["Sincronización"])
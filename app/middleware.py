@@ -0,0 +1,335 @@
+"""
+Middlewares ASGI de la aplicación.
+"""
+import hashlib
+import re
+import time
+from typing import Any, Callable, List, NamedTuple, Optional, Pattern, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from .security import decode_session_token
+from .services import compression, query_profiler, telemetry
+from .services.db_routing import ReadContext, read_context
+from .services.family_versions import family_versions
+from .services.presence import presence
+
+class ConditionalRoute(NamedTuple):
+    """Lectura con ETag: claves de versión de las que depende y un extra opcional no guardado en BD"""
+    pattern: Pattern[str]
+    template: str  # Etiqueta de la ruta en las métricas cuando se responde 304 sin llegar al router
+    scope: str  # "user": todo lo visible para el usuario; "family": la familia de la ruta
+    extra: Optional[Callable[[], Any]] = None
+
+CONDITIONAL_ROUTES: List[ConditionalRoute] = [
+    ConditionalRoute(re.compile(r"^/api/events/?$"), "/api/events/", "user"),
+    ConditionalRoute(re.compile(r"^/api/tasks/?$"), "/api/tasks/", "user"),
+    # "online" sale de la presencia en memoria
+    ConditionalRoute(
+        re.compile(r"^/api/auth/familia/miembros$"), "/api/auth/familia/miembros", "user",
+        lambda: presence.online_revision
+    ),
+    # "eventos de esta semana/mes" depende de la hora actual: el ETag vale como mucho un minuto
+    ConditionalRoute(
+        re.compile(r"^/api/events/metrics$"), "/api/events/metrics", "user",
+        lambda: int(time.time() // 60)
+    ),
+    ConditionalRoute(
+        re.compile(r"^/api/chat/history/(?P<family_id>\d+)$"), "/api/chat/history/{family_id}", "family"
+    ),
+]
+
+def bearer_user_id(headers: Headers) -> Optional[int]:
+    """user_id del token Bearer de la request, o None si no hay o no es válido"""
+    authorization = headers.get("authorization", "")
+    if not authorization.lower().startswith("bearer "):
+        return None
+    return decode_session_token(authorization[7:].strip())
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Comparación débil (RFC 9110 §8.8.3.2): se ignora el prefijo W/"""
+    opaque = etag.removeprefix("W/")
+    return any(
+        tag == "*" or tag.removeprefix("W/") == opaque
+        for tag in (candidate.strip() for candidate in if_none_match.split(","))
+    )
+
+class ConditionalGetMiddleware:
+    """
+    ETag débil en las lecturas de CONDITIONAL_ROUTES a partir de las versiones en memoria
+    (services/family_versions.py). Con If-None-Match coincidente responde 304 sin llegar
+    al endpoint. El ETag se calcula antes de ejecutar la lectura: si hay una escritura
+    concurrente, el cliente vuelve a pedir los datos en la próxima consulta.
+    """
+    def __init__(self, app, routes: List[ConditionalRoute] = CONDITIONAL_ROUTES):
+        self.app = app
+        self.routes = routes
+
+    def compute_etag(self, scope, headers: Headers) -> Optional[Tuple[str, ConditionalRoute]]:
+        for route in self.routes:
+            match = route.pattern.match(scope["path"])
+            if match:
+                break
+        else:
+            return None
+
+        if route.scope == "family":
+            keys: List[Tuple[str, int]] = [("family", int(match.group("family_id")))]
+        else:
+            # Sin token o token inválido: sin ETag, el endpoint responde 401
+            user_id = bearer_user_id(headers)
+            if user_id is None:
+                return None
+            keys = [("user", user_id)]
+
+        version, _ = family_versions.validators(keys)
+        extra = route.extra() if route.extra else None
+        digest = hashlib.sha1(
+            repr((version, keys, scope["path"], scope.get("query_string", b""), extra)).encode()
+        ).hexdigest()[:20]
+        return f'W/"{digest}"', route
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        computed = self.compute_etag(scope, headers)
+        if computed is None:
+            await self.app(scope, receive, send)
+            return
+        etag, route = computed
+
+        if_none_match = headers.get("if-none-match")
+        if if_none_match and etag_matches(if_none_match, etag):
+            scope["route_template"] = route.template
+            await send({
+                "type": "http.response.start",
+                "status": 304,
+                "headers": [
+                    (b"etag", etag.encode()),
+                    (b"cache-control", b"private, no-cache"),
+                ],
+            })
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def send_with_etag(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                response_headers = MutableHeaders(scope=message)
+                response_headers["ETag"] = etag
+                response_headers["Cache-Control"] = "private, no-cache"
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
+
+class InstrumentationMiddleware:
+    """
+    Métricas por ruta (latencia, status, requests en curso, consultas SQL y posibles
+    N+1) y log estructurado muestreado. ASGI puro: no envuelve el cuerpo de la respuesta
+    en otra tarea, así que las respuestas en streaming siguen fluyendo; la duración se
+    mide hasta el último bloque enviado. Con debug=True agrega cabeceras X-DB-*.
+    """
+    def __init__(self, app, debug: bool = query_profiler.QUERY_DEBUG):
+        self.app = app
+        self.debug = debug
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        start = time.perf_counter()
+        status = 500
+        telemetry.http_in_flight.inc((method,))
+
+        with query_profiler.profiling() as profile:
+            async def send_instrumented(message):
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    if self.debug:
+                        message.setdefault("headers", [])
+                        message["headers"] = list(message["headers"]) + query_profiler.debug_headers(profile)
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_instrumented)
+            finally:
+                duration = time.perf_counter() - start
+                telemetry.http_in_flight.dec((method,))
+                # Plantilla de la ruta (/api/events/{event_id}) para no crear una serie por URL
+                route = getattr(scope.get("route"), "path", None) or scope.get("route_template", "unmatched")
+                labels = (method, route)
+                telemetry.http_requests.inc((method, route, str(status)))
+                telemetry.http_latency.observe(labels, duration)
+                telemetry.http_db_queries.observe(labels, profile.count)
+                telemetry.http_db_time.observe(labels, profile.duration)
+                if profile.suspected_n_plus_one():
+                    telemetry.n_plus_one_suspects.inc(labels)
+                    if self.debug:
+                        query_profiler.report_n_plus_one(f"{method} {route}", profile)
+                query_profiler.request_finished(method, route, profile)
+                telemetry.log_request(method, scope["path"], route, status, duration, profile.count)
+
+# Lecturas GET que van al primario: las que escriben en la BD (para no escribir sobre datos
+# atrasados) y las que se validan con ETag
+PRIMARY_GET_ROUTES: List[Pattern[str]] = [
+    re.compile(r"^/api/integrations/google/callback$"),
+    # El ETag de estas otras sale de las versiones en memoria del primario: si el cuerpo
+    # se leyera de una réplica atrasada, el cliente guardaría datos viejos bajo el ETag nuevo
+    # (y los revalidaría con 304 hasta el próximo cambio). Con ETag, la mayoría son 304 sin BD.
+    *(route.pattern for route in CONDITIONAL_ROUTES),
+    re.compile(r"^/api/events/export\.ics$"),
+    re.compile(r"^/api/events/feed/[^/]+\.ics$"),
+]
+
+class ReplicaRoutingMiddleware:
+    """
+    Marca en read_context si la request puede leer de la réplica (GET/HEAD fuera de
+    PRIMARY_GET_ROUTES) y quién la hace, para la ventana de lectura de las propias
+    escrituras (services/db_routing.py). Solo se instala si hay DATABASE_REPLICA_URL.
+    """
+    def __init__(self, app, primary_routes: List[Pattern[str]] = PRIMARY_GET_ROUTES):
+        self.app = app
+        self.primary_routes = primary_routes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        replica_ok = scope["method"] in ("GET", "HEAD") and not any(
+            pattern.match(scope["path"]) for pattern in self.primary_routes
+        )
+        token = read_context.set(ReadContext(replica_ok, bearer_user_id(Headers(scope=scope))))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            read_context.reset(token)
+
+class CompressionMiddleware:
+    """
+    Compresión negociada (Brotli/gzip, services/compression.py) de JSON, NDJSON y text/*
+    a partir de COMPRESSION_MIN_SIZE bytes. No toca websockets, Server-Sent Events, HEAD
+    ni respuestas ya codificadas. Las respuestas en streaming se comprimen bloque a bloque
+    con flush; los feeds ICS se guardan ya comprimidos por ETag y el endpoint los sirve
+    desde esa caché sin volver a leer la BD.
+    """
+    def __init__(self, app, minimum_size: int = compression.COMPRESSION_MIN_SIZE,
+                 cache: compression.PrecompressedCache = compression.precompressed):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        encoding = compression.choose_encoding(headers.get("accept-encoding"))
+        if encoding is None or "text/event-stream" in headers.get("accept", ""):
+            await self.app(scope, receive, send)
+            return
+
+        sender = CompressingSender(send, encoding, self.minimum_size, self.cache, compression.cache_path(scope))
+        await self.app(scope, receive, sender.send)
+
+class CompressingSender:
+    """Estado de una respuesta: el inicio se retiene hasta saber si el cuerpo se comprime"""
+    def __init__(self, send, encoding: str, minimum_size: int, cache: compression.PrecompressedCache, path: str):
+        self.downstream = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.cache = cache
+        self.path = path
+        self.start: Optional[dict] = None
+        self.mode = "pending"  # pending | passthrough | streaming
+        self.compressor: Optional[compression.StreamCompressor] = None
+        self.cache_key: Optional[Tuple[str, str, str]] = None
+        self.kept: Optional[List[bytes]] = None
+        self.kept_size = 0
+
+    def eligible(self, message) -> bool:
+        response_headers = Headers(raw=message.get("headers", []))
+        content_type = response_headers.get("content-type", "")
+        if not compression.is_compressible(content_type):
+            return False
+        MutableHeaders(scope=message).add_vary_header("Accept-Encoding")
+        return (
+            message["status"] not in (204, 206, 304)
+            and "content-encoding" not in response_headers
+            and "no-transform" not in response_headers.get("cache-control", "")
+        )
+
+    def encoded_start(self, content_length: Optional[int]) -> dict:
+        response_headers = MutableHeaders(scope=self.start)
+        response_headers["Content-Encoding"] = self.encoding
+        if content_length is None:
+            del response_headers["Content-Length"]
+        else:
+            response_headers["Content-Length"] = str(content_length)
+        # El cuerpo codificado es otra representación: el ETag fuerte pasa a débil
+        etag = response_headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            response_headers["ETag"] = f"W/{etag}"
+        return self.start
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            if not self.eligible(message):
+                self.mode = "passthrough"
+                await self.downstream(message)
+                return
+            response_headers = Headers(raw=message.get("headers", []))
+            media_type = response_headers.get("content-type", "").split(";", 1)[0].strip().lower()
+            etag = response_headers.get("etag")
+            if etag and media_type in compression.PRECOMPRESSED_TYPES:
+                # Se guarda al terminar; los aciertos los sirve el endpoint (lookup_precompressed)
+                self.cache_key = (self.path, etag, self.encoding)
+            return
+
+        if message["type"] != "http.response.body" or self.mode == "passthrough":
+            await self.downstream(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.mode == "pending":
+            if not more_body:
+                if len(body) < self.minimum_size:
+                    await self.downstream(self.start)
+                    await self.downstream(message)
+                    return
+                compressed = compression.compress(body, self.encoding)
+                self.count(len(body), len(compressed))
+                if self.cache_key is not None:
+                    self.cache.put(self.cache_key, compressed)
+                await self.downstream(self.encoded_start(len(compressed)))
+                await self.downstream({"type": "http.response.body", "body": compressed})
+                return
+            self.mode = "streaming"
+            self.compressor = compression.StreamCompressor(self.encoding)
+            if self.cache_key is not None:
+                self.kept = []
+            await self.downstream(self.encoded_start(None))
+
+        # Streaming: flush por bloque para que el cliente reciba cada parte al momento
+        chunk = self.compressor.compress(body, flush=True) if more_body else self.compressor.finish(body)
+        self.count(len(body), len(chunk))
+        if self.kept is not None:
+            self.kept.append(chunk)
+            self.kept_size += len(chunk)
+            if self.kept_size > self.cache.max_bytes:
+                self.kept = None
+        if not more_body and self.kept is not None:
+            self.cache.put(self.cache_key, b"".join(self.kept))
+        await self.downstream({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    def count(self, raw: int, sent: int):
+        telemetry.http_compression_bytes.inc((self.encoding, "raw"), raw)
+        telemetry.http_compression_bytes.inc((self.encoding, "sent"), sent)
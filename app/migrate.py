@@ -0,0 +1,24 @@
+"""
+Crea las tablas que falten y aplica las migraciones de columnas (database.migrate_db_schema).
+
+Se ejecuta como paso de release/pre-deploy, fuera del arranque de la API:
+    python -m app.migrate
+"""
+import sys
+import time
+
+from .database import DATABASE_URL, create_db_and_tables
+
+def main():
+    start = time.perf_counter()
+    print(f"🗄️  Migrando {DATABASE_URL.split('@')[-1]}")
+    try:
+        # Un fallo de la migración debe cortar el deploy (código de salida distinto de 0)
+        create_db_and_tables(raise_errors=True)
+    except Exception as e:
+        print(f"❌ Migración fallida: {e}")
+        sys.exit(1)
+    print(f"✅ Database tables verified/created ({time.perf_counter() - start:.2f} s)")
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from typing import List, Optional
+from sqlalchemy import UniqueConstraint
 from sqlmodel import Field, SQLModel, Relationship
 from datetime import datetime, timezone
 
@@ -8,6 +9,11 @@ class FamilyMember(SQLModel, table=True):
     user_id: Optional[int] = Field(default=None, foreign_key="user.id", primary_key=True)
     role: str = Field(default="member")  # admin, moderator, member
     joined_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        index=True,
+        sa_column_kwargs={"onupdate": lambda: datetime.now(timezone.utc)}
+    )
 
 class User(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -46,6 +52,8 @@ class Family(SQLModel, table=True):
     events: List["Event"] = Relationship(back_populates="family")
 
 class Event(SQLModel, table=True):
+    __table_args__ = (UniqueConstraint("owner_id", "external_id", name="uq_event_owner_external_id"),)
+    
     id: Optional[int] = Field(default=None, primary_key=True)
     title: str
     description: Optional[str] = None
@@ -71,6 +79,14 @@ class Event(SQLModel, table=True):
     completed_at: Optional[datetime] = None
     completed_by_id: Optional[int] = Field(default=None, foreign_key="user.id")
     
+    # Sincronización con calendarios externos (upsert por owner_id + external_id)
+    external_id: Optional[str] = Field(default=None, index=True)  # ID del evento en Google Calendar
+    updated_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        index=True,
+        sa_column_kwargs={"onupdate": lambda: datetime.now(timezone.utc)}
+    )
+    
     # Relaciones
     owner_id: int = Field(foreign_key="user.id")
     family_id: int = Field(foreign_key="family.id")
@@ -89,6 +105,35 @@ class Event(SQLModel, table=True):
     family: Family = Relationship(back_populates="events")
     shared_with: List["EventShare"] = Relationship(back_populates="event")
     notification_logs: List["NotificationLog"] = Relationship(back_populates="event")
+    recurrence_exceptions: List["RecurrenceException"] = Relationship(back_populates="event")
+
+class RecurrenceException(SQLModel, table=True):
+    """
+    Excepción de una ocurrencia de un evento recurrente (RECURRENCE-ID en RFC 5545).
+    El evento maestro guarda la regla; aquí solo se guardan las ocurrencias que
+    difieren de ella, en lugar de clonar una fila Event por cada ocurrencia.
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    event_id: int = Field(foreign_key="event.id", index=True)
+    original_start: datetime  # Inicio de la ocurrencia según la regla
+    status: str = Field(default="cancelled")  # cancelled, modified, completed
+    
+    # Valores sobrescritos (solo para status "modified")
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
+    title: Optional[str] = None
+    
+    completed_at: Optional[datetime] = None
+    completed_by_id: Optional[int] = Field(default=None, foreign_key="user.id")
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        index=True,
+        sa_column_kwargs={"onupdate": lambda: datetime.now(timezone.utc)}
+    )
+    
+    # Relaciones
+    event: Event = Relationship(back_populates="recurrence_exceptions")
 
 class EventShare(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -96,6 +141,11 @@ class EventShare(SQLModel, table=True):
     shared_with_user_id: int = Field(foreign_key="user.id")
     can_edit: bool = Field(default=False)
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        index=True,
+        sa_column_kwargs={"onupdate": lambda: datetime.now(timezone.utc)}
+    )
     
     # Relaciones
     event: Event = Relationship(back_populates="shared_with")
@@ -118,6 +168,25 @@ class NotificationLog(SQLModel, table=True):
     # Relaciones
     event: Event = Relationship(back_populates="notification_logs")
 
+class UserIntegration(SQLModel, table=True):
+    """Conexión de un usuario con un calendario externo (Google Calendar)"""
+    __table_args__ = (UniqueConstraint("user_id", "provider", name="uq_userintegration_user_provider"),)
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    family_id: int = Field(foreign_key="family.id")  # Familia donde se guardan los eventos importados
+    provider: str = Field(default="google")
+    calendar_id: str = Field(default="primary")
+    encrypted_refresh_token: str  # Cifrado con Fernet (ver security.encrypt_secret)
+    
+    # Estado de la sincronización incremental
+    sync_token: Optional[str] = None  # nextSyncToken de Google (pull)
+    last_pushed_at: Optional[datetime] = None  # Eventos locales con updated_at posterior se envían (push)
+    last_synced_at: Optional[datetime] = None
+    status: str = Field(default="active")  # active, error, revoked
+    last_error: Optional[str] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
 class TaskAssignmentHistory(SQLModel, table=True):
     """Historial de reasignaciones de tareas/eventos"""
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -151,6 +220,11 @@ class Task(SQLModel, table=True):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     completed_at: Optional[datetime] = None
     completed_by_id: Optional[int] = Field(default=None, foreign_key="user.id")
+    updated_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        index=True,
+        sa_column_kwargs={"onupdate": lambda: datetime.now(timezone.utc)}
+    )
     
     # Notificaciones
     notification_config: Optional[str] = Field(default='{"pre": [15], "unit": "minutes"}')
@@ -161,4 +235,18 @@ class ChatMessage(SQLModel, table=True):
     family_id: int = Field(foreign_key="family.id")
     user_id: int = Field(foreign_key="user.id")
     content: str
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
\ No newline at end of file
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class Tombstone(SQLModel, table=True):
+    """
+    Registro de un borrado para la sincronización delta (GET /api/sync).
+    Lo ven los miembros de family_id y el usuario user_id (quien ya no es miembro o
+    con quien se había compartido el evento).
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    entity: str  # event, task, share, membership
+    entity_id: str  # ID de la fila borrada ("family_id:user_id" para membresías)
+    family_id: Optional[int] = Field(default=None, index=True)
+    user_id: Optional[int] = Field(default=None, index=True)
+    external_id: Optional[str] = None  # Evento de Google Calendar: el push envía el borrado
+    deleted_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), index=True)
@@ -1,13 +1,21 @@
 import os
 import json
-import firebase_admin
-from firebase_admin import credentials, messaging
-from sqlmodel import Session, select
-from .models import NotificationToken
+from sqlmodel import Session
+from .services.push_gateway import push_gateway
 
 # Variable para asegurar que Firebase se inicialice solo una vez
 _firebase_app_initialized = False
 
+# firebase_admin.messaging: se importa al inicializar Firebase, no al arrancar la app
+messaging = None
+
+def load_messaging():
+    global messaging
+    if messaging is None:
+        from firebase_admin import messaging as firebase_messaging
+        messaging = firebase_messaging
+    return messaging
+
 def initialize_firebase_app():
     """
     Inicializa la app de Firebase Admin usando las credenciales
@@ -24,9 +32,12 @@ def initialize_firebase_app():
         return
 
     try:
+        import firebase_admin
+        from firebase_admin import credentials
         creds_dict = json.loads(firebase_creds_json)
         cred = credentials.Certificate(creds_dict)
         firebase_admin.initialize_app(cred)
+        load_messaging()
         _firebase_app_initialized = True
         print("Firebase Admin SDK inicializado correctamente.")
     except Exception as e:
@@ -34,27 +45,8 @@ def initialize_firebase_app():
 
 def send_notification_to_family(session: Session, family_id: int, title: str, body: str):
     """
-    Busca todos los tokens de los dispositivos de una familia y les envía una notificación.
+    Envía una notificación a todos los dispositivos de los miembros de una familia.
     """
-    if not _firebase_app_initialized:
-        print("No se puede enviar notificación: Firebase no está inicializado.")
-        return 
-
-    # 1. Obtener todos los tokens para la familia
-    statement = select(NotificationToken).where(NotificationToken.family_id == family_id)
-    tokens_in_db = session.exec(statement).all()
-    
-    registration_tokens = [t.token for t in tokens_in_db]
-
-    if not registration_tokens:
-        return # No hay dispositivos registrados
-
-    # 2. Crear el mensaje
-    message = messaging.MulticastMessage(
-        notification=messaging.Notification(title=title, body=body),
-        tokens=registration_tokens,
-    )
-
-    # 3. Enviar el mensaje
-    response = messaging.send_multicast(message)  # type: ignore
-    print(f"Notificaciones enviadas: {response.success_count}, fallidas: {response.failure_count}")
\ No newline at end of file
+    report = push_gateway.notify_family(session, family_id, title, body)
+    session.commit()
+    print(f"Notificaciones enviadas: {report.sent}, fallidas: {report.failed}")
@@ -1,62 +1,76 @@
 import os
 import json
 import re
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfoNotFoundError
 from fastapi import APIRouter, HTTPException, Depends
 from dotenv import load_dotenv
 from sqlmodel import Session, select, or_
 
 load_dotenv()
 
-# Intentar usar Groq primero (gratis y rápido), luego Gemini
+# Intentar usar Groq primero (gratis y rápido), luego Gemini. El proveedor se decide por
+# las claves configuradas; los SDKs se importan y configuran recién en la primera llamada
+# (importarlos al arrancar cuesta cientos de ms en cada cold start de Render).
 groq_key = os.getenv("GROQ_API_KEY")
 gemini_key = os.getenv("GEMINI_API_KEY")
 
 AI_PROVIDER = None
 groq_client = None
+_gemini_configured = False
 
 if groq_key:
-    try:
-        # Eliminar variables de proxy que pueden causar errores en la inicialización de Groq en Render
-        # Render a veces inyecta proxies que la librería de Groq/httpx no maneja bien por defecto
-        if "http_proxy" in os.environ:
-            del os.environ["http_proxy"]
-        if "https_proxy" in os.environ:
-            del os.environ["https_proxy"]
-            
-        from groq import Groq
-        groq_client = Groq(api_key=groq_key)
-        AI_PROVIDER = "groq"
-        print("✅ Usando Groq AI (gratis y rápido)")
-    except Exception as e:
-        print(f"⚠️ Error al inicializar Groq: {e}")
-        # Si falla Groq, intentamos seguir para ver si Gemini funciona
+    # Eliminar variables de proxy que pueden causar errores en la inicialización de Groq en Render
+    # Render a veces inyecta proxies que la librería de Groq/httpx no maneja bien por defecto
+    if "http_proxy" in os.environ:
+        del os.environ["http_proxy"]
+    if "https_proxy" in os.environ:
+        del os.environ["https_proxy"]
+    AI_PROVIDER = "groq"
+    print("✅ Usando Groq AI (gratis y rápido)")
+elif gemini_key:
+    AI_PROVIDER = "gemini"
+    print("✅ Usando Google Gemini AI")
+else:
+    print("❌ No hay ninguna API de IA configurada. Configura GROQ_API_KEY o GEMINI_API_KEY")
 
-if not AI_PROVIDER and gemini_key:
-    try:
-        import google.generativeai as genai
-        genai.configure(api_key=gemini_key)  # type: ignore
-        AI_PROVIDER = "gemini"
-        print("✅ Usando Google Gemini AI")
-    except Exception as e:
-        print(f"⚠️ Error configurando Gemini: {e}")
+def get_groq_client():
+    """Cliente de Groq, creado en la primera llamada"""
+    global groq_client
+    if groq_client is None and groq_key:
+        try:
+            from groq import Groq
+            groq_client = Groq(api_key=groq_key)
+        except Exception as e:
+            print(f"⚠️ Error al inicializar Groq: {e}")
+    return groq_client
 
-if not AI_PROVIDER:
-    print("❌ No hay ninguna API de IA configurada. Configura GROQ_API_KEY o GEMINI_API_KEY")
+def get_gemini():
+    """Módulo de Gemini, configurado en la primera llamada"""
+    global _gemini_configured
+    import google.generativeai as genai
+    if not _gemini_configured:
+        genai.configure(api_key=gemini_key)  # type: ignore
+        _gemini_configured = True
+    return genai
 
-from ..schemas import PromptUsuario
+from ..schemas import PromptUsuario, SuggestTimeRequest
+from ..services.scheduling import find_free_slots
+from ..services.recurrence import naive_utc
 from ..database import get_session
 from ..security import get_current_user_id
 from ..models import Event, FamilyMember, EventShare
+from ..services.projections import EventSummary, fetch_records, select_records
 
 router = APIRouter()
 
 def call_groq_ai(prompt: str) -> str:
     """Llama a Groq AI (gratis y muy rápido)"""
-    if not groq_client:
+    client = get_groq_client()
+    if not client:
         raise RuntimeError("Groq client no está disponible")
         
-    chat_completion = groq_client.chat.completions.create(
+    chat_completion = client.chat.completions.create(
         messages=[
             {
                 "role": "system",
@@ -75,8 +89,7 @@ def call_groq_ai(prompt: str) -> str:
 
 def call_gemini_ai(prompt: str) -> str:
     """Llama a Google Gemini AI"""
-    import google.generativeai as genai
-    model = genai.GenerativeModel('gemini-1.5-flash')  # type: ignore
+    model = get_gemini().GenerativeModel('gemini-1.5-flash')  # type: ignore
     response = model.generate_content(prompt)
     return response.text
 
@@ -127,57 +140,71 @@ async def procesar_texto_ia(prompt: PromptUsuario):
         raise HTTPException(status_code=500, detail=f"Error al procesar con IA: {type(e).__name__}: {str(e)}")
 
 
-@router.post("/suggest-time", summary="Sugiere mejor horario para un evento usando IA")
+@router.post("/suggest-time", summary="Sugiere mejor horario para un evento")
 async def suggest_optimal_time(
-    prompt: PromptUsuario,
+    prompt: SuggestTimeRequest,
     session: Session = Depends(get_session),
     user_id: int = Depends(get_current_user_id)
 ):
-    """Analiza eventos existentes y sugiere el mejor horario"""
-    if not AI_PROVIDER:
-        raise HTTPException(status_code=503, detail="No hay ninguna API de IA configurada")
-    
-    # Obtener eventos de los próximos 7 días
-    now = datetime.now()
-    week_later = now + timedelta(days=7)
-    
-    statement = select(Event).where(
-        Event.family_id == user_id,
-        Event.start_time >= now,
-        Event.start_time <= week_later
-    )
-    eventos = session.exec(statement).all()
-    
-    # Crear contexto de eventos
-    eventos_str = "\n".join([
-        f"- {e.title}: {e.start_time.isoformat()} a {e.end_time.isoformat()}"
-        for e in eventos
-    ])
-    
-    system_prompt = f"""
-    Eres un asistente de calendario. Analiza los siguientes eventos programados:
-    {eventos_str}
+    """
+    Busca huecos libres en la agenda de la familia con el motor local de disponibilidad.
+    La IA (si está configurada) solo redacta la explicación del horario elegido.
+    """
+    membership_query = select(FamilyMember).where(FamilyMember.user_id == user_id)
+    if prompt.family_id:
+        membership_query = membership_query.where(FamilyMember.family_id == prompt.family_id)
+    membership = session.exec(membership_query).first()
+    if not membership:
+        raise HTTPException(status_code=403, detail="No eres miembro de esta familia")
+    if prompt.day_end <= prompt.day_start:
+        raise HTTPException(status_code=400, detail="La franja horaria debe terminar después de empezar")
     
-    El usuario quiere: "{prompt.texto}"
+    try:
+        slots = find_free_slots(
+            session,
+            membership.family_id,
+            duration=timedelta(minutes=prompt.duration_minutes),
+            end=naive_utc(datetime.now(timezone.utc)) + timedelta(days=prompt.days),
+            day_start=prompt.day_start,
+            day_end=prompt.day_end,
+            buffer=timedelta(minutes=prompt.buffer_minutes),
+            tz=prompt.timezone
+        )
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Zona horaria desconocida: {prompt.timezone}")
     
-    Sugiere el mejor horario considerando:
-    1. Evitar conflictos
-    2. Horarios razonables (9am-9pm)
-    3. Dejar tiempo entre eventos
+    if not slots:
+        raise HTTPException(status_code=404, detail="No hay huecos libres con esos criterios")
     
-    Devuelve SOLO un JSON con: {{"suggested_start": "ISO8601", "suggested_end": "ISO8601", "reason": "explicación breve"}}
-    """
+    best = slots[0]
+    reason = ". ".join(best.reasons)
+    reason_source = "local"
+    if AI_PROVIDER:
+        system_prompt = f"""
+        El usuario quiere: "{prompt.texto}"
+        Se eligió el horario {best.start.isoformat()} a {best.end.isoformat()} (UTC) por estos motivos: {reason}.
+        Redacta en una sola frase breve, en español, por qué es un buen horario.
+        Devuelve SOLO un JSON con: {{"reason": "explicación breve"}}
+        """
+        try:
+            if AI_PROVIDER == "groq":
+                response_text = call_groq_ai(system_prompt)
+            else:
+                response_text = call_gemini_ai(system_prompt)
+            texto_limpio = response_text.replace("```json", "").replace("```", "").strip()
+            reason = json.loads(texto_limpio)["reason"]
+            reason_source = "ai"
+        except Exception as e:
+            # El horario ya está decidido; sin IA se usa la explicación local
+            print(f"⚠️ No se pudo redactar la explicación con IA: {e}")
     
-    try:
-        if AI_PROVIDER == "groq":
-            response_text = call_groq_ai(system_prompt)
-        else:
-            response_text = call_gemini_ai(system_prompt)
-            
-        texto_limpio = response_text.replace("```json", "").replace("```", "").strip()
-        return json.loads(texto_limpio)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    return {
+        "suggested_start": best.start,
+        "suggested_end": best.end,
+        "reason": reason,
+        "reason_source": reason_source,
+        "alternatives": [slot.to_dict() for slot in slots[1:]]
+    }
 
 
 @router.post("/analyze-routine", summary="Analiza rutinas y patrones de eventos")
@@ -191,19 +218,19 @@ async def analyze_routine(
     
     # Obtener eventos del último mes
     month_ago = datetime.now() - timedelta(days=30)
-    statement = select(Event).where(
+    statement = select(Event.category).where(
         Event.family_id == user_id,
         Event.start_time >= month_ago
     )
-    eventos = session.exec(statement).all()
+    categorias = session.exec(statement).all()
     
-    if not eventos:
+    if not categorias:
         return {"analysis": "No hay suficientes eventos para analizar patrones."}
     
     # Crear resumen de eventos
     eventos_resumen = {}
-    for e in eventos:
-        categoria = e.category or "sin_categoria"
+    for categoria in categorias:
+        categoria = categoria or "sin_categoria"
         if categoria not in eventos_resumen:
             eventos_resumen[categoria] = 0
         eventos_resumen[categoria] += 1
@@ -212,7 +239,7 @@ async def analyze_routine(
     Analiza los siguientes datos de eventos del último mes:
     {json.dumps(eventos_resumen, indent=2)}
     
-    Total de eventos: {len(eventos)}
+    Total de eventos: {len(categorias)}
     
     Proporciona:
     1. Patrones identificados
@@ -328,8 +355,8 @@ async def optimize_schedule(
                 detail="Usuario no pertenece a ninguna familia"
             )
         
-        # Obtener eventos
-        events_query = select(Event).where(
+        # Obtener eventos (solo lo que se le pasa a la IA)
+        events_query = select_records(EventSummary).where(
             or_(
                 Event.owner_id == user_id,
                 Event.family_id == member.family_id
@@ -337,7 +364,7 @@ async def optimize_schedule(
             Event.start_time >= ahora,
             Event.start_time <= una_semana
         )
-        eventos = session.exec(events_query).all()
+        eventos = fetch_records(session, EventSummary, events_query)
         
         # Convertir eventos a formato simple para la IA
         eventos_data = [
@@ -1,8 +1,10 @@
+from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
 from ..database import get_session
 from ..models import User, Family, FamilyMember
 from ..security import get_password_hash, verify_password, create_access_token, get_current_user_id
+from ..services.presence import presence
 from pydantic import BaseModel
 import secrets
 import string
@@ -98,22 +100,26 @@ async def login_slash(user: UserLogin, session: Session = Depends(get_session)):
 
 @router.get("/familia/miembros")
 async def get_family_members(
+    online: Optional[bool] = None,
     session: Session = Depends(get_session),
     user_id: int = Depends(get_current_user_id)
 ):
-    """Obtener miembros de la familia del usuario"""
-    # Obtener familia del usuario
-    member = session.exec(select(FamilyMember).where(FamilyMember.user_id == user_id)).first()
-    
-    if not member:
-        return []
-    
-    # Obtener todos los miembros de la familia
-    members = session.exec(
-        select(User)
+    """
+    Obtener miembros de la familia del usuario.
+    Cada miembro incluye "online" (presencia del chat, resuelta en memoria).
+    Con ?online=true solo se devuelven los miembros conectados.
+    """
+    # Familia del usuario como subconsulta: miembros y perfiles en una sola consulta
+    family_id = select(FamilyMember.family_id).where(FamilyMember.user_id == user_id).limit(1).scalar_subquery()
+    statement = (
+        select(User.id, User.full_name, User.email, User.avatar_url, User.color, FamilyMember.family_id)
         .join(FamilyMember)
-        .where(FamilyMember.family_id == member.family_id)
-    ).all()
+        .where(FamilyMember.family_id == family_id)
+    )
+    members = session.exec(statement).all()
+    if not members:
+        return []
+    online_ids = set(presence.online_users(members[0].family_id))
     
     return [
         {
@@ -121,9 +127,11 @@ async def get_family_members(
             "full_name": m.full_name,
             "email": m.email,
             "avatar_url": m.avatar_url,
-            "color": m.color
+            "color": m.color,
+            "online": m.id in online_ids
         }
         for m in members
+        if online is None or (m.id in online_ids) == online
     ]
 
 @router.get("/me")
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlmodel import Session, select
+
+from ..database import get_session
+from ..models import FamilyMember
+from ..security import get_current_user_id
+from ..services.availability import free_windows
+
+router = APIRouter()
+
+# Rango máximo por consulta (12 semanas = 8064 franjas de 15 minutos)
+MAX_AVAILABILITY_RANGE = timedelta(weeks=12)
+
+@router.get("/")
+def read_availability(
+    start: datetime,
+    end: datetime,
+    family_id: Optional[int] = None,
+    user_ids: Optional[List[int]] = Query(None),
+    min_minutes: int = Query(15, gt=0),
+    mode: str = Query("all", pattern="^(all|any)$"),
+    session: Session = Depends(get_session),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    Ventanas libres comunes de los miembros de la familia en [start, end).
+    mode=all: todos libres; mode=any: al menos uno libre.
+    Sin user_ids se consideran todos los miembros de la familia.
+    """
+    if end <= start:
+        raise HTTPException(status_code=400, detail="La ventana debe terminar después de empezar")
+    if end - start > MAX_AVAILABILITY_RANGE:
+        raise HTTPException(status_code=400, detail="El rango máximo es de 12 semanas")
+    
+    membership_query = select(FamilyMember).where(FamilyMember.user_id == user_id)
+    if family_id:
+        membership_query = membership_query.where(FamilyMember.family_id == family_id)
+    membership = session.exec(membership_query).first()
+    if not membership:
+        raise HTTPException(status_code=403, detail="No eres miembro de esta familia")
+    
+    member_ids = set(session.exec(
+        select(FamilyMember.user_id).where(FamilyMember.family_id == membership.family_id)
+    ).all())
+    if user_ids:
+        if not set(user_ids) <= member_ids:
+            raise HTTPException(status_code=400, detail="Todos los usuarios deben ser miembros de la familia")
+        member_ids = set(user_ids)
+    
+    result = free_windows(
+        session,
+        sorted(member_ids),
+        start,
+        end,
+        min_duration=timedelta(minutes=min_minutes),
+        mode=mode
+    )
+    return {
+        "family_id": membership.family_id,
+        "user_ids": sorted(member_ids),
+        "mode": mode,
+        "slot_minutes": result["slot_minutes"],
+        "busy_slots": result["busy_slots"],
+        "windows": [{"start": s, "end": e} for s, e in result["windows"]]
+    }
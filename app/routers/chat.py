@@ -1,22 +1,79 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException
 from sqlmodel import Session, select
 from datetime import datetime, timezone
-import json
 
 from ..database import get_session
 from ..models import ChatMessage, FamilyMember, User
 from ..schemas import MessageRead
 from ..security import get_current_user_id_websocket
-from ..services.websocket_manager import manager
+from ..services.websocket_manager import manager, negotiate_subprotocol, encoding_for, decode_frame
+from ..services.presence import presence
+from ..services.serialization import MESSAGE_COLUMNS, json_response, message_list_adapter
 
 router = APIRouter()
 
+def get_recent_messages(session: Session, family_id: int, limit: int = 50) -> List[dict]:
+    """Últimos mensajes de la familia en orden cronológico, con el nombre del autor"""
+    messages = session.exec(
+        select(*MESSAGE_COLUMNS)
+        .join(User)
+        .where(ChatMessage.family_id == family_id)
+        .order_by(ChatMessage.created_at.desc())
+        .limit(limit)
+    ).all()
+    
+    # Devolver cronológico
+    return [dict(row._mapping) for row in reversed(messages)]
+
+async def send_missed_frames(websocket: WebSocket, family_id: int, missed: Optional[List[dict]], session: Session):
+    """
+    Reenvía al cliente los frames que se perdió (obtenidos con manager.missed_since).
+    Si el hueco ya no está en el log de replay (missed es None), envía un frame
+    "resync" con el historial reciente de la BD para que el cliente reemplace su estado.
+    """
+    if missed is not None:
+        for frame in missed:
+            await manager.send(websocket, frame)
+        return
+
+    # Capturar la secuencia antes de consultar la BD: lo que llegue después se recibe por broadcast
+    seq = manager.current_seq(family_id)
+    messages = [
+        {**m, "created_at": m["created_at"].isoformat()}
+        for m in get_recent_messages(session, family_id)
+    ]
+    await manager.send(websocket, {"type": "resync", "seq": seq, "messages": messages})
+
+def parse_seq(value) -> Optional[int]:
+    """seq enviado por el cliente; None si no es un entero válido (se responde con resync)"""
+    if isinstance(value, bool):
+        return None
+    try:
+        seq = int(value)
+    except (TypeError, ValueError):
+        return None
+    return seq if seq >= 0 else None
+
+async def resume(websocket: WebSocket, family_id: int, last_seq: Optional[int], session: Session):
+    """
+    Reenvía lo perdido desde last_seq. Los broadcasts a esta conexión se encolan durante
+    el replay y se envían después, así el cliente recibe los seq en orden.
+    """
+    # hold + snapshot sin await intermedio: todo frame posterior queda encolado
+    manager.hold(websocket)
+    try:
+        missed = manager.missed_since(family_id, last_seq) if last_seq is not None else None
+        await send_missed_frames(websocket, family_id, missed, session)
+    finally:
+        await manager.release(websocket)
+
 @router.websocket("/ws/{family_id}/{token}")
 async def websocket_endpoint(
     websocket: WebSocket, 
     family_id: int, 
     token: str,
+    last_seq: Optional[str] = None,
     session: Session = Depends(get_session)
 ):
     # Validar token y obtener usuario (simplificado para WebSocket)
@@ -35,16 +92,51 @@ async def websocket_endpoint(
         await websocket.close(code=1008)
         return
 
-    await manager.connect(websocket, family_id)
+    # Codificación de frames: JSON por defecto, MessagePack si el cliente lo pide como subprotocolo
+    subprotocol = negotiate_subprotocol(websocket.scope.get("subprotocols", []))
+    encoding = encoding_for(subprotocol)
+    await websocket.accept(subprotocol=subprotocol)
     
     try:
+        manager.register(websocket, family_id, encoding, user_id)
+        presence.heartbeat(family_id, user_id)
+        # Reanudación: el cliente indica el último seq recibido (?last_seq=N)
+        if last_seq is not None:
+            await resume(websocket, family_id, parse_seq(last_seq), session)
+
         while True:
-            data = await websocket.receive_text()
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            try:
+                message_data = decode_frame(message)
+            except Exception:
+                await manager.send(websocket, {"type": "error", "detail": "Frame inválido"})
+                continue
+            if not isinstance(message_data, dict):
+                await manager.send(websocket, {"type": "error", "detail": "Frame inválido"})
+                continue
+            presence.heartbeat(family_id, user_id)
+
+            # Latido explícito del cliente (mantiene la presencia sin enviar nada)
+            if message_data.get("type") == "ping":
+                continue
+
+            # Indicador de escritura: se agrupa y envía en el próximo frame de presencia
+            if message_data.get("type") == "typing":
+                presence.set_typing(family_id, user_id, bool(message_data.get("typing", True)))
+                continue
+
+            # Reanudación dentro de una conexión abierta
+            if message_data.get("type") == "resume":
+                await resume(websocket, family_id, parse_seq(message_data.get("last_seq")), session)
+                continue
+
             # Guardar mensaje en BD
-            message_data = json.loads(data)
             content = message_data.get("content")
             
             if content:
+                presence.set_typing(family_id, user_id, False)
                 new_message = ChatMessage(
                     family_id=family_id,
                     user_id=user_id,
@@ -70,7 +162,11 @@ async def websocket_endpoint(
                 await manager.broadcast(response, family_id)
                 
     except WebSocketDisconnect:
+        pass
+    finally:
+        # También ante errores (frame o BD): no dejar sockets muertos ni usuarios "en línea"
         manager.disconnect(websocket, family_id)
+        presence.leave(family_id, user_id)
 
 @router.get("/history/{family_id}", response_model=List[MessageRead])
 def get_chat_history(
@@ -78,19 +174,4 @@ def get_chat_history(
     session: Session = Depends(get_session)
     # Aquí deberíamos validar auth normal también, pero por brevedad lo omito o uso dependencia global
 ):
-    messages = session.exec(
-        select(ChatMessage, User.full_name)
-        .join(User)
-        .where(ChatMessage.family_id == family_id)
-        .order_by(ChatMessage.created_at.desc())
-        .limit(50)
-    ).all()
-    
-    # Mapear resultados
-    result = []
-    for msg, user_name in messages:
-        m_dict = msg.model_dump()
-        m_dict["user_name"] = user_name
-        result.append(m_dict)
-        
-    return list(reversed(result)) # Devolver cronológico
+    return json_response(message_list_adapter, get_recent_messages(session, family_id))
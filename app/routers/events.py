@@ -1,20 +1,129 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select, or_
+import io
+import json
+import shutil
+import tempfile
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, UploadFile, status
+from fastapi.responses import Response, StreamingResponse
+from sqlmodel import Session, select, or_, and_
 
 from ..database import get_session
-from ..models import Event, FamilyMember, TaskAssignmentHistory, NotificationLog
+from ..models import Event, Family, FamilyMember, TaskAssignmentHistory, NotificationLog
 from ..schemas import EventCreate, EventRead, EventUpdate
-from ..security import get_current_user_id
+from ..security import get_current_user_id, create_feed_token, decode_feed_token
 from ..services.notification_scheduler import schedule_notifications_for_event, handle_recurring_event_completion
+from ..services.recurrence import expand_events, validate_pattern
+from ..services.conflicts import find_conflicts_for_event, overlapping_pairs
+from ..services import compression, event_changes, telemetry
+from ..services.event_import import import_events, iter_csv_rows, iter_ics_rows
+from ..services.ics import feed_cache, feed_versions, http_date, iter_calendar, not_modified
+from ..services.serialization import EVENT_READ_COLUMNS, event_list_adapter, json_response
 from datetime import datetime, timezone
 from pydantic import BaseModel
+from fastapi.encoders import jsonable_encoder
 
 router = APIRouter()
 
+def raise_if_conflicts(
+    session: Session,
+    family_id: Optional[int],
+    start_time: datetime,
+    end_time: datetime,
+    recurrence_pattern: Optional[str] = None,
+    exclude_event_id: Optional[int] = None
+):
+    """409 con la lista de eventos que se solapan con el horario propuesto"""
+    if not family_id:
+        return
+    conflicts = find_conflicts_for_event(
+        session, family_id, start_time, end_time, recurrence_pattern, exclude_event_id
+    )
+    if conflicts:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={
+                "message": "El horario se solapa con otros eventos de la familia",
+                "conflicts": [jsonable_encoder(c.to_dict()) for c in conflicts]
+            }
+        )
+
+def raise_if_invalid_recurrence(is_recurring: bool, recurrence_pattern: Optional[str], start_time: datetime):
+    """422 si el patrón de un evento recurrente no compila como RRULE con su inicio"""
+    if not is_recurring or not recurrence_pattern:
+        return
+    try:
+        validate_pattern(recurrence_pattern, start_time)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+def visible_events_filter(session: Session, user_id: int):
+    """Eventos donde soy owner, de mis familias o compartidos conmigo. Retorna (filtro, family_ids)"""
+    from ..models import EventShare
+    family_ids = session.exec(
+        select(FamilyMember.family_id).where(FamilyMember.user_id == user_id)
+    ).all()
+    shared_event_ids = session.exec(
+        select(EventShare.event_id).where(EventShare.shared_with_user_id == user_id)
+    ).all()
+    condition = or_(
+        Event.owner_id == user_id,
+        Event.family_id.in_(family_ids), # type: ignore
+        Event.id.in_(shared_event_ids) # type: ignore
+    )
+    return condition, family_ids
+
+def calendar_response(
+    request: Request,
+    session: Session,
+    statement,
+    name: str,
+    cache_key: str,
+    validator_keys
+) -> Response:
+    """
+    Respuesta text/calendar con ETag/Last-Modified: 304 si el cliente ya tiene la versión
+    actual, el feed ya comprimido o sin comprimir en caché si existe, o el calendario en
+    streaming desde la BD.
+    """
+    etag, last_modified = feed_versions.validators(validator_keys)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(last_modified),
+        "Cache-Control": "private, no-cache",
+    }
+    if not_modified(request.headers, etag, last_modified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    # Cuerpo ya comprimido (lo guarda CompressionMiddleware): sin BD ni compresión
+    precompressed = compression.lookup_precompressed(request.scope, request.headers.get("accept-encoding"), etag)
+    if precompressed is not None:
+        encoding, body = precompressed
+        telemetry.http_precompressed_hits.inc((encoding,))
+        return Response(body, media_type="text/calendar; charset=utf-8", headers={
+            **headers,
+            # Otra representación del mismo recurso: ETag débil, como en el middleware
+            "ETag": f"W/{etag}",
+            "Content-Encoding": encoding,
+        })
+    
+    cached = feed_cache.get(cache_key, etag)
+    if cached is not None:
+        return Response(cached, media_type="text/calendar; charset=utf-8", headers=headers)
+    
+    def body():
+        try:
+            yield from feed_cache.caching(cache_key, etag, iter_calendar(session, statement, name))
+        finally:
+            # La dependencia de sesión ya terminó: liberar la conexión usada por el cursor
+            session.close()
+    
+    headers["Content-Disposition"] = f'inline; filename="{cache_key.split(":")[0]}.ics"'
+    return StreamingResponse(body(), media_type="text/calendar; charset=utf-8", headers=headers)
+
 @router.post("/", response_model=EventRead, status_code=status.HTTP_201_CREATED)
 def create_event(
     event: EventCreate,
+    check_conflicts: bool = False,
     session: Session = Depends(get_session),
     user_id: int = Depends(get_current_user_id)
 ):
@@ -28,6 +137,8 @@ def create_event(
         if not membership:
             raise HTTPException(status_code=403, detail="No eres miembro de esta familia")
 
+    raise_if_invalid_recurrence(event.is_recurring, event.recurrence_pattern, event.start_time)
+
     event_data = event.model_dump()
     event_data["owner_id"] = user_id
     
@@ -35,42 +146,219 @@ def create_event(
     if not event_data.get("family_id"):
         event_data["visibility"] = "private"
 
+    if check_conflicts:
+        raise_if_conflicts(
+            session,
+            event_data.get("family_id"),
+            event.start_time,
+            event.end_time,
+            event.recurrence_pattern if event.is_recurring else None
+        )
+
     db_event = Event.model_validate(event_data)
         
     session.add(db_event)
     session.commit()
     session.refresh(db_event)
+    event_changes.event_saved(session, db_event)
     return db_event
 
+@router.post("/import")
+def import_events_file(
+    family_id: int,
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(ics|csv)$"),
+    session: Session = Depends(get_session),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    Importa eventos desde un archivo ICS o CSV (encabezados: title, start_time, end_time,
+    description, category, visibility, is_recurring, recurrence_pattern, assigned_to_id).
+    Responde con NDJSON: una línea por fila con errores, una por bloque importado y un resumen final.
+    """
+    membership = session.exec(
+        select(FamilyMember)
+        .where(FamilyMember.family_id == family_id)
+        .where(FamilyMember.user_id == user_id)
+    ).first()
+    if not membership:
+        raise HTTPException(status_code=403, detail="No eres miembro de esta familia")
+    
+    if format is None:
+        filename = (file.filename or "").lower()
+        if filename.endswith(".ics") or file.content_type == "text/calendar":
+            format = "ics"
+        elif filename.endswith(".csv") or file.content_type == "text/csv":
+            format = "csv"
+        else:
+            raise HTTPException(status_code=400, detail="Formato no reconocido: indica ?format=ics o ?format=csv")
+    
+    member_ids = session.exec(
+        select(FamilyMember.user_id).where(FamilyMember.family_id == family_id)
+    ).all()
+    # FastAPI cierra el UploadFile antes de que corra el StreamingResponse: se copia por
+    # bloques a un temporal propio que luego se lee línea a línea sin cargarlo entero
+    spool = tempfile.TemporaryFile()
+    shutil.copyfileobj(file.file, spool)
+    spool.seek(0)
+    lines = io.TextIOWrapper(spool, encoding="utf-8-sig", errors="replace", newline="")
+    rows = iter_ics_rows(lines) if format == "ics" else iter_csv_rows(lines)
+    
+    def body():
+        imported = 0
+        try:
+            for message in import_events(session, rows, user_id, family_id, member_ids):
+                imported = message.get("imported", imported)
+                yield json.dumps(message, ensure_ascii=False) + "\n"
+        finally:
+            if imported:
+                event_changes.events_imported(family_id, member_ids)
+            lines.close()
+            session.close()
+    
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
 @router.get("/", response_model=List[EventRead])
 def read_events(
     skip: int = 0,
     limit: int = 100,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
     session: Session = Depends(get_session),
     user_id: int = Depends(get_current_user_id)
 ):
-    # Obtener IDs de familias del usuario
-    family_ids = session.exec(
-        select(FamilyMember.family_id).where(FamilyMember.user_id == user_id)
-    ).all()
-
-    # Obtener IDs de eventos compartidos conmigo
-    from ..models import EventShare
-    shared_event_ids = session.exec(
-        select(EventShare.event_id).where(EventShare.shared_with_user_id == user_id)
-    ).all()
-
+    """
+    Eventos visibles para el usuario.
+    Con una ventana (?start=...&end=...) solo se devuelven los eventos que se solapan
+    con ella y los eventos recurrentes se expanden en ocurrencias virtuales.
+    """
     # Query: Eventos donde soy owner O eventos de mis familias O eventos compartidos conmigo
-    statement = select(Event).where(
-        or_(
-            Event.owner_id == user_id,
-            Event.family_id.in_(family_ids), # type: ignore
-            Event.id.in_(shared_event_ids) # type: ignore
+    # Solo las columnas de EventRead: filas livianas serializadas con un TypeAdapter precompilado
+    visible, _ = visible_events_filter(session, user_id)
+    statement = select(*EVENT_READ_COLUMNS).where(visible)
+    
+    if start and end:
+        statement = statement.where(
+            or_(
+                and_(Event.is_recurring == True, Event.start_time < end),
+                and_(Event.start_time < end, Event.end_time > start)
+            )
         )
-    ).offset(skip).limit(limit)
     
-    events = session.exec(statement).all()
-    return events
+    events = session.exec(statement.offset(skip).limit(limit)).all()
+    
+    if start and end:
+        events = expand_events(session, events, start, end)
+    return json_response(event_list_adapter, events)
+
+@router.get("/conflicts")
+def read_conflicts(
+    family_id: int,
+    start: datetime,
+    end: datetime,
+    session: Session = Depends(get_session),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    Pares de eventos de la familia que se solapan dentro de la ventana [start, end).
+    Las ocurrencias de eventos recurrentes se incluyen con su recurrence_id.
+    """
+    membership = session.exec(
+        select(FamilyMember)
+        .where(FamilyMember.family_id == family_id)
+        .where(FamilyMember.user_id == user_id)
+    ).first()
+    if not membership:
+        raise HTTPException(status_code=403, detail="No eres miembro de esta familia")
+    if end <= start:
+        raise HTTPException(status_code=400, detail="La ventana debe terminar después de empezar")
+    
+    pairs = overlapping_pairs(session, family_id, start, end)
+    return {
+        "family_id": family_id,
+        "start": start,
+        "end": end,
+        "conflicts": [
+            {
+                "first": first.to_dict(),
+                "second": second.to_dict(),
+                "overlap_start": max(first.start_time, second.start_time),
+                "overlap_end": min(first.end_time, second.end_time)
+            }
+            for first, second in pairs
+        ]
+    }
+
+@router.get("/export.ics")
+def export_events_ics(
+    request: Request,
+    session: Session = Depends(get_session),
+    user_id: int = Depends(get_current_user_id)
+):
+    """Exporta en formato iCalendar todos los eventos visibles para el usuario"""
+    visible, family_ids = visible_events_filter(session, user_id)
+    statement = select(Event).where(visible).order_by(Event.id)
+    validator_keys = [("user", user_id)] + [("family", family_id) for family_id in family_ids]
+    return calendar_response(request, session, statement, "FamilIAgenda", f"export:{user_id}", validator_keys)
+
+class FeedTokenRequest(BaseModel):
+    family_id: int
+
+@router.post("/feed-token")
+def create_calendar_feed_token(
+    request: FeedTokenRequest,
+    session: Session = Depends(get_session),
+    user_id: int = Depends(get_current_user_id)
+):
+    """URL de suscripción (webcal) al calendario de la familia para otras apps de calendario"""
+    membership = session.exec(
+        select(FamilyMember)
+        .where(FamilyMember.family_id == request.family_id)
+        .where(FamilyMember.user_id == user_id)
+    ).first()
+    if not membership:
+        raise HTTPException(status_code=403, detail="No eres miembro de esta familia")
+    
+    token = create_feed_token(user_id, request.family_id)
+    return {"token": token, "path": f"/api/events/feed/{token}.ics"}
+
+@router.get("/feed/{token}.ics")
+def family_calendar_feed(
+    token: str,
+    request: Request,
+    session: Session = Depends(get_session)
+):
+    """Feed ICS de la familia autenticado por el token de la URL (sin cabecera Authorization)"""
+    claims = decode_feed_token(token)
+    if not claims:
+        raise HTTPException(status_code=404, detail="Calendario no encontrado")
+    
+    family_id, user_id = claims["family_id"], claims["user_id"]
+    # El acceso se pierde al salir de la familia. Membresía y nombre en una sola consulta:
+    # con el feed en caché es la única lectura de la BD
+    family_name = session.exec(
+        select(Family.name)
+        .join(FamilyMember, FamilyMember.family_id == Family.id)
+        .where(FamilyMember.family_id == family_id)
+        .where(FamilyMember.user_id == user_id)
+    ).first()
+    if family_name is None:
+        raise HTTPException(status_code=404, detail="Calendario no encontrado")
+    
+    statement = (
+        select(Event)
+        .where(Event.family_id == family_id)
+        .where(or_(Event.visibility != "private", Event.owner_id == user_id))
+        .order_by(Event.id)
+    )
+    return calendar_response(
+        request,
+        session,
+        statement,
+        family_name or "FamilIAgenda",
+        f"family:{family_id}:{user_id}",
+        [("family", family_id)]
+    )
 
 @router.get("/{event_id}", response_model=EventRead)
 def read_event(
@@ -103,6 +391,7 @@ def read_event(
 def update_event(
     event_id: int,
     event_update: EventUpdate,
+    check_conflicts: bool = False,
     session: Session = Depends(get_session),
     user_id: int = Depends(get_current_user_id)
 ):
@@ -144,12 +433,49 @@ def update_event(
         raise HTTPException(status_code=403, detail="No tienes permiso para editar este evento")
     
     event_data = event_update.model_dump(exclude_unset=True)
+    
+    # Valores resultantes de la edición (lo enviado o, si no, lo guardado)
+    family_id = event_data.get("family_id", db_event.family_id)
+    start_time = event_data.get("start_time") or db_event.start_time
+    end_time = event_data.get("end_time") or db_event.end_time
+    is_recurring = event_data.get("is_recurring", db_event.is_recurring)
+    recurrence_pattern = event_data.get("recurrence_pattern", db_event.recurrence_pattern)
+    
+    # Mover el evento a otra familia exige ser miembro de ella, como al crearlo
+    if family_id and family_id != db_event.family_id:
+        membership = session.exec(
+            select(FamilyMember)
+            .where(FamilyMember.family_id == family_id)
+            .where(FamilyMember.user_id == user_id)
+        ).first()
+        if not membership:
+            raise HTTPException(status_code=403, detail="No eres miembro de esta familia")
+    
+    # Misma validación que al crear. Solo si la edición toca la regla o su inicio: no
+    # bloquea otros cambios en filas viejas
+    if {"is_recurring", "recurrence_pattern", "start_time"} & event_data.keys():
+        raise_if_invalid_recurrence(is_recurring, recurrence_pattern, start_time)
+    
+    if check_conflicts:
+        # Se valida el horario resultante antes de tocar el objeto de la sesión
+        raise_if_conflicts(
+            session,
+            family_id,
+            start_time,
+            end_time,
+            recurrence_pattern if is_recurring else None,
+            exclude_event_id=event_id
+        )
+    
+    previous_user_ids = event_changes.event_user_ids(session, db_event)
+    previous_family_id = db_event.family_id
     for key, value in event_data.items():
         setattr(db_event, key, value)
         
     session.add(db_event)
     session.commit()
     session.refresh(db_event)
+    event_changes.event_saved(session, db_event, previous_user_ids, previous_family_id)
     return db_event
 
 @router.delete("/{event_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -182,8 +508,11 @@ def delete_event(
     if not can_delete:
         raise HTTPException(status_code=403, detail="No tienes permiso para eliminar este evento")
     
+    family_id = db_event.family_id
+    user_ids = event_changes.event_user_ids(session, db_event)
     session.delete(db_event)
     session.commit()
+    event_changes.event_deleted(event_id, family_id, user_ids)
     return None
 
 # Schemas para nuevos endpoints
@@ -192,6 +521,8 @@ class AssignEventRequest(BaseModel):
 
 class CompleteEventRequest(BaseModel):
     completed_by_id: Optional[int] = None
+    # Para eventos recurrentes: inicio de la ocurrencia que se completa (recurrence_id)
+    occurrence_start: Optional[datetime] = None
 
 class NotificationConfigRequest(BaseModel):
     notification_config: str  # JSON string
@@ -248,10 +579,12 @@ def assign_event(
     session.add(history)
     
     # Actualizar asignación
+    previous_user_ids = event_changes.event_user_ids(session, db_event)
     db_event.assigned_to_id = request.assigned_to_id
     session.add(db_event)
     session.commit()
     session.refresh(db_event)
+    event_changes.event_saved(session, db_event, previous_user_ids)
     
     # Reprogramar notificaciones para el nuevo usuario
     schedule_notifications_for_event(session, event_id)
@@ -267,7 +600,8 @@ def complete_event(
 ):
     """
     Marca un evento como completado.
-    Si es recurrente, programa la próxima instancia.
+    Si es recurrente, se completa solo la ocurrencia indicada (o la actual) y se
+    programan las notificaciones de la próxima; el evento maestro sigue vigente.
     """
     db_event = session.get(Event, event_id)
     if not db_event:
@@ -289,18 +623,32 @@ def complete_event(
     if not can_complete:
         raise HTTPException(status_code=403, detail="No tienes permiso para completar este evento")
     
+    completed_by_id = (request.completed_by_id if request else None) or user_id
+    
+    # Si es recurrente, registrar la ocurrencia completada sin clonar el evento
+    try:
+        completed_occurrence = db_event.is_recurring and handle_recurring_event_completion(
+            session,
+            event_id,
+            occurrence_start=request.occurrence_start if request else None,
+            completed_by_id=completed_by_id
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    if completed_occurrence:
+        session.refresh(db_event)
+        event_changes.event_saved(session, db_event)
+        return db_event
+    
     # Marcar como completado
     db_event.status = "completed"
     db_event.completed_at = datetime.now(timezone.utc)
-    db_event.completed_by_id = (request.completed_by_id if request else None) or user_id
+    db_event.completed_by_id = completed_by_id
     
     session.add(db_event)
     session.commit()
     session.refresh(db_event)
-    
-    # Si es recurrente, crear próxima instancia
-    if db_event.is_recurring:
-        handle_recurring_event_completion(session, event_id)
+    event_changes.event_saved(session, db_event)
     
     return db_event
 
@@ -2,84 +2,122 @@ import os
 from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import RedirectResponse
 from sqlmodel import Session, select
-from google_auth_oauthlib.flow import Flow
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from datetime import datetime
-import json
 
 from ..database import get_session
-from ..security import get_current_user_id
-from ..models import User, Event
+from ..security import get_current_user_id, create_oauth_state, decode_oauth_state, encrypt_secret
+from ..models import FamilyMember, UserIntegration
+from ..services.google_calendar import GoogleCalendarClient
+from ..services.google_sync import sync_integration
 
 router = APIRouter()
 
 # Configuración de Google OAuth
 # Asegúrate de tener el archivo client_secret.json en la raíz o configurar las variables de entorno
-CLIENT_SECRETS_FILE = "client_secret.json" 
+CLIENT_SECRETS_FILE = "client_secret.json"
 SCOPES = ['https://www.googleapis.com/auth/calendar.events', 'https://www.googleapis.com/auth/calendar.readonly']
 REDIRECT_URI = "http://localhost:8000/api/integrations/google/callback"
 
-@router.get("/google/auth")
-def google_auth(user_id: int = Depends(get_current_user_id)):
-    """Inicia el flujo de OAuth2 para Google Calendar"""
-    if not os.path.exists(CLIENT_SECRETS_FILE):
-        raise HTTPException(status_code=500, detail="Falta configuración de Google (client_secret.json)")
-
-    flow = Flow.from_client_secrets_file(
+def google_flow():
+    """Flujo OAuth de Google; google_auth_oauthlib se importa solo al conectar una cuenta"""
+    from google_auth_oauthlib.flow import Flow
+    return Flow.from_client_secrets_file(
         CLIENT_SECRETS_FILE,
         scopes=SCOPES,
         redirect_uri=REDIRECT_URI
     )
-    
-    # Pasamos el user_id en el estado para recuperarlo en el callback
+
+def get_google_client() -> GoogleCalendarClient:
+    return GoogleCalendarClient()
+
+@router.get("/google/auth")
+def google_auth(
+    family_id: int,
+    session: Session = Depends(get_session),
+    user_id: int = Depends(get_current_user_id)
+):
+    """Inicia el flujo de OAuth2 para Google Calendar. Los eventos de Google se guardan en `family_id`."""
+    membership = session.exec(
+        select(FamilyMember)
+        .where(FamilyMember.family_id == family_id)
+        .where(FamilyMember.user_id == user_id)
+    ).first()
+    if not membership:
+        raise HTTPException(status_code=403, detail="No eres miembro de esta familia")
+
+    if not os.path.exists(CLIENT_SECRETS_FILE):
+        raise HTTPException(status_code=500, detail="Falta configuración de Google (client_secret.json)")
+
+    flow = google_flow()
+
+    # El state va firmado: el callback no trae cabecera Authorization
     authorization_url, state = flow.authorization_url(
         access_type='offline',
         include_granted_scopes='true',
-        state=str(user_id)
+        prompt='consent',
+        state=create_oauth_state(user_id, family_id)
     )
-    
+
     return {"auth_url": authorization_url}
 
 @router.get("/google/callback")
 async def google_auth_callback(request: Request, session: Session = Depends(get_session)):
-    """Callback de Google OAuth2"""
-    state = request.query_params.get("state")
+    """Callback de Google OAuth2: guarda el refresh token cifrado"""
+    state = decode_oauth_state(request.query_params.get("state") or "")
     if not state:
         raise HTTPException(status_code=400, detail="Estado no válido")
-        
-    user_id = int(state)
-    
+
     if not os.path.exists(CLIENT_SECRETS_FILE):
         raise HTTPException(status_code=500, detail="Falta configuración de Google")
 
-    flow = Flow.from_client_secrets_file(
-        CLIENT_SECRETS_FILE,
-        scopes=SCOPES,
-        redirect_uri=REDIRECT_URI
-    )
-    
+    flow = google_flow()
+
     # Intercambiar código por token
     flow.fetch_token(authorization_response=str(request.url))
     credentials = flow.credentials
-    
-    # Guardar credenciales en el usuario (simplificado, idealmente en tabla separada o encriptado)
-    # Aquí asumimos que podríamos guardar el token en un campo del usuario o una tabla de integraciones
-    # Por ahora, retornamos éxito. En producción: guardar refresh_token.
-    
-    # TODO: Crear tabla UserIntegration para guardar tokens de forma segura
-    
+    if not credentials.refresh_token:
+        raise HTTPException(status_code=400, detail="Google no devolvió un refresh token")
+
+    integration = session.exec(
+        select(UserIntegration)
+        .where(UserIntegration.user_id == state["user_id"])
+        .where(UserIntegration.provider == "google")
+    ).first()
+    if not integration:
+        integration = UserIntegration(
+            user_id=state["user_id"],
+            family_id=state["family_id"],
+            encrypted_refresh_token=encrypt_secret(credentials.refresh_token)
+        )
+    # Una cuenta nueva o una familia distinta empiezan desde cero
+    integration.family_id = state["family_id"]
+    integration.encrypted_refresh_token = encrypt_secret(credentials.refresh_token)
+    integration.sync_token = None
+    integration.last_pushed_at = None
+    integration.status = "active"
+    integration.last_error = None
+    session.add(integration)
+    session.commit()
+
     # Redirigir al frontend con indicador de éxito
     return RedirectResponse(url="http://localhost:5173/settings?google_auth=success")
 
 @router.post("/google/sync")
 def sync_google_calendar(
     session: Session = Depends(get_session),
-    user_id: int = Depends(get_current_user_id)
+    user_id: int = Depends(get_current_user_id),
+    client: GoogleCalendarClient = Depends(get_google_client)
 ):
-    """Sincroniza eventos desde Google Calendar (Demo)"""
-    # Aquí necesitaríamos recuperar las credenciales guardadas del usuario
-    # Como no tenemos persistencia de tokens aún, este endpoint es un placeholder
-    # para la lógica de sincronización.
-    
-    return {"message": "Sincronización iniciada (requiere persistencia de tokens)"}
+    """Sincronización incremental con Google Calendar (pull con syncToken + push de cambios locales)"""
+    integration = session.exec(
+        select(UserIntegration)
+        .where(UserIntegration.user_id == user_id)
+        .where(UserIntegration.provider == "google")
+    ).first()
+    if not integration:
+        raise HTTPException(status_code=404, detail="Google Calendar no está conectado")
+
+    stats = sync_integration(session, integration, client)
+    if integration.status != "active":
+        raise HTTPException(status_code=502, detail=integration.last_error or "Error al sincronizar con Google")
+
+    return {"message": "Sincronización completada", **stats}
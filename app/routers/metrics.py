@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 from ..database import get_session
 from ..security import get_current_user_id
 from ..models import Event, FamilyMember, User
+from ..services.projections import EventStats, fetch_records, select_records
 
 router = APIRouter()
 
@@ -38,8 +39,8 @@ async def get_metrics(
     week_ago = now - timedelta(days=7)
     month_ago = now - timedelta(days=30)
     
-    # Query base
-    base_query = select(Event).where(Event.family_id == family_id)
+    # Query base: solo las columnas que usan las métricas
+    base_query = select_records(EventStats).where(Event.family_id == family_id)
     
     # Aplicar filtro de rango
     if range == "week":
@@ -47,50 +48,45 @@ async def get_metrics(
     elif range == "month":
         base_query = base_query.where(Event.start_time >= month_ago)
     
-    events = session.exec(base_query).all()
+    events = fetch_records(session, EventStats, base_query)
     
-    # Calcular métricas
+    # Calcular métricas en una sola pasada
     total_events = len(events)
-    completed_events = len([e for e in events if e.status == "completed"])
-    pending_events = total_events - completed_events
-    
-    # Eventos esta semana
-    events_this_week = len([
-        e for e in events 
-        if e.start_time >= week_ago
-    ])
-    
-    # Eventos este mes
-    events_this_month = len([
-        e for e in events 
-        if e.start_time >= month_ago
-    ])
-    
-    # Distribución por categoría
+    completed_events = 0
+    events_this_week = 0
+    events_this_month = 0
     category_breakdown = {}
+    assigned_by_user = {}
+    completed_by_user = {}
     for event in events:
+        completed = event.status == "completed"
+        completed_events += completed
+        events_this_week += event.start_time >= week_ago
+        events_this_month += event.start_time >= month_ago
         cat = event.category or "other"
         category_breakdown[cat] = category_breakdown.get(cat, 0) + 1
+        if event.assigned_to_id is not None:
+            assigned_by_user[event.assigned_to_id] = assigned_by_user.get(event.assigned_to_id, 0) + 1
+            if completed:
+                completed_by_user[event.assigned_to_id] = completed_by_user.get(event.assigned_to_id, 0) + 1
+    pending_events = total_events - completed_events
     
     # Estadísticas por miembro
     members = session.exec(
-        select(User)
+        select(User.id, User.full_name)
         .join(FamilyMember)
         .where(FamilyMember.family_id == family_id)
     ).all()
     
     member_stats = []
-    for member_user in members:
-        assigned_events = [e for e in events if e.assigned_to_id == member_user.id]
-        completed = [e for e in assigned_events if e.status == "completed"]
-        
-        assigned_count = len(assigned_events)
-        completed_count = len(completed)
+    for member_id, member_name in members:
+        assigned_count = assigned_by_user.get(member_id, 0)
+        completed_count = completed_by_user.get(member_id, 0)
         completion_rate = round((completed_count / assigned_count * 100)) if assigned_count > 0 else 0
         
         member_stats.append({
-            "user_id": member_user.id,
-            "user_name": member_user.full_name,
+            "user_id": member_id,
+            "user_name": member_name,
             "assigned_count": assigned_count,
             "completed_count": completed_count,
             "completion_rate": completion_rate
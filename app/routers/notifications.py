@@ -5,8 +5,10 @@ from datetime import datetime, timezone
 
 from ..database import get_session
 from ..models import NotificationToken, NotificationLog, User
-from ..schemas import TokenRegistration
+from ..schemas import NotificationHistoryItem, TokenRegistration
 from ..security import get_current_user_id
+from ..services.push_gateway import PushMessage, push_gateway
+from ..services.serialization import NOTIFICATION_HISTORY_COLUMNS, json_response, notification_history_adapter
 
 router = APIRouter()
 
@@ -41,7 +43,7 @@ def register_device_token(
 
     return {"message": "El token ya estaba registrado"}
 
-@router.get("/history")
+@router.get("/history", response_model=List[NotificationHistoryItem])
 def get_notification_history(
     session: Session = Depends(get_session),
     user_id: int = Depends(get_current_user_id),
@@ -51,26 +53,14 @@ def get_notification_history(
     """Obtener historial de notificaciones enviadas al usuario"""
     # Obtener notificaciones del usuario
     statement = (
-        select(NotificationLog)
+        select(*NOTIFICATION_HISTORY_COLUMNS)
         .where(NotificationLog.user_id == user_id)
         .order_by(NotificationLog.sent_at.desc())
         .offset(skip)
         .limit(limit)
     )
     
-    notifications = session.exec(statement).all()
-    
-    return [
-        {
-            "id": notif.id,
-            "event_id": notif.event_id,
-            "title": notif.title,
-            "body": notif.body,
-            "sent_at": notif.sent_at.isoformat() if notif.sent_at else None,
-            "status": notif.status
-        }
-        for notif in notifications
-    ]
+    return json_response(notification_history_adapter, session.exec(statement).all())
 
 @router.delete("/token/{token}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_notification_token(
@@ -115,40 +105,34 @@ def send_test_notification(
     # Obtener info del usuario
     user = session.get(User, user_id)
     
-    # Intentar enviar notificación de prueba
-    try:
-        from ..notification_service import send_notification
-        
-        sent_count = 0
-        for token in tokens:
-            try:
-                send_notification(
-                    token=token.token,
-                    title="🔔 Notificación de Prueba",
-                    body=f"Hola {user.full_name}! Tu sistema de notificaciones funciona correctamente.",
-                    data={"type": "test", "timestamp": datetime.now(timezone.utc).isoformat()}
-                )
-                sent_count += 1
-            except Exception as e:
-                print(f"Error enviando a token {token.id}: {e}")
-                continue
-        
-        if sent_count > 0:
-            return {
-                "message": f"Notificación de prueba enviada a {sent_count} dispositivo(s)",
-                "sent_count": sent_count,
-                "total_tokens": len(tokens)
-            }
-        else:
-            raise HTTPException(
-                status_code=500,
-                detail="No se pudo enviar la notificación a ningún dispositivo"
-            )
-            
-    except ImportError:
+    if not push_gateway.transport.ready():
         # Si Firebase no está configurado
         return {
             "message": "Servicio de notificaciones no configurado (Firebase)",
             "tokens_registered": len(tokens),
             "note": "Configura Firebase para enviar notificaciones reales"
-        }
\ No newline at end of file
+        }
+    
+    # Un solo lote para todos los dispositivos; los tokens dados de baja se eliminan
+    report = push_gateway.send(session, [
+        PushMessage(
+            token=token.token,
+            title="🔔 Notificación de Prueba",
+            body=f"Hola {user.full_name}! Tu sistema de notificaciones funciona correctamente.",
+            data=(("timestamp", datetime.now(timezone.utc).isoformat()), ("type", "test"))
+        )
+        for token in tokens
+    ])
+    session.commit()
+    
+    if report.sent > 0:
+        return {
+            "message": f"Notificación de prueba enviada a {report.sent} dispositivo(s)",
+            "sent_count": report.sent,
+            "total_tokens": len(tokens),
+            "pruned_tokens": len(report.pruned_tokens)
+        }
+    raise HTTPException(
+        status_code=500,
+        detail="No se pudo enviar la notificación a ningún dispositivo"
+    )
\ No newline at end of file
@@ -6,6 +6,7 @@ from ..database import get_session
 from ..models import Event, EventShare, FamilyMember
 from ..schemas import EventShareCreate, EventShareRead
 from ..security import get_current_user_id
+from ..services import event_changes
 
 router = APIRouter()
 
@@ -50,6 +51,7 @@ def share_event(
     session.add(db_share)
     session.commit()
     session.refresh(db_share)
+    event_changes.shares_changed([db_share.shared_with_user_id])
     
     return db_share
 
@@ -95,6 +97,7 @@ def unshare_event(
     
     session.delete(share)
     session.commit()
+    event_changes.shares_changed([share.shared_with_user_id])
     
     return None
 
@@ -0,0 +1,31 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException
+from sqlmodel import Session
+
+from ..database import get_session
+from ..schemas import SyncResponse
+from ..security import get_current_user_id
+from ..services.delta_sync import InvalidCursor, changes_since, decode_cursor
+from .events import visible_events_filter
+
+router = APIRouter()
+
+@router.get("/", response_model=SyncResponse)
+def sync_changes(
+    since: Optional[str] = None,
+    session: Session = Depends(get_session),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    Cambios en eventos, ocurrencias de eventos recurrentes, tareas, shares y membresías desde el cursor `since`.
+    Sin cursor, con uno más viejo que la retención de borrados o si el usuario salió de una
+    familia desde el cursor, devuelve todo lo visible con reset=true (reemplazar el estado local).
+    Los borrados llegan en "deleted". Guardar "cursor" y enviarlo en la próxima llamada.
+    """
+    try:
+        since_at = decode_cursor(since) if since else None
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    visible, family_ids = visible_events_filter(session, user_id)
+    return changes_since(session, user_id, visible, family_ids, since_at)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from datetime import datetime
+from pydantic import BaseModel, EmailStr, Field, field_serializer
+from datetime import datetime, time
 from typing import Optional, List
 
 # --- AUTH SCHEMAS ---
@@ -60,6 +60,9 @@ class EventRead(EventBase):
     id: int
     owner_id: Optional[int]
     family_id: Optional[int]
+    status: Optional[str] = None
+    # Inicio original de la ocurrencia cuando es una ocurrencia virtual de un evento recurrente
+    recurrence_id: Optional[datetime] = None
 
 class EventUpdate(BaseModel):
     title: Optional[str] = None
@@ -68,6 +71,9 @@ class EventUpdate(BaseModel):
     end_time: Optional[datetime] = None
     category: Optional[str] = None
     visibility: Optional[str] = None
+    is_recurring: Optional[bool] = None
+    recurrence_pattern: Optional[str] = None
+    family_id: Optional[int] = None
 
 # --- EVENT SHARE SCHEMAS ---
 class EventShareCreate(BaseModel):
@@ -113,6 +119,54 @@ class TaskUpdate(BaseModel):
     notification_config: Optional[str] = None
     status: Optional[str] = None
 
+# --- SINCRONIZACIÓN DELTA ---
+class SyncEvent(EventRead):
+    updated_at: datetime
+
+class SyncTask(TaskRead):
+    updated_at: datetime
+
+class SyncShare(BaseModel):
+    id: int
+    event_id: int
+    shared_with_user_id: int
+    can_edit: bool
+    updated_at: datetime
+
+class SyncMembership(BaseModel):
+    family_id: int
+    user_id: int
+    role: str
+    updated_at: datetime
+
+class SyncOccurrence(BaseModel):
+    """Ocurrencia completada, cancelada o movida de un evento recurrente"""
+    id: int
+    event_id: int
+    original_start: datetime
+    status: str  # cancelled, modified, completed
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
+    title: Optional[str] = None
+    completed_at: Optional[datetime] = None
+    completed_by_id: Optional[int] = None
+    updated_at: datetime
+
+class SyncDeleted(BaseModel):
+    entity: str  # event, task, share, membership
+    id: str
+    deleted_at: datetime
+
+class SyncResponse(BaseModel):
+    cursor: str  # Enviar como ?since= en la próxima sincronización
+    reset: bool  # True: respuesta completa, el cliente debe reemplazar sus datos locales
+    events: List[SyncEvent]
+    tasks: List[SyncTask]
+    shares: List[SyncShare]
+    memberships: List[SyncMembership]
+    occurrences: List[SyncOccurrence]
+    deleted: List[SyncDeleted]
+
 # --- CHAT ---
 class MessageCreate(BaseModel):
     content: str
@@ -129,7 +183,30 @@ class MessageRead(BaseModel):
 class PromptUsuario(BaseModel):
     texto: str
 
+class SuggestTimeRequest(PromptUsuario):
+    duration_minutes: int = Field(default=60, gt=0, le=24 * 60)
+    days: int = Field(default=7, gt=0, le=60)
+    day_start: time = time(9, 0)
+    day_end: time = time(21, 0)
+    buffer_minutes: int = Field(default=15, ge=0, le=240)
+    timezone: Optional[str] = None  # Zona IANA de la franja horaria, p. ej. "America/Argentina/Buenos_Aires"
+    family_id: Optional[int] = None
+
 # --- NOTIFICATION SCHEMAS ---
 class TokenRegistration(BaseModel):
     token: str
     device_info: Optional[str] = None
+
+class NotificationHistoryItem(BaseModel):
+    id: int
+    event_id: int
+    # Las filas anteriores a la migración de title/body/status pueden tenerlos en NULL
+    title: Optional[str] = None
+    body: Optional[str] = None
+    sent_at: Optional[datetime] = None
+    status: Optional[str] = None
+
+    @field_serializer("sent_at")
+    def serialize_sent_at(self, sent_at: Optional[datetime]) -> Optional[str]:
+        # Mismo formato que devolvía el endpoint (isoformat: "+00:00" y no "Z" con zona)
+        return sent_at.isoformat() if sent_at else None
@@ -2,6 +2,9 @@ import os
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
+import base64
+import hashlib
+from cryptography.fernet import Fernet, InvalidToken
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
@@ -19,6 +22,13 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY", "tu_super_secreto_jwt_muy_seguro_y_larg
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 # Token expira en 24 horas
 
+# Clave para cifrar secretos guardados en la BD (refresh tokens de integraciones).
+# Debe ser una clave Fernet; si no se configura se deriva de JWT_SECRET_KEY.
+INTEGRATIONS_ENCRYPTION_KEY = os.getenv("INTEGRATIONS_ENCRYPTION_KEY") or base64.urlsafe_b64encode(
+    hashlib.sha256(SECRET_KEY.encode()).digest()
+).decode()
+fernet = Fernet(INTEGRATIONS_ENCRYPTION_KEY)
+
 # Esquema OAuth2 para FastAPI
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token")
 
@@ -41,6 +51,54 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def encrypt_secret(value: str) -> str:
+    """Cifra un secreto (p. ej. refresh token de Google) para guardarlo en la BD"""
+    return fernet.encrypt(value.encode()).decode()
+
+def decrypt_secret(value: str) -> Optional[str]:
+    """Descifra un secreto guardado con encrypt_secret. Retorna None si la clave no coincide."""
+    try:
+        return fernet.decrypt(value.encode()).decode()
+    except InvalidToken:
+        return None
+
+# Alcance de los tokens de suscripción al calendario (URL .ics sin cabecera Authorization)
+FEED_TOKEN_SCOPE = "calendar_feed"
+
+def create_feed_token(user_id: int, family_id: int) -> str:
+    """Token sin vencimiento para la URL de suscripción ICS de una familia. Solo sirve para leer el feed."""
+    data = {"sub": str(user_id), "fam": family_id, "scope": FEED_TOKEN_SCOPE}
+    return jwt.encode(data, SECRET_KEY, algorithm=ALGORITHM)
+
+def decode_feed_token(token: str) -> Optional[dict]:
+    """Retorna {"user_id", "family_id"} o None si el token no es de suscripción o no es válido"""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    if payload.get("scope") != FEED_TOKEN_SCOPE or payload.get("sub") is None or payload.get("fam") is None:
+        return None
+    return {"user_id": int(payload["sub"]), "family_id": int(payload["fam"])}
+
+# Alcance del parámetro state del flujo OAuth de Google (vuelve sin cabecera Authorization)
+OAUTH_STATE_SCOPE = "google_oauth"
+
+def create_oauth_state(user_id: int, family_id: int) -> str:
+    """State firmado y con vencimiento corto para identificar al usuario en el callback de OAuth"""
+    expire = datetime.now(timezone.utc) + timedelta(minutes=10)
+    data = {"sub": str(user_id), "fam": family_id, "scope": OAUTH_STATE_SCOPE, "exp": expire}
+    return jwt.encode(data, SECRET_KEY, algorithm=ALGORITHM)
+
+def decode_oauth_state(state: str) -> Optional[dict]:
+    """Retorna {"user_id", "family_id"} o None si el state no es válido o venció"""
+    try:
+        payload = jwt.decode(state, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    if payload.get("scope") != OAUTH_STATE_SCOPE or payload.get("sub") is None or payload.get("fam") is None:
+        return None
+    return {"user_id": int(payload["sub"]), "family_id": int(payload["fam"])}
+
 async def get_current_user_id(token: str = Depends(oauth2_scheme)) -> int:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -50,18 +108,23 @@ async def get_current_user_id(token: str = Depends(oauth2_scheme)) -> int:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
-        if user_id is None:
+        # Los tokens con alcance (p. ej. suscripción ICS) no son tokens de sesión
+        if user_id is None or payload.get("scope"):
             raise credentials_exception
         return int(user_id)
     except JWTError:
         raise credentials_exception
 
-async def get_current_user_id_websocket(token: str) -> Optional[int]:
+def decode_session_token(token: str) -> Optional[int]:
+    """user_id de un token de sesión, o None si no es válido (sin lanzar excepción)"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
-        if user_id is None:
+        if user_id is None or payload.get("scope"):
             return None
         return int(user_id)
     except JWTError:
-        return None
\ No newline at end of file
+        return None
+
+async def get_current_user_id_websocket(token: str) -> Optional[int]:
+    return decode_session_token(token)
\ No newline at end of file
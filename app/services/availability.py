@@ -0,0 +1,175 @@
+"""
+Disponibilidad de varios miembros con bitsets.
+La agenda de cada usuario se representa por semana como un entero de Python con un
+bit por franja de 15 minutos (672 bits, lunes 00:00 UTC = bit 0); un bit en 1 es una
+franja ocupada. Los enteros de Python operan palabra a palabra, así que combinar a
+toda la familia es un OR/AND por semana en lugar de recorrer eventos.
+
+Los bitsets se guardan en caché por (usuario, semana) y se invalidan por usuario
+cuando cambian sus eventos (ver services/event_changes.py).
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from sqlmodel import Session, select, or_, and_
+
+from ..models import Event, EventShare
+from .conflicts import INACTIVE_STATUSES
+from .recurrence import expand_events, naive_utc
+
+SLOT_MINUTES = 15
+SLOT = timedelta(minutes=SLOT_MINUTES)
+SLOTS_PER_WEEK = 7 * 24 * 60 // SLOT_MINUTES
+WEEK = timedelta(weeks=1)
+
+# Semanas (usuario, semana) que se mantienen en memoria
+AVAILABILITY_CACHE_SIZE = 20000
+
+def week_start(moment: datetime) -> datetime:
+    """Lunes 00:00 de la semana que contiene `moment`"""
+    day = naive_utc(moment).replace(hour=0, minute=0, second=0, microsecond=0)
+    return day - timedelta(days=day.weekday())
+
+def slot_index(moment: datetime, origin: datetime) -> int:
+    return int((moment - origin) // SLOT)
+
+def interval_bits(start: datetime, end: datetime, origin: datetime, size: int) -> int:
+    """Bits de las franjas que toca [start, end), relativo a `origin` y recortado a `size` franjas"""
+    first = max(slot_index(start, origin), 0)
+    # Una franja ocupada parcialmente cuenta como ocupada
+    last = min(-(-(end - origin) // SLOT), size)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+def build_week_bits(session: Session, user_id: int, week: datetime) -> int:
+    """Franjas ocupadas del usuario en la semana: eventos propios, asignados y compartidos"""
+    week_end = week + WEEK
+    shared_ids = select(EventShare.event_id).where(EventShare.shared_with_user_id == user_id)
+    statement = select(Event).where(
+        Event.status.notin_(INACTIVE_STATUSES),  # type: ignore
+        or_(
+            Event.owner_id == user_id,
+            Event.assigned_to_id == user_id,
+            Event.id.in_(shared_ids)  # type: ignore
+        ),
+        or_(
+            and_(Event.is_recurring == True, Event.start_time < week_end),
+            and_(Event.start_time < week_end, Event.end_time > week)
+        )
+    )
+    bits = 0
+    for item in expand_events(session, session.exec(statement).all(), week, week_end):
+        if isinstance(item, dict):
+            if item.get("status") in INACTIVE_STATUSES:
+                continue
+            start, end = item["start_time"], item["end_time"]
+        else:
+            start, end = item.start_time, item.end_time
+        bits |= interval_bits(naive_utc(start), naive_utc(end), week, SLOTS_PER_WEEK)
+    return bits
+
+class AvailabilityCache:
+    def __init__(self, max_size: int = AVAILABILITY_CACHE_SIZE):
+        self.weeks: "OrderedDict[Tuple[int, datetime], int]" = OrderedDict()
+        self.max_size = max_size
+        self.lock = Lock()
+
+    def clear(self):
+        with self.lock:
+            self.weeks.clear()
+
+    def invalidate_users(self, user_ids: Iterable[int]):
+        user_ids = set(user_ids)
+        if not user_ids:
+            return
+        with self.lock:
+            for key in [key for key in self.weeks if key[0] in user_ids]:
+                del self.weeks[key]
+
+    def week_bits(self, session: Session, user_id: int, week: datetime) -> int:
+        key = (user_id, week)
+        with self.lock:
+            if key in self.weeks:
+                self.weeks.move_to_end(key)
+                return self.weeks[key]
+
+        bits = build_week_bits(session, user_id, week)
+        with self.lock:
+            self.weeks[key] = bits
+            while len(self.weeks) > self.max_size:
+                self.weeks.popitem(last=False)
+        return bits
+
+availability_cache = AvailabilityCache()
+
+def range_bits(session: Session, user_id: int, start: datetime, end: datetime) -> int:
+    """Bitset del usuario en [start, end) armado con sus semanas cacheadas (bit 0 = franja de `start`)"""
+    first_week = week_start(start)
+    offset = slot_index(start, first_week)
+    size = -(-(end - start) // SLOT)
+
+    bits = 0
+    week = first_week
+    position = 0
+    while week < end:
+        bits |= availability_cache.week_bits(session, user_id, week) << position
+        position += SLOTS_PER_WEEK
+        week += WEEK
+    return (bits >> offset) & ((1 << size) - 1)
+
+def zero_runs(bits: int, size: int, min_slots: int = 1) -> List[Tuple[int, int]]:
+    """Tramos [inicio, fin) de bits en 0 dentro de `size` franjas con al menos `min_slots` franjas"""
+    free = ~bits & ((1 << size) - 1)
+    runs = []
+    position = 0
+    while free:
+        # Saltar hasta el próximo bit libre y medir la racha de unos que empieza ahí
+        skip = (free & -free).bit_length() - 1
+        free >>= skip
+        position += skip
+        length = (~free & (free + 1)).bit_length() - 1
+        if length >= min_slots:
+            runs.append((position, position + length))
+        free >>= length
+        position += length
+    return runs
+
+def free_windows(
+    session: Session,
+    user_ids: Sequence[int],
+    start: datetime,
+    end: datetime,
+    min_duration: timedelta = SLOT,
+    mode: str = "all"
+) -> Dict[str, object]:
+    """
+    Ventanas libres de un grupo de usuarios en [start, end), alineadas a franjas de 15 minutos.
+    mode="all": todos libres (OR de ocupados). mode="any": al menos uno libre (AND de ocupados).
+    """
+    start, end = naive_utc(start), naive_utc(end)
+    start -= (start - datetime.min) % SLOT
+    size = -(-(end - start) // SLOT)
+
+    per_user = {user_id: range_bits(session, user_id, start, end) for user_id in user_ids}
+    if mode == "any":
+        combined = (1 << size) - 1
+        for bits in per_user.values():
+            combined &= bits
+    else:
+        combined = 0
+        for bits in per_user.values():
+            combined |= bits
+
+    min_slots = max(1, -(-min_duration // SLOT))
+    windows = [
+        (start + first * SLOT, min(start + last * SLOT, end))
+        for first, last in zero_runs(combined, size, min_slots)
+    ]
+    return {
+        "windows": windows,
+        "busy_slots": {user_id: bits.bit_count() for user_id, bits in per_user.items()},
+        "slot_minutes": SLOT_MINUTES,
+    }
@@ -0,0 +1,149 @@
+"""
+Compresión negociada de respuestas (Brotli si está instalado, si no gzip).
+
+- choose_encoding: elige la codificación según Accept-Encoding (con q-values).
+- StreamCompressor: compresor incremental; en respuestas en streaming cada bloque se
+  envía con flush para que el cliente no espere al final (progreso de importación).
+- precompressed: caché LRU de cuerpos ya comprimidos por (ruta, ETag, codificación),
+  para respuestas que no cambian mientras no cambie su ETag (feeds ICS).
+"""
+import os
+import zlib
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Iterable, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin la librería solo se negocia gzip
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))  # Bytes; debajo no compensa
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))  # 4-5: ratio mejor que gzip con CPU parecida
+PRECOMPRESSED_CACHE_MAX_BYTES = int(os.getenv("COMPRESSION_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+
+# Preferencia del servidor ante q-values iguales
+SUPPORTED_ENCODINGS: Tuple[str, ...] = ("br", "gzip") if brotli is not None else ("gzip",)
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "application/xml", "application/javascript")
+
+# Tipos cuyo ETag identifica exactamente el cuerpo (se calcula junto con el contenido): se
+# pueden guardar ya comprimidos. Los ETag de ConditionalGetMiddleware se calculan antes de
+# la lectura y pueden quedar atrasados ante una escritura concurrente, así que no entran.
+PRECOMPRESSED_TYPES = ("text/calendar",)
+
+def is_compressible(content_type: str) -> bool:
+    """JSON, NDJSON y text/*, salvo Server-Sent Events (cada evento debe llegar al instante)"""
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    if media_type == "text/event-stream":
+        return False
+    return media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    accepted: Dict[str, float] = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name] = quality
+    return accepted
+
+def choose_encoding(header: Optional[str], supported: Iterable[str] = SUPPORTED_ENCODINGS) -> Optional[str]:
+    """Codificación con mayor q aceptada por el cliente, o None (identity)"""
+    if not header:
+        return None
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for encoding in supported:
+        quality = accepted.get(encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+class StreamCompressor:
+    """Compresor incremental con la misma interfaz para gzip y Brotli"""
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self.compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        if self.encoding == "br":
+            out = self.compressor.process(data)
+            return out + self.compressor.flush() if flush else out
+        out = self.compressor.compress(data)
+        return out + self.compressor.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self.compressor.process(data) + self.compressor.finish()
+        return self.compressor.compress(data) + self.compressor.flush()
+
+def compress(body: bytes, encoding: str) -> bytes:
+    return StreamCompressor(encoding).finish(body)
+
+class PrecompressedCache:
+    """Cuerpos comprimidos por (ruta, ETag, codificación); se descartan los menos usados por tamaño"""
+    def __init__(self, max_bytes: int = PRECOMPRESSED_CACHE_MAX_BYTES):
+        self.entries: "OrderedDict[Tuple[str, str, str], bytes]" = OrderedDict()
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.lock = Lock()
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[bytes]:
+        with self.lock:
+            body = self.entries.get(key)
+            if body is not None:
+                self.entries.move_to_end(key)
+            return body
+
+    def put(self, key: Tuple[str, str, str], body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self.entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+precompressed = PrecompressedCache()
+
+def cache_path(scope) -> str:
+    """Ruta con query de la request: parte de la clave de la caché de cuerpos comprimidos"""
+    path = scope["path"]
+    query = scope.get("query_string", b"")
+    return f"{path}?{query.decode('latin-1')}" if query else path
+
+def lookup_precompressed(scope, accept_encoding: Optional[str], etag: str,
+                         cache: PrecompressedCache = precompressed) -> Optional[Tuple[str, bytes]]:
+    """
+    (codificación, cuerpo) ya comprimido para esta ruta y ETag si el cliente acepta la
+    codificación. Lo consultan los endpoints antes de leer la BD: el ETag solo se conoce
+    después de autenticar la request, así que el middleware no puede responder por ellos.
+    """
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return None
+    body = cache.get((cache_path(scope), etag, encoding))
+    return (encoding, body) if body is not None else None
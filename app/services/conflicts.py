@@ -0,0 +1,252 @@
+"""
+Detección de solapamientos entre eventos de una familia.
+Cada familia tiene un índice en memoria con los eventos simples ordenados por inicio
+(arreglos paralelos + bisect) y la lista de eventos maestros recurrentes, cuyas
+ocurrencias se expanden con el motor RRULE solo para la ventana consultada.
+
+El índice se construye de forma perezosa en la primera consulta de la familia y se
+mantiene de forma incremental desde los endpoints que crean, editan o borran eventos.
+Vive en la memoria del proceso: con varios workers cada uno mantiene el suyo.
+"""
+import heapq
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlmodel import Session, select
+
+from ..models import Event
+from .recurrence import expand_window, load_exceptions, naive_utc, to_rrule
+
+# Horizonte para revisar las ocurrencias de un evento recurrente nuevo o editado
+RECURRING_CHECK_HORIZON = timedelta(days=90)
+
+# Eventos que ya no ocupan la agenda
+INACTIVE_STATUSES = ("completed", "cancelled")
+
+class Interval(NamedTuple):
+    event_id: int
+    title: str
+    start_time: datetime
+    end_time: datetime
+    recurrence_id: Optional[datetime] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "event_id": self.event_id,
+            "title": self.title,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "recurrence_id": self.recurrence_id,
+        }
+
+class RecurringMaster(NamedTuple):
+    event_id: int
+    title: str
+    start_time: datetime
+    duration: timedelta
+    rule: str
+
+class FamilyIndex:
+    """
+    Eventos simples ordenados por (inicio, id). Como los intervalos no están
+    ordenados por fin, se guarda la duración máxima: un evento que se solapa con
+    [start, end) necesariamente empieza en [start - max_duration, end).
+    """
+    def __init__(self):
+        self.keys: List[Tuple[datetime, int]] = []
+        self.intervals: List[Interval] = []
+        self.positions: Dict[int, Tuple[datetime, int]] = {}
+        self.max_duration = timedelta(0)
+        self.masters: Dict[int, RecurringMaster] = {}
+
+    def add(self, event: Event):
+        self.remove(event.id)
+        if event.status in INACTIVE_STATUSES:
+            return
+
+        start, end = naive_utc(event.start_time), naive_utc(event.end_time)
+        if event.is_recurring:
+            rule = to_rrule(event.recurrence_pattern)
+            if rule:
+                self.masters[event.id] = RecurringMaster(event.id, event.title, start, end - start, rule)
+                return
+
+        key = (start, event.id)
+        position = bisect_left(self.keys, key)
+        self.keys.insert(position, key)
+        self.intervals.insert(position, Interval(event.id, event.title, start, end))
+        self.positions[event.id] = key
+        self.max_duration = max(self.max_duration, end - start)
+
+    def remove(self, event_id: int):
+        # max_duration no se reduce: sigue siendo una cota válida, solo un poco más holgada
+        self.masters.pop(event_id, None)
+        key = self.positions.pop(event_id, None)
+        if key is None:
+            return
+        position = bisect_left(self.keys, key)
+        del self.keys[position]
+        del self.intervals[position]
+
+    def overlapping(self, start: datetime, end: datetime) -> List[Interval]:
+        """Eventos simples que se solapan con [start, end)"""
+        low = bisect_left(self.keys, (start - self.max_duration,))
+        high = bisect_left(self.keys, (end,))
+        return [interval for interval in self.intervals[low:high] if interval.end_time > start]
+
+class ConflictIndex:
+    def __init__(self):
+        self.families: Dict[int, FamilyIndex] = {}
+        self.lock = Lock()
+
+    def clear(self):
+        with self.lock:
+            self.families.clear()
+
+    def invalidate(self, family_id: Optional[int]):
+        """Descarta el índice de la familia; se reconstruye en la próxima consulta"""
+        with self.lock:
+            self.families.pop(family_id, None)
+
+    def family(self, session: Session, family_id: int) -> FamilyIndex:
+        with self.lock:
+            index = self.families.get(family_id)
+        if index is not None:
+            return index
+
+        index = FamilyIndex()
+        events = session.exec(select(Event).where(Event.family_id == family_id)).all()
+        for event in events:
+            index.add(event)
+        with self.lock:
+            return self.families.setdefault(family_id, index)
+
+    def event_saved(self, event: Event, previous_family_id: Optional[int] = None):
+        """
+        Actualiza el índice tras crear o editar un evento (solo si la familia ya está cargada).
+        Si la edición lo movió de familia, se quita del índice de la anterior.
+        """
+        with self.lock:
+            if previous_family_id is not None and previous_family_id != event.family_id:
+                previous = self.families.get(previous_family_id)
+                if previous is not None:
+                    previous.remove(event.id)
+            index = self.families.get(event.family_id)
+            if index is not None:
+                index.add(event)
+
+    def event_deleted(self, event_id: int, family_id: Optional[int]):
+        with self.lock:
+            index = self.families.get(family_id)
+            if index is not None:
+                index.remove(event_id)
+
+conflict_index = ConflictIndex()
+
+def _recurring_overlapping(
+    session: Session,
+    masters: Iterable[RecurringMaster],
+    start: datetime,
+    end: datetime
+) -> List[Interval]:
+    """Ocurrencias de los eventos recurrentes que se solapan con [start, end), respetando excepciones"""
+    masters = [m for m in masters if m.start_time < end]
+    if not masters:
+        return []
+
+    exceptions = load_exceptions(session, [m.event_id for m in masters])
+    result = []
+    for master in masters:
+        for occurrence in expand_window(master.rule, master.start_time, start - master.duration, end):
+            occurrence_end = occurrence + master.duration
+            exc = exceptions[master.event_id].get(occurrence)
+            if exc is not None:
+                if exc.status in INACTIVE_STATUSES:
+                    continue
+                if exc.status == "modified":
+                    occurrence_start = naive_utc(exc.start_time or occurrence)
+                    occurrence_end = naive_utc(exc.end_time or occurrence_end)
+                    if occurrence_start < end and occurrence_end > start:
+                        result.append(Interval(master.event_id, exc.title or master.title, occurrence_start, occurrence_end, occurrence))
+                    continue
+            if occurrence_end > start:
+                result.append(Interval(master.event_id, master.title, occurrence, occurrence_end, occurrence))
+    return result
+
+def intervals_in_window(session: Session, family_id: int, start: datetime, end: datetime) -> List[Interval]:
+    """Todos los intervalos (eventos simples y ocurrencias) que se solapan con [start, end)"""
+    start, end = naive_utc(start), naive_utc(end)
+    index = conflict_index.family(session, family_id)
+    with conflict_index.lock:
+        simple = index.overlapping(start, end)
+        masters = list(index.masters.values())
+    return simple + _recurring_overlapping(session, masters, start, end)
+
+def find_conflicts(
+    session: Session,
+    family_id: int,
+    start: datetime,
+    end: datetime,
+    exclude_event_id: Optional[int] = None
+) -> List[Interval]:
+    """Eventos de la familia que se solapan con el horario propuesto [start, end)"""
+    return [
+        interval for interval in intervals_in_window(session, family_id, start, end)
+        if interval.event_id != exclude_event_id
+    ]
+
+def find_conflicts_for_event(
+    session: Session,
+    family_id: int,
+    start_time: datetime,
+    end_time: datetime,
+    recurrence_pattern: Optional[str] = None,
+    exclude_event_id: Optional[int] = None
+) -> List[Interval]:
+    """
+    Conflictos de un evento propuesto. Si es recurrente se revisan sus ocurrencias
+    dentro de RECURRING_CHECK_HORIZON desde su inicio.
+    """
+    start_time, end_time = naive_utc(start_time), naive_utc(end_time)
+    rule = to_rrule(recurrence_pattern)
+    if not rule:
+        return find_conflicts(session, family_id, start_time, end_time, exclude_event_id)
+
+    duration = end_time - start_time
+    horizon_end = start_time + RECURRING_CHECK_HORIZON
+    candidates = find_conflicts(session, family_id, start_time, horizon_end + duration, exclude_event_id)
+    if not candidates:
+        return []
+
+    # Intersección de dos listas de intervalos ordenadas por inicio
+    candidates.sort(key=lambda i: i.start_time)
+    candidate_starts = [c.start_time for c in candidates]
+    max_candidate = max(c.end_time - c.start_time for c in candidates)
+    conflicts: Dict[Tuple[int, Optional[datetime]], Interval] = {}
+    for occurrence in expand_window(rule, start_time, start_time, horizon_end):
+        occurrence_end = occurrence + duration
+        low = bisect_left(candidate_starts, occurrence - max_candidate)
+        high = bisect_right(candidate_starts, occurrence_end)
+        for candidate in candidates[low:high]:
+            if candidate.start_time < occurrence_end and candidate.end_time > occurrence:
+                conflicts[(candidate.event_id, candidate.recurrence_id)] = candidate
+    return sorted(conflicts.values(), key=lambda i: i.start_time)
+
+def overlapping_pairs(session: Session, family_id: int, start: datetime, end: datetime) -> List[Tuple[Interval, Interval]]:
+    """
+    Pares de eventos que se pisan dentro de [start, end).
+    Barrido por inicio con un heap de eventos activos ordenado por fin.
+    """
+    intervals = sorted(intervals_in_window(session, family_id, start, end), key=lambda i: (i.start_time, i.event_id))
+    active: List[Tuple[datetime, int, Interval]] = []
+    pairs = []
+    for position, interval in enumerate(intervals):
+        while active and active[0][0] <= interval.start_time:
+            heapq.heappop(active)
+        for _, _, other in active:
+            if other.event_id != interval.event_id:
+                pairs.append((other, interval))
+        heapq.heappush(active, (interval.end_time, position, interval))
+    return pairs
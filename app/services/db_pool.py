@@ -0,0 +1,203 @@
+"""
+Configuración del pool de conexiones del engine y sus métricas.
+
+Modos (DB_POOL_MODE):
+- queue: QueuePool de SQLAlchemy con DB_POOL_SIZE / DB_MAX_OVERFLOW / DB_POOL_TIMEOUT.
+  Para conexión directa a Postgres o el pooler de Supabase en modo sesión.
+- null: sin pool propio (NullPool), cada checkout abre una conexión. Para PgBouncer en
+  modo transacción: apilar un QueuePool encima retiene conexiones del pooler sin uso.
+- sqlite: QueuePool sobre un archivo SQLite en modo WAL con busy_timeout, para que las
+  escrituras concurrentes esperen el lock en lugar de fallar con "database is locked",
+  synchronous=NORMAL (seguro con WAL), mmap y caché de páginas más grande.
+  Con SQLITE_READ_WRITE_SPLIT=true se separa en un único escritor (pool de 1: las
+  escrituras se serializan en el pool y no compiten por el lock de SQLite) y un pool
+  de conexiones de solo lectura; las sesiones se enrutan con services/db_routing.py.
+- auto (por defecto): sqlite si la URL es SQLite, null si lleva pgbouncer=true, si no queue.
+
+Métricas (/metrics): espera de checkout, conexiones en uso, overflow en uso, saturación
+(en uso / máximo) y timeouts de checkout, etiquetadas por engine.
+"""
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import event as sa_event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import NullPool, QueuePool
+from sqlmodel import create_engine
+
+from . import telemetry
+
+POOL_MODE = os.getenv("DB_POOL_MODE", "auto").lower()
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))  # Evita conexiones cortadas por Supabase
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+SQLITE_READ_WRITE_SPLIT = os.getenv("SQLITE_READ_WRITE_SPLIT", "false").lower() in ("1", "true", "yes")
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "4"))
+
+POOL_MODES = ("queue", "null", "sqlite")
+
+class LabeledPool:
+    """Etiqueta del engine en las métricas; se conserva al recrear el pool (engine.dispose())"""
+    engine_label = "primary"
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.engine_label = self.engine_label
+        return pool
+
+class InstrumentedQueuePool(LabeledPool, QueuePool):
+    """QueuePool que mide cuánto espera cada checkout (incluye abrir la conexión si hace falta)"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            telemetry.db_pool_timeouts.inc((self.engine_label,))
+            raise
+        finally:
+            telemetry.db_pool_wait.observe((self.engine_label,), time.perf_counter() - start)
+        update_pool_gauges(self, self.engine_label)
+        return connection
+
+    def _do_return_conn(self, record):
+        super()._do_return_conn(record)
+        update_pool_gauges(self, self.engine_label)
+
+class InstrumentedNullPool(LabeledPool, NullPool):
+    """Sin pool: la "espera" es lo que tarda en abrirse la conexión"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            telemetry.db_pool_wait.observe((self.engine_label,), time.perf_counter() - start)
+
+def resolve_pool_mode(database_url: str, mode: Optional[str] = None) -> str:
+    mode = (mode or POOL_MODE).lower()
+    if mode == "sqlite" and not database_url.startswith("sqlite"):
+        raise ValueError("DB_POOL_MODE=sqlite requiere una DATABASE_URL de SQLite")
+    if mode in POOL_MODES:
+        return mode
+    if mode != "auto":
+        raise ValueError(f"DB_POOL_MODE inválido: {mode} (opciones: auto, {', '.join(POOL_MODES)})")
+    if database_url.startswith("sqlite"):
+        return "sqlite"
+    if "pgbouncer=true" in database_url:
+        return "null"
+    return "queue"
+
+def is_memory_sqlite(database_url: str) -> bool:
+    return database_url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in database_url
+
+def engine_options(database_url: str, mode: Optional[str] = None) -> Dict[str, Any]:
+    """Argumentos de create_engine para el modo de pool"""
+    mode = resolve_pool_mode(database_url, mode)
+    connect_args: Dict[str, Any] = {}
+    if database_url.startswith("sqlite"):
+        connect_args["check_same_thread"] = False
+    elif "pgbouncer=true" in database_url:
+        # Connection Pooler requiere prepared statements deshabilitados
+        connect_args["prepare_threshold"] = 0
+
+    options: Dict[str, Any] = {"connect_args": connect_args, "pool_pre_ping": True}
+    if mode == "null":
+        options["poolclass"] = InstrumentedNullPool
+    elif not is_memory_sqlite(database_url):
+        options.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=POOL_SIZE,
+            max_overflow=MAX_OVERFLOW,
+            pool_timeout=POOL_TIMEOUT,
+            pool_recycle=POOL_RECYCLE,
+        )
+    return options
+
+def sqlite_pragmas(read_only: bool = False, busy_timeout_ms: int = SQLITE_BUSY_TIMEOUT_MS) -> List[str]:
+    pragmas = [
+        f"PRAGMA busy_timeout={int(busy_timeout_ms)}",
+        f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}",
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}",  # Negativo: KiB en lugar de páginas
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only=1")
+    else:
+        # journal_mode queda guardado en el archivo: lo fija el escritor
+        pragmas.insert(0, "PRAGMA journal_mode=WAL")
+    return pragmas
+
+def configure_sqlite(engine: Engine, read_only: bool = False, busy_timeout_ms: int = SQLITE_BUSY_TIMEOUT_MS):
+    """WAL (lectores y un escritor en paralelo) y pragmas de rendimiento en cada conexión nueva"""
+    pragmas = sqlite_pragmas(read_only, busy_timeout_ms)
+    if is_memory_sqlite(str(engine.url)):
+        pragmas = [pragma for pragma in pragmas if "journal_mode" not in pragma]
+
+    @sa_event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+def pool_capacity(pool) -> Optional[int]:
+    """Conexiones simultáneas que admite el pool (None si no tiene límite)"""
+    if isinstance(pool, QueuePool):
+        return pool.size() + max(pool._max_overflow, 0)
+    return None
+
+def update_pool_gauges(pool: QueuePool, label: str):
+    checked_out = pool.checkedout()
+    telemetry.db_pool_checked_out.set((label,), checked_out)
+    telemetry.db_pool_overflow.set((label,), max(pool.overflow(), 0))
+    capacity = pool_capacity(pool)
+    if capacity:
+        telemetry.db_pool_saturation.set((label,), round(checked_out / capacity, 4))
+
+def instrument_pool(engine: Engine, label: str = "primary"):
+    """Etiqueta el pool en las métricas (los gauges se actualizan en cada checkout/checkin)"""
+    pool = engine.pool
+    if isinstance(pool, LabeledPool):
+        pool.engine_label = label
+    if isinstance(pool, QueuePool):
+        telemetry.db_pool_size.set((label,), pool_capacity(pool))
+
+def create_configured_engine(database_url: str, label: str = "primary", mode: Optional[str] = None) -> Engine:
+    mode = resolve_pool_mode(database_url, mode)
+    engine = create_engine(database_url, **engine_options(database_url, mode))
+    if mode == "sqlite":
+        configure_sqlite(engine)
+    instrument_pool(engine, label)
+    print(f"🔌 Pool de conexiones ({label}): {mode}")
+    return engine
+
+def read_only_sqlite_url(database_url: str) -> str:
+    """URL de solo lectura (mode=ro) sobre el mismo archivo"""
+    path = os.path.abspath(make_url(database_url).database)
+    return f"sqlite:///file:{path}?mode=ro&uri=true"
+
+def create_sqlite_engines(database_url: str) -> Tuple[Engine, Engine]:
+    """(escritor único, pool de lectores) sobre el mismo archivo SQLite en WAL"""
+    options = engine_options(database_url, "sqlite")
+    writer = create_engine(database_url, **{**options, "pool_size": 1, "max_overflow": 0})
+    configure_sqlite(writer)
+    instrument_pool(writer, "sqlite-writer")
+    # El escritor crea el archivo y activa WAL antes de que se abra ningún lector
+    writer.connect().close()
+
+    reader = create_engine(
+        read_only_sqlite_url(database_url),
+        **{**options, "pool_size": SQLITE_READ_POOL_SIZE, "max_overflow": 0}
+    )
+    configure_sqlite(reader, read_only=True)
+    instrument_pool(reader, "sqlite-reader")
+    print(f"🔌 SQLite: 1 escritor + {SQLITE_READ_POOL_SIZE} lectores (WAL, synchronous={SQLITE_SYNCHRONOUS})")
+    return writer, reader
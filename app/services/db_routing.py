@@ -0,0 +1,105 @@
+"""
+Sesión que reparte las consultas entre un engine de escritura y uno de lectura:
+SQLite con escritor único y lectores de solo lectura (ver services/db_pool.py) o
+Postgres primario + réplica de lectura (DATABASE_REPLICA_URL).
+
+- Las sentencias INSERT/UPDATE/DELETE, los flush del ORM y el SQL textual van al escritor.
+- Después de la primera escritura, el resto de la transacción también va al escritor:
+  los lectores no ven lo que todavía no tiene commit.
+- Tras el commit o rollback se vuelve a leer de los lectores (en WAL ven lo confirmado).
+
+Una réplica puede ir atrasada, así que solo se usa en las requests GET/HEAD (lo marca
+ReplicaRoutingMiddleware en read_context) y no para un usuario que escribió hace menos
+de REPLICA_STICKY_SECONDS (lee sus propias escrituras del primario). Los jobs y los
+WebSockets no tienen read_context y leen del primario. La ventana es por proceso: con
+varios workers, una escritura en uno no fija al usuario en los demás.
+"""
+import os
+import time
+from contextvars import ContextVar
+from threading import Lock
+from typing import Dict, NamedTuple, Optional
+
+from sqlalchemy import event as sa_event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session as OrmSession
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+from sqlmodel import Session
+
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+
+class ReadContext(NamedTuple):
+    replica_ok: bool  # Request de lectura (GET/HEAD)
+    user_id: Optional[int]
+
+read_context: ContextVar[Optional[ReadContext]] = ContextVar("read_context", default=None)
+
+class RecentWriters:
+    """Usuarios que escribieron hace menos de `window` segundos"""
+    def __init__(self, window: float = REPLICA_STICKY_SECONDS):
+        self.window = window
+        self.until: Dict[int, float] = {}
+        self.lock = Lock()
+
+    def mark(self, user_id: int, now: Optional[float] = None):
+        now = now if now is not None else time.monotonic()
+        with self.lock:
+            self.until[user_id] = now + self.window
+            # Limpieza ocasional de ventanas vencidas
+            if len(self.until) > 1024:
+                self.until = {uid: until for uid, until in self.until.items() if until > now}
+
+    def is_sticky(self, user_id: int, now: Optional[float] = None) -> bool:
+        until = self.until.get(user_id)
+        return until is not None and until > (now if now is not None else time.monotonic())
+
+    def clear(self):
+        with self.lock:
+            self.until.clear()
+
+recent_writers = RecentWriters()
+
+def replica_allowed() -> bool:
+    context = read_context.get()
+    if context is None or not context.replica_ok:
+        return False
+    return context.user_id is None or not recent_writers.is_sticky(context.user_id)
+
+def is_write(clause) -> bool:
+    return isinstance(clause, (UpdateBase, TextClause))
+
+class RoutingSession(Session):
+    """
+    lagging=False: lector siempre consistente con lo confirmado (SQLite en WAL).
+    lagging=True: réplica con retraso, solo para lecturas de requests GET (replica_allowed).
+    """
+    def __init__(self, writer: Engine, reader: Optional[Engine] = None, lagging: bool = False, **kwargs):
+        super().__init__(bind=writer, **kwargs)
+        self.writer = writer
+        self.reader = reader or writer
+        self.lagging = lagging
+        self.wrote = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.wrote or self._flushing or is_write(clause):
+            self.wrote = True
+            return self.writer
+        if self.lagging and not replica_allowed():
+            return self.writer
+        return self.reader
+
+@sa_event.listens_for(OrmSession, "after_commit")
+def _after_commit(session):
+    if not isinstance(session, RoutingSession):
+        return
+    if session.wrote and session.lagging:
+        context = read_context.get()
+        if context is not None and context.user_id is not None:
+            recent_writers.mark(context.user_id)
+    session.wrote = False
+
+@sa_event.listens_for(OrmSession, "after_rollback")
+def _after_rollback(session):
+    if isinstance(session, RoutingSession):
+        session.wrote = False
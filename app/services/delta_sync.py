@@ -0,0 +1,230 @@
+"""
+Sincronización delta para clientes offline-first (GET /api/sync?since=<cursor>).
+Las altas y ediciones se detectan por updated_at; los borrados quedan como Tombstone,
+que se escriben solos en el flush del ORM al borrar eventos, tareas, shares o membresías
+(y al mover un evento o tarea a otra familia, para la familia anterior).
+
+Las ocurrencias completadas, canceladas o movidas de eventos recurrentes
+(RecurrenceException) tienen su propio updated_at y llegan en "occurrences".
+
+Cambios de visibilidad: un share nuevo o el ingreso a una familia incluyen los eventos
+y tareas existentes que pasan a verse; al quitar un share, quien lo recibía recibe el
+borrado del evento; al salir de una familia, el siguiente delta es un reset completo.
+
+El cursor es un instante del servidor. Para no perder cambios de transacciones que
+hicieron commit después de que se leyera el delta, el cursor devuelto queda
+SYNC_OVERLAP antes del inicio de la consulta: los clientes pueden recibir un mismo
+cambio dos veces y deben aplicarlos de forma idempotente (upsert por id).
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import delete, event as sa_event, inspect, or_, select as sa_select
+from sqlalchemy.orm import Session as OrmSession, aliased
+from sqlmodel import Session, select
+
+from ..models import Event, EventShare, FamilyMember, RecurrenceException, Task, Tombstone
+from .recurrence import naive_utc
+
+SYNC_OVERLAP = timedelta(seconds=5)
+# Tombstones más viejos se eliminan; un cursor anterior obliga a resincronizar todo
+TOMBSTONE_RETENTION = timedelta(days=90)
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(moment: datetime) -> str:
+    """Cursor opaco: microsegundos UTC desde la época"""
+    return str(int(naive_utc(moment).replace(tzinfo=timezone.utc).timestamp() * 1_000_000))
+
+def decode_cursor(cursor: str) -> datetime:
+    try:
+        return datetime(1970, 1, 1) + timedelta(microseconds=int(cursor))
+    except (ValueError, OverflowError):
+        # OverflowError: números fuera del rango de timedelta o de datetime
+        raise InvalidCursor("Cursor inválido")
+
+# --- Tombstones automáticos ---
+
+def _previous(obj, attribute: str) -> Optional[int]:
+    history = inspect(obj).attrs[attribute].history
+    return history.deleted[0] if history.deleted else None
+
+@sa_event.listens_for(OrmSession, "before_flush")
+def _record_tombstones(session: OrmSession, flush_context, instances):
+    tombstones: List[Tombstone] = []
+    deleted_event_ids = []
+    deleted_shares: List[EventShare] = []
+
+    for obj in session.deleted:
+        if isinstance(obj, Event):
+            tombstones.append(Tombstone(
+                entity="event",
+                entity_id=str(obj.id),
+                family_id=obj.family_id,
+                user_id=obj.owner_id,
+                external_id=obj.external_id
+            ))
+            deleted_event_ids.append(obj.id)
+        elif isinstance(obj, Task):
+            tombstones.append(Tombstone(entity="task", entity_id=str(obj.id), family_id=obj.family_id))
+        elif isinstance(obj, EventShare):
+            tombstones.append(Tombstone(entity="share", entity_id=str(obj.id), user_id=obj.shared_with_user_id))
+            deleted_shares.append(obj)
+        elif isinstance(obj, FamilyMember):
+            tombstones.append(Tombstone(
+                entity="membership",
+                entity_id=f"{obj.family_id}:{obj.user_id}",
+                family_id=obj.family_id,
+                user_id=obj.user_id
+            ))
+
+    # Evento o tarea que pasó a otra familia: para la anterior es un borrado
+    for obj in session.dirty:
+        if isinstance(obj, (Event, Task)) and session.is_modified(obj):
+            previous_family = _previous(obj, "family_id")
+            if previous_family is not None and previous_family != obj.family_id:
+                entity = "event" if isinstance(obj, Event) else "task"
+                tombstones.append(Tombstone(entity=entity, entity_id=str(obj.id), family_id=previous_family))
+
+    if deleted_event_ids:
+        # Con quienes se había compartido el evento también deben borrarlo
+        recipients = session.connection().execute(
+            sa_select(EventShare.event_id, EventShare.shared_with_user_id)
+            .where(EventShare.event_id.in_(deleted_event_ids))  # type: ignore
+        ).all()
+        tombstones.extend(
+            Tombstone(entity="event", entity_id=str(event_id), user_id=user_id)
+            for event_id, user_id in recipients
+        )
+
+    shares = [share for share in deleted_shares if share.event_id not in deleted_event_ids]
+    if shares:
+        tombstones.extend(_unshare_tombstones(session, shares))
+
+    session.add_all(tombstones)
+
+def _unshare_tombstones(session: OrmSession, shares: List[EventShare]) -> List[Tombstone]:
+    """
+    Al quitar un share: el dueño del evento también debe borrar el share, y quien lo
+    recibía debe borrar el evento si ya no lo ve por otra vía (dueño o miembro de la familia).
+    """
+    connection = session.connection()
+    events = {
+        event_id: (owner_id, family_id)
+        for event_id, owner_id, family_id in connection.execute(
+            sa_select(Event.id, Event.owner_id, Event.family_id)
+            .where(Event.id.in_({share.event_id for share in shares}))  # type: ignore
+        )
+    }
+    memberships = set(connection.execute(
+        sa_select(FamilyMember.family_id, FamilyMember.user_id)
+        .where(FamilyMember.user_id.in_({share.shared_with_user_id for share in shares}))  # type: ignore
+    ).all())
+
+    tombstones = []
+    for share in shares:
+        if share.event_id not in events:
+            continue
+        owner_id, family_id = events[share.event_id]
+        recipient = share.shared_with_user_id
+        if owner_id != recipient:
+            tombstones.append(Tombstone(entity="share", entity_id=str(share.id), user_id=owner_id))
+        if recipient != owner_id and (family_id, recipient) not in memberships:
+            tombstones.append(Tombstone(entity="event", entity_id=str(share.event_id), user_id=recipient))
+    return tombstones
+
+# --- Delta ---
+
+def changes_since(
+    session: Session,
+    user_id: int,
+    visible_events,
+    family_ids: Sequence[int],
+    since: Optional[datetime],
+    now: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """
+    Cambios visibles para el usuario desde `since` (todo si es None).
+    visible_events: filtro de eventos visibles (routers/events.visible_events_filter).
+    """
+    now = naive_utc(now or datetime.now(timezone.utc))
+    reset = since is None or since < now - TOMBSTONE_RETENTION
+
+    events = select(Event).where(visible_events)
+    tasks = select(Task).where(Task.family_id.in_(family_ids))  # type: ignore
+    shares = select(EventShare).where(or_(
+        EventShare.shared_with_user_id == user_id,
+        EventShare.event_id.in_(select(Event.id).where(Event.owner_id == user_id))  # type: ignore
+    ))
+    memberships = select(FamilyMember).where(FamilyMember.family_id.in_(family_ids))  # type: ignore
+    occurrences = select(RecurrenceException).where(
+        RecurrenceException.event_id.in_(select(Event.id).where(visible_events))  # type: ignore
+    )
+    deleted: List[Tombstone] = []
+
+    if not reset:
+        deleted = session.exec(
+            select(Tombstone)
+            .where(Tombstone.deleted_at > since)
+            .where(or_(
+                Tombstone.family_id.in_(family_ids),  # type: ignore
+                Tombstone.user_id == user_id
+            ))
+            .order_by(Tombstone.deleted_at)
+        ).all()
+        # Salir de una familia quita de golpe todos sus eventos y tareas: se resincroniza todo
+        if any(t.entity == "membership" and t.user_id == user_id for t in deleted):
+            reset, deleted = True, []
+
+    if not reset:
+        # Filas viejas que pasan a ser visibles: eventos compartidos conmigo y datos de
+        # las familias a las que me uní después del cursor
+        new_share_event_ids = (
+            select(EventShare.event_id)
+            .where(EventShare.shared_with_user_id == user_id, EventShare.created_at > since)
+        )
+        joined = aliased(FamilyMember)
+        joined_family_ids = select(joined.family_id).where(joined.user_id == user_id, joined.joined_at > since)
+        events = events.where(or_(
+            Event.updated_at > since,
+            Event.id.in_(new_share_event_ids),  # type: ignore
+            Event.family_id.in_(joined_family_ids)  # type: ignore
+        ))
+        # Las ocurrencias no cambian el evento maestro: van con su propio updated_at
+        occurrences = occurrences.where(or_(
+            RecurrenceException.updated_at > since,
+            RecurrenceException.event_id.in_(new_share_event_ids),  # type: ignore
+            RecurrenceException.event_id.in_(select(Event.id).where(Event.family_id.in_(joined_family_ids)))  # type: ignore
+        ))
+        tasks = tasks.where(or_(Task.updated_at > since, Task.family_id.in_(joined_family_ids)))  # type: ignore
+        shares = shares.where(EventShare.updated_at > since)
+        memberships = memberships.where(or_(
+            FamilyMember.updated_at > since,
+            FamilyMember.family_id.in_(joined_family_ids)  # type: ignore
+        ))
+
+    next_cursor = now - SYNC_OVERLAP
+    if since is not None and not reset:
+        next_cursor = max(next_cursor, since)
+
+    return {
+        "cursor": encode_cursor(next_cursor),
+        "reset": reset,
+        "events": session.exec(events.order_by(Event.updated_at, Event.id)).all(),
+        "tasks": session.exec(tasks.order_by(Task.updated_at, Task.id)).all(),
+        "shares": session.exec(shares.order_by(EventShare.updated_at, EventShare.id)).all(),
+        "memberships": session.exec(memberships.order_by(FamilyMember.updated_at)).all(),
+        "occurrences": session.exec(occurrences.order_by(RecurrenceException.updated_at, RecurrenceException.id)).all(),
+        "deleted": [
+            {"entity": t.entity, "id": t.entity_id, "deleted_at": t.deleted_at}
+            for t in deleted
+        ],
+    }
+
+def prune_tombstones(session: Session, now: Optional[datetime] = None) -> int:
+    """Borra los tombstones más viejos que TOMBSTONE_RETENTION. Retorna cuántos se borraron."""
+    cutoff = naive_utc(now or datetime.now(timezone.utc)) - TOMBSTONE_RETENTION
+    result = session.execute(delete(Tombstone).where(Tombstone.deleted_at < cutoff))
+    session.commit()
+    return result.rowcount
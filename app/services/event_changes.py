@@ -0,0 +1,77 @@
+"""
+Aviso único de cambios en eventos para los índices y cachés en memoria que dependen
+de ellos (índice de conflictos, bitsets de disponibilidad, versiones de los feeds ICS).
+Las versiones para ETag (services/family_versions.py) se actualizan solas con cada
+commit del ORM; solo las altas en bloque con Core necesitan avisarlas aquí.
+Los routers llaman a estas funciones después de hacer commit.
+"""
+from typing import Iterable, Optional, Set
+
+from sqlmodel import Session, select
+
+from ..models import Event, EventShare
+from .availability import availability_cache
+from .conflicts import conflict_index
+from .family_versions import family_versions
+from .ics import feed_cache, feed_versions
+
+def event_user_ids(session: Session, event: Event) -> Set[int]:
+    """Usuarios cuya agenda ocupa el evento: dueño, asignado y con quienes se compartió"""
+    user_ids = {event.owner_id}
+    if event.assigned_to_id:
+        user_ids.add(event.assigned_to_id)
+    if event.id is not None:
+        user_ids.update(session.exec(
+            select(EventShare.shared_with_user_id).where(EventShare.event_id == event.id)
+        ).all())
+    return user_ids
+
+def event_saved(
+    session: Session,
+    event: Event,
+    previous_user_ids: Iterable[int] = (),
+    previous_family_id: Optional[int] = None
+):
+    """
+    Tras crear o editar un evento. previous_user_ids: usuarios afectados antes del cambio;
+    previous_family_id: familia anterior si la edición movió el evento a otra.
+    """
+    user_ids = event_user_ids(session, event) | set(previous_user_ids)
+    conflict_index.event_saved(event, previous_family_id)
+    availability_cache.invalidate_users(user_ids)
+    feed_versions.bump_family(event.family_id)
+    if previous_family_id != event.family_id:
+        feed_versions.bump_family(previous_family_id)
+    feed_versions.bump_users(user_ids)
+
+def event_deleted(event_id: int, family_id: Optional[int], user_ids: Iterable[int]):
+    user_ids = set(user_ids)
+    conflict_index.event_deleted(event_id, family_id)
+    availability_cache.invalidate_users(user_ids)
+    feed_versions.bump_family(family_id)
+    feed_versions.bump_users(user_ids)
+
+def events_imported(family_id: int, user_ids: Iterable[int]):
+    """
+    Altas en bloque: el índice de la familia se reconstruye en la próxima consulta.
+    user_ids: miembros de la familia (todos ven los eventos nuevos).
+    """
+    user_ids = set(user_ids)
+    conflict_index.invalidate(family_id)
+    availability_cache.invalidate_users(user_ids)
+    feed_versions.bump_family(family_id)
+    feed_versions.bump_users(user_ids)
+    family_versions.bump_family(family_id)
+    family_versions.bump_users(user_ids)
+
+def shares_changed(user_ids: Iterable[int]):
+    user_ids = set(user_ids)
+    availability_cache.invalidate_users(user_ids)
+    feed_versions.bump_users(user_ids)
+
+def reset():
+    conflict_index.clear()
+    availability_cache.clear()
+    feed_versions.clear()
+    family_versions.clear()
+    feed_cache.clear()
@@ -0,0 +1,311 @@
+"""
+Importación masiva de eventos desde archivos ICS o CSV.
+El archivo se lee como stream (línea a línea), las filas se validan por bloques con
+EventCreate y cada bloque se inserta con un INSERT multi-fila ... RETURNING y una sola
+transacción; las notificaciones del bloque también se insertan en bloque.
+import_events es un generador que reporta el progreso y los errores por fila.
+"""
+import csv
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+from zoneinfo import ZoneInfo
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import Session
+
+from ..models import Event, NotificationLog
+from ..schemas import EventCreate
+from .notification_scheduler import build_notification_log, calculate_notification_times
+from .recurrence import naive_utc, validate_pattern
+from .recurrence_batch import next_occurrences
+
+# Filas por bloque (una transacción por bloque)
+IMPORT_CHUNK_SIZE = 1000
+# Errores por fila que se reportan en detalle; el resto solo se cuenta
+MAX_REPORTED_ERRORS = 500
+
+CSV_FIELDS = (
+    "title", "description", "start_time", "end_time", "category", "visibility",
+    "is_recurring", "recurrence_pattern", "assigned_to_id",
+)
+
+class RowError(ValueError):
+    pass
+
+# --- CSV ---
+
+def iter_csv_rows(lines: Iterable[str]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Filas del CSV (con encabezado) como (número de línea, dict) sin columnas vacías"""
+    reader = csv.DictReader(lines)
+    for row in reader:
+        data = {
+            key.strip(): value.strip()
+            for key, value in row.items()
+            if key and key.strip() in CSV_FIELDS and value is not None and value.strip() != ""
+        }
+        if "is_recurring" in data:
+            data["is_recurring"] = data["is_recurring"].lower() in ("1", "true", "si", "sí", "yes")
+        yield reader.line_num, data
+
+# --- ICS ---
+
+def unfold_lines(lines: Iterable[str]) -> Iterator[Tuple[int, str]]:
+    """Une las líneas continuadas (RFC 5545 §3.1) sin leer el archivo completo"""
+    current = None
+    current_number = 0
+    for number, raw in enumerate(lines, start=1):
+        line = raw.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current_number, current
+        current, current_number = line, number
+    if current is not None:
+        yield current_number, current
+
+def unescape_text(value: str) -> str:
+    result = []
+    chars = iter(value)
+    for char in chars:
+        if char == "\\":
+            escaped = next(chars, "")
+            result.append("\n" if escaped in ("n", "N") else escaped)
+        else:
+            result.append(char)
+    return "".join(result)
+
+def parse_ics_datetime(value: str, params: Dict[str, str]) -> datetime:
+    """DTSTART/DTEND en UTC (Z), con TZID, flotante o de día completo (VALUE=DATE)"""
+    if params.get("VALUE") == "DATE" or len(value) == 8:
+        day = date(int(value[0:4]), int(value[4:6]), int(value[6:8]))
+        return datetime(day.year, day.month, day.day)
+
+    parsed = datetime.strptime(value.rstrip("Z"), "%Y%m%dT%H%M%S")
+    if value.endswith("Z"):
+        return parsed
+    if "TZID" in params:
+        try:
+            return naive_utc(parsed.replace(tzinfo=ZoneInfo(params["TZID"])))
+        except (KeyError, ValueError):
+            raise RowError(f"Zona horaria desconocida: {params['TZID']}")
+    return parsed
+
+def parse_ics_duration(value: str) -> timedelta:
+    """Duraciones simples: P1D, PT1H30M, P1W"""
+    sign = -1 if value.startswith("-") else 1
+    value = value.lstrip("+-")
+    if not value.startswith("P"):
+        raise RowError(f"Duración inválida: {value}")
+    total = timedelta()
+    number = ""
+    for char in value[1:]:
+        if char.isdigit():
+            number += char
+        elif char in "WDHMS":
+            amount = int(number or 0)
+            total += {
+                "W": timedelta(weeks=amount),
+                "D": timedelta(days=amount),
+                "H": timedelta(hours=amount),
+                "M": timedelta(minutes=amount),
+                "S": timedelta(seconds=amount),
+            }[char]
+            number = ""
+    return sign * total
+
+def _split_property(line: str) -> Tuple[str, Dict[str, str], str]:
+    head, _, value = line.partition(":")
+    name, *raw_params = head.split(";")
+    params = {}
+    for param in raw_params:
+        key, _, param_value = param.partition("=")
+        params[key.upper()] = param_value.strip('"')
+    return name.upper(), params, value
+
+def vevent_to_row(properties: Dict[str, Tuple[Dict[str, str], str]]) -> Dict[str, Any]:
+    if "DTSTART" not in properties:
+        raise RowError("VEVENT sin DTSTART")
+    if "RECURRENCE-ID" in properties:
+        raise RowError("Las ocurrencias modificadas (RECURRENCE-ID) no se importan")
+
+    start_params, start_value = properties["DTSTART"]
+    start = parse_ics_datetime(start_value, start_params)
+    all_day = start_params.get("VALUE") == "DATE" or len(start_value) == 8
+    if "DTEND" in properties:
+        end = parse_ics_datetime(properties["DTEND"][1], properties["DTEND"][0])
+    elif "DURATION" in properties:
+        end = start + parse_ics_duration(properties["DURATION"][1])
+    else:
+        end = start + (timedelta(days=1) if all_day else timedelta(0))
+
+    row: Dict[str, Any] = {
+        "title": unescape_text(properties.get("SUMMARY", ({}, ""))[1]) or "(Sin título)",
+        "start_time": start,
+        "end_time": end,
+    }
+    if "DESCRIPTION" in properties:
+        row["description"] = unescape_text(properties["DESCRIPTION"][1])
+    if "CATEGORIES" in properties:
+        row["category"] = unescape_text(properties["CATEGORIES"][1]).split(",")[0].strip().lower() or "general"
+    if "RRULE" in properties:
+        row["is_recurring"] = True
+        row["recurrence_pattern"] = properties["RRULE"][1]
+    if properties.get("CLASS", ({}, ""))[1].upper() in ("PRIVATE", "CONFIDENTIAL"):
+        row["visibility"] = "private"
+    return row
+
+def iter_ics_rows(lines: Iterable[str]) -> Iterator[Tuple[int, Any]]:
+    """
+    Un dict por VEVENT como (línea de BEGIN:VEVENT, dict). Si un VEVENT no se puede
+    interpretar se devuelve la excepción en lugar del dict para reportarla en esa fila.
+    """
+    properties: Optional[Dict[str, Tuple[Dict[str, str], str]]] = None
+    start_line = 0
+    depth = 0
+    for number, line in unfold_lines(lines):
+        upper = line.upper()
+        if upper == "BEGIN:VEVENT":
+            properties, start_line, depth = {}, number, 0
+            continue
+        if properties is None:
+            continue
+        if upper == "END:VEVENT":
+            try:
+                row: Any = vevent_to_row(properties)
+            except (RowError, ValueError) as e:
+                row = e
+            yield start_line, row
+            properties = None
+            continue
+        # Los VALARM y otros componentes anidados se ignoran
+        if upper.startswith("BEGIN:"):
+            depth += 1
+        elif upper.startswith("END:"):
+            depth -= 1
+        elif depth == 0 and ":" in line:
+            name, params, value = _split_property(line)
+            properties.setdefault(name, (params, value))
+
+# --- Inserción por bloques ---
+
+def _validate(number: int, row: Any, family_id: int, member_ids: Set[int]) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Retorna (valores para la tabla Event, None) o (None, error de la fila)"""
+    if isinstance(row, Exception):
+        return None, {"row": number, "errors": [str(row)]}
+    try:
+        event = EventCreate.model_validate({**row, "family_id": family_id})
+    except ValidationError as e:
+        return None, {
+            "row": number,
+            "errors": [f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()]
+        }
+
+    errors = []
+    if event.end_time < event.start_time:
+        errors.append("end_time: debe ser posterior a start_time")
+    if event.assigned_to_id is not None and event.assigned_to_id not in member_ids:
+        errors.append("assigned_to_id: el usuario no es miembro de la familia")
+    # Misma validación que POST /api/events/: la regla debe compilar con su inicio real
+    if event.is_recurring and event.recurrence_pattern:
+        try:
+            validate_pattern(event.recurrence_pattern, event.start_time)
+        except ValueError as e:
+            errors.append(f"recurrence_pattern: {e}")
+    if errors:
+        return None, {"row": number, "errors": errors}
+
+    values = event.model_dump()
+    values["start_time"] = naive_utc(values["start_time"])
+    values["end_time"] = naive_utc(values["end_time"])
+    return values, None
+
+def _insert_chunk(session: Session, rows: List[Dict[str, Any]], owner_id: int, now: datetime) -> List[int]:
+    """INSERT multi-fila con RETURNING y las notificaciones futuras del bloque en un solo INSERT"""
+    defaults = {
+        "priority": "normal",
+        "status": "pending",
+        "notification_config": Event.model_fields["notification_config"].default,
+        "owner_id": owner_id,
+    }
+    params = [{**defaults, **row} for row in rows]
+    ids = list(session.scalars(
+        insert(Event).returning(Event.id, sort_by_parameter_order=True),
+        params
+    ))
+
+    events = [Event(id=event_id, **values) for event_id, values in zip(ids, params)]
+    recurring = [e for e in events if e.is_recurring]
+    next_starts = dict(zip(
+        (e.id for e in recurring),
+        next_occurrences([e.start_time for e in recurring], [e.recurrence_pattern for e in recurring], now)
+    ))
+
+    logs = []
+    for event in events:
+        start = next_starts.get(event.id) if event.is_recurring else event.start_time
+        if start is None or start <= now:
+            continue
+        user_id = event.assigned_to_id or event.owner_id
+        for notif in calculate_notification_times(event, start):
+            if naive_utc(notif["scheduled_for"]) > now:
+                logs.append(build_notification_log(event, user_id, notif).model_dump(exclude={"id"}))
+    if logs:
+        session.execute(insert(NotificationLog), logs)
+
+    session.commit()
+    return ids
+
+def import_events(
+    session: Session,
+    rows: Iterable[Tuple[int, Any]],
+    owner_id: int,
+    family_id: int,
+    member_ids: Sequence[int],
+    chunk_size: int = IMPORT_CHUNK_SIZE,
+    now: Optional[datetime] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Valida e inserta las filas por bloques. Produce mensajes
+    {"type": "error"} por fila inválida, {"type": "progress"} por bloque y un {"type": "done"} final.
+    """
+    now = naive_utc(now or datetime.now(timezone.utc))
+    members = set(member_ids)
+    processed = imported = failed = 0
+    chunk: List[Dict[str, Any]] = []
+
+    def flush():
+        nonlocal imported
+        if not chunk:
+            return
+        imported += len(_insert_chunk(session, chunk, owner_id, now))
+        chunk.clear()
+
+    for number, row in rows:
+        processed += 1
+        values, error = _validate(number, row, family_id, members)
+        if error:
+            failed += 1
+            if failed <= MAX_REPORTED_ERRORS:
+                yield {"type": "error", **error}
+            continue
+        chunk.append(values)
+        if len(chunk) >= chunk_size:
+            try:
+                flush()
+            except SQLAlchemyError as e:
+                # Los bloques anteriores ya quedaron guardados
+                session.rollback()
+                yield {"type": "aborted", "detail": f"Error de base de datos: {type(e).__name__}", "imported": imported}
+                return
+            yield {"type": "progress", "processed": processed, "imported": imported, "failed": failed}
+
+    try:
+        flush()
+    except SQLAlchemyError as e:
+        session.rollback()
+        yield {"type": "aborted", "detail": f"Error de base de datos: {type(e).__name__}", "imported": imported}
+        return
+    yield {"type": "done", "processed": processed, "imported": imported, "failed": failed}
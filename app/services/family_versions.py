@@ -0,0 +1,129 @@
+"""
+Versiones por familia y por usuario para las peticiones condicionales (ETag / 304).
+Cualquier escritura ORM sobre eventos (y sus ocurrencias), tareas, miembros, mensajes o shares incrementa,
+al hacer commit, la versión de la familia afectada y la de cada miembro. Las lecturas
+que dependen de "todo lo que ve el usuario" (eventos, tareas, miembros, métricas) usan
+la versión del usuario; el historial del chat usa la de la familia. Así el middleware
+de app/middleware.py puede responder 304 sin consultar las tablas de datos.
+
+Las altas en bloque con Core (importación, sincronización con Google) no pasan por el
+flush del ORM y se avisan con services/event_changes.events_imported.
+
+Límite: los contadores viven en la memoria de un único proceso. Con varios workers de
+uvicorn o varias instancias, una escritura atendida por otro proceso no cambia las
+versiones de este, que respondería 304 con datos viejos. Por eso CONDITIONAL_GET=auto
+solo activa el middleware con un worker (WEB_CONCURRENCY); al escalar a más de una
+instancia hay que fijar CONDITIONAL_GET=off.
+"""
+import os
+from typing import Iterable, Set
+
+from sqlalchemy import event as sa_event, inspect, select
+from sqlalchemy.orm import Session
+
+from ..models import ChatMessage, Event, EventShare, FamilyMember, RecurrenceException, Task, User
+from .ics import FeedVersions
+
+# Mismo esquema de contadores que los feeds ICS, en una instancia propia
+family_versions = FeedVersions()
+
+CONDITIONAL_GET = os.getenv("CONDITIONAL_GET", "auto").lower()  # auto, on, off
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY") or "1")  # Workers de uvicorn/gunicorn
+
+PENDING_KEY = "family_versions_pending"
+PARENT_ATTRIBUTES = {"family_id", "owner_id", "assigned_to_id"}
+
+def conditional_get_enabled(mode: str = CONDITIONAL_GET, workers: int = WEB_CONCURRENCY) -> bool:
+    """Si se pueden responder 304 con estas versiones (solo con un único proceso)"""
+    if mode in ("on", "true", "1"):
+        return True
+    if mode in ("off", "false", "0"):
+        return False
+    return workers <= 1
+
+def _values(obj, attribute: str) -> Set[int]:
+    """Valor actual y anterior (si cambió en este flush) de un atributo"""
+    history = inspect(obj).attrs[attribute].history
+    return {value for value in (*history.unchanged, *history.added, *history.deleted) if value is not None}
+
+def _affected(session: Session, objects: Iterable[object]):
+    family_ids: Set[int] = set()
+    user_ids: Set[int] = set()
+    event_ids: Set[int] = set()
+    exception_event_ids: Set[int] = set()
+    profile_user_ids: Set[int] = set()
+
+    for obj in objects:
+        if isinstance(obj, Event):
+            family_ids |= _values(obj, "family_id")
+            user_ids |= _values(obj, "owner_id") | _values(obj, "assigned_to_id")
+            if obj.id is not None:
+                event_ids.add(obj.id)
+        elif isinstance(obj, RecurrenceException):
+            # Completar, cancelar o mover una ocurrencia cambia lo que muestra el evento maestro
+            exception_event_ids |= _values(obj, "event_id")
+        elif isinstance(obj, (Task, ChatMessage)):
+            family_ids |= _values(obj, "family_id")
+        elif isinstance(obj, FamilyMember):
+            family_ids |= _values(obj, "family_id")
+            user_ids |= _values(obj, "user_id")
+        elif isinstance(obj, EventShare):
+            user_ids |= _values(obj, "shared_with_user_id")
+        elif isinstance(obj, User) and obj.id is not None:
+            profile_user_ids.add(obj.id)
+
+    if not (family_ids or user_ids or event_ids or exception_event_ids or profile_user_ids):
+        return family_ids, user_ids
+
+    # Dentro del flush: consultas por la conexión para no disparar otro autoflush
+    connection = session.connection()
+    if exception_event_ids:
+        # El evento maestro suele estar ya cargado en la sesión (completar, sincronizar)
+        rows, missing = [], []
+        for event_id in exception_event_ids:
+            event = session.identity_map.get(session.identity_key(Event, event_id))
+            if event is not None and not PARENT_ATTRIBUTES & inspect(event).unloaded:
+                rows.append((event.family_id, event.owner_id, event.assigned_to_id))
+            else:
+                missing.append(event_id)
+        if missing:
+            rows += connection.execute(
+                select(Event.family_id, Event.owner_id, Event.assigned_to_id).where(Event.id.in_(missing))  # type: ignore
+            ).all()
+        for family_id, owner_id, assigned_to_id in rows:
+            family_ids.update({family_id} - {None})
+            user_ids.update({owner_id, assigned_to_id} - {None})
+        event_ids |= exception_event_ids
+    if profile_user_ids:
+        family_ids.update(connection.execute(
+            select(FamilyMember.family_id).where(FamilyMember.user_id.in_(profile_user_ids))  # type: ignore
+        ).scalars())
+    if family_ids:
+        user_ids.update(connection.execute(
+            select(FamilyMember.user_id).where(FamilyMember.family_id.in_(family_ids))  # type: ignore
+        ).scalars())
+    if event_ids:
+        user_ids.update(connection.execute(
+            select(EventShare.shared_with_user_id).where(EventShare.event_id.in_(event_ids))  # type: ignore
+        ).scalars())
+    return family_ids, user_ids
+
+@sa_event.listens_for(Session, "after_flush")
+def _collect(session: Session, flush_context):
+    family_ids, user_ids = _affected(session, [*session.new, *session.dirty, *session.deleted])
+    if family_ids or user_ids:
+        pending = session.info.setdefault(PENDING_KEY, (set(), set()))
+        pending[0].update(family_ids)
+        pending[1].update(user_ids)
+
+@sa_event.listens_for(Session, "after_commit")
+def _publish(session: Session):
+    pending = session.info.pop(PENDING_KEY, None)
+    if pending:
+        for family_id in pending[0]:
+            family_versions.bump_family(family_id)
+        family_versions.bump_users(pending[1])
+
+@sa_event.listens_for(Session, "after_rollback")
+def _discard(session: Session):
+    session.info.pop(PENDING_KEY, None)
@@ -0,0 +1,142 @@
+"""
+Cliente HTTP mínimo para la API de Google Calendar v3.
+- Cambios incrementales con syncToken (events.list), paginados con pageToken.
+- Escrituras agrupadas en requests batch (multipart/mixed, hasta 50 por request).
+- Renovación del access token a partir del refresh token.
+Las URLs base son configurables para poder apuntar a un servidor falso en los tests.
+"""
+import json
+import os
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+import httpx
+
+GOOGLE_API_URL = os.getenv("GOOGLE_CALENDAR_API_URL", "https://www.googleapis.com")
+GOOGLE_TOKEN_URL = os.getenv("GOOGLE_TOKEN_URL", "https://oauth2.googleapis.com/token")
+GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID", "")
+GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET", "")
+
+# Límite de Google para requests dentro de un batch
+BATCH_LIMIT = 50
+PAGE_SIZE = 250
+
+class GoogleCalendarError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"Google Calendar {status_code}: {detail}")
+        self.status_code = status_code
+
+class SyncTokenExpired(GoogleCalendarError):
+    """410 Gone: el syncToken ya no es válido y Google exige una sincronización completa"""
+
+# Una operación del batch: (método, ruta relativa a /calendar/v3, cuerpo JSON)
+BatchRequest = Tuple[str, str, Optional[Dict[str, Any]]]
+
+def encode_batch(requests: Sequence[BatchRequest], boundary: str) -> bytes:
+    parts = []
+    for index, (method, path, body) in enumerate(requests):
+        payload = json.dumps(body) if body is not None else ""
+        parts.append(
+            f"--{boundary}\r\n"
+            "Content-Type: application/http\r\n"
+            f"Content-ID: <item{index}>\r\n\r\n"
+            f"{method} /calendar/v3{path} HTTP/1.1\r\n"
+            "Content-Type: application/json\r\n\r\n"
+            f"{payload}\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n")
+    return "".join(parts).encode("utf-8")
+
+def decode_batch(content: bytes, content_type: str) -> List[Tuple[int, Dict[str, Any]]]:
+    """Respuestas (status, cuerpo JSON) de un batch, en el orden de las requests (según Content-ID)"""
+    boundary = content_type.split("boundary=", 1)[1].strip().strip('"')
+    responses: Dict[int, Tuple[int, Dict[str, Any]]] = {}
+    for part in content.decode("utf-8").split(f"--{boundary}"):
+        part = part.strip()
+        if not part or part == "--":
+            continue
+        outer_headers, _, http_message = part.partition("\r\n\r\n")
+        index = len(responses)
+        for header in outer_headers.split("\r\n"):
+            if header.lower().startswith("content-id:") and "item" in header:
+                index = int(header.rsplit("item", 1)[1].rstrip(">").strip())
+        status_line, _, rest = http_message.partition("\r\n")
+        _, _, body = rest.partition("\r\n\r\n")
+        status_code = int(status_line.split()[1])
+        responses[index] = (status_code, json.loads(body) if body.strip() else {})
+    return [responses[i] for i in sorted(responses)]
+
+class GoogleCalendarClient:
+    def __init__(
+        self,
+        http: Optional[httpx.Client] = None,
+        api_url: str = GOOGLE_API_URL,
+        token_url: str = GOOGLE_TOKEN_URL,
+        client_id: str = GOOGLE_CLIENT_ID,
+        client_secret: str = GOOGLE_CLIENT_SECRET
+    ):
+        self.http = http or httpx.Client(timeout=30)
+        self.api_url = api_url.rstrip("/")
+        self.token_url = token_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+
+    def refresh_access_token(self, refresh_token: str) -> str:
+        response = self.http.post(self.token_url, data={
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token,
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+        })
+        if response.status_code != 200:
+            raise GoogleCalendarError(response.status_code, response.text)
+        return response.json()["access_token"]
+
+    def list_changes(
+        self,
+        access_token: str,
+        calendar_id: str,
+        sync_token: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], str]:
+        """
+        Eventos cambiados desde sync_token (o todos si es None) y el nextSyncToken.
+        Los eventos borrados llegan con status "cancelled".
+        """
+        url = f"{self.api_url}/calendar/v3/calendars/{quote(calendar_id, safe='')}/events"
+        params: Dict[str, Any] = {"maxResults": PAGE_SIZE, "showDeleted": "true"}
+        if sync_token:
+            params["syncToken"] = sync_token
+
+        items: List[Dict[str, Any]] = []
+        while True:
+            response = self.http.get(url, params=params, headers={"Authorization": f"Bearer {access_token}"})
+            if response.status_code == 410:
+                raise SyncTokenExpired(410, "syncToken inválido")
+            if response.status_code != 200:
+                raise GoogleCalendarError(response.status_code, response.text)
+            data = response.json()
+            items.extend(data.get("items", []))
+            if data.get("nextPageToken"):
+                params = {**params, "pageToken": data["nextPageToken"]}
+                continue
+            return items, data["nextSyncToken"]
+
+    def batch(self, access_token: str, requests: Sequence[BatchRequest]) -> List[Tuple[int, Dict[str, Any]]]:
+        """Ejecuta las requests en grupos de BATCH_LIMIT; respuestas en el mismo orden"""
+        results: List[Tuple[int, Dict[str, Any]]] = []
+        for offset in range(0, len(requests), BATCH_LIMIT):
+            chunk = requests[offset:offset + BATCH_LIMIT]
+            boundary = f"batch_{uuid.uuid4().hex}"
+            response = self.http.post(
+                f"{self.api_url}/batch/calendar/v3",
+                content=encode_batch(chunk, boundary),
+                headers={
+                    "Authorization": f"Bearer {access_token}",
+                    "Content-Type": f"multipart/mixed; boundary={boundary}",
+                }
+            )
+            if response.status_code != 200:
+                raise GoogleCalendarError(response.status_code, response.text)
+            results.extend(decode_batch(response.content, response.headers["content-type"]))
+        return results
@@ -0,0 +1,274 @@
+"""
+Sincronización incremental con Google Calendar.
+- Pull: events.list con el syncToken guardado; solo llegan los cambios desde la última
+  vez. Se aplican con un upsert por (owner_id, external_id) que no toca las filas cuyo
+  contenido no cambió, para que lo recién enviado no rebote en el próximo push.
+- Push: eventos locales del usuario con updated_at posterior a last_pushed_at
+  (equivalente local de updatedMin), enviados en requests batch, y los borrados locales
+  de eventos de Google (Tombstone con external_id) posteriores a esa misma marca.
+Solo se vuelve a traer todo si Google invalida el syncToken (410).
+Un error de una integración (Google, red, respuesta inesperada) se registra en ella
+sin frenar la sincronización de las demás.
+"""
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import httpx
+from sqlalchemy import or_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+
+from ..models import Event, FamilyMember, RecurrenceException, Tombstone, UserIntegration
+from ..security import decrypt_secret
+from . import event_changes
+from .google_calendar import GoogleCalendarClient, GoogleCalendarError, SyncTokenExpired
+from .recurrence import naive_utc, to_rrule
+
+SYNCED_FIELDS = ("title", "description", "start_time", "end_time", "is_recurring", "recurrence_pattern")
+# Red caída o timeout (httpx), respuesta sin nextSyncToken o batch que no se puede decodificar
+SYNC_ERRORS = (httpx.HTTPError, KeyError, IndexError, ValueError)
+
+def parse_google_time(value: Dict[str, str]) -> datetime:
+    """{"dateTime": "...Z"} o {"date": "YYYY-MM-DD"} (día completo) a UTC sin zona"""
+    if "dateTime" in value:
+        return naive_utc(datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00")))
+    day = date.fromisoformat(value["date"])
+    return datetime(day.year, day.month, day.day)
+
+def google_to_values(item: Dict[str, Any]) -> Dict[str, Any]:
+    rule = next((line[len("RRULE:"):] for line in item.get("recurrence", []) if line.startswith("RRULE:")), None)
+    rule = to_rrule(rule) if rule else None
+    return {
+        "title": item.get("summary") or "(Sin título)",
+        "description": item.get("description"),
+        "start_time": parse_google_time(item["start"]),
+        "end_time": parse_google_time(item["end"]),
+        "is_recurring": rule is not None,
+        "recurrence_pattern": rule,
+    }
+
+def event_to_google(event: Event) -> Dict[str, Any]:
+    body: Dict[str, Any] = {
+        "summary": event.title,
+        "description": event.description,
+        "start": {"dateTime": naive_utc(event.start_time).isoformat() + "Z"},
+        "end": {"dateTime": naive_utc(event.end_time).isoformat() + "Z"},
+    }
+    rule = to_rrule(event.recurrence_pattern) if event.is_recurring else None
+    if rule:
+        body["recurrence"] = [f"RRULE:{rule}"]
+    return body
+
+def _insert_for(session: Session):
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert
+    if dialect == "sqlite":
+        return sqlite.insert
+    raise RuntimeError(f"Upsert no soportado para {dialect}")
+
+def upsert_events(session: Session, integration: UserIntegration, rows: List[Tuple[str, Dict[str, Any]]]):
+    """INSERT ... ON CONFLICT (owner_id, external_id) DO UPDATE solo si algo cambió"""
+    if not rows:
+        return
+    insert = _insert_for(session)
+    statement = insert(Event).values([
+        {**values, "owner_id": integration.user_id, "family_id": integration.family_id, "external_id": external_id}
+        for external_id, values in rows
+    ])
+    changed = or_(*[getattr(Event, name).is_distinct_from(getattr(statement.excluded, name)) for name in SYNCED_FIELDS])
+    statement = statement.on_conflict_do_update(
+        index_elements=["owner_id", "external_id"],
+        set_={**{name: getattr(statement.excluded, name) for name in SYNCED_FIELDS}, "updated_at": datetime.now(timezone.utc)},
+        where=changed
+    )
+    session.execute(statement)
+
+def apply_instance_exception(session: Session, integration: UserIntegration, item: Dict[str, Any]) -> bool:
+    """Instancia de una serie (recurringEventId): se guarda como RecurrenceException del maestro"""
+    master = session.exec(
+        select(Event)
+        .where(Event.owner_id == integration.user_id)
+        .where(Event.external_id == item["recurringEventId"])
+    ).first()
+    if not master or "originalStartTime" not in item:
+        return False
+
+    original_start = parse_google_time(item["originalStartTime"])
+    exc = session.exec(
+        select(RecurrenceException)
+        .where(RecurrenceException.event_id == master.id)
+        .where(RecurrenceException.original_start == original_start)
+    ).first() or RecurrenceException(event_id=master.id, original_start=original_start)
+
+    if item.get("status") == "cancelled":
+        exc.status = "cancelled"
+    else:
+        exc.status = "modified"
+        exc.start_time = parse_google_time(item["start"])
+        exc.end_time = parse_google_time(item["end"])
+        exc.title = item.get("summary")
+    session.add(exc)
+    return True
+
+def pull(session: Session, integration: UserIntegration, client: GoogleCalendarClient, access_token: str) -> Tuple[Dict[str, int], Set[str]]:
+    """Aplica los cambios remotos. Retorna estadísticas y los IDs externos recibidos (también los borrados)."""
+    try:
+        items, next_token = client.list_changes(access_token, integration.calendar_id, integration.sync_token)
+    except SyncTokenExpired:
+        # Único caso de sincronización completa: Google invalidó el token
+        integration.sync_token = None
+        items, next_token = client.list_changes(access_token, integration.calendar_id, None)
+
+    upserts: Dict[str, Dict[str, Any]] = {}
+    deleted: List[str] = []
+    instances = []
+    for item in items:
+        if item.get("recurringEventId"):
+            instances.append(item)
+        elif item.get("status") == "cancelled":
+            deleted.append(item["id"])
+        elif "start" in item and "end" in item:
+            upserts[item["id"]] = google_to_values(item)
+
+    upsert_events(session, integration, list(upserts.items()))
+
+    removed = 0
+    if deleted:
+        doomed = session.exec(
+            select(Event)
+            .where(Event.owner_id == integration.user_id)
+            .where(Event.external_id.in_(deleted))  # type: ignore
+        ).all()
+        for event in doomed:
+            for exc in session.exec(select(RecurrenceException).where(RecurrenceException.event_id == event.id)).all():
+                session.delete(exc)
+            session.delete(event)
+        removed = len(doomed)
+
+    exceptions = sum(apply_instance_exception(session, integration, item) for item in instances)
+    integration.sync_token = next_token
+    return {"pulled": len(upserts), "deleted": removed, "exceptions": exceptions}, set(upserts) | set(deleted)
+
+def push(
+    session: Session,
+    integration: UserIntegration,
+    client: GoogleCalendarClient,
+    access_token: str,
+    pulled_ids: Set[str] = frozenset()
+) -> Dict[str, int]:
+    """
+    Envía los eventos locales modificados y borrados; lo recién recibido en el pull
+    (altas, ediciones o borrados) no se devuelve a Google.
+    """
+    pushed_at = datetime.now(timezone.utc)
+    statement = (
+        select(Event)
+        .where(Event.owner_id == integration.user_id)
+        .where(Event.family_id == integration.family_id)
+        .order_by(Event.id)
+    )
+    deletions = (
+        select(Tombstone.external_id)
+        .where(Tombstone.entity == "event")
+        .where(Tombstone.user_id == integration.user_id)
+        .where(Tombstone.family_id == integration.family_id)
+        .where(Tombstone.external_id != None)
+        .order_by(Tombstone.id)
+    )
+    if integration.last_pushed_at:
+        statement = statement.where(Event.updated_at > naive_utc(integration.last_pushed_at))
+        deletions = deletions.where(Tombstone.deleted_at > naive_utc(integration.last_pushed_at))
+    events = [e for e in session.exec(statement).all() if e.external_id not in pulled_ids]
+    # Sin repetir y sin lo que el pull acaba de borrar porque ya se borró en Google
+    deleted_ids = [external_id for external_id in dict.fromkeys(session.exec(deletions).all()) if external_id not in pulled_ids]
+    if not events and not deleted_ids:
+        integration.last_pushed_at = pushed_at
+        return {"pushed": 0}
+
+    calendar = integration.calendar_id
+    requests = [
+        ("PATCH", f"/calendars/{calendar}/events/{event.external_id}", event_to_google(event))
+        if event.external_id else
+        ("POST", f"/calendars/{calendar}/events", event_to_google(event))
+        for event in events
+    ]
+    requests += [("DELETE", f"/calendars/{calendar}/events/{external_id}", None) for external_id in deleted_ids]
+    responses = client.batch(access_token, requests)
+
+    failed = 0
+    for status_code, _ in responses[len(events):]:
+        # 404/410: el evento ya no existe en Google, el borrado ya está hecho
+        if status_code >= 300 and status_code not in (404, 410):
+            failed += 1
+    for event, (status_code, body) in zip(events, responses):
+        if status_code >= 300:
+            failed += 1
+            continue
+        if not event.external_id:
+            # updated_at explícito para que guardar el ID externo no cuente como cambio local
+            session.execute(
+                update(Event)
+                .where(Event.id == event.id)
+                .values(external_id=body["id"], updated_at=event.updated_at)
+            )
+    # Con fallos se conserva la marca anterior para reintentarlos en la próxima pasada
+    if not failed:
+        integration.last_pushed_at = pushed_at
+    return {"pushed": len(requests) - failed, "push_failed": failed}
+
+def record_sync_error(session: Session, integration: UserIntegration, status: str, detail: str) -> Dict[str, int]:
+    """Descarta lo aplicado a medias y deja el error registrado en la integración"""
+    session.rollback()
+    integration.status = status
+    integration.last_error = detail[:500]
+    session.add(integration)
+    session.commit()
+    return {}
+
+def sync_integration(session: Session, integration: UserIntegration, client: GoogleCalendarClient) -> Dict[str, int]:
+    """Pull + push de una integración. Los errores de Google quedan registrados en la integración."""
+    refresh_token = decrypt_secret(integration.encrypted_refresh_token)
+    if not refresh_token:
+        integration.status, integration.last_error = "error", "No se pudo descifrar el refresh token"
+        session.add(integration)
+        session.commit()
+        return {}
+
+    try:
+        access_token = client.refresh_access_token(refresh_token)
+        stats, pulled_ids = pull(session, integration, client, access_token)
+        session.flush()
+        stats.update(push(session, integration, client, access_token, pulled_ids))
+    except GoogleCalendarError as e:
+        return record_sync_error(session, integration, "revoked" if e.status_code in (400, 401) else "error", str(e))
+    except SYNC_ERRORS as e:
+        return record_sync_error(session, integration, "error", f"{type(e).__name__}: {e}")
+
+    integration.status, integration.last_error = "active", None
+    integration.last_synced_at = datetime.now(timezone.utc)
+    session.add(integration)
+    session.commit()
+    member_ids = session.exec(
+        select(FamilyMember.user_id).where(FamilyMember.family_id == integration.family_id)
+    ).all()
+    event_changes.events_imported(integration.family_id, member_ids)
+    return stats
+
+def sync_all_integrations(session: Session, client: Optional[GoogleCalendarClient] = None) -> int:
+    """Worker periódico: sincroniza todas las integraciones activas. Retorna cuántas se procesaron."""
+    client = client or GoogleCalendarClient()
+    integrations = session.exec(
+        select(UserIntegration)
+        .where(UserIntegration.provider == "google")
+        .where(UserIntegration.status != "revoked")
+        .order_by(UserIntegration.id)
+    ).all()
+    for integration in integrations:
+        try:
+            sync_integration(session, integration, client)
+        except Exception as e:
+            # Un error inesperado en una integración no debe frenar a las demás
+            print(f"⚠️ Error sincronizando la integración {integration.id}: {e}")
+            record_sync_error(session, integration, "error", f"{type(e).__name__}: {e}")
+    return len(integrations)
@@ -0,0 +1,237 @@
+"""
+Exportación iCalendar (RFC 5545).
+Los VEVENT se generan en streaming desde un cursor del lado del servidor (yield_per),
+sin armar el archivo completo en memoria. Cada feed tiene un ETag y un Last-Modified
+derivados de contadores de versión por familia y por usuario que se incrementan al
+cambiar los eventos; los feeds pequeños se guardan ya renderizados para responder
+a los clientes de suscripción, que consultan muy seguido, sin tocar la BD.
+"""
+import hashlib
+import secrets
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from threading import Lock
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlmodel import Session
+
+from ..models import Event, RecurrenceException
+from .recurrence import load_exceptions, naive_utc, to_rrule
+
+PRODID = "-//FamilIAgenda//ES"
+# Filas por lote del cursor del lado del servidor
+ICS_YIELD_PER = 500
+# Feeds renderizados en caché y tamaño máximo de cada uno
+FEED_CACHE_SIZE = 256
+FEED_CACHE_MAX_BYTES = 2 * 1024 * 1024
+
+def escape_text(value: Optional[str]) -> str:
+    if not value:
+        return ""
+    return (
+        value.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+def fold_line(line: str) -> str:
+    """Corta las líneas a 75 octetos como exige el RFC (continuación con un espacio)"""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+
+    parts = []
+    start = 0
+    limit = 75
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        # No partir un carácter UTF-8 multibyte
+        while end < len(encoded) and (encoded[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode("utf-8"))
+        start = end
+        limit = 74
+    return "\r\n ".join(parts) + "\r\n"
+
+def format_dt(value: datetime) -> str:
+    return naive_utc(value).strftime("%Y%m%dT%H%M%SZ")
+
+def render_vevent(
+    event: Event,
+    exceptions: Optional[Dict[datetime, RecurrenceException]] = None,
+    stamp: Optional[datetime] = None
+) -> str:
+    """VEVENT del evento; los maestros recurrentes llevan RRULE, EXDATE y sus ocurrencias modificadas"""
+    stamp = stamp or datetime.now(timezone.utc)
+    uid = f"event-{event.id}@familiagenda"
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{uid}",
+        f"DTSTAMP:{format_dt(stamp)}",
+        f"DTSTART:{format_dt(event.start_time)}",
+        f"DTEND:{format_dt(event.end_time)}",
+        f"SUMMARY:{escape_text(event.title)}",
+    ]
+    if event.description:
+        lines.append(f"DESCRIPTION:{escape_text(event.description)}")
+    if event.category:
+        lines.append(f"CATEGORIES:{escape_text(event.category)}")
+
+    overrides = []
+    rule = to_rrule(event.recurrence_pattern) if event.is_recurring else None
+    if rule:
+        lines.append(f"RRULE:{rule}")
+        duration = event.end_time - event.start_time
+        for original_start, exc in sorted((exceptions or {}).items()):
+            if exc.status == "cancelled":
+                lines.append(f"EXDATE:{format_dt(original_start)}")
+            elif exc.status == "modified":
+                start = exc.start_time or original_start
+                overrides.extend([
+                    "BEGIN:VEVENT",
+                    f"UID:{uid}",
+                    f"DTSTAMP:{format_dt(stamp)}",
+                    f"RECURRENCE-ID:{format_dt(original_start)}",
+                    f"DTSTART:{format_dt(start)}",
+                    f"DTEND:{format_dt(exc.end_time or start + duration)}",
+                    f"SUMMARY:{escape_text(exc.title or event.title)}",
+                    "END:VEVENT",
+                ])
+    lines.append("END:VEVENT")
+    return "".join(fold_line(line) for line in lines + overrides)
+
+def calendar_header(name: str) -> str:
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{escape_text(name)}",
+    ]
+    return "".join(fold_line(line) for line in lines)
+
+CALENDAR_FOOTER = "END:VCALENDAR\r\n"
+
+def iter_calendar(session: Session, statement, name: str) -> Iterator[bytes]:
+    """
+    Genera el calendario por lotes: cada lote del cursor se convierte en un bloque de
+    VEVENTs, con las excepciones de sus eventos recurrentes en una sola consulta.
+    """
+    stamp = datetime.now(timezone.utc)
+    yield calendar_header(name).encode("utf-8")
+
+    result = session.exec(statement.execution_options(yield_per=ICS_YIELD_PER))
+    for events in result.partitions():
+        recurring_ids = [e.id for e in events if e.is_recurring]
+        exceptions = load_exceptions(session, recurring_ids)
+        yield "".join(
+            render_vevent(event, exceptions.get(event.id), stamp) for event in events
+        ).encode("utf-8")
+
+    yield CALENDAR_FOOTER.encode("utf-8")
+
+class FeedVersions:
+    """
+    Contadores de versión en memoria por familia y por usuario. El token de arranque
+    hace que los ETag emitidos por un proceso anterior no coincidan tras un reinicio.
+    """
+    def __init__(self):
+        self.boot = secrets.token_hex(4)
+        self.started_at = datetime.now(timezone.utc).replace(microsecond=0)
+        self.versions: Dict[Tuple[str, int], Tuple[int, datetime]] = {}
+        self.lock = Lock()
+
+    def bump(self, kind: str, ids: Iterable[Optional[int]]):
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        with self.lock:
+            for key_id in ids:
+                if key_id is None:
+                    continue
+                version, _ = self.versions.get((kind, key_id), (0, self.started_at))
+                self.versions[(kind, key_id)] = (version + 1, now)
+
+    def bump_family(self, family_id: Optional[int]):
+        self.bump("family", [family_id])
+
+    def bump_users(self, user_ids: Iterable[int]):
+        self.bump("user", user_ids)
+
+    def validators(self, keys: Iterable[Tuple[str, int]]) -> Tuple[str, datetime]:
+        """ETag y Last-Modified de un feed que depende de las claves indicadas"""
+        with self.lock:
+            current = [(key, self.versions.get(key, (0, self.started_at))) for key in sorted(keys)]
+        digest = hashlib.sha1(repr((self.boot, current)).encode()).hexdigest()[:20]
+        last_modified = max((modified for _, (_, modified) in current), default=self.started_at)
+        return f'"{digest}"', last_modified
+
+    def clear(self):
+        with self.lock:
+            self.versions.clear()
+
+feed_versions = FeedVersions()
+
+def not_modified(headers, etag: str, last_modified: datetime) -> bool:
+    """If-None-Match tiene prioridad sobre If-Modified-Since (RFC 9110)"""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def http_date(value: datetime) -> str:
+    return format_datetime(value, usegmt=True)
+
+class FeedCache:
+    """Feeds ya renderizados por clave; una entrada vale mientras coincida su ETag"""
+    def __init__(self, max_entries: int = FEED_CACHE_SIZE, max_bytes: int = FEED_CACHE_MAX_BYTES):
+        self.entries: "OrderedDict[str, Tuple[str, bytes]]" = OrderedDict()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.lock = Lock()
+
+    def get(self, key: str, etag: str) -> Optional[bytes]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != etag:
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: str, etag: str, body: bytes):
+        with self.lock:
+            self.entries[key] = (etag, body)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def caching(self, key: str, etag: str, chunks: Iterator[bytes]) -> Iterator[bytes]:
+        """Reenvía los bloques y guarda el feed completo si no supera max_bytes"""
+        kept: Optional[List[bytes]] = []
+        size = 0
+        for chunk in chunks:
+            if kept is not None:
+                size += len(chunk)
+                if size <= self.max_bytes:
+                    kept.append(chunk)
+                else:
+                    kept = None
+            yield chunk
+        if kept is not None:
+            self.put(key, etag, b"".join(kept))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+feed_cache = FeedCache()
@@ -6,7 +6,9 @@ from datetime import datetime, timedelta, timezone
 from typing import List, Optional, Dict, Any
 import json
 from sqlmodel import Session, select
-from ..models import Event, NotificationLog, User, NotificationToken, Task
+from ..models import Event, NotificationLog, User, NotificationToken, Task, RecurrenceException
+from .push_gateway import push_gateway
+from .recurrence_batch import NEXT_OFFSET, weekday_mask, next_occurrences, skip_exceptions
 
 def parse_notification_config(config_str: str) -> Dict[str, Any]:
     """
@@ -23,29 +25,31 @@ def parse_notification_config(config_str: str) -> Dict[str, Any]:
 def parse_recurrence_pattern(pattern: str) -> Dict[str, Any]:
     """
     Parsea el patrón de recurrencia.
-    Formato: "weekly:mon,wed,fri:22:00" o "daily:18:00"
+    Formato: "weekly:mon,wed,fri:22:00", "daily:18:00", "monthly:09:00" o "yearly:09:00"
     """
     parts = pattern.split(":")
     if len(parts) < 2:
         return {}
     
-    freq = parts[0]  # daily, weekly, monthly
+    freq = parts[0]  # daily, weekly, monthly, yearly
     
     if freq == "weekly" and len(parts) >= 3:
         days = parts[1].split(",")  # mon,wed,fri
-        time = parts[2] if len(parts) > 2 else "00:00"
+        time = ":".join(parts[2:]) or "00:00"
         return {"frequency": "weekly", "days": days, "time": time}
-    elif freq == "daily":
-        time = parts[1] if len(parts) > 1 else "00:00"
-        return {"frequency": "daily", "time": time}
+    elif freq in ("daily", "monthly", "yearly"):
+        time = ":".join(parts[1:]) or "00:00"
+        return {"frequency": freq, "time": time}
     
     return {}
 
-def calculate_notification_times(event: Event) -> List[Dict[str, Any]]:
+def calculate_notification_times(event: Event, start_time: Optional[datetime] = None) -> List[Dict[str, Any]]:
     """
     Calcula todos los momentos en que se deben enviar notificaciones para un evento.
+    start_time permite calcularlas para una ocurrencia concreta de un evento recurrente.
     Retorna lista de dicts con {scheduled_for, notification_type, stage}
     """
+    event_start = start_time or event.start_time
     config = parse_notification_config(event.notification_config or "{}")
     notifications = []
     
@@ -64,7 +68,7 @@ def calculate_notification_times(event: Event) -> List[Dict[str, Any]]:
                 delta = timedelta(minutes=stage)
             
             # Calcular fecha/hora de notificación
-            notification_date = event.start_time - delta
+            notification_date = event_start - delta
             
             # Ajustar hora si se especificó
             if time_str and unit == "days":
@@ -91,16 +95,29 @@ def calculate_notification_times(event: Event) -> List[Dict[str, Any]]:
                 delta = timedelta(days=pre_time)
             
             notifications.append({
-                "scheduled_for": event.start_time - delta,
+                "scheduled_for": event_start - delta,
                 "notification_type": "pre_event",
                 "stage": None
             })
     
     return notifications
 
-def schedule_notifications_for_event(session: Session, event_id: int):
+def build_notification_log(event: Event, user_id: int, notif: Dict[str, Any]) -> NotificationLog:
+    """Crea el registro de NotificationLog para uno de los momentos de calculate_notification_times"""
+    return NotificationLog(
+        event_id=event.id,
+        user_id=user_id,
+        title=f"Recordatorio: {event.title}",
+        body=f"'{event.title}' comienza pronto",
+        scheduled_for=notif["scheduled_for"],
+        notification_type=notif["notification_type"],
+        stage=notif["stage"]
+    )
+
+def schedule_notifications_for_event(session: Session, event_id: int, occurrence_start: Optional[datetime] = None):
     """
-    Programa todas las notificaciones para un evento.
+    Programa todas las notificaciones para un evento (o para una ocurrencia de un
+    evento recurrente si se indica occurrence_start).
     Crea registros en NotificationLog para cada notificación pendiente.
     """
     event = session.get(Event, event_id)
@@ -111,7 +128,7 @@ def schedule_notifications_for_event(session: Session, event_id: int):
     user_id = event.assigned_to_id or event.owner_id
     
     # Calcular momentos de notificación
-    notification_times = calculate_notification_times(event)
+    notification_times = calculate_notification_times(event, occurrence_start)
     
     # Crear registros en NotificationLog
     for notif in notification_times:
@@ -125,14 +142,7 @@ def schedule_notifications_for_event(session: Session, event_id: int):
         ).first()
         
         if not existing:
-            log = NotificationLog(
-                event_id=event_id,
-                user_id=user_id,
-                scheduled_for=notif["scheduled_for"],
-                notification_type=notif["notification_type"],
-                stage=notif["stage"]
-            )
-            session.add(log)
+            session.add(build_notification_log(event, user_id, notif))
     
     session.commit()
 
@@ -151,6 +161,7 @@ def process_pending_notifications(session: Session):
         )
     ).all()
     
+    outgoing = []
     for notif_log in pending:
         try:
             # Obtener evento y usuario
@@ -172,8 +183,8 @@ def process_pending_notifications(session: Session):
                 title = f"Recordatorio: {event.title}"
                 body = f"'{event.title}' comienza pronto"
             
-            # Enviar notificación
-            send_notification_to_user(session, notif_log.user_id, title, body)
+            # Se envían todas juntas al final (lotes de hasta 500 en el gateway)
+            outgoing.append((notif_log.user_id, title, body))
             
             # Marcar como enviada
             notif_log.sent_at = datetime.now(timezone.utc)
@@ -182,53 +193,141 @@ def process_pending_notifications(session: Session):
         except Exception as e:
             print(f"Error enviando notificación {notif_log.id}: {e}")
     
+    if outgoing:
+        try:
+            report = push_gateway.notify_users(session, outgoing)
+            print(f"Notificaciones enviadas: {report.sent}, fallidas: {report.failed}, tokens eliminados: {len(report.pruned_tokens)}")
+        except Exception as e:
+            print(f"Error enviando notificaciones: {e}")
+    
     session.commit()
 
-def handle_recurring_event_completion(session: Session, event_id: int):
+def handle_recurring_event_completion(
+    session: Session,
+    event_id: int,
+    occurrence_start: Optional[datetime] = None,
+    completed_by_id: Optional[int] = None
+) -> bool:
     """
-    Cuando se marca un evento recurrente como completado:
-    1. Marca la instancia actual como completada
-    2. Calcula la próxima instancia
-    3. Programa notificaciones para la próxima instancia
+    Cuando se completa una ocurrencia de un evento recurrente:
+    1. Registra la ocurrencia como completada (RecurrenceException), sin clonar el evento
+    2. Calcula la próxima ocurrencia con el motor RRULE
+    3. Programa notificaciones para la próxima ocurrencia
+    Retorna False si el evento no tiene una regla de recurrencia válida.
+    Lanza ValueError si occurrence_start no es una ocurrencia de la regla.
     """
+    from .recurrence import (
+        to_rrule, first_occurrence, next_occurrence, previous_occurrence, naive_utc, is_occurrence
+    )
+    
     event = session.get(Event, event_id)
     if not event or not event.is_recurring:
-        return
+        return False
     
-    # Parsear patrón de recurrencia
-    pattern = parse_recurrence_pattern(event.recurrence_pattern or "")
-    if not pattern:
-        return
+    rule = to_rrule(event.recurrence_pattern)
+    if not rule:
+        return False
     
-    # Calcular próxima ocurrencia
-    next_start = calculate_next_occurrence(event.start_time, pattern)
-    if not next_start:
-        return
+    # Por defecto se completa la última ocurrencia ya iniciada (o la primera si aún no empezó)
+    if occurrence_start is None:
+        now = datetime.now(timezone.utc)
+        occurrence_start = (
+            previous_occurrence(rule, event.start_time, now)
+            or first_occurrence(rule, event.start_time)
+        )
+    if occurrence_start is None:
+        return False
+    occurrence_start = naive_utc(occurrence_start)
+    # Solo se completan ocurrencias reales: evita excepciones huérfanas que nunca se muestran
+    if not is_occurrence(rule, event.start_time, occurrence_start):
+        raise ValueError("La fecha indicada no es una ocurrencia de este evento")
     
-    # Crear nueva instancia (clonar evento)
-    duration = event.end_time - event.start_time
-    new_event = Event(
-        title=event.title,
-        description=event.description,
-        start_time=next_start,
-        end_time=next_start + duration,
-        category=event.category,
-        priority=event.priority,
-        visibility=event.visibility,
-        is_recurring=True,
-        recurrence_pattern=event.recurrence_pattern,
-        notification_config=event.notification_config,
-        assigned_to_id=event.assigned_to_id,
-        owner_id=event.owner_id,
-        family_id=event.family_id
-    )
+    exception = session.exec(
+        select(RecurrenceException).where(
+            RecurrenceException.event_id == event_id,
+            RecurrenceException.original_start == occurrence_start
+        )
+    ).first() or RecurrenceException(event_id=event_id, original_start=occurrence_start)
+    
+    exception.status = "completed"
+    exception.completed_at = datetime.now(timezone.utc)
+    exception.completed_by_id = completed_by_id
+    session.add(exception)
     
-    session.add(new_event)
+    # Programar notificaciones para la próxima ocurrencia en la misma transacción:
+    # un solo commit evita volver a cargar el evento maestro
+    next_start = next_occurrence(rule, event.start_time, occurrence_start)
+    if next_start:
+        schedule_notifications_for_event(session, event_id, occurrence_start=next_start)
     session.commit()
-    session.refresh(new_event)
+    return True
+
+def roll_forward_recurring_events(
+    session: Session,
+    now: Optional[datetime] = None,
+    batch_size: int = 1000
+) -> int:
+    """
+    Job nocturno: calcula en bloque la próxima ocurrencia de todos los eventos
+    recurrentes (vectorizado) y programa sus notificaciones pendientes, saltando
+    las ocurrencias canceladas o ya completadas (RecurrenceException).
+    Procesa por lotes de batch_size eventos con una consulta de duplicados por lote.
+    Retorna la cantidad de notificaciones creadas.
+    """
+    from .recurrence import load_exceptions, naive_utc
+    
+    now = naive_utc(now or datetime.now(timezone.utc))
+    created = 0
+    last_id = 0
     
-    # Programar notificaciones para la nueva instancia
-    schedule_notifications_for_event(session, new_event.id)
+    while True:
+        events = session.exec(
+            select(Event)
+            .where(Event.is_recurring == True, Event.id > last_id)
+            .order_by(Event.id)
+            .limit(batch_size)
+        ).all()
+        if not events:
+            break
+        last_id = events[-1].id
+        
+        next_starts = next_occurrences(
+            [e.start_time for e in events],
+            [e.recurrence_pattern for e in events],
+            now
+        )
+        
+        # Ocurrencias canceladas, completadas o movidas del lote: una sola consulta
+        exceptions = load_exceptions(session, [e.id for e in events], after=now)
+        
+        pending = []
+        for event, next_start in zip(events, next_starts):
+            if exceptions[event.id]:
+                next_start = skip_exceptions(event.start_time, event.recurrence_pattern, next_start, exceptions[event.id])
+            if next_start is None:
+                continue
+            user_id = event.assigned_to_id or event.owner_id
+            for notif in calculate_notification_times(event, next_start):
+                # Las etapas que ya pasaron no se programan (se enviarían todas juntas)
+                if naive_utc(notif["scheduled_for"]) > now:
+                    pending.append(build_notification_log(event, user_id, notif))
+        
+        if pending:
+            existing = set(session.exec(
+                select(NotificationLog.event_id, NotificationLog.user_id, NotificationLog.scheduled_for)
+                .where(NotificationLog.event_id.in_({log.event_id for log in pending}))  # type: ignore
+                .where(NotificationLog.scheduled_for > now)
+            ).all())
+            for log in pending:
+                if (log.event_id, log.user_id, log.scheduled_for) not in existing:
+                    session.add(log)
+                    created += 1
+        
+        session.commit()
+        # Liberar las entidades del lote para que la memoria no crezca con el total
+        session.expunge_all()
+    
+    return created
 
 def calculate_next_occurrence(current_start: datetime, pattern: Dict[str, Any]) -> Optional[datetime]:
     """
@@ -240,24 +339,14 @@ def calculate_next_occurrence(current_start: datetime, pattern: Dict[str, Any])
         return current_start + timedelta(days=1)
     
     elif freq == "weekly":
-        days_map = {
-            "mon": 0, "tue": 1, "wed": 2, "thu": 3,
-            "fri": 4, "sat": 5, "sun": 6
-        }
-        target_days = [days_map.get(d.lower(), 0) for d in pattern.get("days", [])]
+        # Máscara de días precompilada + tabla de desplazamientos (sin recorrer día a día)
+        target_mask = weekday_mask(pattern.get("days", []))
         
-        if not target_days:
+        if not target_mask:
             return None
         
         # Encontrar el próximo día válido
-        current_weekday = current_start.weekday()
-        next_day = None
-        
-        for offset in range(1, 8):
-            check_day = (current_weekday + offset) % 7
-            if check_day in target_days:
-                next_day = current_start + timedelta(days=offset)
-                break
+        next_day = current_start + timedelta(days=NEXT_OFFSET[target_mask][current_start.weekday()])
         
         if next_day and "time" in pattern:
             hour, minute = map(int, pattern["time"].split(":"))
@@ -269,31 +358,11 @@ def calculate_next_occurrence(current_start: datetime, pattern: Dict[str, Any])
 
 def send_notification_to_user(session: Session, user_id: int, title: str, body: str):
     """
-    Envía notificación a un usuario específico.
-    Busca todos los tokens del usuario y envía a cada dispositivo.
+    Envía notificación a un usuario específico (a todos sus dispositivos).
     """
     try:
-        from firebase_admin import messaging
-    except ImportError:
-        print("Firebase Admin SDK no está disponible")
-        return
-    
-    # Obtener tokens del usuario
-    tokens = session.exec(
-        select(NotificationToken).where(NotificationToken.user_id == user_id)
-    ).all()
-    
-    if not tokens:
-        return
-    
-    registration_tokens = [t.token for t in tokens]
-    
-    try:
-        message = messaging.MulticastMessage(
-            notification=messaging.Notification(title=title, body=body),
-            tokens=registration_tokens,
-        )
-        response = messaging.send_multicast(message)
-        print(f"Notificaciones enviadas a usuario {user_id}: {response.success_count}/{len(registration_tokens)}")
+        report = push_gateway.notify_users(session, [(user_id, title, body)])
+        session.commit()
+        print(f"Notificaciones enviadas a usuario {user_id}: {report.sent}/{report.sent + report.failed}")
     except Exception as e:
         print(f"Error enviando notificación a usuario {user_id}: {e}")
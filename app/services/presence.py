@@ -0,0 +1,136 @@
+"""
+Servicio de presencia ("en línea") e indicadores de escritura para el chat.
+Se apoya en el registro de conexiones de ConnectionManager y agrupa los cambios
+por familia en un único frame cada PRESENCE_FLUSH_INTERVAL segundos, para que
+la presencia no multiplique el tráfico de broadcast.
+"""
+import asyncio
+import time
+from typing import Callable, Dict, List, Set
+
+from .websocket_manager import ConnectionManager, manager
+
+# Intervalo fijo de envío de frames de presencia agrupados (segundos)
+PRESENCE_FLUSH_INTERVAL = 1.0
+# Sin frames del cliente durante este tiempo la conexión se considera caída (segundos)
+HEARTBEAT_TIMEOUT = 45.0
+# Un indicador de "escribiendo" expira solo si el cliente no lo renueva (segundos)
+TYPING_TTL = 6.0
+
+class PresenceService:
+    def __init__(
+        self,
+        connections: ConnectionManager,
+        heartbeat_timeout: float = HEARTBEAT_TIMEOUT,
+        typing_ttl: float = TYPING_TTL,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.connections = connections
+        self.heartbeat_timeout = heartbeat_timeout
+        self.typing_ttl = typing_ttl
+        self.clock = clock
+        # family_id -> user_id -> último frame recibido
+        self.last_seen: Dict[int, Dict[int, float]] = {}
+        # family_id -> user_id -> vencimiento del indicador de escritura
+        self.typing: Dict[int, Dict[int, float]] = {}
+        # Estado enviado en el último frame de cada familia
+        self.published: Dict[int, tuple] = {}
+        # Familias con cambios pendientes de enviar
+        self.dirty: Set[int] = set()
+        # Aumenta con cada alta o baja en la lista de conectados (ETag de la lista de miembros)
+        self.online_revision = 0
+
+    def heartbeat(self, family_id: int, user_id: int):
+        """Cualquier frame del cliente cuenta como latido"""
+        family_seen = self.last_seen.setdefault(family_id, {})
+        if user_id not in family_seen:
+            self.dirty.add(family_id)
+            self.online_revision += 1
+        family_seen[user_id] = self.clock()
+
+    def set_typing(self, family_id: int, user_id: int, is_typing: bool = True):
+        family_typing = self.typing.setdefault(family_id, {})
+        if is_typing:
+            # Renovar no genera tráfico: solo el cambio de estado marca la familia
+            if user_id not in family_typing:
+                self.dirty.add(family_id)
+            family_typing[user_id] = self.clock() + self.typing_ttl
+        elif family_typing.pop(user_id, None) is not None:
+            self.dirty.add(family_id)
+
+    def leave(self, family_id: int, user_id: int):
+        """Llamar al cerrar una conexión; si el usuario no tiene otras, sale de línea"""
+        if user_id in self.connections.connected_users(family_id):
+            # Sigue en línea por otra conexión: la lista de conectados no cambia
+            return
+        self.typing.get(family_id, {}).pop(user_id, None)
+        # Si el latido ya había vencido, expire() ya contó la baja
+        if self.last_seen.get(family_id, {}).pop(user_id, None) is not None:
+            self.dirty.add(family_id)
+            self.online_revision += 1
+
+    def online_users(self, family_id: int) -> List[int]:
+        """Usuarios con conexión abierta y latido reciente. Solo memoria, sin BD."""
+        deadline = self.clock() - self.heartbeat_timeout
+        seen = self.last_seen.get(family_id, {})
+        return sorted(
+            user_id for user_id in self.connections.connected_users(family_id)
+            if seen.get(user_id, float("-inf")) >= deadline
+        )
+
+    def typing_users(self, family_id: int) -> List[int]:
+        now = self.clock()
+        online = set(self.online_users(family_id))
+        return sorted(
+            user_id for user_id, expires in self.typing.get(family_id, {}).items()
+            if expires > now and user_id in online
+        )
+
+    def expire(self):
+        """Descarta latidos e indicadores vencidos y marca las familias afectadas"""
+        now = self.clock()
+        deadline = now - self.heartbeat_timeout
+        for family_id, seen in self.last_seen.items():
+            stale = [user_id for user_id, ts in seen.items() if ts < deadline]
+            for user_id in stale:
+                del seen[user_id]
+            if stale:
+                self.dirty.add(family_id)
+                self.online_revision += 1
+        for family_id, family_typing in self.typing.items():
+            expired = [user_id for user_id, expires in family_typing.items() if expires <= now]
+            for user_id in expired:
+                del family_typing[user_id]
+            if expired:
+                self.dirty.add(family_id)
+
+    def snapshot(self, family_id: int) -> dict:
+        return {
+            "type": "presence",
+            "online": self.online_users(family_id),
+            "typing": self.typing_users(family_id),
+        }
+
+    async def flush(self):
+        """Envía como mucho un frame por familia con cambios desde el último envío"""
+        self.expire()
+        dirty, self.dirty = self.dirty, set()
+        for family_id in dirty:
+            frame = self.snapshot(family_id)
+            state = (tuple(frame["online"]), tuple(frame["typing"]))
+            if self.published.get(family_id) == state:
+                continue
+            self.published[family_id] = state
+            # Frames efímeros: sin seq ni replay log
+            await self.connections.broadcast(frame, family_id, replay=False)
+
+    async def run(self, interval: float = PRESENCE_FLUSH_INTERVAL):
+        """Bucle de envío periódico. Se lanza en el lifespan de la app."""
+        while True:
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error en servicio de presencia: {e}")
+            await asyncio.sleep(interval)
+
+presence = PresenceService(manager)
@@ -0,0 +1,43 @@
+"""
+Consultas proyectadas para las rutas que recorren listas: se seleccionan solo las
+columnas necesarias y cada fila se convierte en un NamedTuple liviano, sin pasar por
+el identity map ni instanciar entidades del ORM (con sus relaciones y estado).
+
+Los campos de cada registro se llaman igual que las columnas del modelo.
+"""
+from datetime import datetime
+from typing import List, NamedTuple, Optional, Type, TypeVar
+
+from sqlmodel import Session, select
+
+from ..models import Event
+
+R = TypeVar("R", bound=tuple)
+
+class EventStats(NamedTuple):
+    """Lo que usan las métricas de la familia"""
+    category: Optional[str]
+    status: Optional[str]
+    assigned_to_id: Optional[int]
+    start_time: datetime
+
+class EventSummary(NamedTuple):
+    """Lo que se le pasa a la IA como contexto del calendario"""
+    id: int
+    title: str
+    start_time: datetime
+    end_time: datetime
+    category: Optional[str]
+
+class EventTiming(NamedTuple):
+    """Patrones de productividad: cuándo y de qué categoría"""
+    start_time: datetime
+    category: Optional[str]
+
+def select_records(record: Type[R], model=Event):
+    """select() de las columnas de `model` con los nombres de los campos de `record`"""
+    return select(*(getattr(model, field) for field in record._fields))
+
+def fetch_records(session: Session, record: Type[R], statement) -> List[R]:
+    make = record._make
+    return [make(row) for row in session.exec(statement)]
@@ -0,0 +1,213 @@
+"""
+Gateway de notificaciones push.
+
+Todos los envíos (recordatorios del scheduler, avisos a la familia, notificación de
+prueba) pasan por push_gateway:
+- los tokens de todos los destinatarios se buscan en una sola consulta y se deduplican
+  (mismo token y mismo contenido = un solo mensaje),
+- los mensajes se agrupan en lotes de hasta 500 (límite de FCM send_each), mezclando usuarios,
+- los tokens que FCM reporta como no registrados se borran de NotificationToken,
+- los fallos transitorios (UNAVAILABLE, INTERNAL, cuota) se reintentan con backoff
+  exponencial con jitter completo.
+
+El envío real lo hace un PushTransport: FirebaseTransport en producción, FakeTransport
+en los tests (o con PUSH_TRANSPORT=fake en desarrollo, solo registra los envíos).
+"""
+import os
+import random
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from ..models import FamilyMember, NotificationToken
+
+PUSH_BATCH_SIZE = 500  # Máximo de mensajes por llamada a send_each de FCM
+PUSH_MAX_ATTEMPTS = int(os.getenv("PUSH_MAX_ATTEMPTS", "4"))
+PUSH_RETRY_BASE_SECONDS = float(os.getenv("PUSH_RETRY_BASE_SECONDS", "0.5"))
+PUSH_RETRY_MAX_SECONDS = float(os.getenv("PUSH_RETRY_MAX_SECONDS", "8"))
+
+# Resultado de cada mensaje
+SENT = "sent"
+DEAD_TOKEN = "dead_token"  # El token ya no existe: se borra
+TRANSIENT = "transient"  # Se reintenta
+FAILED = "failed"  # Error permanente del mensaje (no del token)
+
+TRANSIENT_CODES = {"UNAVAILABLE", "INTERNAL", "RESOURCE_EXHAUSTED", "DEADLINE_EXCEEDED", "UNKNOWN", "ABORTED"}
+
+@dataclass(frozen=True)
+class PushMessage:
+    token: str
+    title: str
+    body: str
+    data: Tuple[Tuple[str, str], ...] = ()  # Pares clave/valor (FCM solo acepta strings)
+
+    @property
+    def dedupe_key(self):
+        return (self.token, self.title, self.body, self.data)
+
+@dataclass
+class PushReport:
+    sent: int = 0
+    failed: int = 0
+    retries: int = 0
+    pruned_tokens: List[str] = field(default_factory=list)
+
+def classify_error(exc: BaseException) -> str:
+    """Tipo de fallo de un mensaje a partir de la excepción de firebase_admin"""
+    name = type(exc).__name__
+    code = getattr(exc, "code", None)
+    if name in ("UnregisteredError", "SenderIdMismatchError"):
+        return DEAD_TOKEN
+    if code == "INVALID_ARGUMENT" and "registration token" in str(exc).lower():
+        return DEAD_TOKEN
+    if code in TRANSIENT_CODES or isinstance(exc, (ConnectionError, TimeoutError)):
+        return TRANSIENT
+    return FAILED
+
+class PushTransport(ABC):
+    """Interfaz: envía un lote y devuelve un resultado (SENT, DEAD_TOKEN, ...) por mensaje"""
+    max_batch = PUSH_BATCH_SIZE
+
+    def ready(self) -> bool:
+        return True
+
+    @abstractmethod
+    def send_each(self, messages: Sequence[PushMessage]) -> List[str]:
+        ...
+
+class FirebaseTransport(PushTransport):
+    def ready(self) -> bool:
+        from .. import notification_service
+        return notification_service._firebase_app_initialized
+
+    def send_each(self, messages: Sequence[PushMessage]) -> List[str]:
+        from ..notification_service import load_messaging
+        messaging = load_messaging()
+        response = messaging.send_each([
+            messaging.Message(
+                token=message.token,
+                notification=messaging.Notification(title=message.title, body=message.body),
+                data=dict(message.data) or None,
+            )
+            for message in messages
+        ])
+        return [SENT if item.success else classify_error(item.exception) for item in response.responses]
+
+class FakeTransport(PushTransport):
+    """
+    Transporte local: registra los lotes enviados. `dead_tokens` responde como token no
+    registrado; `transient_failures[token]` es cuántas veces falla antes de entregarse.
+    """
+    def __init__(self, dead_tokens: Iterable[str] = (), transient_failures: Optional[Dict[str, int]] = None,
+                 max_batch: int = PUSH_BATCH_SIZE):
+        self.dead_tokens: Set[str] = set(dead_tokens)
+        self.transient_failures: Dict[str, int] = dict(transient_failures or {})
+        self.max_batch = max_batch
+        self.batches: List[List[PushMessage]] = []
+        self.delivered: List[PushMessage] = []
+
+    def send_each(self, messages: Sequence[PushMessage]) -> List[str]:
+        self.batches.append(list(messages))
+        results = []
+        for message in messages:
+            if message.token in self.dead_tokens:
+                results.append(DEAD_TOKEN)
+            elif self.transient_failures.get(message.token, 0) > 0:
+                self.transient_failures[message.token] -= 1
+                results.append(TRANSIENT)
+            else:
+                self.delivered.append(message)
+                results.append(SENT)
+        return results
+
+class PushGateway:
+    def __init__(self, transport: PushTransport, max_attempts: int = PUSH_MAX_ATTEMPTS,
+                 base_delay: float = PUSH_RETRY_BASE_SECONDS, max_delay: float = PUSH_RETRY_MAX_SECONDS,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.transport = transport
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+
+    def backoff(self, attempt: int) -> float:
+        """Jitter completo: uniforme entre 0 y base * 2^intento (acotado)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def send(self, session: Session, messages: Iterable[PushMessage]) -> PushReport:
+        """Envía los mensajes y borra los tokens dados de baja (sin commit)"""
+        report = PushReport()
+        pending = list({message.dedupe_key: message for message in messages}.values())
+        if not pending:
+            return report
+        if not self.transport.ready():
+            print("No se pueden enviar notificaciones: Firebase no está inicializado.")
+            report.failed = len(pending)
+            return report
+
+        dead: Set[str] = set()
+        for attempt in range(self.max_attempts):
+            if attempt:
+                report.retries += len(pending)
+                self.sleep(self.backoff(attempt - 1))
+            retry: List[PushMessage] = []
+            for start in range(0, len(pending), self.transport.max_batch):
+                batch = pending[start:start + self.transport.max_batch]
+                try:
+                    results = self.transport.send_each(batch)
+                except Exception as e:
+                    # El lote entero falló (red, auth): transitorio si el error lo es
+                    kind = classify_error(e)
+                    print(f"Error enviando lote de {len(batch)} notificaciones: {e}")
+                    results = [kind] * len(batch)
+                for message, result in zip(batch, results):
+                    if result == SENT:
+                        report.sent += 1
+                    elif result == DEAD_TOKEN:
+                        dead.add(message.token)
+                        report.failed += 1
+                    elif result == TRANSIENT:
+                        retry.append(message)
+                    else:
+                        report.failed += 1
+            pending = retry
+            if not pending:
+                break
+        report.failed += len(pending)
+
+        if dead:
+            # Solo flush: el commit queda a cargo de quien llama, dentro de su transacción
+            session.exec(delete(NotificationToken).where(NotificationToken.token.in_(dead)))  # type: ignore
+            session.flush()
+            report.pruned_tokens = sorted(dead)
+        return report
+
+    def notify_users(self, session: Session, notifications: Iterable[Tuple[int, str, str]],
+                     data: Optional[Dict[str, str]] = None) -> PushReport:
+        """Envía (user_id, título, cuerpo) a todos los dispositivos de cada usuario"""
+        notifications = list(notifications)
+        user_ids = {user_id for user_id, _, _ in notifications}
+        if not user_ids:
+            return PushReport()
+        tokens: Dict[int, List[str]] = {}
+        for user_id, token in session.exec(
+            select(NotificationToken.user_id, NotificationToken.token)
+            .where(NotificationToken.user_id.in_(user_ids))  # type: ignore
+        ):
+            tokens.setdefault(user_id, []).append(token)
+        payload = tuple(sorted((data or {}).items()))
+        return self.send(session, (
+            PushMessage(token, title, body, payload)
+            for user_id, title, body in notifications
+            for token in tokens.get(user_id, ())
+        ))
+
+    def notify_family(self, session: Session, family_id: int, title: str, body: str) -> PushReport:
+        member_ids = session.exec(select(FamilyMember.user_id).where(FamilyMember.family_id == family_id)).all()
+        return self.notify_users(session, ((user_id, title, body) for user_id in member_ids))
+
+push_gateway = PushGateway(FakeTransport() if os.getenv("PUSH_TRANSPORT") == "fake" else FirebaseTransport())
@@ -0,0 +1,96 @@
+"""
+Perfilador de consultas SQL sobre los eventos before/after_cursor_execute del engine.
+Mientras hay un perfil activo (una request, un job) se cuentan las consultas, su
+duración y cuántas veces se repite cada sentencia: la misma sentencia parametrizada
+ejecutada N_PLUS_ONE_THRESHOLD veces o más en una unidad de trabajo es un posible N+1.
+
+El perfil vive en un ContextVar; el threadpool de FastAPI copia el contexto, así que
+los endpoints síncronos también quedan registrados.
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event as sa_event
+from sqlalchemy.engine import Engine
+
+# Repeticiones de una misma sentencia SELECT a partir de las cuales se marca como N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+# Cabeceras X-DB-* en las respuestas (solo para desarrollo)
+QUERY_DEBUG = os.getenv("QUERY_DEBUG", "false").lower() in ("1", "true", "yes")
+
+class QueryProfile:
+    __slots__ = ("count", "duration", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements: Dict[str, int] = {}
+
+    def record(self, statement: str, duration: float):
+        self.count += 1
+        self.duration += duration
+        self.statements[statement] = self.statements.get(statement, 0) + 1
+
+    def suspected_n_plus_one(self, threshold: Optional[int] = None) -> List[Tuple[str, int]]:
+        """Sentencias SELECT repetidas al menos `threshold` veces, de la más repetida a la menos"""
+        threshold = threshold or N_PLUS_ONE_THRESHOLD
+        return sorted(
+            (
+                (statement, repeats) for statement, repeats in self.statements.items()
+                if repeats >= threshold and statement.lstrip().upper().startswith("SELECT")
+            ),
+            key=lambda item: -item[1]
+        )
+
+current_profile: ContextVar[Optional[QueryProfile]] = ContextVar("current_profile", default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_profile.get() is not None:
+        conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile.get()
+    started = conn.info.get("query_started_at")
+    if profile is None or not started:
+        return
+    profile.record(statement, time.perf_counter() - started.pop())
+
+def instrument_engine(engine: Engine):
+    """Engancha el perfilador a un engine (idempotente)"""
+    if not sa_event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        sa_event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        sa_event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+@contextmanager
+def profiling() -> Iterator[QueryProfile]:
+    """Activa un perfil nuevo para el bloque (y lo que se ejecute desde él)"""
+    profile = QueryProfile()
+    token = current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        current_profile.reset(token)
+
+# Callbacks (método, ruta, perfil) por request; los usa el plugin de pytest de presupuestos
+request_observers: List[Callable[[str, str, QueryProfile], None]] = []
+
+def request_finished(method: str, route: str, profile: QueryProfile):
+    for observer in list(request_observers):
+        observer(method, route, profile)
+
+def report_n_plus_one(name: str, profile: QueryProfile) -> int:
+    """Avisa en el log de las sentencias sospechosas. Retorna cuántas hay."""
+    suspects = profile.suspected_n_plus_one()
+    for statement, repeats in suspects:
+        print(f"⚠️  Posible N+1 en {name}: {repeats}x {' '.join(statement.split())[:160]}")
+    return len(suspects)
+
+def debug_headers(profile: QueryProfile) -> List[Tuple[bytes, bytes]]:
+    return [
+        (b"x-db-query-count", str(profile.count).encode()),
+        (b"x-db-query-time-ms", f"{profile.duration * 1000:.2f}".encode()),
+        (b"x-db-n-plus-one", str(len(profile.suspected_n_plus_one())).encode()),
+    ]
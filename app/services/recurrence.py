@@ -0,0 +1,302 @@
+"""
+Motor de recurrencia basado en RRULE (RFC 5545).
+Un evento recurrente se guarda una sola vez (evento maestro con su regla) y sus
+ocurrencias se generan de forma perezosa para la ventana que se consulta.
+Las ocurrencias que difieren de la regla se guardan en RecurrenceException.
+"""
+import json
+import re
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from dateutil.rrule import rrule, rrulestr
+from sqlmodel import Session, select
+
+from ..models import Event, RecurrenceException
+
+# Frecuencias admitidas (se excluyen HOURLY/MINUTELY/SECONDLY para acotar expansiones)
+FREQUENCIES = {"daily": "DAILY", "weekly": "WEEKLY", "monthly": "MONTHLY", "yearly": "YEARLY"}
+WEEKDAY_CODES = {"mon": "MO", "tue": "TU", "wed": "WE", "thu": "TH", "fri": "FR", "sat": "SA", "sun": "SU"}
+# daysOfWeek del frontend: 0=Domingo, 1=Lunes, ..., 6=Sábado
+JS_WEEKDAY_CODES = ["SU", "MO", "TU", "WE", "TH", "FR", "SA"]
+
+# UNTIL en UTC ("...T000000Z"): las fechas ya se guardan en UTC sin zona, así que se quita la Z
+UTC_UNTIL = re.compile(r"(UNTIL=\d{8}T\d{6})Z", re.IGNORECASE)
+
+# Tope de ocurrencias por ventana para que una regla mal formada no bloquee el servidor
+MAX_OCCURRENCES_PER_WINDOW = 10000
+
+def naive_utc(dt: datetime) -> datetime:
+    """Las fechas se guardan sin zona horaria; las que traen zona se pasan a UTC"""
+    if dt.tzinfo is not None:
+        return dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+def _time_parts(time_str: Optional[str]) -> str:
+    if not time_str:
+        return ""
+    hour, minute = map(int, time_str.split(":")[:2])
+    return f";BYHOUR={hour};BYMINUTE={minute};BYSECOND=0"
+
+def _rrule_from_json(data: Dict[str, Any]) -> Optional[str]:
+    """Patrón del frontend: {"frequency", "interval", "daysOfWeek", "endDate", "occurrences"}"""
+    frequency = data.get("frequency")
+    days = data.get("daysOfWeek") or []
+    if frequency == "custom":
+        frequency = "weekly" if days else "daily"
+    freq = FREQUENCIES.get(frequency)
+    if not freq:
+        return None
+
+    rule = f"FREQ={freq}"
+    interval = int(data.get("interval") or 1)
+    if interval > 1:
+        rule += f";INTERVAL={interval}"
+    if freq == "WEEKLY" and days:
+        rule += ";BYDAY=" + ",".join(JS_WEEKDAY_CODES[int(d) % 7] for d in days)
+    if data.get("occurrences"):
+        rule += f";COUNT={int(data['occurrences'])}"
+    elif data.get("endDate"):
+        until = naive_utc(datetime.fromisoformat(str(data["endDate"]).replace("Z", "+00:00")))
+        if until.time() == datetime.min.time():
+            until = until.replace(hour=23, minute=59, second=59)
+        rule += f";UNTIL={until.strftime('%Y%m%dT%H%M%S')}"
+    return rule
+
+def to_rrule(pattern: Optional[str]) -> Optional[str]:
+    """
+    Normaliza Event.recurrence_pattern a una RRULE. Acepta:
+    - RRULE: "FREQ=MONTHLY;BYMONTHDAY=15" (con o sin prefijo "RRULE:")
+    - Formato legado: "weekly:mon,wed,fri:22:00", "daily:18:00", "monthly:09:00"
+    - JSON del frontend: '{"frequency": "weekly", "interval": 1, "daysOfWeek": [1, 3]}'
+    Retorna None si el patrón no es válido.
+    """
+    if not pattern:
+        return None
+    pattern = pattern.strip()
+
+    if pattern.upper().startswith("RRULE:"):
+        pattern = pattern[len("RRULE:"):]
+    if pattern.upper().startswith("FREQ="):
+        freq = pattern.upper().split(";")[0][len("FREQ="):]
+        if freq not in FREQUENCIES.values():
+            return None
+        pattern = UTC_UNTIL.sub(r"\1", pattern)
+        try:
+            # Se descartan las reglas que dateutil no puede compilar (partes desconocidas, UNTIL inválido...)
+            rrulestr(pattern, dtstart=datetime(2000, 1, 1))
+        except (ValueError, TypeError):
+            return None
+        return pattern
+
+    if pattern.startswith("{"):
+        try:
+            return _rrule_from_json(json.loads(pattern))
+        except (ValueError, TypeError, IndexError):
+            return None
+
+    from .notification_scheduler import parse_recurrence_pattern
+    parsed = parse_recurrence_pattern(pattern)
+    freq = FREQUENCIES.get(parsed.get("frequency", ""))
+    if not freq:
+        return None
+
+    rule = f"FREQ={freq}"
+    if freq == "WEEKLY":
+        codes = [WEEKDAY_CODES.get(d.strip().lower()) for d in parsed.get("days", [])]
+        codes = [c for c in codes if c]
+        if not codes:
+            return None
+        rule += ";BYDAY=" + ",".join(codes)
+    try:
+        return rule + _time_parts(parsed.get("time"))
+    except ValueError:
+        return None
+
+def validate_pattern(pattern: str, dtstart: datetime) -> str:
+    """
+    RRULE normalizada de un patrón que se va a guardar, compilada con su DTSTART real.
+    Lanza ValueError si el patrón no se reconoce o la regla no compila con ese inicio.
+    """
+    rule = to_rrule(pattern)
+    if not rule:
+        raise ValueError("Patrón de recurrencia no válido")
+    try:
+        compile_rule(rule, naive_utc(dtstart))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Regla de recurrencia no válida: {e}")
+    return rule
+
+def is_occurrence(rule: str, dtstart: datetime, start: datetime) -> bool:
+    """True si `start` es exactamente una ocurrencia de la regla"""
+    dtstart, start = naive_utc(dtstart), naive_utc(start)
+    compiled = _fast_forward(compile_rule(rule, dtstart), rule, dtstart, start)
+    return compiled.after(start - timedelta(microseconds=1), inc=True) == start
+
+def rule_parts(rule: str) -> Dict[str, str]:
+    return dict(part.split("=", 1) for part in rule.upper().split(";") if "=" in part)
+
+@lru_cache(maxsize=512)
+def compile_rule(rule: str, dtstart: datetime) -> rrule:
+    """Compila la RRULE una sola vez por (regla, inicio)"""
+    return rrulestr(rule, dtstart=dtstart)
+
+def _fast_forward(compiled: rrule, rule: str, dtstart: datetime, start: datetime) -> rrule:
+    """
+    dateutil siempre itera desde DTSTART. Para reglas diarias/semanales sin COUNT,
+    mover DTSTART un número entero de periodos conserva el mismo conjunto de
+    ocurrencias, así que se adelanta hasta un periodo antes de la ventana.
+    """
+    parts = rule_parts(rule)
+    if "COUNT" in parts:
+        return compiled
+
+    interval = int(parts.get("INTERVAL", 1))
+    if parts.get("FREQ") == "DAILY":
+        period = timedelta(days=interval)
+    elif parts.get("FREQ") == "WEEKLY":
+        period = timedelta(weeks=interval)
+    else:
+        return compiled
+
+    periods = (start - dtstart) // period - 1
+    if periods <= 0:
+        return compiled
+    return compiled.replace(dtstart=dtstart + periods * period)
+
+def iter_occurrences(
+    rule: str,
+    dtstart: datetime,
+    start: datetime,
+    end: datetime,
+    limit: int = MAX_OCCURRENCES_PER_WINDOW
+) -> Iterator[datetime]:
+    """Genera perezosamente los inicios de ocurrencia en [start, end)"""
+    dtstart, start, end = naive_utc(dtstart), naive_utc(start), naive_utc(end)
+    compiled = _fast_forward(compile_rule(rule, dtstart), rule, dtstart, start)
+
+    for count, occurrence in enumerate(compiled.xafter(start, inc=True)):
+        if occurrence >= end or count >= limit:
+            return
+        yield occurrence
+
+@lru_cache(maxsize=1024)
+def _expand_window_cached(rule: str, dtstart: datetime, start: datetime, end: datetime) -> Tuple[datetime, ...]:
+    return tuple(iter_occurrences(rule, dtstart, start, end))
+
+def expand_window(rule: str, dtstart: datetime, start: datetime, end: datetime) -> Tuple[datetime, ...]:
+    """Ocurrencias en [start, end), memorizadas por (regla, inicio, ventana)"""
+    return _expand_window_cached(rule, naive_utc(dtstart), naive_utc(start), naive_utc(end))
+
+def first_occurrence(rule: str, dtstart: datetime) -> Optional[datetime]:
+    return next(iter(compile_rule(rule, naive_utc(dtstart))), None)
+
+def next_occurrence(rule: str, dtstart: datetime, after: datetime) -> Optional[datetime]:
+    """Primera ocurrencia estrictamente posterior a `after`"""
+    dtstart, after = naive_utc(dtstart), naive_utc(after)
+    compiled = _fast_forward(compile_rule(rule, dtstart), rule, dtstart, after)
+    return compiled.after(after, inc=False)
+
+def previous_occurrence(rule: str, dtstart: datetime, before: datetime) -> Optional[datetime]:
+    """Última ocurrencia en o antes de `before`"""
+    dtstart, before = naive_utc(dtstart), naive_utc(before)
+    compiled = _fast_forward(compile_rule(rule, dtstart), rule, dtstart, before)
+    found = compiled.before(before, inc=True)
+    if found is None and compiled is not compile_rule(rule, dtstart):
+        found = compile_rule(rule, dtstart).before(before, inc=True)
+    return found
+
+def load_exceptions(
+    session: Session,
+    event_ids: Iterable[int],
+    after: Optional[datetime] = None
+) -> Dict[int, Dict[datetime, RecurrenceException]]:
+    """Excepciones de varios eventos maestros en una sola consulta (solo las posteriores a `after`, si se indica)"""
+    event_ids = list(event_ids)
+    result: Dict[int, Dict[datetime, RecurrenceException]] = {event_id: {} for event_id in event_ids}
+    if not event_ids:
+        return result
+    statement = select(RecurrenceException).where(RecurrenceException.event_id.in_(event_ids))  # type: ignore
+    if after is not None:
+        statement = statement.where(RecurrenceException.original_start > naive_utc(after))
+    exceptions = session.exec(statement).all()
+    for exc in exceptions:
+        result[exc.event_id][naive_utc(exc.original_start)] = exc
+    return result
+
+def expand_event(
+    event: Event,
+    exceptions: Dict[datetime, RecurrenceException],
+    start: datetime,
+    end: datetime
+) -> List[Dict[str, Any]]:
+    """
+    Ocurrencias virtuales (dicts con los campos de EventRead) de un evento maestro
+    que se solapan con [start, end). No se crea ninguna fila en la BD.
+    Las ocurrencias movidas ("modified") se filtran por su horario nuevo: aparecen si
+    se movieron dentro de la ventana aunque su inicio original quede afuera, y no
+    aparecen si se movieron fuera de ella.
+    """
+    rule = to_rrule(event.recurrence_pattern)
+    if not rule:
+        return []
+
+    start, end = naive_utc(start), naive_utc(end)
+    duration = event.end_time - event.start_time
+    # Entidad Event o fila con columnas seleccionadas (select(*EVENT_READ_COLUMNS))
+    base = event.model_dump() if hasattr(event, "model_dump") else dict(event._mapping)
+    occurrences = []
+    # Incluir ocurrencias que empezaron antes de la ventana pero siguen en curso
+    for occurrence in expand_window(rule, event.start_time, start - duration, end):
+        exc = exceptions.get(occurrence)
+        if exc is not None and exc.status in ("cancelled", "modified"):
+            continue
+        item = {
+            **base,
+            "start_time": occurrence,
+            "end_time": occurrence + duration,
+            "recurrence_id": occurrence,
+        }
+        if exc is not None and exc.status == "completed":
+            item["status"] = "completed"
+            item["completed_at"] = exc.completed_at
+            item["completed_by_id"] = exc.completed_by_id
+        occurrences.append(item)
+
+    for original, exc in exceptions.items():
+        if exc.status != "modified":
+            continue
+        moved_start = naive_utc(exc.start_time) if exc.start_time else original
+        moved_end = naive_utc(exc.end_time) if exc.end_time else moved_start + duration
+        if moved_start >= end or moved_end < start or not is_occurrence(rule, event.start_time, original):
+            continue
+        occurrences.append({
+            **base,
+            "start_time": moved_start,
+            "end_time": moved_end,
+            "recurrence_id": original,
+            "title": exc.title or base["title"],
+        })
+    return occurrences
+
+def expand_events(session: Session, events: Iterable[Event], start: datetime, end: datetime) -> List[Any]:
+    """
+    Sustituye los eventos maestros recurrentes por sus ocurrencias virtuales dentro
+    de la ventana. Los eventos simples se devuelven tal cual. Ordenado por inicio.
+    """
+    events = list(events)
+    masters = [e for e in events if e.is_recurring and to_rrule(e.recurrence_pattern)]
+    exceptions = load_exceptions(session, [e.id for e in masters])
+    master_ids = {e.id for e in masters}
+
+    result: List[Any] = [e for e in events if e.id not in master_ids]
+    for master in masters:
+        result.extend(expand_event(master, exceptions[master.id], start, end))
+
+    def start_of(item):
+        value = item["start_time"] if isinstance(item, dict) else item.start_time
+        return naive_utc(value)
+
+    result.sort(key=start_of)
+    return result
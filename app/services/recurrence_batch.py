@@ -0,0 +1,185 @@
+"""
+Cálculo vectorizado de próximas ocurrencias para mantenimiento masivo.
+Los patrones diarios/semanales se precompilan a una máscara de días (bit 0 = lunes)
+y una hora del día; la tabla NEXT_OFFSET da los días hasta el próximo día marcado,
+así que la próxima ocurrencia de miles de eventos se calcula sin recorrer día a día.
+Usa NumPy si está instalado; si no, el mismo cálculo en Python puro.
+"""
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from ..models import RecurrenceException
+from .recurrence import naive_utc, next_occurrence, rule_parts, to_rrule
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional
+    np = None
+
+DAYS_MAP = {"mon": 0, "tue": 1, "wed": 2, "thu": 3, "fri": 4, "sat": 5, "sun": 6}
+RRULE_DAYS = {"MO": 0, "TU": 1, "WE": 2, "TH": 3, "FR": 4, "SA": 5, "SU": 6}
+ALL_DAYS = 0b1111111
+
+# Claves de RRULE que se pueden resolver con máscara de días + hora fija
+VECTORIZABLE_KEYS = {"FREQ", "BYDAY", "BYHOUR", "BYMINUTE", "BYSECOND", "INTERVAL", "WKST"}
+
+# Tope de ocurrencias seguidas canceladas/completadas que se saltan por evento
+MAX_SKIPPED_OCCURRENCES = 366
+
+DAY_US = 86_400_000_000
+EPOCH = datetime(1970, 1, 1)  # Jueves: weekday() == 3
+
+def _build_next_offset_table() -> List[List[int]]:
+    """NEXT_OFFSET[mask][weekday] -> días (1..7) hasta el próximo día marcado; 0 si mask está vacía"""
+    table = []
+    for mask in range(ALL_DAYS + 1):
+        row = []
+        for weekday in range(7):
+            offset = 0
+            for candidate in range(1, 8):
+                if mask >> ((weekday + candidate) % 7) & 1:
+                    offset = candidate
+                    break
+            row.append(offset)
+        table.append(row)
+    return table
+
+NEXT_OFFSET = _build_next_offset_table()
+NEXT_OFFSET_ARRAY = np.array(NEXT_OFFSET, dtype=np.int64) if np is not None else None
+
+def weekday_mask(days: Sequence[str]) -> int:
+    """["mon", "wed"] -> 0b0000101. Días desconocidos cuentan como lunes (igual que antes)."""
+    mask = 0
+    for day in days:
+        mask |= 1 << DAYS_MAP.get(day.lower(), 0)
+    return mask
+
+class CompiledPattern(NamedTuple):
+    mask: int
+    # Microsegundos desde medianoche; None = usar la hora de inicio del evento
+    time_of_day_us: Optional[int]
+
+@lru_cache(maxsize=4096)
+def compile_pattern(pattern: Optional[str]) -> Optional[CompiledPattern]:
+    """
+    Precompila un recurrence_pattern a máscara de días + hora.
+    Retorna None si la regla no es diaria/semanal simple (mensual, INTERVAL, COUNT, UNTIL...).
+    """
+    rule = to_rrule(pattern)
+    if not rule:
+        return None
+    parts = rule_parts(rule)
+    if set(parts) - VECTORIZABLE_KEYS or int(parts.get("INTERVAL", 1)) != 1:
+        return None
+
+    if "BYDAY" in parts:
+        codes = parts["BYDAY"].split(",")
+        if any(code not in RRULE_DAYS for code in codes):
+            return None
+        mask = 0
+        for code in codes:
+            mask |= 1 << RRULE_DAYS[code]
+    elif parts["FREQ"] == "DAILY":
+        mask = ALL_DAYS
+    else:
+        # Semanal sin BYDAY depende del día de DTSTART
+        return None
+
+    if "BYHOUR" not in parts:
+        return None if "BYMINUTE" in parts else CompiledPattern(mask, None)
+    try:
+        hour = int(parts["BYHOUR"])
+        minute = int(parts.get("BYMINUTE", 0))
+        second = int(parts.get("BYSECOND", 0))
+    except ValueError:  # Varias horas por día ("BYHOUR=9,18")
+        return None
+    return CompiledPattern(mask, ((hour * 60 + minute) * 60 + second) * 1_000_000)
+
+def _to_us(dt: datetime) -> int:
+    return (dt - EPOCH) // timedelta(microseconds=1)
+
+def _next_python(refs: List[int], masks: List[int], tods: List[int]) -> List[Optional[datetime]]:
+    result: List[Optional[datetime]] = []
+    for ref, mask, tod in zip(refs, masks, tods):
+        if not mask:
+            result.append(None)
+            continue
+        day, time_of_day = divmod(ref, DAY_US)
+        weekday = (day + 3) % 7
+        if mask >> weekday & 1 and tod > time_of_day:
+            offset = 0
+        else:
+            offset = NEXT_OFFSET[mask][weekday]
+        result.append(EPOCH + timedelta(microseconds=(day + offset) * DAY_US + tod))
+    return result
+
+def _next_numpy(refs: List[int], masks: List[int], tods: List[int]) -> List[Optional[datetime]]:
+    ref = np.array(refs, dtype=np.int64)
+    mask = np.array(masks, dtype=np.int64)
+    tod = np.array(tods, dtype=np.int64)
+
+    day, time_of_day = np.divmod(ref, DAY_US)
+    weekday = (day + 3) % 7
+    today = ((mask >> weekday) & 1).astype(bool) & (tod > time_of_day)
+    offset = np.where(today, 0, NEXT_OFFSET_ARRAY[mask, weekday])
+    values = ((day + offset) * DAY_US + tod).astype("datetime64[us]").tolist()
+    return [value if m else None for value, m in zip(values, masks)]
+
+def next_occurrences(
+    starts: Sequence[datetime],
+    patterns: Sequence[Optional[str]],
+    after: datetime
+) -> List[Optional[datetime]]:
+    """
+    Próxima ocurrencia estrictamente posterior a `after` (y no anterior al inicio
+    del evento) para cada par (start_time, recurrence_pattern).
+    Los patrones que no se pueden vectorizar se resuelven con el motor RRULE.
+    """
+    after_us = _to_us(naive_utc(after))
+    result: List[Optional[datetime]] = [None] * len(starts)
+
+    fast_idx, refs, masks, tods = [], [], [], []
+    for i, (start, pattern) in enumerate(zip(starts, patterns)):
+        compiled = compile_pattern(pattern)
+        if compiled is None:
+            rule = to_rrule(pattern)
+            if rule:
+                result[i] = next_occurrence(rule, start, max(naive_utc(after), naive_utc(start) - timedelta(microseconds=1)))
+            continue
+        start_us = _to_us(naive_utc(start))
+        fast_idx.append(i)
+        # La ocurrencia en el propio inicio cuenta: referencia = inicio - 1µs
+        refs.append(max(after_us, start_us - 1))
+        masks.append(compiled.mask)
+        tods.append(compiled.time_of_day_us if compiled.time_of_day_us is not None else start_us % DAY_US)
+
+    if fast_idx:
+        compute = _next_numpy if np is not None else _next_python
+        for i, value in zip(fast_idx, compute(refs, masks, tods)):
+            result[i] = value
+    return result
+
+def skip_exceptions(
+    start: datetime,
+    pattern: Optional[str],
+    candidate: Optional[datetime],
+    exceptions: Dict[datetime, RecurrenceException]
+) -> Optional[datetime]:
+    """
+    Primera ocurrencia desde `candidate` que no esté cancelada ni completada.
+    Si la ocurrencia fue modificada, retorna su nuevo inicio.
+    `exceptions` son las del evento indexadas por original_start (load_exceptions).
+    """
+    for _ in range(MAX_SKIPPED_OCCURRENCES):
+        if candidate is None:
+            return None
+        exc = exceptions.get(candidate)
+        if exc is None:
+            return candidate
+        if exc.status == "modified":
+            return naive_utc(exc.start_time) if exc.start_time else candidate
+        if exc.status not in ("cancelled", "completed"):
+            return candidate
+        candidate = next_occurrence(to_rrule(pattern), start, candidate)
+    return None
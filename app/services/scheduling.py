@@ -0,0 +1,207 @@
+"""
+Motor local de disponibilidad (free/busy) para sugerir horarios.
+Une los intervalos ocupados de los miembros de la familia (eventos de la familia,
+eventos asignados o compartidos con ellos y ocurrencias de eventos recurrentes),
+aplica un margen entre eventos y la franja horaria permitida, y devuelve los huecos
+candidatos ordenados por puntuación. Es un problema de intervalos: no necesita IA.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime, time, timedelta, timezone
+from typing import List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+from sqlmodel import Session, select, or_, and_
+
+from ..models import Event, EventShare, FamilyMember
+from .conflicts import INACTIVE_STATUSES, intervals_in_window
+from .recurrence import expand_events, naive_utc
+
+# Valores por defecto (los mismos criterios que se le pedían al LLM)
+DEFAULT_DAY_START = time(9, 0)
+DEFAULT_DAY_END = time(21, 0)
+DEFAULT_BUFFER_MINUTES = 15
+DEFAULT_STEP_MINUTES = 15
+
+# Holgura a partir de la cual un hueco ya no puntúa más
+COMFORT_SLACK = timedelta(hours=2)
+
+Busy = Tuple[datetime, datetime]
+
+@dataclass
+class FreeSlot:
+    start: datetime
+    end: datetime
+    score: float
+    gap_start: datetime
+    gap_end: datetime
+    reasons: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            "start": self.start,
+            "end": self.end,
+            "score": round(self.score, 3),
+            "gap_start": self.gap_start,
+            "gap_end": self.gap_end,
+            "reasons": self.reasons,
+        }
+
+def merge_intervals(intervals: Sequence[Busy], buffer: timedelta = timedelta(0)) -> List[Busy]:
+    """Ordena y fusiona intervalos ocupados, ensanchando cada uno con el margen indicado"""
+    merged: List[Busy] = []
+    for start, end in sorted((s - buffer, e + buffer) for s, e in intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+def working_windows(
+    start: datetime,
+    end: datetime,
+    day_start: time = DEFAULT_DAY_START,
+    day_end: time = DEFAULT_DAY_END,
+    tz: Optional[str] = None
+) -> List[Busy]:
+    """
+    Franjas permitidas de cada día entre start y end, en UTC sin zona.
+    La franja horaria se interpreta en la zona `tz` (IANA); sin zona, en las mismas
+    fechas sin zona con las que se guardan los eventos.
+    """
+    zone = ZoneInfo(tz) if tz else None
+    local_start = start.replace(tzinfo=timezone.utc).astimezone(zone) if zone else start
+    local_end = end.replace(tzinfo=timezone.utc).astimezone(zone) if zone else end
+
+    windows = []
+    day = local_start.date()
+    while day <= local_end.date():
+        window_start = datetime.combine(day, day_start, tzinfo=zone)
+        window_end = datetime.combine(day, day_end, tzinfo=zone)
+        if zone:
+            window_start, window_end = naive_utc(window_start), naive_utc(window_end)
+        window_start, window_end = max(window_start, start), min(window_end, end)
+        if window_start < window_end:
+            windows.append((window_start, window_end))
+        day += timedelta(days=1)
+    return windows
+
+def free_gaps(busy: Sequence[Busy], windows: Sequence[Busy]) -> List[Busy]:
+    """Complemento de los intervalos ocupados (ya fusionados) dentro de cada franja"""
+    gaps = []
+    position = 0
+    for window_start, window_end in windows:
+        # Los intervalos ocupados que terminan antes de la franja no vuelven a mirarse
+        while position < len(busy) and busy[position][1] <= window_start:
+            position += 1
+        cursor = window_start
+        index = position
+        while index < len(busy) and busy[index][0] < window_end:
+            if busy[index][0] > cursor:
+                gaps.append((cursor, busy[index][0]))
+            cursor = max(cursor, busy[index][1])
+            index += 1
+        if cursor < window_end:
+            gaps.append((cursor, window_end))
+    return gaps
+
+def _align(moment: datetime, step: timedelta) -> datetime:
+    """Redondea hacia arriba al siguiente múltiplo de `step` (p. ej. cuartos de hora)"""
+    remainder = (moment - datetime.min) % step
+    return moment if not remainder else moment + (step - remainder)
+
+def rank_slots(
+    gaps: Sequence[Busy],
+    duration: timedelta,
+    now: datetime,
+    step: timedelta = timedelta(minutes=DEFAULT_STEP_MINUTES),
+    limit: int = 5
+) -> List[FreeSlot]:
+    """
+    Un candidato por hueco (al inicio del hueco, alineado a `step`).
+    Puntuación: antes es mejor y se premia la holgura que queda después del evento.
+    """
+    slots = []
+    for gap_start, gap_end in gaps:
+        start = _align(gap_start, step)
+        end = start + duration
+        if end > gap_end:
+            continue
+
+        days_ahead = (start - now).total_seconds() / 86400
+        slack = min(gap_end - end, COMFORT_SLACK)
+        score = 1.0 / (1.0 + days_ahead) + 0.5 * (slack / COMFORT_SLACK)
+
+        reasons = ["Sin conflictos con los eventos de la familia"]
+        if slack >= COMFORT_SLACK:
+            reasons.append("Deja tiempo libre después")
+        if days_ahead < 1:
+            reasons.append("Es el primer hueco disponible")
+        slots.append(FreeSlot(start, end, score, gap_start, gap_end, reasons))
+
+    slots.sort(key=lambda s: (-s.score, s.start))
+    return slots[:limit]
+
+def collect_busy_intervals(
+    session: Session,
+    family_id: int,
+    start: datetime,
+    end: datetime,
+    member_ids: Optional[Sequence[int]] = None
+) -> List[Busy]:
+    """
+    Intervalos ocupados de la familia en [start, end): eventos de la familia (vía el
+    índice de conflictos) más los eventos de otras agendas que ocupan a sus miembros
+    (dueños, asignados o compartidos con ellos).
+    """
+    busy = [(i.start_time, i.end_time) for i in intervals_in_window(session, family_id, start, end)]
+
+    if member_ids is None:
+        member_ids = session.exec(
+            select(FamilyMember.user_id).where(FamilyMember.family_id == family_id)
+        ).all()
+    if not member_ids:
+        return busy
+
+    shared_ids = select(EventShare.event_id).where(EventShare.shared_with_user_id.in_(member_ids))  # type: ignore
+    statement = select(Event).where(
+        Event.family_id != family_id,
+        Event.status.notin_(INACTIVE_STATUSES),  # type: ignore
+        or_(
+            Event.owner_id.in_(member_ids),  # type: ignore
+            Event.assigned_to_id.in_(member_ids),  # type: ignore
+            Event.id.in_(shared_ids)  # type: ignore
+        ),
+        or_(
+            and_(Event.is_recurring == True, Event.start_time < end),
+            and_(Event.start_time < end, Event.end_time > start)
+        )
+    )
+    for item in expand_events(session, session.exec(statement).all(), start, end):
+        item_start = item["start_time"] if isinstance(item, dict) else item.start_time
+        item_end = item["end_time"] if isinstance(item, dict) else item.end_time
+        if isinstance(item, dict) and item.get("status") in INACTIVE_STATUSES:
+            continue
+        busy.append((naive_utc(item_start), naive_utc(item_end)))
+    return busy
+
+def find_free_slots(
+    session: Session,
+    family_id: int,
+    duration: timedelta,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    day_start: time = DEFAULT_DAY_START,
+    day_end: time = DEFAULT_DAY_END,
+    buffer: timedelta = timedelta(minutes=DEFAULT_BUFFER_MINUTES),
+    tz: Optional[str] = None,
+    member_ids: Optional[Sequence[int]] = None,
+    limit: int = 5
+) -> List[FreeSlot]:
+    """Huecos libres de la familia ordenados por puntuación (por defecto, los próximos 7 días)"""
+    now = naive_utc(start) if start else datetime.now(timezone.utc).replace(tzinfo=None)
+    end = naive_utc(end) if end else now + timedelta(days=7)
+
+    busy = merge_intervals(collect_busy_intervals(session, family_id, now, end, member_ids), buffer)
+    gaps = free_gaps(busy, working_windows(now, end, day_start, day_end, tz))
+    return rank_slots(gaps, duration, now, limit=limit)
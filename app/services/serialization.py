@@ -0,0 +1,49 @@
+"""
+Serialización rápida de las listas grandes (eventos, historial de chat, notificaciones).
+
+En lugar de cargar entidades del ORM y dejar que FastAPI las valide contra el
+response_model y pase el resultado por jsonable_encoder, las rutas calientes:
+- seleccionan solo las columnas del esquema de salida (filas, no entidades),
+- las validan y serializan a JSON con un TypeAdapter precompilado (pydantic-core),
+- y devuelven los bytes tal cual en una Response.
+
+El response_model de la ruta se mantiene para la documentación de OpenAPI.
+Para el resto de las rutas, la respuesta por defecto es ORJSONResponse si orjson
+está instalado.
+"""
+from typing import Any, Iterable, List
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter
+from sqlalchemy.engine import Row
+
+from ..models import ChatMessage, Event, NotificationLog, User
+from ..schemas import EventRead, MessageRead, NotificationHistoryItem
+
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as DefaultResponse
+except ImportError:  # orjson es opcional: sin la librería se usa el JSONResponse estándar
+    orjson = None
+    DefaultResponse = JSONResponse
+
+def columns_for(model, schema) -> List[Any]:
+    """Columnas de `model` que forman parte de `schema` (en el orden del esquema)"""
+    return [getattr(model, name) for name in schema.model_fields if name in model.__table__.columns]
+
+EVENT_READ_COLUMNS = columns_for(Event, EventRead)
+MESSAGE_COLUMNS = [*columns_for(ChatMessage, MessageRead), User.full_name.label("user_name")]
+NOTIFICATION_HISTORY_COLUMNS = columns_for(NotificationLog, NotificationHistoryItem)
+
+event_list_adapter = TypeAdapter(List[EventRead])
+message_list_adapter = TypeAdapter(List[MessageRead])
+notification_history_adapter = TypeAdapter(List[NotificationHistoryItem])
+
+def dump_json(adapter: TypeAdapter, items: Iterable[Any]) -> bytes:
+    """Valida (filas, dicts u objetos) y serializa en una sola pasada de pydantic-core"""
+    # Validar un dict es bastante más barato que leer atributos de una Row (from_attributes)
+    items = [item._asdict() if isinstance(item, Row) else item for item in items]
+    return adapter.dump_json(adapter.validate_python(items, from_attributes=True))
+
+def json_response(adapter: TypeAdapter, items: Iterable[Any]) -> Response:
+    return Response(dump_json(adapter, items), media_type="application/json")
@@ -7,6 +7,7 @@ from typing import Dict, List
 from sqlmodel import Session, select
 from ..models import Event, User, NotificationToken
 from ..notification_service import send_notification_to_family
+from .projections import EventTiming, fetch_records, select_records
 
 def calculate_smart_reminder_time(event: Event) -> List[datetime]:
     """
@@ -50,12 +51,13 @@ def analyze_productivity_patterns(session: Session, user_id: int) -> Dict[str, a
     # Obtener eventos de los últimos 30 días
     thirty_days_ago = datetime.now(timezone.utc) - timedelta(days=30)
     
-    events = session.exec(
-        select(Event)
+    events = fetch_records(
+        session, EventTiming,
+        select_records(EventTiming)
         .where(Event.owner_id == user_id)
         .where(Event.start_time >= thirty_days_ago)
         .where(Event.start_time <= datetime.now(timezone.utc))
-    ).all()
+    )
     
     if not events:
         return {
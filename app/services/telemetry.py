@@ -0,0 +1,230 @@
+"""
+Métricas en proceso con exposición en formato de texto de Prometheus y log estructurado
+asíncrono. Sin dependencias externas: contadores, gauges e histogramas con etiquetas,
+protegidos por un lock (las actualizaciones son sumas, muy baratas).
+
+- Las consultas SQL por request salen del perfilador (services/query_profiler.py).
+- El log de requests va a una cola (QueueHandler) que escribe un hilo aparte; solo se
+  registran los errores, las requests lentas y una muestra del resto.
+"""
+import json
+import logging
+import os
+import queue
+import random
+import secrets
+import time
+from logging.handlers import QueueHandler, QueueListener
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Buckets por defecto del cliente oficial de Prometheus (segundos)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+INF_LABEL = 'le="+Inf"'
+
+# Fracción de requests normales que se registran en el log (errores y lentas siempre)
+LOG_SAMPLE_RATE = float(os.getenv("REQUEST_LOG_SAMPLE_RATE", "0.01"))
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "1.0"))
+
+# /metrics expone rutas, latencias y estado del pool: se lee con "Authorization: Bearer
+# <METRICS_TOKEN>". Sin token configurado queda cerrado, salvo METRICS_PUBLIC=true explícito
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_PUBLIC = os.getenv("METRICS_PUBLIC", "false").lower() in ("1", "true", "yes")
+
+Labels = Tuple[str, ...]
+
+def metrics_authorized(authorization: Optional[str]) -> bool:
+    """Si el header Authorization permite leer /metrics"""
+    if METRICS_PUBLIC:
+        return True
+    scheme, _, token = (authorization or "").partition(" ")
+    return bool(METRICS_TOKEN) and scheme.lower() == "bearer" and secrets.compare_digest(token.strip(), METRICS_TOKEN)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: Labels = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.lock = Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Labels = ()):
+        super().__init__(name, documentation, label_names)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def get(self, labels: Labels = ()) -> float:
+        return self.values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        with self.lock:
+            items = sorted(self.values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.label_names, labels)} {value}" for labels, value in items
+        ]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels: Labels = (), amount: float = 1):
+        self.inc(labels, -amount)
+
+    def set(self, labels: Labels, value: float):
+        with self.lock:
+            self.values[labels] = value
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Labels = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(buckets)
+        # labels -> [conteos por bucket..., suma, total]
+        self.values: Dict[Labels, List[float]] = {}
+
+    def observe(self, labels: Labels, value: float):
+        with self.lock:
+            row = self.values.get(labels)
+            if row is None:
+                row = self.values[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[index] += 1
+                    break
+            row[-2] += value
+            row[-1] += 1
+
+    def count(self, labels: Labels) -> int:
+        row = self.values.get(labels)
+        return row[-1] if row else 0
+
+    def render(self) -> List[str]:
+        with self.lock:
+            items = sorted((labels, list(row)) for labels, row in self.values.items())
+        lines = self.header()
+        for labels, row in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, row):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, INF_LABEL)} {row[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {row[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {row[-1]}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+HTTP_LABELS = ("method", "route", "status")
+http_requests = registry.register(Counter(
+    "http_requests_total", "Requests HTTP atendidas", HTTP_LABELS))
+http_latency = registry.register(Histogram(
+    "http_request_duration_seconds", "Latencia de las requests HTTP", ("method", "route")))
+http_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "Requests HTTP en curso", ("method",)))
+http_db_queries = registry.register(Histogram(
+    "http_request_db_queries", "Consultas SQL por request", ("method", "route"), QUERY_BUCKETS))
+http_db_time = registry.register(Histogram(
+    "http_request_db_seconds", "Tiempo total en consultas SQL por request", ("method", "route")))
+n_plus_one_suspects = registry.register(Counter(
+    "db_n_plus_one_suspected_total", "Requests con sentencias repetidas (posible N+1)", ("method", "route")))
+
+# Pool de conexiones (services/db_pool.py), por engine
+db_pool_wait = registry.register(Histogram(
+    "db_pool_checkout_wait_seconds", "Espera para obtener una conexión del pool", ("engine",)))
+db_pool_checked_out = registry.register(Gauge(
+    "db_pool_checked_out", "Conexiones del pool en uso", ("engine",)))
+db_pool_overflow = registry.register(Gauge(
+    "db_pool_overflow", "Conexiones de overflow en uso (por encima de DB_POOL_SIZE)", ("engine",)))
+db_pool_size = registry.register(Gauge(
+    "db_pool_capacity", "Conexiones simultáneas máximas del pool (tamaño + overflow)", ("engine",)))
+db_pool_saturation = registry.register(Gauge(
+    "db_pool_saturation_ratio", "Conexiones en uso sobre la capacidad del pool", ("engine",)))
+db_pool_timeouts = registry.register(Counter(
+    "db_pool_timeouts_total", "Checkouts que agotaron DB_POOL_TIMEOUT", ("engine",)))
+
+# Compresión de respuestas (CompressionMiddleware)
+http_compression_bytes = registry.register(Counter(
+    "http_compression_bytes_total", "Bytes de respuestas comprimidas, antes (raw) y después (sent)",
+    ("encoding", "stage")))
+http_precompressed_hits = registry.register(Counter(
+    "http_precompressed_hits_total", "Respuestas servidas desde la caché de cuerpos comprimidos", ("encoding",)))
+
+# --- Log asíncrono con muestreo ---
+
+request_logger = logging.getLogger("familiagenda.requests")
+request_logger.propagate = False
+_log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+_listener: Optional[QueueListener] = None
+
+def start_request_logging(handler: Optional[logging.Handler] = None):
+    """Conecta el logger de requests a una cola que un hilo aparte escribe en stdout"""
+    global _listener
+    if _listener is not None:
+        return
+    handler = handler or logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    request_logger.addHandler(QueueHandler(_log_queue))
+    request_logger.setLevel(logging.INFO)
+    _listener = QueueListener(_log_queue, handler, respect_handler_level=False)
+    _listener.start()
+
+def stop_request_logging():
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+    for handler in list(request_logger.handlers):
+        if isinstance(handler, QueueHandler):
+            request_logger.removeHandler(handler)
+
+def should_log(status: int, duration: float) -> bool:
+    return status >= 500 or duration >= SLOW_REQUEST_SECONDS or random.random() < LOG_SAMPLE_RATE
+
+def log_request(method: str, path: str, route: str, status: int, duration: float, queries: int):
+    if not request_logger.handlers or not should_log(status, duration):
+        return
+    request_logger.info(json.dumps({
+        "ts": round(time.time(), 3),
+        "method": method,
+        "path": path,
+        "route": route,
+        "status": status,
+        "duration_ms": round(duration * 1000, 2),
+        "db_queries": queries,
+    }))
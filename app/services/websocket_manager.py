@@ -1,27 +1,182 @@
-from typing import List, Dict
+import json
+from collections import deque
+from typing import List, Dict, Deque, Optional, Set, Union
 from fastapi import WebSocket
 
+try:
+    import msgpack
+except ImportError:  # MessagePack es opcional: sin la librería solo se negocia JSON
+    msgpack = None
+
+# Cantidad de frames que se guardan por familia para reenviar tras una reconexión
+REPLAY_LOG_SIZE = 200
+
+# Subprotocolos de WebSocket (Sec-WebSocket-Protocol) -> codificación de frames
+SUBPROTOCOL_JSON = "familiagenda.json"
+SUBPROTOCOL_MSGPACK = "familiagenda.msgpack"
+ENCODING_JSON = "json"
+ENCODING_MSGPACK = "msgpack"
+
+def negotiate_subprotocol(requested: List[str]) -> Optional[str]:
+    """
+    Elige el subprotocolo a aceptar entre los que ofrece el cliente.
+    Se respeta el orden de preferencia del cliente; MessagePack solo se acepta
+    si la librería está instalada. Sin subprotocolo se usa JSON (clientes actuales).
+    """
+    for protocol in requested:
+        if protocol == SUBPROTOCOL_MSGPACK and msgpack is not None:
+            return protocol
+        if protocol == SUBPROTOCOL_JSON:
+            return protocol
+    return None
+
+def encoding_for(subprotocol: Optional[str]) -> str:
+    return ENCODING_MSGPACK if subprotocol == SUBPROTOCOL_MSGPACK else ENCODING_JSON
+
+def encode_frame(frame: dict, encoding: str) -> Union[str, bytes]:
+    if encoding == ENCODING_MSGPACK:
+        return msgpack.packb(frame, use_bin_type=True)
+    # Mismo formato que send_json de Starlette
+    return json.dumps(frame, separators=(",", ":"), ensure_ascii=False)
+
+def decode_frame(message: dict) -> dict:
+    """Decodifica un mensaje recibido con websocket.receive() (texto JSON o binario MessagePack)"""
+    if message.get("bytes") is not None:
+        return msgpack.unpackb(message["bytes"], raw=False)
+    return json.loads(message.get("text") or "{}")
+
 class ConnectionManager:
-    def __init__(self):
+    def __init__(self, replay_log_size: int = REPLAY_LOG_SIZE):
         # Mapa de family_id -> List[WebSocket]
         self.active_connections: Dict[int, List[WebSocket]] = {}
+        # Codificación negociada por conexión (json por defecto)
+        self.encodings: Dict[WebSocket, str] = {}
+        # Usuario autenticado de cada conexión (base para presencia)
+        self.connection_users: Dict[WebSocket, int] = {}
+        # Último número de secuencia emitido por familia (monótono, en memoria)
+        self.sequences: Dict[int, int] = {}
+        # Últimos frames enviados por familia, para reenviar huecos al reconectar
+        self.replay_logs: Dict[int, Deque[dict]] = {}
+        self.replay_log_size = replay_log_size
+        # Conexiones reenviando frames perdidos: los broadcasts se encolan hasta terminar
+        self.held: Dict[WebSocket, List[Union[str, bytes]]] = {}
+
+    async def connect(self, websocket: WebSocket, family_id: int, user_id: Optional[int] = None):
+        subprotocol = negotiate_subprotocol(websocket.scope.get("subprotocols", []))
+        await websocket.accept(subprotocol=subprotocol)
+        self.register(websocket, family_id, encoding_for(subprotocol), user_id)
 
-    async def connect(self, websocket: WebSocket, family_id: int):
-        await websocket.accept()
+    def register(
+        self,
+        websocket: WebSocket,
+        family_id: int,
+        encoding: str = ENCODING_JSON,
+        user_id: Optional[int] = None
+    ):
         if family_id not in self.active_connections:
             self.active_connections[family_id] = []
         self.active_connections[family_id].append(websocket)
+        self.encodings[websocket] = encoding
+        if user_id is not None:
+            self.connection_users[websocket] = user_id
 
     def disconnect(self, websocket: WebSocket, family_id: int):
         if family_id in self.active_connections:
             if websocket in self.active_connections[family_id]:
                 self.active_connections[family_id].remove(websocket)
+        self.encodings.pop(websocket, None)
+        self.connection_users.pop(websocket, None)
+        self.held.pop(websocket, None)
+
+    def hold(self, websocket: WebSocket):
+        """
+        Encola los broadcasts a esta conexión (sin enviarlos) hasta release(). Se usa
+        mientras se reenvían frames perdidos, para que ningún frame en vivo llegue antes
+        que el replay y rompa el orden de seq.
+        """
+        self.held.setdefault(websocket, [])
+
+    async def release(self, websocket: WebSocket):
+        """Envía en orden lo encolado durante hold() y vuelve a enviar en vivo"""
+        while True:
+            queued = self.held.get(websocket)
+            if not queued:
+                # Sin await entre la comprobación y el pop: nada puede quedar encolado
+                self.held.pop(websocket, None)
+                return
+            self.held[websocket] = []
+            for payload in queued:
+                await self.send_encoded(websocket, payload)
+
+    def connected_users(self, family_id: int) -> Set[int]:
+        """IDs de usuarios con al menos una conexión abierta en la familia"""
+        return {
+            self.connection_users[connection]
+            for connection in self.active_connections.get(family_id, [])
+            if connection in self.connection_users
+        }
+
+    def current_seq(self, family_id: int) -> int:
+        return self.sequences.get(family_id, 0)
+
+    def missed_since(self, family_id: int, last_seq: int) -> Optional[List[dict]]:
+        """
+        Devuelve los frames con seq > last_seq que siguen en el log de replay.
+        Retorna None si el hueco ya no puede cubrirse desde memoria (el cliente
+        quedó demasiado atrás o el servidor se reinició) y hay que ir a la BD.
+        """
+        current = self.current_seq(family_id)
+        if last_seq > current:
+            return None
+        if last_seq == current:
+            return []
+
+        log = self.replay_logs.get(family_id)
+        if not log or log[0]["seq"] > last_seq + 1:
+            return None
+
+        return [frame for frame in log if frame["seq"] > last_seq]
+
+    def stamp(self, message: dict, family_id: int) -> dict:
+        """Asigna el próximo número de secuencia al frame y lo guarda en el log de replay."""
+        seq = self.sequences.get(family_id, 0) + 1
+        self.sequences[family_id] = seq
+
+        frame = {**message, "seq": seq}
+        if family_id not in self.replay_logs:
+            self.replay_logs[family_id] = deque(maxlen=self.replay_log_size)
+        self.replay_logs[family_id].append(frame)
+        return frame
+
+    async def send_encoded(self, websocket: WebSocket, payload: Union[str, bytes]):
+        if isinstance(payload, bytes):
+            await websocket.send_bytes(payload)
+        else:
+            await websocket.send_text(payload)
+
+    async def send(self, websocket: WebSocket, frame: dict):
+        """Envía un frame a una sola conexión con la codificación que negoció"""
+        encoding = self.encodings.get(websocket, ENCODING_JSON)
+        await self.send_encoded(websocket, encode_frame(frame, encoding))
 
-    async def broadcast(self, message: dict, family_id: int):
+    async def broadcast(self, message: dict, family_id: int, replay: bool = True):
+        """
+        Envía el frame a todas las conexiones de la familia.
+        Con replay=False (frames efímeros como presencia) no se asigna seq ni se guarda en el log.
+        """
+        frame = self.stamp(message, family_id) if replay else message
         if family_id in self.active_connections:
-            for connection in self.active_connections[family_id]:
+            # Serializar una sola vez por codificación, no una vez por conexión
+            encoded: Dict[str, Union[str, bytes]] = {}
+            for connection in list(self.active_connections[family_id]):
+                encoding = self.encodings.get(connection, ENCODING_JSON)
+                if encoding not in encoded:
+                    encoded[encoding] = encode_frame(frame, encoding)
+                if connection in self.held:
+                    self.held[connection].append(encoded[encoding])
+                    continue
                 try:
-                    await connection.send_json(message)
+                    await self.send_encoded(connection, encoded[encoding])
                 except Exception as e:
                     print(f"Error sending message: {e}")
 
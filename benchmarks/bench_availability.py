@@ -0,0 +1,62 @@
+"""
+Benchmark de la matriz de disponibilidad con bitsets: ventanas libres comunes de
+una familia a lo largo de varias semanas, con la caché fría y con la caché cargada.
+
+Uso:
+    python -m benchmarks.bench_availability [--members 8] [--weeks 12] [--events-per-week 30]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.pool import StaticPool
+
+from app.models import Event, Family, FamilyMember, User
+from app.services.availability import availability_cache, free_windows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=8)
+    parser.add_argument("--weeks", type=int, default=12)
+    parser.add_argument("--events-per-week", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    rng = random.Random(9)
+    start = datetime(2025, 3, 3)
+    end = start + timedelta(weeks=args.weeks)
+
+    with Session(engine) as session:
+        family = Family(name="Bench", invitation_code="AVAIL001")
+        users = [User(email=f"u{i}@avail.com", full_name=f"U{i}", hashed_password="x") for i in range(args.members)]
+        session.add_all([family, *users])
+        session.commit()
+        session.add_all([FamilyMember(family_id=family.id, user_id=u.id) for u in users])
+        for user in users:
+            for _ in range(args.events_per_week * args.weeks):
+                event_start = start + timedelta(minutes=15 * rng.randrange(0, 4 * 24 * 7 * args.weeks))
+                session.add(Event(
+                    title="Evento", start_time=event_start, end_time=event_start + timedelta(minutes=rng.choice([30, 60, 120])),
+                    owner_id=user.id, family_id=family.id
+                ))
+        session.commit()
+        user_ids = [u.id for u in users]
+        print(f"{args.members} miembros, {args.weeks} semanas, {args.members * args.events_per_week * args.weeks} eventos")
+
+        availability_cache.clear()
+        began = time.perf_counter()
+        result = free_windows(session, user_ids, start, end, min_duration=timedelta(hours=1))
+        print(f"  caché fría (construye bitsets)   {(time.perf_counter() - began) * 1000:9.2f} ms")
+
+        began = time.perf_counter()
+        for _ in range(args.repeat):
+            result = free_windows(session, user_ids, start, end, min_duration=timedelta(hours=1))
+        print(f"  caché cargada                    {(time.perf_counter() - began) / args.repeat * 1000:9.2f} ms")
+        print(f"  {len(result['windows'])} ventanas libres comunes de al menos 1 hora")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark de tamaño y CPU de la compresión de respuestas (services/compression.py)
+sobre payloads reales: vista de mes de /api/events/ (JSON), historial de chat y un
+feed ICS. Para cada codificación: bytes enviados, ratio y ms de CPU por respuesta, y
+el costo de servir el feed desde la caché de cuerpos comprimidos.
+
+Brotli se mide solo si la librería está instalada.
+
+Uso:
+    python -m benchmarks.bench_compression [--events 300] [--messages 200] [--repeat 50]
+"""
+import argparse
+import random
+import time
+import gzip
+from datetime import datetime, timedelta
+
+from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel.pool import StaticPool
+
+from app.models import Event, Family, User
+from app.services.compression import PrecompressedCache, brotli, compress
+from app.services.ics import iter_calendar
+from app.services.serialization import dump_json, event_list_adapter, message_list_adapter
+
+def build_payloads(events: int, messages: int):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    rng = random.Random(48)
+    base = datetime(2025, 3, 1)
+    with Session(engine) as session:
+        session.add_all([Family(id=1, name="Bench", invitation_code="CMP001"),
+                         User(id=1, email="bench@example.com", full_name="Bench", hashed_password="x")])
+        session.add_all([
+            Event(
+                title=rng.choice(["Fútbol", "Dentista", "Reunión de padres", "Compras", "Clase de piano"]) + f" {i}",
+                description="Llevar la autorización firmada" if i % 3 else None,
+                start_time=(start := base + timedelta(minutes=rng.randrange(0, 60 * 24 * 30))),
+                end_time=start + timedelta(hours=1), owner_id=1, family_id=1,
+                category=rng.choice(["home", "school", "work", "health"]),
+            )
+            for i in range(events)
+        ])
+        session.commit()
+        payloads = {
+            f"/api/events/ ({events} eventos)": dump_json(event_list_adapter, session.exec(select(Event)).all()),
+            f"feed ICS ({events} eventos)": b"".join(iter_calendar(session, select(Event), "Bench")),
+        }
+    payloads[f"historial de chat ({messages} mensajes)"] = dump_json(message_list_adapter, [
+        {"id": i, "family_id": 1, "user_id": 1 + i % 4, "user_name": f"Miembro {1 + i % 4}",
+         "content": rng.choice(["¿Quién busca a los chicos?", "Yo paso a las 18", "Compré pan", "Ok!"]),
+         "created_at": base + timedelta(minutes=i)}
+        for i in range(messages)
+    ])
+    return payloads
+
+def encoders():
+    yield "gzip-1", lambda body: gzip.compress(body, compresslevel=1, mtime=0)
+    yield "gzip-6 (por defecto)", lambda body: compress(body, "gzip")
+    if brotli is not None:
+        yield "br-4 (por defecto)", lambda body: compress(body, "br")
+        yield "br-11", lambda body: brotli.compress(body, quality=11)
+
+def cpu_ms(fn, body: bytes, repeat: int) -> float:
+    start = time.process_time()
+    for _ in range(repeat):
+        fn(body)
+    return (time.process_time() - start) / repeat * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=300)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    if brotli is None:
+        print("(brotli no instalado: solo gzip)")
+    for label, body in build_payloads(args.events, args.messages).items():
+        print(f"{label}: {len(body) / 1024:.1f} KB sin comprimir")
+        for name, fn in encoders():
+            size = len(fn(body))
+            print(f"  {name:<22} {size / 1024:8.1f} KB  ratio {len(body) / size:5.1f}x  "
+                  f"{cpu_ms(fn, body, args.repeat):7.3f} ms CPU")
+
+        cache = PrecompressedCache()
+        key = (label, '"etag"', "gzip")
+        cache.put(key, compress(body, "gzip"))
+        print(f"  {'caché precomprimida':<22} {'':>8}    {'':>12}  "
+              f"{cpu_ms(lambda _: cache.get(key), body, args.repeat * 100):7.3f} ms CPU")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark del índice de conflictos: consultas de solapamiento y mutaciones
+incrementales sobre una familia con miles de eventos.
+
+Uso:
+    python -m benchmarks.bench_conflicts [--events 5000] [--queries 10000]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from app.models import Event
+from app.services.conflicts import FamilyIndex
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=10000)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    base = datetime(2025, 1, 1)
+    events = [
+        Event(
+            id=i,
+            title=f"Evento {i}",
+            start_time=(start := base + timedelta(minutes=rng.randrange(0, 60 * 24 * 365 * 2))),
+            end_time=start + timedelta(minutes=rng.choice([15, 30, 60, 120, 480])),
+            owner_id=1,
+            family_id=1
+        )
+        for i in range(1, args.events + 1)
+    ]
+
+    index = FamilyIndex()
+    start = time.perf_counter()
+    for event in events:
+        index.add(event)
+    print(f"{args.events} eventos")
+    print(f"  construcción del índice        {(time.perf_counter() - start) * 1000:9.2f} ms")
+
+    windows = []
+    for _ in range(args.queries):
+        window_start = base + timedelta(minutes=rng.randrange(0, 60 * 24 * 365 * 2))
+        windows.append((window_start, window_start + timedelta(hours=2)))
+
+    start = time.perf_counter()
+    for window_start, window_end in windows:
+        index.overlapping(window_start, window_end)
+    per_query = (time.perf_counter() - start) / args.queries
+    print(f"  consulta de solapamiento (índice) {per_query * 1e6:9.1f} µs")
+
+    start = time.perf_counter()
+    for window_start, window_end in windows[:200]:
+        [e for e in events if e.start_time < window_end and e.end_time > window_start]
+    per_scan = (time.perf_counter() - start) / 200
+    print(f"  recorrido lineal                {per_scan * 1e6:9.1f} µs")
+
+    start = time.perf_counter()
+    for event in rng.sample(events, 1000):
+        index.add(event)
+    print(f"  actualización incremental       {(time.perf_counter() - start) / 1000 * 1e6:9.1f} µs")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark del buscador local de huecos libres frente a la ruta anterior con LLM.
+
+Crea en SQLite en memoria una familia con N miembros y sus eventos de la semana
+(simples, recurrentes y asignados desde otra familia) y mide find_free_slots.
+Si hay GROQ_API_KEY o GEMINI_API_KEY configurada, mide también la llamada al LLM
+con el mismo prompt que usaba suggest_optimal_time.
+
+Uso:
+    python -m benchmarks.bench_free_slots [--members 6] [--events-per-member 40] [--repeat 50]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.pool import StaticPool
+
+from app.models import Event, Family, FamilyMember, User
+from app.services.conflicts import conflict_index
+from app.services.scheduling import find_free_slots
+
+def seed(session: Session, members: int, events_per_member: int, now: datetime) -> int:
+    rng = random.Random(5)
+    family = Family(name="Bench", invitation_code="BENCH001")
+    other = Family(name="Otra", invitation_code="BENCH002")
+    users = [User(email=f"u{i}@bench.com", full_name=f"U{i}", hashed_password="x") for i in range(members)]
+    session.add_all([family, other, *users])
+    session.commit()
+    session.add_all([FamilyMember(family_id=family.id, user_id=u.id) for u in users])
+    for user in users:
+        for _ in range(events_per_member):
+            start = now + timedelta(minutes=15 * rng.randrange(0, 4 * 24 * 7))
+            session.add(Event(
+                title="Evento", start_time=start, end_time=start + timedelta(minutes=rng.choice([30, 60, 90])),
+                owner_id=user.id, family_id=rng.choice([family.id, family.id, other.id]),
+                assigned_to_id=user.id
+            ))
+        session.add(Event(
+            title="Rutina", start_time=now.replace(hour=8), end_time=now.replace(hour=9), is_recurring=True,
+            recurrence_pattern="daily:08:00", owner_id=user.id, family_id=family.id
+        ))
+    session.commit()
+    return family.id
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=6)
+    parser.add_argument("--events-per-member", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    now = datetime(2025, 3, 3, 7, 0)
+    with Session(engine) as session:
+        family_id = seed(session, args.members, args.events_per_member, now)
+        print(f"{args.members} miembros, {args.members * args.events_per_member} eventos en la semana")
+
+        conflict_index.clear()
+        start = time.perf_counter()
+        slots = find_free_slots(session, family_id, timedelta(hours=1), start=now)
+        print(f"  motor local (índice en frío)     {(time.perf_counter() - start) * 1000:9.2f} ms")
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            slots = find_free_slots(session, family_id, timedelta(hours=1), start=now)
+        print(f"  motor local (índice cargado)     {(time.perf_counter() - start) / args.repeat * 1000:9.2f} ms")
+        print(f"  mejor hueco: {slots[0].start} - {slots[0].end}")
+
+        from app.routers import ai
+        if not ai.AI_PROVIDER:
+            print("  ruta LLM: sin GROQ_API_KEY/GEMINI_API_KEY, se omite")
+            return
+
+        events = session.query(Event).filter(Event.family_id == family_id).all()
+        eventos_str = "\n".join(f"- {e.title}: {e.start_time.isoformat()} a {e.end_time.isoformat()}" for e in events)
+        prompt = f"""
+        Eres un asistente de calendario. Analiza los siguientes eventos programados:
+        {eventos_str}
+        El usuario quiere: "Reunión de una hora"
+        Sugiere el mejor horario considerando: 1. Evitar conflictos 2. Horarios razonables (9am-9pm) 3. Dejar tiempo entre eventos
+        Devuelve SOLO un JSON con: {{"suggested_start": "ISO8601", "suggested_end": "ISO8601", "reason": "explicación breve"}}
+        """
+        call = ai.call_groq_ai if ai.AI_PROVIDER == "groq" else ai.call_gemini_ai
+        start = time.perf_counter()
+        call(prompt)
+        print(f"  ruta LLM ({ai.AI_PROVIDER})                 {(time.perf_counter() - start) * 1000:9.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Microbenchmarks de las funciones puras que corren dentro de bucles sobre muchos
+eventos (programación de notificaciones, recurrencia, recordatorios inteligentes),
+con lotes de tamaño realista. Cada caso se ejecuta --rounds veces y se reportan
+mínimo, mediana, media y desviación por lote, como pytest-benchmark.
+
+La línea base queda en benchmarks/baselines/hot_paths.json. Con --compare se marca
+como regresión un mínimo que empeore más de --threshold % y se sale con código 1
+(el mínimo es la estadística menos sensible al ruido de la máquina).
+Las líneas base dependen de la máquina: regenerarlas en la misma máquina antes de
+comparar una optimización.
+
+Uso:
+    python -m benchmarks.bench_hot_paths [--rounds 20] [--only notification] [--save] [--compare] [--threshold 20]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Tuple
+
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.pool import StaticPool
+
+from app.models import Event, User
+from app.services.notification_scheduler import (
+    calculate_next_occurrence, calculate_notification_times, parse_notification_config, parse_recurrence_pattern
+)
+from app.services.smart_reminders import analyze_productivity_patterns, calculate_smart_reminder_time
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "hot_paths.json")
+
+CONFIGS = [
+    '{"pre": [15], "post": false}',
+    '{"pre": [15, 60], "unit": "minutes"}',
+    '{"stages": [30, 15, 7, 3, 1, 0], "unit": "days", "time": "09:00"}',
+    '{"pre": [1, 2], "unit": "hours"}',
+]
+PATTERNS = ["daily:18:00", "weekly:mon,wed,fri:22:00", "weekly:sat:10:00", "monthly:09:00", "yearly:12:30"]
+CATEGORIES = ["work", "health", "school", "leisure", "general", "home"]
+
+def make_events(count: int, rng: random.Random, aware: bool = False) -> List[Event]:
+    base = datetime.now(timezone.utc) if aware else datetime(2025, 1, 1)
+    return [
+        Event(
+            id=i, title=f"Evento {i}",
+            start_time=(start := base + timedelta(minutes=rng.randrange(-60 * 24 * 30, 60 * 24 * 365))),
+            end_time=start + timedelta(hours=1), owner_id=1, family_id=1,
+            category=rng.choice(CATEGORIES), notification_config=rng.choice(CONFIGS)
+        )
+        for i in range(count)
+    ]
+
+def build_cases(rng: random.Random) -> List[Tuple[str, int, Callable[[], object]]]:
+    """(nombre, tamaño del lote, función que procesa el lote completo)"""
+    events = make_events(5000, rng)
+    aware_events = make_events(5000, rng, aware=True)
+    configs = [rng.choice(CONFIGS) for _ in range(10000)]
+    patterns = [rng.choice(PATTERNS) for _ in range(10000)]
+    parsed = [parse_recurrence_pattern(p) for p in patterns[:5000]]
+    starts = [datetime(2025, 1, 1) + timedelta(minutes=rng.randrange(0, 60 * 24 * 365)) for _ in parsed]
+
+    # analyze_productivity_patterns consulta la BD: usuario con 30 días de eventos en SQLite en memoria
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    session = Session(engine)
+    session.add(User(id=1, email="bench@example.com", full_name="Bench", hashed_password="x"))
+    now = datetime.now(timezone.utc)
+    session.add_all([
+        Event(
+            title="Pasado", start_time=(start := now - timedelta(minutes=rng.randrange(1, 60 * 24 * 29))),
+            end_time=start + timedelta(hours=1), owner_id=1, family_id=1, category=rng.choice(CATEGORIES)
+        )
+        for _ in range(2000)
+    ])
+    session.commit()
+
+    return [
+        ("parse_notification_config", len(configs), lambda: [parse_notification_config(c) for c in configs]),
+        ("parse_recurrence_pattern", len(patterns), lambda: [parse_recurrence_pattern(p) for p in patterns]),
+        ("calculate_notification_times", len(events), lambda: [calculate_notification_times(e) for e in events]),
+        ("calculate_next_occurrence", len(parsed), lambda: [
+            calculate_next_occurrence(s, p) for s, p in zip(starts, parsed)
+        ]),
+        ("calculate_smart_reminder_time", len(aware_events), lambda: [
+            calculate_smart_reminder_time(e) for e in aware_events
+        ]),
+        ("analyze_productivity_patterns", 2000, lambda: analyze_productivity_patterns(session, 1)),
+    ]
+
+def measure(fn: Callable[[], object], rounds: int) -> Dict[str, float]:
+    fn()  # Calentamiento
+    samples = []
+    # Sin el recolector de ciclos durante las rondas: sus pausas dominan la varianza
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return {
+        "min_ms": round(min(samples) * 1000, 3),
+        "median_ms": round(statistics.median(samples) * 1000, 3),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3),
+        "stddev_ms": round(statistics.pstdev(samples) * 1000, 3),
+        "rounds": rounds,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--only", help="Solo los casos cuyo nombre contiene este texto")
+    parser.add_argument("--save", action="store_true", help="Guardar el resultado como línea base")
+    parser.add_argument("--compare", action="store_true", help="Comparar contra la línea base guardada")
+    parser.add_argument("--threshold", type=float, default=20.0, help="Regresión tolerada del mínimo en %%")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    args = parser.parse_args()
+
+    results = {}
+    print(f"  {'caso':32} {'lote':>6} {'mín ms':>9} {'mediana ms':>11} {'media ms':>9} {'desv ms':>8}")
+    for name, batch, fn in build_cases(random.Random(42)):
+        if args.only and args.only not in name:
+            continue
+        row = {"batch": batch, **measure(fn, args.rounds)}
+        results[name] = row
+        print(f"  {name:32} {batch:6d} {row['min_ms']:9.2f} {row['median_ms']:11.2f} "
+              f"{row['mean_ms']:9.2f} {row['stddev_ms']:8.2f}")
+
+    regressions = []
+    if args.compare:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        print(f"\n  {'caso':32} {'base ms':>9} {'actual ms':>10} {'cambio':>8}")
+        for name, row in results.items():
+            base = baseline.get(name)
+            if not base or base["batch"] != row["batch"]:
+                print(f"  {name:32} sin línea base comparable")
+                continue
+            change = (row["min_ms"] - base["min_ms"]) / base["min_ms"] * 100
+            flag = "❌" if change > args.threshold else ""
+            print(f"  {name:32} {base['min_ms']:9.2f} {row['min_ms']:10.2f} {change:+7.1f}% {flag}")
+            if change > args.threshold:
+                regressions.append(name)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "results": results,
+            }, f, indent=2)
+            f.write("\n")
+        print(f"\n💾 Línea base guardada en {args.baseline}")
+
+    if regressions:
+        print(f"\n❌ Regresiones (> {args.threshold:.0f}%): {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
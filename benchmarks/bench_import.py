@@ -0,0 +1,84 @@
+"""
+Benchmark de la importación masiva: N eventos desde CSV con el pipeline por bloques
+frente al camino anterior (un INSERT y un commit por evento, como POST /api/events/).
+
+Usa una base SQLite en un archivo temporal para que los commits tengan costo real.
+
+Uso:
+    python -m benchmarks.bench_import [--events 10000] [--chunk-size 1000]
+"""
+import argparse
+import io
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlmodel import Session, SQLModel, create_engine, select, func
+
+from app.models import Event, Family, FamilyMember, NotificationLog, User
+from app.services.event_import import import_events, iter_csv_rows
+
+def make_csv(count: int) -> str:
+    rng = random.Random(2)
+    base = datetime.utcnow() + timedelta(days=1)
+    lines = ["title,start_time,end_time,category,description"]
+    for i in range(count):
+        start = base + timedelta(minutes=15 * rng.randrange(0, 4 * 24 * 365))
+        end = start + timedelta(minutes=rng.choice([30, 60, 90]))
+        lines.append(f"Evento {i},{start.isoformat()},{end.isoformat()},general,Importado")
+    return "\n".join(lines)
+
+def fresh_engine(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        user = User(email="bench@import.com", full_name="Bench", hashed_password="x")
+        family = Family(name="Bench", invitation_code="IMPORT01")
+        session.add_all([user, family])
+        session.commit()
+        session.add(FamilyMember(family_id=family.id, user_id=user.id))
+        session.commit()
+        return engine, user.id, family.id
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--baseline-events", type=int, default=1000, help="Eventos para el camino uno por uno")
+    args = parser.parse_args()
+
+    csv_text = make_csv(args.events)
+    path = os.path.join(tempfile.gettempdir(), "bench_import.db")
+    print(f"{args.events} eventos desde CSV ({len(csv_text) / 1024:.0f} KiB)")
+
+    engine, user_id, family_id = fresh_engine(path)
+    with Session(engine) as session:
+        start = time.perf_counter()
+        for message in import_events(session, iter_csv_rows(io.StringIO(csv_text)), user_id, family_id, [user_id], args.chunk_size):
+            pass
+        elapsed = time.perf_counter() - start
+        logs = session.exec(select(func.count()).select_from(NotificationLog)).one()
+        print(f"  pipeline por bloques            {elapsed:8.2f} s  ({message['imported']} eventos, {logs} notificaciones)")
+
+    engine, user_id, family_id = fresh_engine(path)
+    rows = list(iter_csv_rows(io.StringIO(make_csv(args.baseline_events))))
+    with Session(engine) as session:
+        start = time.perf_counter()
+        for _, row in rows:
+            event = Event(**row, owner_id=user_id, family_id=family_id)
+            event.start_time = datetime.fromisoformat(row["start_time"])
+            event.end_time = datetime.fromisoformat(row["end_time"])
+            session.add(event)
+            session.commit()
+            session.refresh(event)
+        elapsed = time.perf_counter() - start
+        print(f"  uno por uno ({args.baseline_events} eventos)      {elapsed:8.2f} s  "
+              f"(~{elapsed * args.events / args.baseline_events:.1f} s estimados para {args.events})")
+    os.remove(path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark de memoria (tracemalloc) y tiempo al cargar eventos, por cada 10k filas:
+- entidades Event del ORM (select(Event), el camino anterior de métricas e IA)
+- filas de SQLAlchemy con las columnas de la proyección
+- registros NamedTuple de services/projections.py
+
+Se mide la memoria retenida por la lista resultante (con la sesión abierta, como en
+la ruta) y el pico durante la consulta. SQLite en memoria.
+
+Uso:
+    python -m benchmarks.bench_projections [--events 10000] [--repeat 5]
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel.pool import StaticPool
+
+from app.models import Event, Family, User
+from app.services.projections import EventStats, EventSummary, fetch_records, select_records
+
+def measure(engine, load):
+    """(memoria retenida, pico) en bytes de `load(session)` con la sesión abierta"""
+    gc.collect()
+    with Session(engine) as session:
+        tracemalloc.start()
+        result = load(session)
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del result
+    return retained, peak
+
+def timed(engine, load, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        with Session(engine) as session:
+            start = time.perf_counter()
+            load(session)
+            best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    rng = random.Random(47)
+    with Session(engine) as session:
+        session.add_all([Family(id=1, name="Bench", invitation_code="PRJ001"),
+                         User(id=1, email="bench@example.com", full_name="Bench", hashed_password="x")])
+        base = datetime(2025, 1, 1)
+        session.add_all([
+            Event(
+                title=f"Evento {i}", description="Descripción del evento" if i % 3 else None,
+                start_time=(start := base + timedelta(minutes=rng.randrange(0, 60 * 24 * 90))),
+                end_time=start + timedelta(hours=1), owner_id=1, family_id=1, assigned_to_id=1,
+                category=rng.choice(["home", "school", "work", "health"]),
+                status=rng.choice(["pending", "completed"]),
+            )
+            for i in range(args.events)
+        ])
+        session.commit()
+
+    loaders = {
+        "entidades Event (select(Event))": lambda s: s.exec(select(Event)).all(),
+        "filas EventStats (Row)": lambda s: s.exec(select_records(EventStats)).all(),
+        "registros EventStats (NamedTuple)": lambda s: fetch_records(s, EventStats, select_records(EventStats)),
+        "filas EventSummary (Row)": lambda s: s.exec(select_records(EventSummary)).all(),
+        "registros EventSummary (NamedTuple)": lambda s: fetch_records(s, EventSummary, select_records(EventSummary)),
+    }
+
+    scale = 10000 / args.events
+    print(f"{args.events} eventos (valores por cada 10k filas)")
+    print(f"  {'':<38} {'retenida':>10} {'pico':>10} {'tiempo':>10}")
+    for label, load in loaders.items():
+        retained, peak = measure(engine, load)
+        elapsed = timed(engine, load, args.repeat)
+        print(f"  {label:<38} {retained * scale / 2**20:7.2f} MB {peak * scale / 2**20:7.2f} MB "
+              f"{elapsed * scale * 1000:7.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark del motor de recurrencia RRULE: expansión de 10 años de una regla diaria.
+
+Compara:
+- expansión completa de 10 años (en frío y memorizada)
+- ventana mensual al final del rango (con adelanto de DTSTART vs. iterar desde el inicio)
+- el enfoque anterior: encadenar calculate_next_occurrence ocurrencia por ocurrencia
+
+Uso:
+    python -m benchmarks.bench_recurrence [--years 10] [--repeat 20]
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from dateutil.rrule import rrulestr
+
+from app.services import recurrence
+from app.services.notification_scheduler import calculate_next_occurrence, parse_recurrence_pattern
+
+def timed(label: str, repeat: int, fn):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"  {label:<52} {elapsed * 1000:9.3f} ms  ({len(result)} ocurrencias)")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    pattern = "daily:18:00"
+    rule = recurrence.to_rrule(pattern)
+    dtstart = datetime(2025, 1, 1, 18, 0)
+    end = dtstart + timedelta(days=365 * args.years)
+    month_start = end - timedelta(days=30)
+
+    print(f"Regla: {rule}  ({args.years} años)\n")
+
+    def full_cold():
+        recurrence._expand_window_cached.cache_clear()
+        return recurrence.expand_window(rule, dtstart, dtstart, end)
+
+    timed("Expansión completa (en frío)", args.repeat, full_cold)
+    recurrence.expand_window(rule, dtstart, dtstart, end)
+    timed("Expansión completa (memorizada por ventana)", args.repeat,
+          lambda: recurrence.expand_window(rule, dtstart, dtstart, end))
+
+    timed("Ventana del último mes, dateutil desde DTSTART", args.repeat,
+          lambda: [d for d in rrulestr(rule, dtstart=dtstart).between(month_start, end, inc=True) if d < end])
+    timed("Ventana del último mes, generador con adelanto", args.repeat,
+          lambda: list(recurrence.iter_occurrences(rule, dtstart, month_start, end)))
+
+    def legacy_chain():
+        parsed = parse_recurrence_pattern(pattern)
+        current, result = dtstart, []
+        while current < end:
+            result.append(current)
+            current = calculate_next_occurrence(current, parsed)
+        return result
+
+    timed("Anterior: calculate_next_occurrence encadenado", args.repeat, legacy_chain)
+    print("\n  (el enfoque anterior además insertaba una fila Event por ocurrencia)")
+
+if __name__ == "__main__":
+    main()
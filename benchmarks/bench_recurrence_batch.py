@@ -0,0 +1,58 @@
+"""
+Benchmark del cálculo en bloque de próximas ocurrencias (tarea nocturna de recurrencia).
+
+Compara, para N eventos con patrones diarios/semanales:
+- recurrence.next_occurrence evento por evento (dateutil)
+- recurrence_batch.next_occurrences en Python puro
+- recurrence_batch.next_occurrences vectorizado con NumPy (si está instalado)
+
+Uso:
+    python -m benchmarks.bench_recurrence_batch [--events 100000]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from app.services import recurrence, recurrence_batch
+
+PATTERNS = ["daily:18:00", "weekly:mon,wed,fri:22:00", "weekly:sat:10:00", '{"frequency": "weekly", "daysOfWeek": [1, 4]}']
+
+def timed(label: str, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"  {label:<44} {(time.perf_counter() - start) * 1000:9.1f} ms")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=100000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    base = datetime(2023, 1, 1)
+    starts = [base + timedelta(minutes=rng.randrange(0, 60 * 24 * 700)) for _ in range(args.events)]
+    patterns = [rng.choice(PATTERNS) for _ in starts]
+    after = datetime(2025, 6, 1, 3, 0)
+
+    print(f"{args.events} eventos recurrentes")
+    rules = [recurrence.to_rrule(p) for p in patterns]
+    expected = timed("dateutil, uno por uno", lambda: [
+        recurrence.next_occurrence(r, s, max(after, s - timedelta(microseconds=1)))
+        for r, s in zip(rules, starts)
+    ])
+
+    numpy_module = recurrence_batch.np
+    recurrence_batch.np = None
+    python_result = timed("lote, Python puro", lambda: recurrence_batch.next_occurrences(starts, patterns, after))
+    recurrence_batch.np = numpy_module
+    assert python_result == expected
+
+    if numpy_module is not None:
+        numpy_result = timed("lote, NumPy", lambda: recurrence_batch.next_occurrences(starts, patterns, after))
+        assert numpy_result == expected
+    else:
+        print("  NumPy no instalado: se omite la variante vectorizada")
+
+if __name__ == "__main__":
+    main()
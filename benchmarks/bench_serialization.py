@@ -0,0 +1,95 @@
+"""
+Benchmark del costo de serializar listas de eventos (GET /api/events/), por cada
+1000 eventos:
+- ORM + response_model: entidades Event, validación contra EventRead, jsonable_encoder
+  y JSONResponse (el camino anterior de FastAPI)
+- el mismo camino con ORJSONResponse
+- filas con las columnas de EventRead + TypeAdapter precompilado (services/serialization.py)
+
+Se mide con y sin la consulta a la BD (SQLite en memoria).
+
+Uso:
+    python -m benchmarks.bench_serialization [--events 5000] [--repeat 20]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel.pool import StaticPool
+
+from app.models import Event, Family, User
+from app.schemas import EventRead
+from app.services.serialization import EVENT_READ_COLUMNS, dump_json, event_list_adapter, orjson
+
+def per_thousand(label: str, fn, count: int, repeat: int):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"  {label:<48} {elapsed / count * 1000 * 1000:9.2f} ms / 1000 eventos")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    rng = random.Random(46)
+    with Session(engine) as session:
+        session.add_all([Family(id=1, name="Bench", invitation_code="SER001"),
+                         User(id=1, email="bench@example.com", full_name="Bench", hashed_password="x")])
+        base = datetime(2025, 1, 1)
+        session.add_all([
+            Event(
+                title=f"Evento {i}", description="Descripción" if i % 3 else None,
+                start_time=(start := base + timedelta(minutes=rng.randrange(0, 60 * 24 * 90))),
+                end_time=start + timedelta(hours=1), owner_id=1, family_id=1,
+                category=rng.choice(["home", "school", "work", "health"])
+            )
+            for i in range(args.events)
+        ])
+        session.commit()
+
+    def entities():
+        with Session(engine) as session:
+            return session.exec(select(Event)).all()
+
+    def rows():
+        with Session(engine) as session:
+            return session.exec(select(*EVENT_READ_COLUMNS)).all()
+
+    def response_model_path(events, response_class=JSONResponse):
+        validated = [EventRead.model_validate(e, from_attributes=True) for e in events]
+        return response_class(jsonable_encoder(validated)).body
+
+    loaded_entities, loaded_rows = entities(), rows()
+    assert response_model_path(loaded_entities) == JSONResponse(
+        jsonable_encoder(event_list_adapter.validate_python(loaded_rows, from_attributes=True))
+    ).body
+
+    print(f"{args.events} eventos")
+    print(" Solo serialización")
+    per_thousand("response_model + jsonable_encoder + JSONResponse",
+                 lambda: response_model_path(loaded_entities), args.events, args.repeat)
+    if orjson is not None:
+        from fastapi.responses import ORJSONResponse
+        per_thousand("response_model + jsonable_encoder + ORJSONResponse",
+                     lambda: response_model_path(loaded_entities, ORJSONResponse), args.events, args.repeat)
+    per_thousand("filas + TypeAdapter.dump_json",
+                 lambda: dump_json(event_list_adapter, loaded_rows), args.events, args.repeat)
+
+    print(" Consulta + serialización")
+    per_thousand("entidades ORM + response_model + JSONResponse",
+                 lambda: response_model_path(entities()), args.events, args.repeat)
+    per_thousand("filas + TypeAdapter.dump_json",
+                 lambda: dump_json(event_list_adapter, rows()), args.events, args.repeat)
+
+if __name__ == "__main__":
+    main()
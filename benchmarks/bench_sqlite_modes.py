@@ -0,0 +1,104 @@
+"""
+Benchmark de SQLite con lecturas y escrituras concurrentes (chat familiar: muchos
+mensajes nuevos mientras se leen historiales). Compara:
+- por defecto: engine como antes (sin WAL, sin busy_timeout)
+- ajustado: WAL, synchronous=NORMAL, mmap, caché y busy_timeout (DB_POOL_MODE=sqlite)
+- escritor único + lectores: lo anterior con SQLITE_READ_WRITE_SPLIT=true
+
+Reporta operaciones por segundo y errores "database is locked".
+
+Uso:
+    python -m benchmarks.bench_sqlite_modes [--threads 8] [--seconds 5] [--write-ratio 0.3]
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.models import ChatMessage, Family, User
+from app.services import db_pool
+from app.services.db_routing import RoutingSession
+
+def build(mode: str, url: str):
+    if mode == "por defecto":
+        engine = create_engine(url, connect_args={"check_same_thread": False})
+        return engine, lambda: Session(engine), [engine]
+    if mode == "ajustado":
+        engine = db_pool.create_configured_engine(url, label="bench", mode="sqlite")
+        return engine, lambda: Session(engine), [engine]
+    writer, reader = db_pool.create_sqlite_engines(url)
+    return writer, lambda: RoutingSession(writer, reader), [writer, reader]
+
+def run(mode: str, args) -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+        writer, new_session, engines = build(mode, url)
+        SQLModel.metadata.create_all(writer)
+        with Session(writer) as session:
+            session.add_all([Family(id=f, name=f"F{f}", invitation_code=f"B{f}") for f in range(1, 11)])
+            session.add(User(id=1, email="bench@example.com", full_name="Bench", hashed_password="x"))
+            session.add_all([
+                ChatMessage(family_id=1 + i % 10, user_id=1, content=f"m{i}", created_at=datetime.now(timezone.utc))
+                for i in range(5000)
+            ])
+            session.commit()
+
+        counts = {"reads": 0, "writes": 0, "locked": 0, "errors": 0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + args.seconds
+
+        def worker(seed: int):
+            rng = random.Random(seed)
+            while time.perf_counter() < deadline:
+                family_id = rng.randint(1, 10)
+                kind = "writes" if rng.random() < args.write_ratio else "reads"
+                try:
+                    with new_session() as session:
+                        if kind == "writes":
+                            session.add(ChatMessage(
+                                family_id=family_id, user_id=1, content="hola",
+                                created_at=datetime.now(timezone.utc)
+                            ))
+                            session.commit()
+                        else:
+                            session.exec(
+                                select(ChatMessage).where(ChatMessage.family_id == family_id)
+                                .order_by(ChatMessage.created_at.desc()).limit(50)
+                            ).all()
+                    outcome = kind
+                except OperationalError as exc:
+                    outcome = "locked" if "locked" in str(exc) else "errors"
+                with lock:
+                    counts[outcome] += 1
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for engine in engines:
+            engine.dispose()
+
+    ops = counts["reads"] + counts["writes"]
+    print(f"  {mode:28} {ops / args.seconds:9.0f} op/s  lecturas {counts['reads']:6d}  "
+          f"escrituras {counts['writes']:6d}  locked {counts['locked']:5d}  otros errores {counts['errors']}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--write-ratio", type=float, default=0.3)
+    args = parser.parse_args()
+
+    print(f"{args.threads} hilos, {args.seconds:.0f}s, {args.write_ratio:.0%} escrituras")
+    for mode in ("por defecto", "ajustado", "escritor único + lectores"):
+        run(mode, args)
+
+if __name__ == "__main__":
+    main()
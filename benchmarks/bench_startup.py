@@ -0,0 +1,142 @@
+"""
+Benchmark del arranque de la API en un intérprete nuevo (como un cold start de Render):
+- import: `import app.main` (routers, modelos, SDKs que se importen al cargar)
+- lifespan: desde el inicio del lifespan hasta que la app queda lista para recibir
+  requests (scheduler, presencia, Firebase; migraciones si MIGRATE_ON_STARTUP)
+
+Cada medición corre en un subproceso con una base SQLite temporal. Se reporta mínimo y
+mediana de --runs ejecuciones.
+
+Con --profile se agrega el perfil de `python -X importtime`: los paquetes y módulos de
+app/ que más tardan en importarse (tiempo acumulado, incluye sus dependencias).
+
+Presupuesto de regresión: la línea base queda en benchmarks/baselines/startup.json.
+Con --compare se sale con código 1 si la mediana del total empeora más de --threshold %
+(o supera --budget-ms, si se indica).
+
+Uso:
+    python -m benchmarks.bench_startup [--runs 7] [--profile] [--save] [--compare] [--threshold 20] [--budget-ms 2500]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "startup.json")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Corre en el subproceso: los prints del arranque van a /dev/null, el resultado a stdout
+CHILD = """
+import asyncio, contextlib, io, json, sys, time
+out = sys.stdout
+sys.stdout = io.StringIO()
+start = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+
+async def startup():
+    async with app.router.lifespan_context(app):
+        return time.perf_counter()
+
+ready = asyncio.run(startup())
+out.write(json.dumps({"import_ms": (imported - start) * 1000, "lifespan_ms": (ready - imported) * 1000}))
+"""
+
+def child_env(database_url: str) -> Dict[str, str]:
+    env = dict(os.environ, DATABASE_URL=database_url, PYTHONDONTWRITEBYTECODE="0")
+    return env
+
+def run_once(database_url: str) -> Dict[str, float]:
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=ROOT, env=child_env(database_url),
+        capture_output=True, text=True, check=True
+    )
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["total_ms"] = timings["import_ms"] + timings["lifespan_ms"]
+    return timings
+
+def import_profile(database_url: str, top: int) -> List[Tuple[str, float]]:
+    """Paquetes de primer nivel y módulos de app/ por tiempo de import acumulado"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"], cwd=ROOT,
+        env=child_env(database_url), capture_output=True, text=True, check=True
+    )
+    modules: Dict[str, float] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name.strip()
+        if not cumulative.strip().isdigit():
+            continue
+        if "." not in name or name.startswith("app."):
+            modules[name] = max(modules.get(name, 0), int(cumulative) / 1000)
+    return sorted(modules.items(), key=lambda item: item[1], reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--profile", action="store_true", help="Mostrar el perfil de -X importtime")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--save", action="store_true", help="Guardar el resultado como línea base")
+    parser.add_argument("--compare", action="store_true", help="Comparar contra la línea base guardada")
+    parser.add_argument("--threshold", type=float, default=20.0, help="Regresión tolerada de la mediana en %%")
+    parser.add_argument("--budget-ms", type=float, help="Tope absoluto para la mediana del arranque total")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{os.path.join(tmp, 'startup.db')}"
+        run_once(database_url)  # Primera corrida: compila .pyc y crea la base
+        runs = [run_once(database_url) for _ in range(args.runs)]
+        profile = import_profile(database_url, args.top) if args.profile else []
+
+    results = {}
+    print(f"  {'fase':10} {'mín ms':>9} {'mediana ms':>11}")
+    for phase in ("import_ms", "lifespan_ms", "total_ms"):
+        values = [run[phase] for run in runs]
+        results[phase] = {"min_ms": min(values), "median_ms": statistics.median(values)}
+        print(f"  {phase[:-3]:10} {min(values):9.1f} {statistics.median(values):11.1f}")
+
+    if profile:
+        print(f"\n  {'módulo (import acumulado)':40} {'ms':>8}")
+        for name, ms in profile:
+            print(f"  {name:40} {ms:8.1f}")
+
+    failed = []
+    total = results["total_ms"]["median_ms"]
+    if args.compare:
+        with open(args.baseline, encoding="utf-8") as f:
+            base = json.load(f)["results"]["total_ms"]["median_ms"]
+        change = (total - base) / base * 100
+        flag = "❌" if change > args.threshold else ""
+        print(f"\n  total: base {base:.1f} ms, actual {total:.1f} ms ({change:+.1f}%) {flag}")
+        if change > args.threshold:
+            failed.append(f"el arranque empeoró {change:.0f}% (> {args.threshold:.0f}%)")
+    if args.budget_ms is not None and total > args.budget_ms:
+        failed.append(f"el arranque tarda {total:.0f} ms (presupuesto {args.budget_ms:.0f} ms)")
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "results": results,
+            }, f, indent=2)
+            f.write("\n")
+        print(f"\n💾 Línea base guardada en {args.baseline}")
+
+    if failed:
+        print(f"\n❌ {'; '.join(failed)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
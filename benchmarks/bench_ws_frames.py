@@ -0,0 +1,105 @@
+"""
+Benchmark de frames de WebSocket por broadcast para una familia de 100 miembros.
+
+Mide bytes en el cable y CPU de serialización para:
+- send_json por conexión (comportamiento anterior: 100 serializaciones por broadcast)
+- JSON serializado una vez por broadcast
+- MessagePack serializado una vez por broadcast
+Y el tamaño tras permessage-deflate (zlib raw deflate con context takeover, como websockets).
+
+Uso:
+    python -m benchmarks.bench_ws_frames [--members 100] [--broadcasts 500]
+"""
+import argparse
+import json
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from app.services.websocket_manager import encode_frame, ENCODING_JSON, ENCODING_MSGPACK, msgpack
+
+def sample_frames(count: int):
+    """Mezcla realista de frames de chat y notificaciones"""
+    now = datetime.now(timezone.utc)
+    frames = []
+    for i in range(count):
+        if i % 5 == 4:
+            frame = {
+                "type": "notification",
+                "title": "Recordatorio de Tarea",
+                "message": f"Sacar la basura #{i}: Faltan 15 min",
+                "task_id": 1000 + i,
+                "severity": "warning",
+            }
+        else:
+            frame = {
+                "type": "chat",
+                "id": 50000 + i,
+                "user_id": 10 + i % 7,
+                "user_name": ["Mamá", "Papá", "Lucía", "Tomás", "Abuela", "Abuelo", "Tía Marta"][i % 7],
+                "content": f"Mensaje {i}: ¿quién pasa a buscar a los chicos hoy a las 18?",
+                "created_at": (now + timedelta(seconds=i)).isoformat(),
+            }
+        frame["seq"] = i + 1
+        frames.append(frame)
+    return frames
+
+def bench_cpu(label: str, frames, members: int, fn):
+    start = time.perf_counter()
+    for frame in frames:
+        fn(frame, members)
+    elapsed = time.perf_counter() - start
+    per_broadcast_us = elapsed / len(frames) * 1e6
+    print(f"  {label:<38} {per_broadcast_us:9.1f} µs/broadcast")
+    return per_broadcast_us
+
+def wire_bytes(payloads):
+    raw = sum(len(p) for p in payloads)
+    # permessage-deflate con context takeover: un compresor por conexión que se reutiliza
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    deflated = 0
+    for payload in payloads:
+        data = payload.encode("utf-8") if isinstance(payload, str) else payload
+        chunk = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        # El trailer 00 00 ff ff se elimina en el cable
+        deflated += len(chunk) - 4
+    return raw, deflated
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=100)
+    parser.add_argument("--broadcasts", type=int, default=500)
+    args = parser.parse_args()
+
+    frames = sample_frames(args.broadcasts)
+    print(f"Familia de {args.members} miembros, {args.broadcasts} broadcasts\n")
+    print("CPU de serialización:")
+
+    def per_connection_json(frame, members):
+        for _ in range(members):
+            json.dumps(frame, separators=(",", ":"), ensure_ascii=False)
+
+    def once_json(frame, members):
+        encode_frame(frame, ENCODING_JSON)
+
+    def once_msgpack(frame, members):
+        encode_frame(frame, ENCODING_MSGPACK)
+
+    bench_cpu("send_json por conexión (anterior)", frames, args.members, per_connection_json)
+    bench_cpu("JSON una vez por broadcast", frames, args.members, once_json)
+    if msgpack is not None:
+        bench_cpu("MessagePack una vez por broadcast", frames, args.members, once_msgpack)
+
+    print("\nBytes en el cable por miembro (promedio por frame):")
+    encodings = [ENCODING_JSON] + ([ENCODING_MSGPACK] if msgpack is not None else [])
+    for encoding in encodings:
+        payloads = [encode_frame(frame, encoding) for frame in frames]
+        raw, deflated = wire_bytes(payloads)
+        print(
+            f"  {encoding:<8} sin comprimir {raw / len(frames):7.1f} B"
+            f"   permessage-deflate {deflated / len(frames):7.1f} B"
+            f"   total familia/broadcast {deflated / len(frames) * args.members / 1024:7.1f} KiB"
+        )
+
+if __name__ == "__main__":
+    main()
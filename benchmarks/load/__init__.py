@@ -0,0 +1,10 @@
+"""
+Pruebas de carga de punta a punta de la API: siembra de datos sintéticos a escala
+configurable, cargas mixtas (lecturas de calendario, escrituras de eventos, chat por
+WebSocket y procesamiento de notificaciones) contra un servidor local y reporte de
+RPS, p50/p95/p99 y consultas SQL por ruta en JSON para comparar entre commits.
+
+Uso:
+    python -m benchmarks.load [--families 20] [--duration 30] [--concurrency 16] [--output resultados.json]
+    python -m benchmarks.load.compare base.json nuevo.json [--threshold 10]
+"""
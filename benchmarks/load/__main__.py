@@ -0,0 +1,203 @@
+"""
+Prueba de carga de punta a punta: siembra una base SQLite temporal, levanta uvicorn
+sobre ella (o usa --url con un servidor ya levantado sobre --database-url), ejecuta la
+mezcla de escenarios durante --duration segundos y guarda el resultado en JSON.
+
+Uso:
+    python -m benchmarks.load [--families 20] [--members 4] [--events 200] [--duration 30]
+                              [--concurrency 16] [--mix calendar_read=60,event_write=20,chat=15,notifications=5]
+                              [--output resultados.json] [--compare base.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+import httpx
+from sqlmodel import Session, create_engine
+
+from app.services.notification_scheduler import process_pending_notifications
+from app.services.query_profiler import instrument_engine, profiling
+
+from .compare import compare, print_comparison
+from .seed import Scale, seed
+from .workload import Stats, Workload, db_queries_delta
+
+DEFAULT_MIX = "calendar_read=60,event_write=20,chat=15,notifications=5"
+# /metrics exige token: con --url exportar el mismo METRICS_TOKEN que usa el servidor
+METRICS_TOKEN = os.getenv("METRICS_TOKEN") or secrets.token_hex(16)
+METRICS_HEADERS = {"Authorization": f"Bearer {METRICS_TOKEN}"}
+
+def parse_mix(value: str) -> List[Tuple[str, float]]:
+    mix = []
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if not hasattr(Workload, name.strip()):
+            raise argparse.ArgumentTypeError(f"Escenario desconocido: {name}")
+        mix.append((name.strip(), float(weight or 1)))
+    return mix
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(database_url: str, port: int) -> subprocess.Popen:
+    env = {**os.environ, "DATABASE_URL": database_url, "REQUEST_LOG_SAMPLE_RATE": "0", "METRICS_TOKEN": METRICS_TOKEN}
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL
+    )
+
+def wait_until_ready(base_url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/metrics", headers=METRICS_HEADERS, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"El servidor no respondió en {timeout:.0f}s")
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def notification_processor(database_url: str):
+    engine = create_engine(database_url, connect_args={"check_same_thread": False} if "sqlite" in database_url else {})
+    instrument_engine(engine)
+
+    def run() -> int:
+        with Session(engine) as session, profiling() as profile:
+            process_pending_notifications(session)
+        return profile.count
+    return run
+
+async def drive(args, workload: Workload) -> Tuple[float, str, str]:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=workload.base_url, limits=limits, timeout=30) as client:
+        before = (await client.get("/metrics", headers=METRICS_HEADERS)).text
+        began = time.perf_counter()
+        deadline = began + args.duration
+        await asyncio.gather(*(workload.worker(client, args.mix, deadline) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - began
+        after = (await client.get("/metrics", headers=METRICS_HEADERS)).text
+    return elapsed, before, after
+
+def print_report(result: dict):
+    print(f"\n{result['totals']['requests']} operaciones en {result['elapsed_s']:.1f}s "
+          f"({result['totals']['rps']:.1f} op/s, {result['totals']['errors']} errores)")
+    print(f"  {'escenario':28} {'n':>7} {'op/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errores':>8}")
+    for name, row in result["scenarios"].items():
+        print(f"  {name:28} {row['requests']:7d} {row['rps']:8.1f} {row['p50_ms']:9.2f} "
+              f"{row['p95_ms']:9.2f} {row['p99_ms']:9.2f} {row['errors']:8d}")
+    print("\n  consultas SQL por request")
+    for route, row in result["db_queries"].items():
+        print(f"  {route:48} {row['queries_per_request']:7.2f}  ({row['requests']} requests)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--families", type=int, default=20)
+    parser.add_argument("--members", type=int, default=4)
+    parser.add_argument("--events", type=int, default=200, help="Eventos por familia")
+    parser.add_argument("--tasks", type=int, default=50, help="Tareas por familia")
+    parser.add_argument("--messages", type=int, default=200, help="Mensajes de chat por familia")
+    parser.add_argument("--notifications", type=int, default=500, help="Notificaciones pendientes en total")
+    parser.add_argument("--duration", type=float, default=30, help="Segundos de carga")
+    parser.add_argument("--concurrency", type=int, default=16, help="Clientes simultáneos")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument("--url", help="Servidor ya levantado (por defecto se levanta uno local)")
+    parser.add_argument("--database-url", help="Base a sembrar (la misma que usa el servidor de --url)")
+    parser.add_argument("--seed", type=int, default=41)
+    parser.add_argument("--output", help="Archivo JSON de resultados")
+    parser.add_argument("--compare", help="Resultado JSON base contra el que comparar")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Regresión tolerada en %% (con --compare)")
+    args = parser.parse_args()
+
+    if args.url and not args.database_url:
+        parser.error("--url requiere --database-url para sembrar los datos")
+    tmpdir = tempfile.TemporaryDirectory(prefix="familiagenda-load-")
+    database_url = args.database_url or f"sqlite:///{os.path.join(tmpdir.name, 'load.db')}"
+
+    scale = Scale(args.families, args.members, args.events, args.tasks, args.messages, args.notifications)
+    began = time.perf_counter()
+    seeded = seed(database_url, scale, timedelta(seconds=args.duration), args.seed)
+    print(f"🌱 {args.families} familias, {len(seeded.users)} usuarios, {args.families * args.events} eventos, "
+          f"{args.families * args.tasks} tareas, {args.families * args.messages} mensajes, "
+          f"{args.notifications} notificaciones ({time.perf_counter() - began:.1f}s)")
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = start_server(database_url, port)
+    try:
+        wait_until_ready(base_url)
+        stats = Stats()
+        workload = Workload(
+            base_url, seeded.users, stats, random.Random(args.seed),
+            notification_processor(database_url)
+        )
+        print(f"🚀 {args.concurrency} clientes durante {args.duration:.0f}s contra {base_url}")
+        elapsed, before, after = asyncio.run(drive(args, workload))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    scenarios = stats.summary(elapsed)
+    total_requests = sum(row["requests"] for row in scenarios.values())
+    result = {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "scale": vars(scale), "duration": args.duration, "concurrency": args.concurrency,
+            "mix": dict(args.mix), "seed": args.seed, "database": database_url.split(":", 1)[0],
+        },
+        "elapsed_s": round(elapsed, 3),
+        "totals": {
+            "requests": total_requests,
+            "errors": sum(row["errors"] for row in scenarios.values()) + stats.errors.get("transport", 0),
+            "rps": round(total_requests / elapsed, 2),
+        },
+        "scenarios": scenarios,
+        "db_queries": db_queries_delta(before, after),
+    }
+    if workload.notification_queries:
+        result["db_queries"]["job process_pending_notifications"] = {
+            "requests": len(workload.notification_queries),
+            "queries_per_request": round(sum(workload.notification_queries) / len(workload.notification_queries), 2),
+        }
+    print_report(result)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Resultado guardado en {args.output}")
+    tmpdir.cleanup()
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, result, args.threshold)
+        print_comparison(baseline, result, regressions)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
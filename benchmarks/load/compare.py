@@ -0,0 +1,76 @@
+"""
+Comparación de dos resultados de la prueba de carga (por ejemplo, main contra una
+rama). Se marca como regresión una caída de op/s o una suba de p95/p99 por encima del
+umbral, y cualquier aumento de consultas SQL por request.
+
+Uso:
+    python -m benchmarks.load.compare base.json nuevo.json [--threshold 10]
+"""
+import argparse
+import json
+import sys
+from typing import List
+
+# Métrica -> True si más alto es mejor
+LATENCY_METRICS = {"rps": True, "p95_ms": False, "p99_ms": False}
+
+def change_pct(before: float, after: float) -> float:
+    return (after - before) / before * 100 if before else 0.0
+
+def compare(baseline: dict, current: dict, threshold: float) -> List[str]:
+    """Descripción de cada regresión encontrada (lista vacía si no hay)"""
+    regressions = []
+    for name, row in current["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if not base:
+            continue
+        for metric, higher_is_better in LATENCY_METRICS.items():
+            change = change_pct(base[metric], row[metric])
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append(f"{name} {metric}: {base[metric]} → {row[metric]} ({change:+.1f}%)")
+    for route, row in current["db_queries"].items():
+        base = baseline["db_queries"].get(route)
+        if base and row["queries_per_request"] > base["queries_per_request"]:
+            regressions.append(
+                f"{route} consultas/request: {base['queries_per_request']} → {row['queries_per_request']}"
+            )
+    return regressions
+
+def print_comparison(baseline: dict, current: dict, regressions: List[str]):
+    print(f"\n📊 {baseline.get('commit') or 'base'} → {current.get('commit') or 'actual'}")
+    if baseline.get("config") != current.get("config"):
+        print("  ⚠️  Las configuraciones difieren: la comparación es orientativa")
+    print(f"  {'escenario':28} {'op/s':>16} {'p95 ms':>20} {'p99 ms':>20}")
+    for name, row in current["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if not base:
+            continue
+        cells = [
+            f"{base[m]:.1f}→{row[m]:.1f} {change_pct(base[m], row[m]):+4.0f}%"
+            for m in ("rps", "p95_ms", "p99_ms")
+        ]
+        print(f"  {name:28} {cells[0]:>16} {cells[1]:>20} {cells[2]:>20}")
+    if regressions:
+        print("\n❌ Regresiones:")
+        for regression in regressions:
+            print(f"  - {regression}")
+    else:
+        print("\n✅ Sin regresiones")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Regresión tolerada en %%")
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+    regressions = compare(baseline, current, args.threshold)
+    print_comparison(baseline, current, regressions)
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Siembra de datos sintéticos para las pruebas de carga. Inserta en bloque (Core, sin
+pasar por el ORM) familias, usuarios, membresías, eventos, tareas, mensajes de chat y
+notificaciones pendientes, y devuelve un token de sesión por usuario.
+
+Las notificaciones quedan programadas a lo largo de la ventana de la prueba, así cada
+pasada del procesador encuentra un lote nuevo de pendientes.
+"""
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import List
+
+from sqlalchemy import insert
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.models import ChatMessage, Event, Family, FamilyMember, NotificationLog, Task, User
+from app.security import create_access_token, get_password_hash
+
+@dataclass
+class Scale:
+    families: int = 20
+    members: int = 4  # Usuarios por familia
+    events: int = 200  # Por familia
+    tasks: int = 50  # Por familia
+    messages: int = 200  # Por familia
+    notifications: int = 500  # En total, repartidas en la ventana de la prueba
+
+@dataclass
+class SeededUser:
+    user_id: int
+    family_id: int
+    token: str
+
+@dataclass
+class Seeded:
+    users: List[SeededUser] = field(default_factory=list)
+    window_start: datetime = field(default_factory=datetime.utcnow)
+
+def seed(database_url: str, scale: Scale, window: timedelta, rng_seed: int = 41) -> Seeded:
+    """Crea el esquema en `database_url` y lo llena según `scale`"""
+    rng = random.Random(rng_seed)
+    engine = create_engine(database_url)
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+    # Un solo hash: bcrypt por usuario dominaría el tiempo de siembra
+    hashed_password = get_password_hash("password123")
+    now = datetime.utcnow()
+    seeded = Seeded(window_start=now)
+
+    with Session(engine) as session:
+        session.execute(insert(Family), [
+            {"id": f, "name": f"Familia {f}", "invitation_code": f"LOAD{f:06d}", "created_at": now}
+            for f in range(1, scale.families + 1)
+        ])
+        users, members = [], []
+        for f in range(1, scale.families + 1):
+            for m in range(scale.members):
+                user_id = (f - 1) * scale.members + m + 1
+                users.append({
+                    "id": user_id, "email": f"load{user_id}@example.com", "full_name": f"Usuario {user_id}",
+                    "hashed_password": hashed_password, "color": "#3B82F6", "created_at": now
+                })
+                members.append({
+                    "family_id": f, "user_id": user_id, "role": "admin" if m == 0 else "member",
+                    "joined_at": now, "updated_at": now
+                })
+                seeded.users.append(SeededUser(user_id, f, create_access_token({"sub": str(user_id)})))
+        session.execute(insert(User), users)
+        session.execute(insert(FamilyMember), members)
+
+        events, tasks, messages = [], [], []
+        for f in range(1, scale.families + 1):
+            owners = range((f - 1) * scale.members + 1, f * scale.members + 1)
+            for i in range(scale.events):
+                start = now + timedelta(minutes=30 * rng.randrange(-24 * 2 * 30, 24 * 2 * 60))
+                recurring = rng.random() < 0.1
+                events.append({
+                    "title": f"Evento {i}", "start_time": start,
+                    "end_time": start + timedelta(minutes=rng.choice([30, 60, 90, 120])),
+                    "category": rng.choice(["home", "school", "work", "health"]), "priority": "normal",
+                    "visibility": "family", "is_recurring": recurring,
+                    "recurrence_pattern": "weekly:mon,wed:18:00" if recurring else None,
+                    "notification_config": '{"pre": [15], "post": false}', "status": "pending",
+                    "owner_id": rng.choice(owners), "family_id": f, "updated_at": now
+                })
+            for i in range(scale.tasks):
+                tasks.append({
+                    "title": f"Tarea {i}", "due_date": now + timedelta(days=rng.randrange(1, 30)),
+                    "priority": "normal", "status": "pending", "family_id": f,
+                    "created_by_id": rng.choice(owners), "created_at": now, "updated_at": now
+                })
+            for i in range(scale.messages):
+                messages.append({
+                    "family_id": f, "user_id": rng.choice(owners), "content": f"Mensaje {i}",
+                    "created_at": now - timedelta(minutes=scale.messages - i)
+                })
+        session.execute(insert(Event), events)
+        session.execute(insert(Task), tasks)
+        session.execute(insert(ChatMessage), messages)
+
+        if scale.notifications and events:
+            step = window / scale.notifications
+            session.execute(insert(NotificationLog), [
+                {
+                    "event_id": (event_id := rng.randrange(1, len(events) + 1)),
+                    "user_id": events[event_id - 1]["owner_id"],
+                    "title": "Recordatorio", "body": "Comienza pronto",
+                    "scheduled_for": now + step * i, "status": "pending",
+                    "notification_type": "pre_event", "created_at": now
+                }
+                for i in range(scale.notifications)
+            ])
+        session.commit()
+
+    engine.dispose()
+    return seeded
@@ -0,0 +1,190 @@
+"""
+Cargas de trabajo de la prueba de carga. Cada escenario es una corrutina que hace una
+operación completa contra el servidor y registra su latencia en Stats; los workers
+eligen el escenario al azar según los pesos de la mezcla.
+
+- calendar_read: GET /api/events/ con una ventana de un mes (expande recurrentes) y,
+  la mitad de las veces, con el ETag de la lectura anterior (304 esperado)
+- event_write: alta de un evento y edición inmediata (POST + PATCH)
+- chat: conexión WebSocket al chat familiar, envío de un mensaje y espera del eco
+- notifications: una pasada de process_pending_notifications en este proceso, sobre la
+  misma base que el servidor (es un job del scheduler, no tiene endpoint)
+"""
+import asyncio
+import json
+import random
+import re
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from .seed import SeededUser
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """Percentil por rango más cercano (muestras ya ordenadas)"""
+    if not samples:
+        return 0.0
+    index = max(0, min(len(samples) - 1, int(round(fraction * len(samples) + 0.5)) - 1))
+    return samples[index]
+
+class Stats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name: str, duration: float, status: Optional[int] = None, ok: bool = True):
+        self.latencies[name].append(duration)
+        if status is not None:
+            self.statuses[name][status] += 1
+        if not ok:
+            self.errors[name] += 1
+
+    def summary(self, elapsed: float) -> Dict[str, dict]:
+        result = {}
+        for name, samples in sorted(self.latencies.items()):
+            ordered = sorted(samples)
+            result[name] = {
+                "requests": len(ordered),
+                "errors": self.errors.get(name, 0),
+                "rps": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+                "p50_ms": round(percentile(ordered, 0.50) * 1000, 2),
+                "p95_ms": round(percentile(ordered, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(ordered, 0.99) * 1000, 2),
+                "max_ms": round(ordered[-1] * 1000, 2),
+                "statuses": {str(code): count for code, count in sorted(self.statuses[name].items())},
+            }
+        return result
+
+class Workload:
+    def __init__(self, base_url: str, users: List[SeededUser], stats: Stats, rng: random.Random,
+                 process_notifications: Optional[Callable[[], int]] = None):
+        self.base_url = base_url.rstrip("/")
+        self.ws_url = re.sub(r"^http", "ws", self.base_url)
+        self.users = users
+        self.stats = stats
+        self.rng = rng
+        self.process_notifications = process_notifications
+        self.etags: Dict[int, str] = {}
+        self.notification_lock = asyncio.Lock()
+        self.notifications_processed = 0
+        self.notification_queries: List[int] = []
+
+    def headers(self, user: SeededUser) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {user.token}"}
+
+    async def calendar_read(self, client: httpx.AsyncClient, user: SeededUser):
+        now = datetime.utcnow()
+        headers = self.headers(user)
+        conditional = self.rng.random() < 0.5 and user.user_id in self.etags
+        if conditional:
+            headers["If-None-Match"] = self.etags[user.user_id]
+        # Ventana fija por día: dos lecturas seguidas del mismo usuario comparten ETag
+        start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        began = time.perf_counter()
+        response = await client.get("/api/events/", headers=headers, params={
+            "start": start.isoformat(), "end": (start + timedelta(days=30)).isoformat()
+        })
+        duration = time.perf_counter() - began
+        if "etag" in response.headers:
+            self.etags[user.user_id] = response.headers["etag"]
+        name = "calendar_read_conditional" if conditional else "calendar_read"
+        self.stats.record(name, duration, response.status_code, response.status_code in (200, 304))
+
+    async def event_write(self, client: httpx.AsyncClient, user: SeededUser):
+        start = datetime.utcnow() + timedelta(hours=self.rng.randrange(1, 24 * 30))
+        began = time.perf_counter()
+        response = await client.post("/api/events/", headers=self.headers(user), json={
+            "title": "Carga", "start_time": start.isoformat(),
+            "end_time": (start + timedelta(hours=1)).isoformat(), "family_id": user.family_id
+        })
+        self.stats.record("event_create", time.perf_counter() - began, response.status_code, response.status_code == 201)
+        if response.status_code != 201:
+            return
+        began = time.perf_counter()
+        response = await client.patch(
+            f"/api/events/{response.json()['id']}", headers=self.headers(user), json={"title": "Carga editada"}
+        )
+        self.stats.record("event_update", time.perf_counter() - began, response.status_code, response.status_code == 200)
+
+    async def chat(self, client: httpx.AsyncClient, user: SeededUser):
+        import websockets
+
+        url = f"{self.ws_url}/api/chat/ws/{user.family_id}/{user.token}"
+        content = f"carga {self.rng.random()}"
+        began = time.perf_counter()
+        ok = False
+        try:
+            async with websockets.connect(url, open_timeout=10) as websocket:
+                connected = time.perf_counter()
+                self.stats.record("chat_connect", connected - began)
+                await websocket.send(json.dumps({"content": content}))
+                sent = time.perf_counter()
+                # Se descartan resync/presencia hasta recibir el eco del propio mensaje
+                while True:
+                    frame = json.loads(await asyncio.wait_for(websocket.recv(), timeout=10))
+                    if frame.get("type") == "chat" and frame.get("content") == content:
+                        ok = True
+                        break
+                self.stats.record("chat_roundtrip", time.perf_counter() - sent)
+        except Exception:
+            pass
+        if not ok:
+            self.stats.record("chat_roundtrip", time.perf_counter() - began, ok=False)
+
+    async def notifications(self, client: httpx.AsyncClient, user: SeededUser):
+        if self.process_notifications is None:
+            return
+        # Como el scheduler: nunca dos pasadas a la vez
+        async with self.notification_lock:
+            began = time.perf_counter()
+            try:
+                queries = await asyncio.to_thread(self.process_notifications)
+                ok = True
+            except Exception:
+                queries, ok = 0, False
+            self.stats.record("notifications_pass", time.perf_counter() - began, ok=ok)
+            self.notification_queries.append(queries)
+
+    async def worker(self, client: httpx.AsyncClient, mix: List[Tuple[str, float]], deadline: float):
+        names = [name for name, _ in mix]
+        weights = [weight for _, weight in mix]
+        while time.perf_counter() < deadline:
+            scenario = getattr(self, self.rng.choices(names, weights)[0])
+            try:
+                await scenario(client, self.rng.choice(self.users))
+            except httpx.HTTPError:
+                self.stats.errors["transport"] += 1
+
+# --- Métricas del servidor (/metrics) ---
+
+METRIC_LINE = re.compile(r'^(?P<name>[a-z_]+)\{method="(?P<method>[^"]*)",route="(?P<route>[^"]*)"\} (?P<value>\S+)$')
+
+def db_queries_by_route(metrics_text: str) -> Dict[Tuple[str, str], Tuple[float, float]]:
+    """(método, ruta) -> (suma de consultas, requests) del histograma http_request_db_queries"""
+    totals: Dict[Tuple[str, str], List[float]] = defaultdict(lambda: [0.0, 0.0])
+    for line in metrics_text.splitlines():
+        match = METRIC_LINE.match(line)
+        if not match or match["name"] not in ("http_request_db_queries_sum", "http_request_db_queries_count"):
+            continue
+        index = 0 if match["name"].endswith("_sum") else 1
+        totals[(match["method"], match["route"])][index] = float(match["value"])
+    return {key: (value[0], value[1]) for key, value in totals.items()}
+
+def db_queries_delta(before: str, after: str) -> Dict[str, dict]:
+    """Consultas por request de cada ruta durante la prueba (diferencia entre dos lecturas de /metrics)"""
+    start, end = db_queries_by_route(before), db_queries_by_route(after)
+    result = {}
+    for key, (queries, requests) in sorted(end.items()):
+        previous_queries, previous_requests = start.get(key, (0.0, 0.0))
+        count = requests - previous_requests
+        if count <= 0 or key[1] == "/metrics":
+            continue
+        result[f"{key[0]} {key[1]}"] = {
+            "requests": int(count),
+            "queries_per_request": round((queries - previous_queries) / count, 2),
+        }
+    return result
@@ -5,6 +5,11 @@ from sqlmodel.pool import StaticPool
 from app.main import app
 from app.database import get_session
 from app.models import User, Family, FamilyMember, Event
+from app.services import event_changes
+from app.services.query_profiler import instrument_engine
+
+# Presupuesto de consultas SQL por endpoint (testing/query_budget.py)
+pytest_plugins = ["testing.query_budget"]
 
 @pytest.fixture(name="session")
 def session_fixture():
@@ -15,6 +20,9 @@ def session_fixture():
         poolclass=StaticPool
     )
     SQLModel.metadata.create_all(engine)
+    instrument_engine(engine)
+    # Los índices en memoria se construyen por family_id, que se repite en cada BD nueva
+    event_changes.reset()
     with Session(engine) as session:
         yield session
 
@@ -0,0 +1,73 @@
+"""
+Plugin de pytest: presupuesto de consultas SQL por endpoint.
+Cada request que hace un test a través del TestClient se compara con QUERY_BUDGETS
+("MÉTODO /plantilla/de/ruta": máximo de consultas). Si alguna lo supera el test falla
+con el detalle de las sentencias. Un test puede fijar su propio límite con
+@pytest.mark.query_budget("GET /api/events/", 3).
+"""
+from typing import Dict, List
+
+import pytest
+
+from app.services.query_profiler import QueryProfile, request_observers
+
+# Valores actuales: bajar el número al optimizar un endpoint, nunca subirlo sin motivo
+QUERY_BUDGETS: Dict[str, int] = {
+    "POST /api/auth/register": 11,
+    "POST /api/auth/token": 1,
+    "GET /api/auth/me": 1,
+    "PATCH /api/auth/me": 5,
+    "GET /api/auth/familia/miembros": 2,
+    "GET /api/events/": 4,
+    "POST /api/events/": 6,
+    "GET /api/events/{event_id}": 1,
+    "PATCH /api/events/{event_id}": 7,
+    "DELETE /api/events/{event_id}": 10,
+    "POST /api/events/{event_id}/complete": 9,
+    "GET /api/events/conflicts": 3,
+    "GET /api/events/metrics": 3,
+    "GET /api/events/export.ics": 4,
+    "GET /api/events/feed/{token}.ics": 3,
+    "POST /api/events/import": 6,
+    "GET /api/tasks/": 2,
+    "POST /api/tasks/": 4,
+    "DELETE /api/tasks/{task_id}": 5,
+    "GET /api/chat/history/{family_id}": 1,
+    "GET /api/availability/": 4,
+    "GET /api/sync/": 8,
+}
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "query_budget(route, max_queries): máximo de consultas SQL de una ruta en este test"
+    )
+
+def _format(key: str, profile: QueryProfile, budget: int) -> str:
+    repeated = sorted(profile.statements.items(), key=lambda item: -item[1])[:5]
+    lines = [f"{key}: {profile.count} consultas (presupuesto {budget})"]
+    lines += [f"    {repeats}x {' '.join(statement.split())[:150]}" for statement, repeats in repeated]
+    return "\n".join(lines)
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_call(item):
+    budgets = dict(QUERY_BUDGETS)
+    # iter_markers devuelve primero el más cercano al test: ese es el que manda
+    for marker in reversed(list(item.iter_markers("query_budget"))):
+        route, max_queries = marker.args
+        budgets[route] = max_queries
+
+    violations: List[str] = []
+
+    def observe(method: str, route: str, profile: QueryProfile):
+        key = f"{method} {route}"
+        if key in budgets and profile.count > budgets[key]:
+            violations.append(_format(key, profile, budgets[key]))
+
+    request_observers.append(observe)
+    try:
+        result = yield
+    finally:
+        request_observers.remove(observe)
+    if violations:
+        pytest.fail("Presupuesto de consultas SQL superado:\n" + "\n".join(violations), pytrace=False)
+    return result
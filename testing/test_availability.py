@@ -0,0 +1,88 @@
+import random
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+from app.models import User
+from app.services.availability import SLOT, availability_cache, interval_bits, zero_runs
+from testing.test_events import get_auth_header
+
+def test_zero_runs_matches_naive_scan():
+    rng = random.Random(11)
+    for _ in range(200):
+        size = rng.randrange(1, 300)
+        bits = rng.getrandbits(size) & rng.getrandbits(size)
+        expected = []
+        run_start = None
+        for i in range(size + 1):
+            free = i < size and not (bits >> i) & 1
+            if free and run_start is None:
+                run_start = i
+            elif not free and run_start is not None:
+                expected.append((run_start, i))
+                run_start = None
+        assert zero_runs(bits, size) == expected
+        assert zero_runs(bits, size, min_slots=3) == [r for r in expected if r[1] - r[0] >= 3]
+
+def test_partial_slots_count_as_busy():
+    origin = datetime(2025, 3, 3)
+    bits = interval_bits(origin + timedelta(minutes=10), origin + timedelta(minutes=31), origin, 10)
+    assert bits == 0b111
+
+def join_family(client: TestClient, session: Session, email: str, family_name: str):
+    response = client.post(
+        "/api/auth/register",
+        json={"email": email, "password": "password123", "full_name": email, "family_name": family_name}
+    )
+    assert response.status_code == 200, response.json()
+    user = session.exec(select(User).where(User.email == email)).first()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}, user.id
+
+@patch("app.routers.events.schedule_notifications_for_event")
+def test_common_free_windows_and_invalidation(mock_schedule, client: TestClient, session: Session):
+    mom_headers, family_id = get_auth_header(client, session, "mom@availability.com")
+    kid_headers, kid_id = join_family(client, session, "kid@availability.com", "Event Family")
+    
+    day = datetime(2025, 3, 5)
+    def create(headers, title, start_hour, end_hour, **extra):
+        response = client.post("/api/events/", headers=headers, json={
+            "title": title,
+            "start_time": (day + timedelta(hours=start_hour)).isoformat(),
+            "end_time": (day + timedelta(hours=end_hour)).isoformat(),
+            "family_id": family_id,
+            **extra
+        })
+        assert response.status_code == 201
+        return response.json()
+    
+    create(mom_headers, "Trabajo", 9, 13)
+    create(kid_headers, "Escuela", 8, 12.5)
+    # Evento de la madre asignado al hijo: ocupa a ambos
+    chore = create(mom_headers, "Dentista", 15, 16, assigned_to_id=kid_id)
+    
+    params = {"start": (day + timedelta(hours=8)).isoformat(), "end": (day + timedelta(hours=18)).isoformat()}
+    response = client.get("/api/availability/", headers=mom_headers, params=params)
+    assert response.status_code == 200
+    windows = [(w["start"], w["end"]) for w in response.json()["windows"]]
+    assert windows == [("2025-03-05T13:00:00", "2025-03-05T15:00:00"), ("2025-03-05T16:00:00", "2025-03-05T18:00:00")]
+    
+    any_free = client.get("/api/availability/", headers=mom_headers, params={**params, "mode": "any"}).json()
+    assert [(w["start"], w["end"]) for w in any_free["windows"]] == [
+        ("2025-03-05T08:00:00", "2025-03-05T09:00:00"),
+        ("2025-03-05T12:30:00", "2025-03-05T15:00:00"),
+        ("2025-03-05T16:00:00", "2025-03-05T18:00:00"),
+    ]
+    assert availability_cache.weeks
+    
+    # Mover el dentista invalida la caché de los dos usuarios afectados
+    client.patch(f"/api/events/{chore['id']}", headers=mom_headers, json={
+        "start_time": (day + timedelta(hours=17)).isoformat(),
+        "end_time": (day + timedelta(hours=18)).isoformat()
+    })
+    response = client.get("/api/availability/", headers=mom_headers, params={**params, "min_minutes": 180})
+    assert [(w["start"], w["end"]) for w in response.json()["windows"]] == [
+        ("2025-03-05T13:00:00", "2025-03-05T17:00:00")
+    ]
+    
+    response = client.get("/api/availability/", headers=mom_headers, params={**params, "user_ids": [999]})
+    assert response.status_code == 400
@@ -1,3 +1,8 @@
+import asyncio
+import json
+from unittest.mock import patch
+
+import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import select, Session
 from app.models import User, FamilyMember, ChatMessage
@@ -53,3 +58,138 @@ def test_get_chat_history(client: TestClient, session: Session):
             break
     
     assert found_message, "Message 'Hello History' not found in chat history"
+
+def test_replay_log_gap_and_fallback():
+    from app.services.websocket_manager import ConnectionManager
+    
+    mgr = ConnectionManager(replay_log_size=3)
+    for i in range(5):
+        mgr.stamp({"type": "chat", "content": f"m{i}"}, family_id=7)
+    
+    assert mgr.current_seq(7) == 5
+    # El hueco está dentro del log: solo se reenvía lo que falta
+    assert [f["seq"] for f in mgr.missed_since(7, 3)] == [4, 5]
+    assert mgr.missed_since(7, 5) == []
+    # El hueco es más viejo que el log o el seq es de otro proceso: hay que ir a la BD
+    assert mgr.missed_since(7, 1) is None
+    assert mgr.missed_since(7, 99) is None
+
+def test_websocket_resume_replays_missed_frames(client: TestClient, session: Session):
+    res = client.post(
+        "/api/auth/register",
+        json={
+            "email": "chat_ws@example.com",
+            "password": "pass",
+            "full_name": "WS User",
+            "family_name": "WS Family"
+        }
+    )
+    token = res.json()["access_token"]
+    user = session.exec(select(User).where(User.email == "chat_ws@example.com")).first()
+    family_id = session.exec(select(FamilyMember).where(FamilyMember.user_id == user.id)).first().family_id
+    
+    with client.websocket_connect(f"/api/chat/ws/{family_id}/{token}") as ws:
+        ws.send_text('{"content": "primero"}')
+        first = ws.receive_json()
+        ws.send_text('{"content": "segundo"}')
+        second = ws.receive_json()
+    
+    assert second["seq"] == first["seq"] + 1
+    
+    # Reconectar indicando el último seq visto: solo llega el frame perdido
+    with client.websocket_connect(f"/api/chat/ws/{family_id}/{token}?last_seq={first['seq']}") as ws:
+        replayed = ws.receive_json()
+        assert replayed["seq"] == second["seq"]
+        assert replayed["content"] == "segundo"
+    
+    # Un seq desconocido (p.ej. tras reiniciar el servidor) cae al historial de la BD
+    with client.websocket_connect(f"/api/chat/ws/{family_id}/{token}?last_seq=999999") as ws:
+        resync = ws.receive_json()
+        assert resync["type"] == "resync"
+        assert [m["content"] for m in resync["messages"]][-2:] == ["primero", "segundo"]
+
+def test_websocket_msgpack_subprotocol(client: TestClient, session: Session):
+    import msgpack
+    
+    res = client.post(
+        "/api/auth/register",
+        json={
+            "email": "chat_msgpack@example.com",
+            "password": "pass",
+            "full_name": "Msgpack User",
+            "family_name": "Msgpack Family"
+        }
+    )
+    token = res.json()["access_token"]
+    user = session.exec(select(User).where(User.email == "chat_msgpack@example.com")).first()
+    family_id = session.exec(select(FamilyMember).where(FamilyMember.user_id == user.id)).first().family_id
+    
+    with client.websocket_connect(
+        f"/api/chat/ws/{family_id}/{token}",
+        subprotocols=["familiagenda.msgpack", "familiagenda.json"]
+    ) as ws:
+        assert ws.accepted_subprotocol == "familiagenda.msgpack"
+        ws.send_bytes(msgpack.packb({"content": "binario"}))
+        frame = msgpack.unpackb(ws.receive_bytes())
+    
+    assert frame["type"] == "chat"
+    assert frame["content"] == "binario"
+    assert "seq" in frame
+
+def register_ws_user(client: TestClient, session: Session, email: str):
+    res = client.post(
+        "/api/auth/register",
+        json={"email": email, "password": "pass", "full_name": "WS User", "family_name": "WS Family"}
+    )
+    user = session.exec(select(User).where(User.email == email)).first()
+    family_id = session.exec(select(FamilyMember).where(FamilyMember.user_id == user.id)).first().family_id
+    return res.json()["access_token"], user.id, family_id
+
+def test_live_frames_wait_for_replay():
+    from app.services.websocket_manager import ConnectionManager
+    from testing.test_presence import FakeWebSocket
+
+    mgr = ConnectionManager()
+    ws = FakeWebSocket()
+    mgr.register(ws, 7, "json", 1)
+    mgr.hold(ws)
+
+    async def scenario():
+        # Llega un frame en vivo mientras se reenvía lo perdido
+        await mgr.broadcast({"type": "chat", "content": "en vivo"}, 7)
+        assert ws.sent == []
+        await mgr.send(ws, {"type": "chat", "content": "replay"})
+        await mgr.release(ws)
+        await mgr.broadcast({"type": "chat", "content": "después"}, 7)
+
+    asyncio.run(scenario())
+    assert [json.loads(frame)["content"] for frame in ws.sent] == ["replay", "en vivo", "después"]
+    assert ws not in mgr.held
+
+def test_websocket_invalid_last_seq_resyncs(client: TestClient, session: Session):
+    token, _, family_id = register_ws_user(client, session, "chat_badseq@example.com")
+
+    for bad in ("abc", "-5"):
+        with client.websocket_connect(f"/api/chat/ws/{family_id}/{token}?last_seq={bad}") as ws:
+            assert ws.receive_json()["type"] == "resync"
+
+    with client.websocket_connect(f"/api/chat/ws/{family_id}/{token}") as ws:
+        ws.send_text('{"type": "resume", "last_seq": "nope"}')
+        assert ws.receive_json()["type"] == "resync"
+        ws.send_text("no es json")
+        assert ws.receive_json() == {"type": "error", "detail": "Frame inválido"}
+
+def test_websocket_cleanup_after_server_error(client: TestClient, session: Session):
+    from app.services.presence import presence
+    from app.services.websocket_manager import manager
+
+    token, user_id, family_id = register_ws_user(client, session, "chat_error@example.com")
+
+    with patch("app.routers.chat.ChatMessage", side_effect=RuntimeError("BD caída")):
+        with pytest.raises(RuntimeError):
+            with client.websocket_connect(f"/api/chat/ws/{family_id}/{token}") as ws:
+                ws.send_text('{"content": "hola"}')
+                ws.receive_json()
+
+    assert user_id not in manager.connected_users(family_id)
+    assert user_id not in presence.online_users(family_id)
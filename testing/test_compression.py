@@ -0,0 +1,98 @@
+import gzip
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.middleware import CompressionMiddleware
+from app.services import telemetry
+from app.services.compression import choose_encoding, precompressed
+from app.services.ics import feed_cache
+from testing.test_events import get_auth_header
+from testing.test_ics import create
+
+@pytest.fixture(autouse=True)
+def clear_precompressed():
+    precompressed.clear()
+    yield
+    precompressed.clear()
+
+def test_choose_encoding_honours_q_values():
+    assert choose_encoding(None) is None
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0, identity") is None
+    assert choose_encoding("*;q=0.5") is not None
+    assert choose_encoding("br;q=1, gzip;q=0.8", supported=("br", "gzip")) == "br"
+    assert choose_encoding("br;q=0.5, gzip", supported=("br", "gzip")) == "gzip"
+
+@patch("app.routers.events.schedule_notifications_for_event")
+def test_large_json_is_compressed_and_small_is_not(mock_schedule, client: TestClient, session: Session):
+    headers, family_id = get_auth_header(client, session, "gzip@example.com")
+    start = datetime(2030, 1, 1, 9, 0)
+    for i in range(20):
+        create(client, headers, family_id, f"Evento {i}", start + timedelta(days=i))
+
+    plain = client.get("/api/events/", headers={**headers, "Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+
+    compressed = client.get("/api/events/", headers={**headers, "Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in compressed.headers["vary"]
+    assert int(compressed.headers["content-length"]) < len(plain.content)
+    assert compressed.json() == plain.json()
+
+    small = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+@patch("app.routers.events.schedule_notifications_for_event")
+def test_ics_feed_is_served_precompressed_by_etag(mock_schedule, client: TestClient, session: Session):
+    headers, family_id = get_auth_header(client, session, "feed-gzip@example.com")
+    start = datetime(2030, 2, 1, 9, 0)
+    for i in range(30):
+        create(client, headers, family_id, f"Clase {i}", start + timedelta(days=i))
+    path = client.post("/api/events/feed-token", headers=headers, json={"family_id": family_id}).json()["path"]
+
+    hits = telemetry.http_precompressed_hits.get(("gzip",))
+    first = client.get(path, headers={"Accept-Encoding": "gzip"})
+    # El acierto se sirve antes de generar el feed: ni consulta de eventos ni caché sin comprimir
+    feed_cache.clear()
+    with patch("app.routers.events.iter_calendar", side_effect=AssertionError("feed regenerado")):
+        second = client.get(path, headers={"Accept-Encoding": "gzip"})
+    assert first.headers["content-encoding"] == second.headers["content-encoding"] == "gzip"
+    assert second.headers["vary"] == "Accept-Encoding"
+    assert first.text == second.text and "SUMMARY:Clase 29" in first.text
+    assert telemetry.http_precompressed_hits.get(("gzip",)) == hits + 1
+
+    # El ETag de la representación comprimida es débil y sigue validando
+    etag = second.headers["etag"]
+    assert etag.startswith("W/")
+    assert client.get(path, headers={"Accept-Encoding": "gzip", "If-None-Match": etag}).status_code == 304
+
+def test_streaming_is_flushed_per_chunk_and_sse_is_skipped():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=10)
+
+    @app.get("/ndjson")
+    def ndjson():
+        return StreamingResponse((f'{{"line": {i}}}\n' for i in range(100)), media_type="application/x-ndjson")
+
+    @app.get("/sse")
+    def sse():
+        return StreamingResponse(iter(["data: uno\n\n"] * 50), media_type="text/event-stream")
+
+    @app.get("/encoded")
+    def encoded():
+        return PlainTextResponse(gzip.compress(b"x" * 100), headers={"Content-Encoding": "gzip"})
+
+    client = TestClient(app)
+    streamed = client.get("/ndjson", headers={"Accept-Encoding": "gzip"})
+    assert streamed.headers["content-encoding"] == "gzip"
+    assert "content-length" not in streamed.headers
+    assert streamed.text.splitlines()[-1] == '{"line": 99}'
+
+    assert "content-encoding" not in client.get("/sse", headers={"Accept-Encoding": "gzip"}).headers
+    assert client.get("/encoded", headers={"Accept-Encoding": "gzip"}).text == "x" * 100
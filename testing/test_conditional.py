@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event as sa_event
+from sqlmodel import Session
+
+from app.models import ChatMessage
+from testing.test_events import get_auth_header
+
+def create_event(client, headers, family_id, title="Evento"):
+    start = datetime(2030, 5, 1, 10, 0)
+    response = client.post("/api/events/", headers=headers, json={
+        "title": title,
+        "start_time": start.isoformat(),
+        "end_time": (start + timedelta(hours=1)).isoformat(),
+        "family_id": family_id,
+    })
+    assert response.status_code == 201, response.text
+    return response.json()
+
+def test_events_etag_and_304_without_queries(client, session: Session):
+    headers, family_id = get_auth_header(client, session, "etag@example.com")
+    create_event(client, headers, family_id)
+
+    first = client.get("/api/events/", headers=headers)
+    etag = first.headers["etag"]
+    assert etag.startswith('W/"')
+
+    queries = []
+    listener = lambda *args: queries.append(args[2])
+    sa_event.listen(session.get_bind(), "before_cursor_execute", listener)
+    try:
+        cached = client.get("/api/events/", headers={**headers, "If-None-Match": etag})
+    finally:
+        sa_event.remove(session.get_bind(), "before_cursor_execute", listener)
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert queries == []
+
+    # Otra ventana es otro recurso
+    windowed = client.get("/api/events/?skip=0&limit=10", headers=headers)
+    assert windowed.headers["etag"] != etag
+
+    create_event(client, headers, family_id, "Nuevo")
+    changed = client.get("/api/events/", headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert len(changed.json()) == 2
+
+def test_family_write_changes_every_member_etag(client, session: Session):
+    headers, family_id = get_auth_header(client, session, "etag-a@example.com")
+    other_headers, _ = get_auth_header(client, session, "etag-b@example.com")
+    outsider = client.post("/api/auth/register", json={
+        "email": "etag-c@example.com",
+        "password": "password123",
+        "full_name": "Otra",
+        "family_name": "Otra Familia",
+    }).json()
+    outsider_headers = {"Authorization": f"Bearer {outsider['access_token']}"}
+    other_etag = client.get("/api/tasks/", headers=other_headers).headers["etag"]
+    outsider_etag = client.get("/api/tasks/", headers=outsider_headers).headers["etag"]
+
+    response = client.post("/api/tasks/", headers=headers, json={
+        "title": "Sacar la basura",
+        "due_date": (datetime.utcnow() + timedelta(days=1)).isoformat(),
+        "priority": "normal",
+    })
+    assert response.status_code == 200, response.text
+
+    assert client.get("/api/tasks/", headers={**other_headers, "If-None-Match": other_etag}).status_code == 200
+    # Otra familia no se ve afectada
+    assert client.get("/api/tasks/", headers={**outsider_headers, "If-None-Match": outsider_etag}).status_code == 304
+
+def test_chat_history_uses_family_version(client, session: Session):
+    headers, family_id = get_auth_header(client, session, "etag-chat@example.com")
+    me = client.get("/api/auth/me", headers=headers).json()
+    etag = client.get(f"/api/chat/history/{family_id}").headers["etag"]
+    assert client.get(f"/api/chat/history/{family_id}", headers={"If-None-Match": etag}).status_code == 304
+
+    session.add(ChatMessage(family_id=family_id, user_id=me["id"], content="Hola"))
+    session.commit()
+    response = client.get(f"/api/chat/history/{family_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert [m["content"] for m in response.json()] == ["Hola"]
+
+def test_rollback_and_invalid_token_do_not_produce_etags(client, session: Session):
+    headers, family_id = get_auth_header(client, session, "etag-rb@example.com")
+    me = client.get("/api/auth/me", headers=headers).json()
+    etag = client.get("/api/events/", headers=headers).headers["etag"]
+
+    session.add(ChatMessage(family_id=family_id, user_id=me["id"], content="Borrador"))
+    session.flush()
+    session.rollback()
+    assert client.get("/api/events/", headers={**headers, "If-None-Match": etag}).status_code == 304
+
+    response = client.get("/api/events/", headers={"Authorization": "Bearer invalido", "If-None-Match": etag})
+    assert response.status_code == 401
+    assert "etag" not in response.headers
+
+def test_completing_an_occurrence_changes_the_events_etag(client, session: Session):
+    headers, family_id = get_auth_header(client, session, "etag-occurrence@example.com")
+    response = client.post("/api/events/", headers=headers, json={
+        "title": "Fútbol",
+        "start_time": "2025-01-06T18:00:00",
+        "end_time": "2025-01-06T19:00:00",
+        "is_recurring": True,
+        "recurrence_pattern": "weekly:mon,thu:18:00",
+        "family_id": family_id,
+    })
+    event_id = response.json()["id"]
+    window = {"start": "2025-03-01T00:00:00", "end": "2025-03-15T00:00:00"}
+    etag = client.get("/api/events/", headers=headers, params=window).headers["etag"]
+
+    completed = client.post(f"/api/events/{event_id}/complete", headers=headers,
+                            json={"occurrence_start": "2025-03-06T18:00:00"})
+    assert completed.status_code == 200, completed.text
+
+    # La excepción de la ocurrencia invalida el ETag del evento maestro
+    changed = client.get("/api/events/", headers={**headers, "If-None-Match": etag}, params=window)
+    assert changed.status_code == 200
+    assert [o["status"] for o in changed.json()] == ["pending", "completed", "pending", "pending"]
+
+def test_conditional_get_only_runs_in_a_single_process():
+    from app.services.family_versions import conditional_get_enabled
+
+    assert conditional_get_enabled("auto", workers=1)
+    # Otro worker no vería las escrituras de este: sin 304 con datos viejos
+    assert not conditional_get_enabled("auto", workers=4)
+    assert conditional_get_enabled("on", workers=4)
+    assert not conditional_get_enabled("off", workers=1)
@@ -0,0 +1,191 @@
+import random
+from datetime import datetime, timedelta
+from unittest.mock import patch
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+from app.models import Event, FamilyMember, User
+from app.services.conflicts import FamilyIndex
+from testing.test_events import get_auth_header
+
+def make_event(event_id, start, minutes, **kwargs):
+    return Event(
+        id=event_id,
+        title=f"Evento {event_id}",
+        start_time=start,
+        end_time=start + timedelta(minutes=minutes),
+        owner_id=1,
+        family_id=1,
+        **kwargs
+    )
+
+def test_family_index_matches_linear_scan():
+    rng = random.Random(7)
+    base = datetime(2025, 1, 1)
+    index = FamilyIndex()
+    events = {}
+    for event_id in range(1, 2001):
+        event = make_event(event_id, base + timedelta(minutes=rng.randrange(0, 60 * 24 * 365)), rng.choice([15, 30, 60, 240, 600]))
+        events[event_id] = event
+        index.add(event)
+    
+    # Mutaciones incrementales: mover y borrar
+    for event_id in rng.sample(list(events), 200):
+        moved = make_event(event_id, base + timedelta(minutes=rng.randrange(0, 60 * 24 * 365)), 45)
+        events[event_id] = moved
+        index.add(moved)
+    for event_id in rng.sample(list(events), 100):
+        del events[event_id]
+        index.remove(event_id)
+    
+    for _ in range(50):
+        start = base + timedelta(minutes=rng.randrange(0, 60 * 24 * 365))
+        end = start + timedelta(minutes=rng.choice([30, 120, 60 * 24]))
+        expected = {e.id for e in events.values() if e.start_time < end and e.end_time > start}
+        assert {i.event_id for i in index.overlapping(start, end)} == expected
+
+def test_completed_events_do_not_occupy_the_calendar():
+    index = FamilyIndex()
+    start = datetime(2025, 1, 1, 10, 0)
+    index.add(make_event(1, start, 60))
+    index.add(make_event(1, start, 60, status="completed"))
+    assert index.overlapping(start, start + timedelta(hours=1)) == []
+
+def create_event(client, headers, family_id, title, start, minutes, **extra):
+    return client.post(
+        "/api/events/",
+        headers=headers,
+        params=extra.pop("params", None),
+        json={
+            "title": title,
+            "start_time": start.isoformat(),
+            "end_time": (start + timedelta(minutes=minutes)).isoformat(),
+            "family_id": family_id,
+            **extra
+        }
+    )
+
+def register(client: TestClient, session: Session):
+    return get_auth_header(client, session, "conflicts@example.com")
+
+@patch("app.routers.events.schedule_notifications_for_event")
+def test_conflict_check_on_create_and_update(mock_schedule, client: TestClient, session: Session):
+    headers, family_id = register(client, session)
+    start = datetime(2025, 5, 5, 10, 0)
+    
+    first = create_event(client, headers, family_id, "Dentista", start, 60)
+    assert first.status_code == 201
+    
+    # Sin check_conflicts se mantiene el comportamiento anterior
+    assert create_event(client, headers, family_id, "Libre", start, 45).status_code == 201
+    
+    response = create_event(client, headers, family_id, "Choque", start + timedelta(minutes=30), 60, params={"check_conflicts": True})
+    assert response.status_code == 409
+    titles = {c["title"] for c in response.json()["detail"]["conflicts"]}
+    assert titles == {"Dentista", "Libre"}
+    
+    later = create_event(client, headers, family_id, "Tarde", start + timedelta(hours=5), 60, params={"check_conflicts": True})
+    assert later.status_code == 201
+    
+    # Mover el evento de la tarde encima del dentista
+    response = client.patch(
+        f"/api/events/{later.json()['id']}",
+        headers=headers,
+        params={"check_conflicts": True},
+        json={"start_time": (start + timedelta(minutes=15)).isoformat(), "end_time": (start + timedelta(minutes=45)).isoformat()}
+    )
+    assert response.status_code == 409
+    
+    # Tras borrar los eventos de la mañana el índice se actualiza sin reconstruirse
+    client.delete(f"/api/events/{first.json()['id']}", headers=headers)
+    events = client.get("/api/events/", headers=headers).json()
+    for event in events:
+        if event["title"] == "Libre":
+            client.delete(f"/api/events/{event['id']}", headers=headers)
+    response = client.patch(
+        f"/api/events/{later.json()['id']}",
+        headers=headers,
+        params={"check_conflicts": True},
+        json={"start_time": (start + timedelta(minutes=15)).isoformat(), "end_time": (start + timedelta(minutes=45)).isoformat()}
+    )
+    assert response.status_code == 200
+
+@patch("app.routers.events.schedule_notifications_for_event")
+def test_conflicts_endpoint_includes_recurring_occurrences(mock_schedule, client: TestClient, session: Session):
+    headers, family_id = register(client, session)
+    # Lunes 2025-01-06 a las 18:00, todos los lunes
+    create_event(
+        client, headers, family_id, "Fútbol", datetime(2025, 1, 6, 18, 0), 90,
+        is_recurring=True, recurrence_pattern="weekly:mon:18:00"
+    )
+    create_event(client, headers, family_id, "Reunión", datetime(2025, 1, 20, 19, 0), 60)
+    
+    response = client.get(
+        "/api/events/conflicts",
+        headers=headers,
+        params={"family_id": family_id, "start": "2025-01-01T00:00:00", "end": "2025-02-01T00:00:00"}
+    )
+    assert response.status_code == 200
+    conflicts = response.json()["conflicts"]
+    assert len(conflicts) == 1
+    pair = {conflicts[0]["first"]["title"], conflicts[0]["second"]["title"]}
+    assert pair == {"Fútbol", "Reunión"}
+    assert conflicts[0]["overlap_start"] == "2025-01-20T19:00:00"
+    assert conflicts[0]["overlap_end"] == "2025-01-20T19:30:00"
+    
+    # Un evento recurrente nuevo choca con la reunión en alguna de sus ocurrencias
+    response = create_event(
+        client, headers, family_id, "Inglés", datetime(2025, 1, 13, 19, 0), 30,
+        is_recurring=True, recurrence_pattern="weekly:mon:19:00", params={"check_conflicts": True}
+    )
+    assert response.status_code == 409
+
+def new_family(client: TestClient, session: Session, name: str) -> int:
+    """Registra a otro usuario con una familia propia y devuelve su id"""
+    email = f"conflicts-{name.lower()}@example.com"
+    client.post("/api/auth/register", json={
+        "email": email, "password": "password123", "full_name": name, "family_name": name
+    })
+    user = session.exec(select(User).where(User.email == email)).one()
+    return session.exec(select(FamilyMember.family_id).where(FamilyMember.user_id == user.id)).one()
+
+# Mover de familia suma la verificación de membresía, el tombstone para la familia anterior
+# y, con check_conflicts, la carga del índice de la familia destino
+@pytest.mark.query_budget("PATCH /api/events/{event_id}", 10)
+@patch("app.routers.events.schedule_notifications_for_event")
+def test_update_checks_the_edited_rule_and_family(mock_schedule, client: TestClient, session: Session):
+    headers, family_id = register(client, session)
+    me = client.get("/api/auth/me", headers=headers).json()["id"]
+    other_family_id, foreign_family_id = new_family(client, session, "Otra"), new_family(client, session, "Ajena")
+    session.add(FamilyMember(family_id=other_family_id, user_id=me))
+    session.commit()
+    
+    create_event(client, headers, family_id, "Reunión", datetime(2025, 1, 20, 19, 0), 60)
+    clase = create_event(client, headers, family_id, "Clase", datetime(2025, 1, 13, 19, 0), 30).json()
+    
+    # Pasar a recurrente se valida con la regla nueva: el lunes 20 choca con la reunión
+    response = client.patch(
+        f"/api/events/{clase['id']}",
+        headers=headers,
+        params={"check_conflicts": True},
+        json={"is_recurring": True, "recurrence_pattern": "weekly:mon:19:00"}
+    )
+    assert response.status_code == 409
+    
+    # En la familia destino no hay choque; la anterior deja de contar el evento movido
+    response = client.patch(
+        f"/api/events/{clase['id']}",
+        headers=headers,
+        params={"check_conflicts": True},
+        json={"is_recurring": True, "recurrence_pattern": "weekly:mon:19:00", "family_id": other_family_id}
+    )
+    assert response.status_code == 200
+    assert response.json()["family_id"] == other_family_id
+    moved_back = create_event(
+        client, headers, family_id, "Otra clase", datetime(2025, 1, 27, 19, 0), 30, params={"check_conflicts": True}
+    )
+    assert moved_back.status_code == 201
+    
+    # No se puede mover a una familia de la que no se es miembro
+    response = client.patch(f"/api/events/{clase['id']}", headers=headers, json={"family_id": foreign_family_id})
+    assert response.status_code == 403
@@ -0,0 +1,122 @@
+import threading
+
+import pytest
+from sqlalchemy import text, update
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+from sqlmodel import SQLModel, select
+
+from app.models import Family
+from app.services import db_pool, telemetry
+from app.services.db_routing import RoutingSession
+
+def test_auto_mode_follows_the_url():
+    assert db_pool.resolve_pool_mode("sqlite:///./database.db", "auto") == "sqlite"
+    assert db_pool.resolve_pool_mode("postgresql://u:p@pooler:6543/db?pgbouncer=true", "auto") == "null"
+    assert db_pool.resolve_pool_mode("postgresql://u:p@db:5432/db", "auto") == "queue"
+    with pytest.raises(ValueError):
+        db_pool.resolve_pool_mode("postgresql://u:p@db:5432/db", "sqlite")
+    with pytest.raises(ValueError):
+        db_pool.resolve_pool_mode("postgresql://u:p@db:5432/db", "bouncy")
+
+def test_null_mode_for_transaction_pooler():
+    options = db_pool.engine_options("postgresql://u:p@pooler:6543/db?pgbouncer=true", "auto")
+    assert options["poolclass"] is db_pool.InstrumentedNullPool
+    assert options["connect_args"] == {"prepare_threshold": 0}
+    assert "pool_size" not in options
+
+def test_sqlite_mode_enables_wal_and_busy_timeout(tmp_path):
+    engine = db_pool.create_configured_engine(f"sqlite:///{tmp_path / 'wal.db'}", label="wal-test")
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert connection.execute(text("PRAGMA busy_timeout")).scalar() == db_pool.SQLITE_BUSY_TIMEOUT_MS
+    assert isinstance(engine.pool, QueuePool)
+    engine.dispose()
+
+def test_pool_saturation_and_timeouts_are_exported(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_pool, "POOL_SIZE", 1)
+    monkeypatch.setattr(db_pool, "MAX_OVERFLOW", 0)
+    monkeypatch.setattr(db_pool, "POOL_TIMEOUT", 0.1)
+    engine = db_pool.create_configured_engine(f"sqlite:///{tmp_path / 'pool.db'}", label="saturation-test")
+    labels = ("saturation-test",)
+
+    held = engine.connect()
+    assert telemetry.db_pool_checked_out.get(labels) == 1
+    assert telemetry.db_pool_saturation.get(labels) == 1.0
+
+    errors = []
+    def checkout():
+        try:
+            engine.connect()
+        except PoolTimeoutError as exc:
+            errors.append(exc)
+    worker = threading.Thread(target=checkout)
+    worker.start()
+    worker.join()
+    assert len(errors) == 1
+    assert telemetry.db_pool_timeouts.get(labels) == 1
+
+    held.close()
+    assert telemetry.db_pool_saturation.get(labels) == 0.0
+    assert telemetry.db_pool_wait.count(labels) >= 2
+
+    rendered = telemetry.registry.render()
+    assert 'db_pool_saturation_ratio{engine="saturation-test"} 0.0' in rendered
+    assert 'db_pool_capacity{engine="saturation-test"} 1' in rendered
+    engine.dispose()
+
+def test_sqlite_split_routes_reads_to_read_only_pool(tmp_path):
+    writer, reader = db_pool.create_sqlite_engines(f"sqlite:///{tmp_path / 'split.db'}")
+    SQLModel.metadata.create_all(writer)
+    with reader.connect() as connection:
+        assert connection.execute(text("PRAGMA query_only")).scalar() == 1
+        assert connection.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+
+    with RoutingSession(writer, reader) as session:
+        family = Family(name="Split", invitation_code="SPLIT1")
+        session.add(family)
+        session.flush()
+        # Dentro de la transacción con escrituras se lee del escritor (los lectores no ven el flush)
+        assert session.get_bind() is writer
+        assert session.exec(select(Family).where(Family.name == "Split")).first() is not None
+        session.commit()
+
+        assert session.get_bind() is reader
+        assert session.exec(select(Family.name)).all() == ["Split"]
+        session.execute(update(Family).values(name="Split 2"))
+        assert session.get_bind() is writer
+        session.commit()
+
+    with reader.connect() as connection:
+        assert connection.execute(text("SELECT name FROM family")).scalar() == "Split 2"
+        with pytest.raises(OperationalError):
+            connection.execute(text("DELETE FROM family"))
+    writer.dispose()
+    reader.dispose()
+
+def test_sqlite_split_serializes_concurrent_writers(tmp_path):
+    writer, reader = db_pool.create_sqlite_engines(f"sqlite:///{tmp_path / 'writers.db'}")
+    SQLModel.metadata.create_all(writer)
+    errors = []
+
+    def write(worker: int):
+        try:
+            for i in range(20):
+                with RoutingSession(writer, reader) as session:
+                    session.exec(select(Family)).all()
+                    session.add(Family(name=f"F{worker}-{i}", invitation_code=f"W{worker}-{i}"))
+                    session.commit()
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    with RoutingSession(writer, reader) as session:
+        assert len(session.exec(select(Family)).all()) == 120
+    writer.dispose()
+    reader.dispose()
@@ -0,0 +1,136 @@
+import json
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+from app.models import Event, NotificationLog
+from testing.test_events import get_auth_header
+
+def read_ndjson(response):
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+def test_csv_import_reports_row_errors(client: TestClient, session: Session):
+    headers, family_id = get_auth_header(client, session, "import@example.com")
+    future = datetime.utcnow() + timedelta(days=10)
+    csv_text = "\n".join([
+        "title,start_time,end_time,category,assigned_to_id",
+        f"Dentista,{future.isoformat()},{(future + timedelta(hours=1)).isoformat()},health,",
+        "Sin fecha,mañana,,general,",
+        f"Al revés,{future.isoformat()},{(future - timedelta(hours=1)).isoformat()},general,",
+        f"Ajeno,{future.isoformat()},{(future + timedelta(hours=1)).isoformat()},general,9999",
+        f"Pasado,2020-01-01T10:00:00,2020-01-01T11:00:00,general,",
+    ])
+    response = client.post(
+        "/api/events/import",
+        headers=headers,
+        params={"family_id": family_id},
+        files={"file": ("agenda.csv", csv_text.encode("utf-8"), "text/csv")}
+    )
+    assert response.status_code == 200
+    messages = read_ndjson(response)
+    errors = {m["row"]: m["errors"] for m in messages if m["type"] == "error"}
+    assert set(errors) == {3, 4, 5}
+    assert any("end_time" in e for e in errors[4])
+    assert any("assigned_to_id" in e for e in errors[5])
+    assert messages[-1] == {"type": "done", "processed": 5, "imported": 2, "failed": 3}
+    
+    titles = set(session.exec(select(Event.title).where(Event.family_id == family_id)).all())
+    assert titles == {"Dentista", "Pasado"}
+    # Solo se programan recordatorios futuros
+    logs = session.exec(select(NotificationLog)).all()
+    assert [log.title for log in logs] == ["Recordatorio: Dentista"]
+
+def test_import_rejects_invalid_recurrence_patterns(client: TestClient, session: Session):
+    headers, family_id = get_auth_header(client, session, "import-rrule@example.com")
+    start = "2030-03-04T17:00:00"
+    end = "2030-03-04T18:00:00"
+    csv_text = "\n".join([
+        "title,start_time,end_time,is_recurring,recurrence_pattern",
+        f"Natación,{start},{end},true,FREQ=WEEKLY;BYDAY=MO",
+        f"Cada hora,{start},{end},true,FREQ=HOURLY",
+        f"Rota,{start},{end},true,FREQ=WEEKLY;BYDAY=XX",
+    ])
+    response = client.post(
+        "/api/events/import",
+        headers=headers,
+        params={"family_id": family_id},
+        files={"file": ("agenda.csv", csv_text.encode("utf-8"), "text/csv")}
+    )
+    messages = read_ndjson(response)
+    errors = {m["row"]: m["errors"] for m in messages if m["type"] == "error"}
+    # Igual que create_event: las reglas no soportadas o mal formadas no se guardan
+    assert set(errors) == {3, 4}
+    assert all(e[0].startswith("recurrence_pattern:") for e in errors.values())
+    assert messages[-1] == {"type": "done", "processed": 3, "imported": 1, "failed": 2}
+    assert session.exec(select(Event.title).where(Event.family_id == family_id)).all() == ["Natación"]
+
+ICS = "\r\n".join([
+    "BEGIN:VCALENDAR",
+    "VERSION:2.0",
+    "BEGIN:VEVENT",
+    "UID:1",
+    "SUMMARY:Reunión de padres con un título muy largo que se corta en varias líneas pa",
+    " ra probar el plegado",
+    "DTSTART;TZID=America/Argentina/Buenos_Aires:20300310T180000",
+    "DURATION:PT1H30M",
+    "BEGIN:VALARM",
+    "TRIGGER:-PT15M",
+    "DESCRIPTION:No es parte del evento",
+    "END:VALARM",
+    "END:VEVENT",
+    "BEGIN:VEVENT",
+    "SUMMARY:Feriado",
+    "DTSTART;VALUE=DATE:20300501",
+    "END:VEVENT",
+    "BEGIN:VEVENT",
+    "SUMMARY:Natación",
+    "DTSTART:20300304T170000Z",
+    "DTEND:20300304T180000Z",
+    "RRULE:FREQ=WEEKLY;BYDAY=MO",
+    "DESCRIPTION:Traer toalla\\, gorro",
+    "END:VEVENT",
+    "BEGIN:VEVENT",
+    "SUMMARY:Natación (movida)",
+    "RECURRENCE-ID:20300311T170000Z",
+    "DTSTART:20300312T170000Z",
+    "END:VEVENT",
+    "END:VCALENDAR",
+    ""
+])
+
+def test_ics_import_parses_stream(client: TestClient, session: Session):
+    headers, family_id = get_auth_header(client, session, "import2@example.com")
+    response = client.post(
+        "/api/events/import",
+        headers=headers,
+        params={"family_id": family_id},
+        files={"file": ("calendar.ics", ICS.encode("utf-8"), "application/octet-stream")}
+    )
+    messages = read_ndjson(response)
+    assert messages[-1]["imported"] == 3
+    assert [m["row"] for m in messages if m["type"] == "error"] == [25]
+    
+    events = {e.title: e for e in session.exec(select(Event).where(Event.family_id == family_id)).all()}
+    meeting = events["Reunión de padres con un título muy largo que se corta en varias líneas para probar el plegado"]
+    assert meeting.start_time == datetime(2030, 3, 10, 21, 0)
+    assert meeting.end_time == datetime(2030, 3, 10, 22, 30)
+    assert events["Feriado"].end_time - events["Feriado"].start_time == timedelta(days=1)
+    assert events["Natación"].is_recurring
+    assert events["Natación"].description == "Traer toalla, gorro"
+    
+    # Los eventos importados aparecen en el índice de conflictos
+    conflicts = client.get(
+        "/api/events/conflicts",
+        headers=headers,
+        params={"family_id": family_id, "start": "2030-03-10T00:00:00", "end": "2030-03-11T00:00:00"}
+    )
+    assert conflicts.status_code == 200
+
+def test_import_requires_membership(client: TestClient, session: Session):
+    headers, family_id = get_auth_header(client, session, "import3@example.com")
+    response = client.post(
+        "/api/events/import",
+        headers=headers,
+        params={"family_id": family_id + 100},
+        files={"file": ("a.csv", b"title\n", "text/csv")}
+    )
+    assert response.status_code == 403
@@ -0,0 +1,300 @@
+import json
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request, Response
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from app.main import app
+from app.models import Event, RecurrenceException, UserIntegration
+from app.routers.integrations import get_google_client
+from app.security import encrypt_secret
+from app.services.google_calendar import GoogleCalendarClient, decode_batch, encode_batch
+from app.services.google_sync import sync_all_integrations, sync_integration
+from testing.test_events import get_auth_header
+
+class FakeGoogle:
+    """Servidor falso de Google Calendar: events.list con syncToken/pageToken y endpoint batch"""
+    def __init__(self, page_size: int = 2):
+        self.events = {}
+        self.sequence = 0
+        self.changed_at = {}
+        self.page_size = page_size
+        self.list_calls = []
+        self.batch_calls = []
+        self.expired_tokens = set()
+        self.app = self.build_app()
+
+    def put(self, event_id: str, **fields):
+        self.sequence += 1
+        self.events[event_id] = {"id": event_id, "status": "confirmed", **self.events.get(event_id, {}), **fields}
+        self.changed_at[event_id] = self.sequence
+
+    def build_app(self) -> FastAPI:
+        fake = FastAPI()
+
+        @fake.post("/token")
+        def token():
+            return {"access_token": "access-123", "expires_in": 3600}
+
+        @fake.get("/calendar/v3/calendars/{calendar_id}/events")
+        def list_events(request: Request, calendar_id: str):
+            params = request.query_params
+            self.list_calls.append(dict(params))
+            sync_token = params.get("syncToken")
+            if sync_token in self.expired_tokens:
+                return Response(status_code=410)
+            since = int(sync_token.split("-")[1]) if sync_token else 0
+            changed = sorted(
+                (e for e in self.events.values() if self.changed_at[e["id"]] > since),
+                key=lambda e: self.changed_at[e["id"]]
+            )
+            offset = int(params.get("pageToken", 0))
+            page = changed[offset:offset + self.page_size]
+            body = {"items": page}
+            if offset + self.page_size < len(changed):
+                body["nextPageToken"] = str(offset + self.page_size)
+            else:
+                body["nextSyncToken"] = f"seq-{self.sequence}"
+            return body
+
+        @fake.post("/batch/calendar/v3")
+        async def batch(request: Request):
+            boundary = request.headers["content-type"].split("boundary=")[1]
+            operations = []
+            for part in (await request.body()).decode().split(f"--{boundary}"):
+                part = part.strip()
+                if not part or part == "--":
+                    continue
+                headers, _, http_message = part.partition("\r\n\r\n")
+                content_id = [h for h in headers.split("\r\n") if h.lower().startswith("content-id")][0]
+                request_line, _, rest = http_message.partition("\r\n")
+                method, path, _ = request_line.split(" ")
+                payload = rest.partition("\r\n\r\n")[2].strip()
+                operations.append((content_id.split(":", 1)[1].strip(), method, path, json.loads(payload or "{}")))
+            self.batch_calls.append([(method, path) for _, method, path, _ in operations])
+
+            out = []
+            for content_id, method, path, body in reversed(operations):  # Google no garantiza el orden
+                if method == "POST":
+                    event_id = f"g{len(self.events) + 1}"
+                    self.put(event_id, **body)
+                    status, result = 200, self.events[event_id]
+                elif method == "DELETE":
+                    event_id = path.rsplit("/", 1)[1]
+                    if self.events.get(event_id, {}).get("status", "cancelled") != "cancelled":
+                        self.put(event_id, status="cancelled")
+                        status, result = 204, {}
+                    else:
+                        status, result = 410, {"error": "deleted"}
+                else:
+                    event_id = path.rsplit("/", 1)[1]
+                    if event_id in self.events:
+                        self.put(event_id, **body)
+                        status, result = 200, self.events[event_id]
+                    else:
+                        status, result = 404, {"error": "notFound"}
+                out.append(
+                    f"--resp\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id.strip('<>')}>\r\n\r\n"
+                    f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n\r\n{json.dumps(result)}\r\n"
+                )
+            out.append("--resp--\r\n")
+            return Response("".join(out), media_type="multipart/mixed; boundary=resp")
+
+        return fake
+
+    def client(self) -> GoogleCalendarClient:
+        return GoogleCalendarClient(
+            http=TestClient(self.app),
+            api_url="http://testserver",
+            token_url="http://testserver/token"
+        )
+
+def google_time(moment: datetime) -> dict:
+    return {"dateTime": moment.isoformat() + "Z"}
+
+BASE = datetime(2030, 3, 4, 10, 0)
+
+@pytest.fixture
+def connected(client, session):
+    headers, family_id = get_auth_header(client, session, "google@example.com")
+    user_id = client.get("/api/auth/me", headers=headers).json()["id"]
+    integration = UserIntegration(
+        user_id=user_id,
+        family_id=family_id,
+        encrypted_refresh_token=encrypt_secret("refresh-abc")
+    )
+    session.add(integration)
+    session.commit()
+    return headers, family_id, user_id, integration
+
+def test_first_sync_pulls_remote_and_pushes_local(session, connected):
+    headers, family_id, user_id, integration = connected
+    google = FakeGoogle()
+    google.put("r1", summary="Dentista", start=google_time(BASE), end=google_time(BASE + timedelta(hours=1)))
+    google.put("r2", summary="Yoga", start=google_time(BASE), end=google_time(BASE + timedelta(hours=1)),
+               recurrence=["RRULE:FREQ=WEEKLY;BYDAY=MO"])
+    google.put("r3", summary="Cumpleaños", start={"date": "2030-03-10"}, end={"date": "2030-03-11"})
+    session.add(Event(title="Reunión escolar", start_time=BASE, end_time=BASE + timedelta(hours=2),
+                      owner_id=user_id, family_id=family_id))
+    session.commit()
+
+    stats = sync_integration(session, integration, google.client())
+
+    assert stats["pulled"] == 3
+    assert stats["pushed"] == 1
+    events = {e.title: e for e in session.exec(select(Event)).all()}
+    assert events["Yoga"].is_recurring and events["Yoga"].recurrence_pattern == "FREQ=WEEKLY;BYDAY=MO"
+    assert events["Cumpleaños"].start_time == datetime(2030, 3, 10)
+    assert events["Reunión escolar"].external_id == "g4"
+    assert google.events["g4"]["summary"] == "Reunión escolar"
+    # Primera pasada paginada sin syncToken; lo traído de Google no se reenvía
+    assert all("syncToken" not in call for call in google.list_calls)
+    assert google.batch_calls == [[("POST", "/calendar/v3/calendars/primary/events")]]
+    # El token es el del pull; el eco del push vuelve en la próxima pasada sin modificar nada
+    assert integration.sync_token == "seq-3"
+    assert integration.status == "active"
+
+def test_incremental_sync_only_moves_changes(session, connected):
+    headers, family_id, user_id, integration = connected
+    google = FakeGoogle()
+    google.put("r1", summary="Dentista", start=google_time(BASE), end=google_time(BASE + timedelta(hours=1)))
+    google.put("r2", summary="Yoga", start=google_time(BASE), end=google_time(BASE + timedelta(hours=1)),
+               recurrence=["RRULE:FREQ=WEEKLY"])
+    google.put("r3", summary="Cine", start=google_time(BASE), end=google_time(BASE + timedelta(hours=2)))
+    sync_integration(session, integration, google.client())
+    google.list_calls.clear()
+    google.batch_calls.clear()
+
+    # Cambios remotos: un evento editado, otro borrado y una ocurrencia de la serie cancelada
+    google.put("r1", summary="Dentista (reprogramado)", start=google_time(BASE + timedelta(days=1)),
+               end=google_time(BASE + timedelta(days=1, hours=1)))
+    google.put("r3", status="cancelled")
+    google.put("r2_20300311", status="cancelled", recurringEventId="r2",
+               originalStartTime=google_time(BASE + timedelta(weeks=1)))
+    # Cambio local
+    local = session.exec(select(Event).where(Event.external_id == "r2")).one()
+    local.title = "Yoga en el parque"
+    session.add(local)
+    session.commit()
+
+    stats = sync_integration(session, integration, google.client())
+
+    assert google.list_calls[0]["syncToken"] == "seq-3"
+    assert stats == {"pulled": 1, "deleted": 1, "exceptions": 1, "pushed": 1, "push_failed": 0}
+    assert session.exec(select(Event).where(Event.external_id == "r1")).one().title == "Dentista (reprogramado)"
+    assert session.exec(select(Event).where(Event.external_id == "r3")).first() is None
+    exception = session.exec(select(RecurrenceException)).one()
+    assert exception.status == "cancelled" and exception.original_start == BASE + timedelta(weeks=1)
+    assert google.batch_calls == [[("PATCH", "/calendar/v3/calendars/primary/events/r2")]]
+    assert google.events["r2"]["summary"] == "Yoga en el parque"
+
+    # Sin cambios de ningún lado: nada que enviar
+    google.batch_calls.clear()
+    stats = sync_integration(session, integration, google.client())
+    assert stats["pushed"] == 0 and google.batch_calls == []
+
+def test_local_deletions_are_pushed(client, session, connected):
+    headers, family_id, user_id, integration = connected
+    google = FakeGoogle()
+    google.put("r1", summary="Dentista", start=google_time(BASE), end=google_time(BASE + timedelta(hours=1)))
+    google.put("r2", summary="Yoga", start=google_time(BASE), end=google_time(BASE + timedelta(hours=1)))
+    sync_integration(session, integration, google.client())
+    google.batch_calls.clear()
+
+    local = session.exec(select(Event).where(Event.external_id == "r1")).one()
+    assert client.delete(f"/api/events/{local.id}", headers=headers).status_code == 204
+
+    stats = sync_integration(session, integration, google.client())
+
+    assert stats["pushed"] == 1 and stats["push_failed"] == 0
+    assert google.batch_calls == [[("DELETE", "/calendar/v3/calendars/primary/events/r1")]]
+    assert google.events["r1"]["status"] == "cancelled"
+    # El próximo pull no lo restaura y el borrado no se vuelve a enviar
+    google.batch_calls.clear()
+    stats = sync_integration(session, integration, google.client())
+    assert stats["pulled"] == 0 and google.batch_calls == []
+    assert [e.external_id for e in session.exec(select(Event)).all()] == ["r2"]
+
+def test_transport_and_protocol_errors_are_recorded_per_integration(client, session, connected):
+    headers, family_id, user_id, integration = connected
+    other_headers, other_family_id = get_auth_header(client, session, "google-2@example.com")
+    other_user_id = client.get("/api/auth/me", headers=other_headers).json()["id"]
+    other = UserIntegration(user_id=other_user_id, family_id=other_family_id, encrypted_refresh_token=encrypt_secret("r"))
+    session.add(other)
+    session.commit()
+
+    def unreachable(request: httpx.Request):
+        raise httpx.ConnectError("sin conexión", request=request)
+    offline = GoogleCalendarClient(http=httpx.Client(transport=httpx.MockTransport(unreachable)))
+
+    # La primera integración falla y la segunda igual se procesa
+    assert sync_all_integrations(session, offline) == 2
+    for item in (integration, other):
+        session.refresh(item)
+        assert item.status == "error" and item.last_error.startswith("ConnectError")
+    assert not session.dirty and not session.new
+
+    # Respuesta sin nextSyncToken: error registrado, sin cambios a medias
+    broken = GoogleCalendarClient(
+        http=httpx.Client(transport=httpx.MockTransport(lambda request: (
+            httpx.Response(200, json={"access_token": "a"}) if request.url.path == "/token"
+            else httpx.Response(200, json={"items": []})
+        ))),
+        api_url="http://google",
+        token_url="http://google/token"
+    )
+    assert sync_integration(session, integration, broken) == {}
+    assert integration.status == "error" and integration.last_error.startswith("KeyError")
+
+def test_expired_sync_token_triggers_full_sync(session, connected):
+    headers, family_id, user_id, integration = connected
+    google = FakeGoogle()
+    google.put("r1", summary="Dentista", start=google_time(BASE), end=google_time(BASE + timedelta(hours=1)))
+    integration.sync_token = "seq-0"
+    google.expired_tokens.add("seq-0")
+
+    stats = sync_integration(session, integration, google.client())
+
+    assert [call.get("syncToken") for call in google.list_calls] == ["seq-0", None]
+    assert stats["pulled"] == 1
+    assert integration.sync_token == "seq-1"
+
+def test_batch_encoding_round_trip_and_chunking():
+    requests = [("POST", "/calendars/primary/events", {"summary": f"E{i}"}) for i in range(3)]
+    body = encode_batch(requests, "b1").decode()
+    assert body.count("Content-ID: <item") == 3
+    assert "POST /calendar/v3/calendars/primary/events HTTP/1.1" in body
+
+    response = (
+        "--r\r\nContent-Type: application/http\r\nContent-ID: <response-item1>\r\n\r\n"
+        'HTTP/1.1 404 Not Found\r\nContent-Type: application/json\r\n\r\n{"error": "x"}\r\n'
+        "--r\r\nContent-Type: application/http\r\nContent-ID: <response-item0>\r\n\r\n"
+        'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n{"id": "a"}\r\n--r--\r\n'
+    )
+    assert decode_batch(response.encode(), "multipart/mixed; boundary=r") == [(200, {"id": "a"}), (404, {"error": "x"})]
+
+    google = FakeGoogle()
+    results = google.client().batch("token", [("POST", "/calendars/primary/events", {"summary": str(i)}) for i in range(120)])
+    assert len(results) == 120 and all(status == 200 for status, _ in results)
+    assert [len(call) for call in google.batch_calls] == [50, 50, 20]
+
+def test_sync_endpoint(client, session):
+    headers, family_id = get_auth_header(client, session, "nogoogle@example.com")
+    response = client.post("/api/integrations/google/sync", headers=headers)
+    assert response.status_code == 404
+
+    user_id = client.get("/api/auth/me", headers=headers).json()["id"]
+    session.add(UserIntegration(user_id=user_id, family_id=family_id, encrypted_refresh_token=encrypt_secret("r")))
+    session.commit()
+    google = FakeGoogle()
+    google.put("r1", summary="Dentista", start=google_time(BASE), end=google_time(BASE + timedelta(hours=1)))
+    app.dependency_overrides[get_google_client] = google.client
+
+    response = client.post("/api/integrations/google/sync", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["pulled"] == 1
+    events = client.get("/api/events/", headers=headers).json()
+    assert [e["title"] for e in events] == ["Dentista"]
@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+from app.models import RecurrenceException
+from app.services.ics import fold_line
+from testing.test_events import get_auth_header
+
+def test_fold_line_respects_octets_and_utf8():
+    line = "SUMMARY:" + "Cumpleaños de la abuela " * 8
+    folded = fold_line(line)
+    parts = folded[:-2].split("\r\n ")
+    assert all(len(part.encode("utf-8")) <= 75 for part in parts)
+    assert "".join(parts) == line
+
+def create(client, headers, family_id, title, start, **extra):
+    response = client.post("/api/events/", headers=headers, json={
+        "title": title,
+        "start_time": start.isoformat(),
+        "end_time": (start + timedelta(hours=1)).isoformat(),
+        "family_id": family_id,
+        **extra
+    })
+    assert response.status_code == 201
+    return response.json()
+
+@patch("app.routers.events.schedule_notifications_for_event")
+def test_export_ics_streams_events_with_recurrence(mock_schedule, client: TestClient, session: Session):
+    headers, family_id = get_auth_header(client, session, "ics@example.com")
+    create(client, headers, family_id, "Reunión, escuela; padres", datetime(2025, 4, 1, 18, 0))
+    weekly = create(client, headers, family_id, "Natación", datetime(2025, 4, 7, 17, 0),
+                    is_recurring=True, recurrence_pattern="weekly:mon:17:00")
+    session.add(RecurrenceException(event_id=weekly["id"], original_start=datetime(2025, 4, 14, 17, 0), status="cancelled"))
+    session.commit()
+    
+    response = client.get("/api/events/export.ics", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/calendar")
+    body = response.text
+    assert body.startswith("BEGIN:VCALENDAR\r\n") and body.endswith("END:VCALENDAR\r\n")
+    assert body.count("BEGIN:VEVENT") == 2
+    assert r"SUMMARY:Reunión\, escuela\; padres" in body
+    assert "DTSTART:20250401T180000Z" in body
+    assert "RRULE:FREQ=WEEKLY;BYDAY=MO;BYHOUR=17;BYMINUTE=0;BYSECOND=0" in body
+    assert "EXDATE:20250414T170000Z" in body
+
+@patch("app.routers.events.schedule_notifications_for_event")
+def test_subscription_feed_conditional_requests_and_cache(mock_schedule, client: TestClient, session: Session):
+    headers, family_id = get_auth_header(client, session, "feed@example.com")
+    event = create(client, headers, family_id, "Fútbol", datetime(2025, 4, 2, 10, 0))
+    
+    token_response = client.post("/api/events/feed-token", headers=headers, json={"family_id": family_id})
+    assert token_response.status_code == 200
+    path = token_response.json()["path"]
+    
+    first = client.get(path)
+    assert first.status_code == 200
+    assert "SUMMARY:Fútbol" in first.text
+    etag = first.headers["etag"]
+    last_modified = first.headers["last-modified"]
+    
+    assert client.get(path, headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(path, headers={"If-Modified-Since": last_modified}).status_code == 304
+    
+    # La segunda descarga sale de la caché sin consultar eventos
+    with patch("app.routers.events.iter_calendar") as mock_render:
+        assert client.get(path).text == first.text
+        mock_render.assert_not_called()
+    
+    # Editar un evento cambia el ETag e invalida la caché
+    client.patch(f"/api/events/{event['id']}", headers=headers, json={"title": "Fútbol (cancha 2)"})
+    changed = client.get(path, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert "SUMMARY:Fútbol (cancha 2)" in changed.text
+    
+    # El token de sesión no sirve como token de feed ni viceversa
+    session_token = headers["Authorization"].split()[1]
+    assert client.get(f"/api/events/feed/{session_token}.ics").status_code == 404
+    feed_token = token_response.json()["token"]
+    assert client.get("/api/events/export.ics", headers={"Authorization": f"Bearer {feed_token}"}).status_code == 401
@@ -0,0 +1,112 @@
+import json
+import logging
+
+import pytest
+from sqlmodel import Session
+
+from app.services import telemetry
+from testing.test_conditional import create_event
+from testing.test_events import get_auth_header
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(record.getMessage())
+
+def test_metrics_endpoint_uses_route_templates(client, session: Session, monkeypatch):
+    headers, family_id = get_auth_header(client, session, "metrics@example.com")
+    event = create_event(client, headers, family_id)
+    labels = ("GET", "/api/events/{event_id}")
+    before = telemetry.http_latency.count(labels)
+
+    assert client.get(f"/api/events/{event['id']}", headers=headers).status_code == 200
+    assert client.get("/api/events/999999", headers=headers).status_code == 404
+
+    assert telemetry.http_latency.count(labels) == before + 2
+    assert telemetry.http_db_queries.count(labels) >= 2
+    assert telemetry.http_in_flight.get(("GET",)) == 0
+
+    # Cerrado sin token configurado y con un token distinto
+    assert client.get("/metrics").status_code == 401
+    monkeypatch.setattr(telemetry, "METRICS_TOKEN", "secreto")
+    assert client.get("/metrics", headers={"Authorization": "Bearer otro"}).status_code == 401
+    assert client.get("/metrics").status_code == 401
+
+    body = client.get("/metrics", headers={"Authorization": "Bearer secreto"}).text
+    assert '# TYPE http_request_duration_seconds histogram' in body
+    assert 'http_requests_total{method="GET",route="/api/events/{event_id}",status="404"}' in body
+    assert 'http_request_db_queries_bucket{method="GET",route="/api/events/{event_id}",le="+Inf"}' in body
+    # Sin una serie por URL concreta
+    assert f'/api/events/{event["id"]}"' not in body
+
+def test_streaming_responses_are_measured_to_the_end(client, session: Session):
+    headers, family_id = get_auth_header(client, session, "metrics-ics@example.com")
+    create_event(client, headers, family_id)
+    labels = ("GET", "/api/events/export.ics")
+    before = telemetry.http_latency.count(labels)
+
+    response = client.get("/api/events/export.ics", headers=headers)
+    assert response.status_code == 200
+    assert response.text.endswith("END:VCALENDAR\r\n")
+    assert telemetry.http_latency.count(labels) == before + 1
+
+def test_sampled_async_request_log(client, monkeypatch):
+    handler = ListHandler()
+    telemetry.stop_request_logging()
+    telemetry.start_request_logging(handler)
+    try:
+        monkeypatch.setattr(telemetry, "LOG_SAMPLE_RATE", 0.0)
+        client.get("/")
+        client.get("/no-existe")
+        monkeypatch.setattr(telemetry, "LOG_SAMPLE_RATE", 1.0)
+        client.get("/")
+    finally:
+        telemetry.stop_request_logging()  # Vacía la cola antes de volver
+
+    records = [json.loads(line) for line in handler.lines]
+    assert [(r["path"], r["status"]) for r in records] == [("/", 200)]
+    assert records[0]["route"] == "/" and records[0]["db_queries"] == 0
+
+def test_profiler_flags_repeated_selects_and_debug_headers(session: Session):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from sqlmodel import select
+
+    from app.middleware import InstrumentationMiddleware
+    from app.models import User
+    from app.services import query_profiler
+
+    debug_app = FastAPI()
+    debug_app.add_middleware(InstrumentationMiddleware, debug=True)
+
+    @debug_app.get("/n-plus-one")
+    def n_plus_one():
+        # Una consulta por "fila", el patrón que el perfilador debe detectar
+        for user_id in range(6):
+            session.exec(select(User).where(User.id == user_id)).first()
+        return {"ok": True}
+
+    seen = []
+    query_profiler.request_observers.append(lambda method, route, profile: seen.append(profile))
+    try:
+        response = TestClient(debug_app).get("/n-plus-one")
+    finally:
+        query_profiler.request_observers.pop()
+
+    assert response.headers["x-db-query-count"] == "6"
+    assert response.headers["x-db-n-plus-one"] == "1"
+    assert float(response.headers["x-db-query-time-ms"]) >= 0
+    [(statement, repeats)] = seen[0].suspected_n_plus_one()
+    assert repeats == 6 and statement.startswith("SELECT")
+    assert telemetry.n_plus_one_suspects.get(("GET", "/n-plus-one")) >= 1
+
+@pytest.mark.query_budget("GET /api/events/", 4)
+def test_events_list_within_query_budget(client, session: Session):
+    headers, family_id = get_auth_header(client, session, "budget@example.com")
+    for index in range(5):
+        create_event(client, headers, family_id, f"Evento {index}")
+    # El presupuesto no depende de la cantidad de eventos
+    assert len(client.get("/api/events/", headers=headers).json()) == 5
@@ -66,7 +66,8 @@ def test_metrics_calculation(mock_handle, mock_schedule, client: TestClient, ses
             "start_time": now.isoformat(),
             "end_time": (now + timedelta(hours=1)).isoformat(),
             "category": "personal",
-            "family_id": family_id
+            "family_id": family_id,
+            "assigned_to_id": user.id
         }
     )
     assert res_event2.status_code in [200, 201]
@@ -82,3 +83,8 @@ def test_metrics_calculation(mock_handle, mock_schedule, client: TestClient, ses
     assert data["pendingEvents"] == 1, f"Expected 1 pending, got {data['pendingEvents']}"
     assert data["categoryBreakdown"]["work"] == 1
     assert data["categoryBreakdown"]["personal"] == 1
+    assert data["eventsThisWeek"] == 2
+    assert data["memberStats"] == [{
+        "user_id": user.id, "user_name": "Metrics User",
+        "assigned_count": 1, "completed_count": 0, "completion_rate": 0
+    }]
@@ -0,0 +1,72 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from app.database import ADDED_COLUMNS, migrate_db_schema
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Esquema anterior a las columnas de ADDED_COLUMNS (como una base creada con versiones viejas)
+BASELINE_SCHEMA = [
+    'CREATE TABLE "user" (id INTEGER PRIMARY KEY, email VARCHAR NOT NULL, full_name VARCHAR, hashed_password VARCHAR)',
+    "CREATE TABLE family (id INTEGER PRIMARY KEY, name VARCHAR, invitation_code VARCHAR)",
+    "CREATE TABLE familymember (family_id INTEGER, user_id INTEGER, role VARCHAR, joined_at TIMESTAMP, PRIMARY KEY (family_id, user_id))",
+    "CREATE TABLE event (id INTEGER PRIMARY KEY, title VARCHAR, start_time TIMESTAMP, end_time TIMESTAMP, owner_id INTEGER, family_id INTEGER)",
+    "CREATE TABLE eventshare (id INTEGER PRIMARY KEY, event_id INTEGER, shared_with_user_id INTEGER, can_edit BOOLEAN, created_at TIMESTAMP)",
+    "CREATE TABLE task (id INTEGER PRIMARY KEY, title VARCHAR, family_id INTEGER)",
+    "CREATE TABLE notificationlog (id INTEGER PRIMARY KEY, event_id INTEGER, user_id INTEGER, scheduled_for TIMESTAMP)",
+    "CREATE TABLE notificationtoken (id INTEGER PRIMARY KEY, user_id INTEGER, token VARCHAR)",
+    "CREATE TABLE recurrenceexception (id INTEGER PRIMARY KEY, event_id INTEGER, original_start TIMESTAMP, status VARCHAR)",
+    "CREATE TABLE tombstone (id INTEGER PRIMARY KEY, entity VARCHAR, entity_id VARCHAR, family_id INTEGER, user_id INTEGER, deleted_at TIMESTAMP)",
+    "INSERT INTO \"user\" (id, email) VALUES (1, 'legacy@example.com')",
+    "INSERT INTO event (id, title, owner_id) VALUES (1, 'Evento viejo', 1)",
+]
+
+def baseline_engine(path):
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as connection:
+        for statement in BASELINE_SCHEMA:
+            connection.execute(text(statement))
+    return engine
+
+def test_upgrades_a_baseline_sqlite_file(tmp_path):
+    engine = baseline_engine(tmp_path / "legacy.db")
+
+    assert migrate_db_schema(engine, raise_errors=True) is True
+    inspector = inspect(engine)
+    for table, column, _ in ADDED_COLUMNS:
+        assert column in {c["name"] for c in inspector.get_columns(table)}, f"{table}.{column}"
+    assert "ix_event_updated_at" in {index["name"] for index in inspector.get_indexes("event")}
+
+    with engine.connect() as connection:
+        row = connection.execute(text('SELECT color, (SELECT updated_at FROM event) FROM "user"')).one()
+    # Las filas existentes reciben el default y el timestamp de la migración
+    assert row[0] == "#3B82F6" and row[1] is not None
+
+    # Idempotente: una segunda pasada no agrega nada ni falla
+    assert migrate_db_schema(engine, raise_errors=True) is True
+
+def test_failed_migration_raises_only_when_asked(tmp_path):
+    engine = baseline_engine(tmp_path / "legacy.db")
+    with engine.begin() as connection:
+        # Una vista con el nombre del índice hace fallar el CREATE INDEX
+        connection.execute(text("CREATE VIEW ix_event_updated_at AS SELECT 1"))
+
+    assert migrate_db_schema(engine) is False
+    with pytest.raises(Exception):
+        migrate_db_schema(engine, raise_errors=True)
+
+def test_migrate_command_exits_non_zero_on_failure(tmp_path):
+    path = tmp_path / "legacy.db"
+    with baseline_engine(path).begin() as connection:
+        connection.execute(text("CREATE VIEW ix_event_updated_at AS SELECT 1"))
+
+    result = subprocess.run(
+        [sys.executable, "-m", "app.migrate"], cwd=ROOT, capture_output=True, text=True,
+        env={**os.environ, "DATABASE_URL": f"sqlite:///{path}"}
+    )
+    assert result.returncode == 1
+    assert "Schema migration failed" in result.stdout and "Migración fallida" in result.stdout
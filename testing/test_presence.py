@@ -0,0 +1,121 @@
+from app.services.presence import PresenceService
+from app.services.websocket_manager import ConnectionManager
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, data):
+        self.sent.append(data)
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+async def test_presence_coalesces_changes_into_one_frame():
+    connections = ConnectionManager()
+    clock = FakeClock()
+    service = PresenceService(connections, heartbeat_timeout=30, typing_ttl=5, clock=clock)
+    
+    sockets = [FakeWebSocket() for _ in range(3)]
+    for user_id, ws in enumerate(sockets, start=1):
+        connections.register(ws, family_id=1, user_id=user_id)
+        service.heartbeat(1, user_id)
+    # Varios cambios en el mismo intervalo
+    service.set_typing(1, 1)
+    service.set_typing(1, 1)
+    service.set_typing(1, 2)
+    
+    await service.flush()
+    
+    # Un solo frame por conexión con el estado agrupado
+    assert [len(ws.sent) for ws in sockets] == [1, 1, 1]
+    assert '"online":[1,2,3]' in sockets[0].sent[0]
+    assert '"typing":[1,2]' in sockets[0].sent[0]
+    # Los frames de presencia no consumen números de secuencia
+    assert connections.current_seq(1) == 0
+    
+    # Sin cambios no se envía nada
+    await service.flush()
+    assert len(sockets[0].sent) == 1
+
+async def test_presence_expires_on_heartbeat_timeout():
+    connections = ConnectionManager()
+    clock = FakeClock()
+    service = PresenceService(connections, heartbeat_timeout=30, typing_ttl=5, clock=clock)
+    
+    ws_a, ws_b = FakeWebSocket(), FakeWebSocket()
+    connections.register(ws_a, family_id=1, user_id=1)
+    connections.register(ws_b, family_id=1, user_id=2)
+    service.heartbeat(1, 1)
+    service.heartbeat(1, 2)
+    service.set_typing(1, 1)
+    await service.flush()
+    
+    # El usuario 1 deja de latir (conexión móvil medio abierta); el 2 sigue activo
+    clock.now += 20
+    service.heartbeat(1, 2)
+    clock.now += 20
+    assert service.online_users(1) == [2]
+    
+    await service.flush()
+    assert ws_b.sent[-1].endswith('"online":[2],"typing":[]}')
+
+def test_leave_only_counts_the_last_connection():
+    connections = ConnectionManager()
+    service = PresenceService(connections, clock=FakeClock())
+    
+    phone, laptop = FakeWebSocket(), FakeWebSocket()
+    for ws in (phone, laptop):
+        connections.register(ws, family_id=1, user_id=1)
+        service.heartbeat(1, 1)
+    service.dirty.clear()
+    revision = service.online_revision
+    
+    # Cerrar una de dos pestañas no cambia la lista de conectados (ni el ETag de miembros)
+    connections.disconnect(phone, 1)
+    service.leave(1, 1)
+    assert service.online_revision == revision and not service.dirty
+    
+    connections.disconnect(laptop, 1)
+    service.leave(1, 1)
+    assert service.online_revision == revision + 1 and service.dirty == {1}
+    assert service.online_users(1) == []
+
+def test_family_members_reports_online_from_memory(client, session):
+    from sqlmodel import select
+    from app.models import FamilyMember
+    from app.services.presence import presence
+    
+    res = client.post(
+        "/api/auth/register",
+        json={
+            "email": "presence@example.com",
+            "password": "pass",
+            "full_name": "Presence User",
+            "family_name": "Presence Family"
+        }
+    )
+    headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+    me = client.get("/api/auth/me", headers=headers).json()
+    
+    members = client.get("/api/auth/familia/miembros", headers=headers).json()
+    assert members[0]["online"] is False
+    assert client.get("/api/auth/familia/miembros?online=true", headers=headers).json() == []
+    
+    ws = FakeWebSocket()
+    family_id = session.exec(select(FamilyMember).where(FamilyMember.user_id == me["id"])).first().family_id
+    presence.connections.register(ws, family_id=family_id, user_id=me["id"])
+    presence.heartbeat(family_id, me["id"])
+    try:
+        online = client.get("/api/auth/familia/miembros?online=true", headers=headers).json()
+        assert [m["id"] for m in online] == [me["id"]]
+    finally:
+        presence.connections.disconnect(ws, family_id)
+        presence.leave(family_id, me["id"])
@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+from firebase_admin import exceptions, messaging
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from app.models import Event, Family, NotificationLog, NotificationToken, User
+from app.services.notification_scheduler import process_pending_notifications
+from app.services.push_gateway import (
+    DEAD_TOKEN, FAILED, SENT, TRANSIENT, FakeTransport, FirebaseTransport, PushGateway, PushMessage,
+    PushTransport, classify_error, push_gateway
+)
+from testing.test_events import get_auth_header
+
+def add_tokens(session: Session, user_id: int, *tokens: str):
+    session.add_all([NotificationToken(user_id=user_id, token=token) for token in tokens])
+    session.commit()
+
+@pytest.fixture
+def fake(monkeypatch):
+    transport = FakeTransport()
+    monkeypatch.setattr(push_gateway, "transport", transport)
+    monkeypatch.setattr(push_gateway, "sleep", lambda seconds: None)
+    return transport
+
+def test_batches_across_users_and_dedupes_tokens(session: Session):
+    transport = FakeTransport()
+    gateway = PushGateway(transport, sleep=lambda seconds: None)
+    messages = [PushMessage(f"token-{i}", "Recordatorio", "Pronto") for i in range(1200)]
+    report = gateway.send(session, messages + messages[:300])
+
+    assert [len(batch) for batch in transport.batches] == [500, 500, 200]
+    assert report.sent == 1200 and report.failed == 0
+    # Mismo token con otro contenido sí se envía
+    gateway.send(session, [PushMessage("token-1", "Otro", "Aviso"), PushMessage("token-1", "Otro", "Aviso")])
+    assert len(transport.batches[-1]) == 1
+
+def test_prunes_dead_tokens_and_retries_transient_with_backoff(session: Session):
+    session.add(User(id=1, email="push@example.com", full_name="Push", hashed_password="x"))
+    add_tokens(session, 1, "vivo", "muerto", "inestable", "caido")
+    delays = []
+    transport = FakeTransport(dead_tokens={"muerto"}, transient_failures={"inestable": 2, "caido": 10})
+    gateway = PushGateway(transport, max_attempts=4, base_delay=1.0, max_delay=3.0, sleep=delays.append)
+
+    report = gateway.notify_users(session, [(1, "Hola", "Mundo")])
+
+    assert report.sent == 2  # vivo + inestable al tercer intento
+    assert report.failed == 2  # muerto + caido (agotó los intentos)
+    assert report.pruned_tokens == ["muerto"]
+    assert len(delays) == 3 and all(0 <= delay <= limit for delay, limit in zip(delays, (1.0, 2.0, 3.0)))
+    assert sorted(session.exec(select(NotificationToken.token)).all()) == ["caido", "inestable", "vivo"]
+    # Los reintentos solo reenvían lo que falló
+    assert [len(batch) for batch in transport.batches] == [4, 2, 2, 1]
+
+def test_pruning_leaves_the_commit_to_the_caller(session: Session):
+    session.add(User(id=1, email="push@example.com", full_name="Push", hashed_password="x"))
+    add_tokens(session, 1, "vivo", "muerto")
+    gateway = PushGateway(FakeTransport(dead_tokens={"muerto"}), sleep=lambda seconds: None)
+
+    session.add(Family(name="Pendiente", invitation_code="PEND01"))
+    report = gateway.notify_users(session, [(1, "Hola", "Mundo")])
+    assert report.pruned_tokens == ["muerto"]
+    # La transacción de quien llama sigue abierta: un rollback deshace todo
+    session.rollback()
+    assert sorted(session.exec(select(NotificationToken.token)).all()) == ["muerto", "vivo"]
+    assert session.exec(select(Family).where(Family.name == "Pendiente")).first() is None
+
+def test_transport_interface_is_abstract():
+    with pytest.raises(TypeError):
+        PushTransport()
+
+def test_pending_notifications_go_out_in_one_batch(session: Session, fake: FakeTransport):
+    users = [User(id=i, email=f"u{i}@example.com", full_name=f"U{i}", hashed_password="x") for i in (1, 2)]
+    session.add_all([*users, Family(id=1, name="Push", invitation_code="PUSH01")])
+    start = datetime.utcnow() + timedelta(hours=1)
+    session.add(Event(id=1, title="Dentista", start_time=start, end_time=start + timedelta(hours=1),
+                      owner_id=1, family_id=1))
+    add_tokens(session, 1, "a1", "a2")
+    add_tokens(session, 2, "b1")
+    for user_id in (1, 2):
+        session.add(NotificationLog(event_id=1, user_id=user_id, title="t", body="b",
+                                    scheduled_for=datetime.utcnow() - timedelta(minutes=1), notification_type="pre_event"))
+    session.commit()
+
+    process_pending_notifications(session)
+
+    assert len(fake.batches) == 1
+    assert sorted(m.token for m in fake.delivered) == ["a1", "a2", "b1"]
+    assert all(log.sent_at for log in session.exec(select(NotificationLog)).all())
+
+def test_test_endpoint_reports_and_prunes(client: TestClient, session: Session, fake: FakeTransport):
+    headers, _ = get_auth_header(client, session, "push-test@example.com")
+    user_id = session.exec(select(User.id).where(User.email == "push-test@example.com")).one()
+    add_tokens(session, user_id, "activo", "desinstalado")
+    fake.dead_tokens.add("desinstalado")
+
+    response = client.post("/api/notifications/test", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["sent_count"] == 1 and response.json()["pruned_tokens"] == 1
+    assert session.exec(select(NotificationToken.token)).all() == ["activo"]
+
+def test_firebase_transport_maps_send_each_errors():
+    assert classify_error(messaging.UnregisteredError("no registrado")) == DEAD_TOKEN
+    assert classify_error(exceptions.UnavailableError("no disponible")) == TRANSIENT
+    assert classify_error(exceptions.InvalidArgumentError("payload inválido")) == FAILED
+
+    responses = [MagicMock(success=True), MagicMock(success=False, exception=messaging.UnregisteredError("x"))]
+    with patch("app.notification_service.messaging") as mock_messaging:
+        mock_messaging.send_each.return_value = MagicMock(responses=responses)
+        results = FirebaseTransport().send_each([PushMessage("a", "t", "b"), PushMessage("b", "t", "b")])
+    assert results == [SENT, DEAD_TOKEN]
+    assert len(mock_messaging.send_each.call_args.args[0]) == 2
@@ -0,0 +1,161 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+from app.models import Event, FamilyMember, RecurrenceException, User
+from app.services.recurrence import to_rrule, iter_occurrences, expand_window
+
+def test_to_rrule_accepts_legacy_json_and_rrule():
+    assert to_rrule("daily:18:00") == "FREQ=DAILY;BYHOUR=18;BYMINUTE=0;BYSECOND=0"
+    assert to_rrule("weekly:mon,wed,fri:22:00") == "FREQ=WEEKLY;BYDAY=MO,WE,FR;BYHOUR=22;BYMINUTE=0;BYSECOND=0"
+    assert to_rrule('{"frequency": "weekly", "daysOfWeek": [1, 3]}') == "FREQ=WEEKLY;BYDAY=MO,WE"
+    assert to_rrule('{"frequency": "monthly", "interval": 2, "occurrences": 5}') == "FREQ=MONTHLY;INTERVAL=2;COUNT=5"
+    assert to_rrule("RRULE:FREQ=YEARLY;BYMONTH=3") == "FREQ=YEARLY;BYMONTH=3"
+    assert to_rrule("FREQ=SECONDLY") is None
+    assert to_rrule("FREQ=WEEKLY;BYDAY=XX") is None
+    assert to_rrule("FREQ=DAILY;UNTIL=20250301T000000Z") == "FREQ=DAILY;UNTIL=20250301T000000"
+    assert to_rrule("nada") is None
+
+def test_monthly_expansion_and_fast_forward_match_full_iteration():
+    dtstart = datetime(2020, 1, 31, 9, 0)
+    monthly = list(iter_occurrences("FREQ=MONTHLY;BYMONTHDAY=31", dtstart, datetime(2024, 1, 1), datetime(2024, 7, 1)))
+    assert [d.month for d in monthly] == [1, 3, 5]
+    
+    # Adelantar DTSTART en reglas diarias/semanales no cambia el resultado
+    rule = "FREQ=WEEKLY;INTERVAL=2;BYDAY=TU,SA"
+    window = (datetime(2027, 5, 3), datetime(2027, 7, 1))
+    from dateutil.rrule import rrulestr
+    expected = rrulestr(rule, dtstart=dtstart).between(*window, inc=True)
+    assert list(expand_window(rule, dtstart, *window)) == expected
+
+def register(client: TestClient, session: Session, email: str):
+    res = client.post(
+        "/api/auth/register",
+        json={"email": email, "password": "pass", "full_name": "Rec User", "family_name": "Rec Family"}
+    )
+    headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+    user = session.exec(select(User).where(User.email == email)).first()
+    family_id = session.exec(select(FamilyMember).where(FamilyMember.user_id == user.id)).first().family_id
+    return headers, family_id
+
+@patch("app.services.notification_scheduler.schedule_notifications_for_event")
+def test_read_events_returns_virtual_occurrences(mock_schedule, client: TestClient, session: Session):
+    headers, family_id = register(client, session, "recurrence@example.com")
+    
+    res = client.post(
+        "/api/events/",
+        headers=headers,
+        json={
+            "title": "Fútbol",
+            "start_time": "2025-01-06T18:00:00",
+            "end_time": "2025-01-06T19:00:00",
+            "is_recurring": True,
+            "recurrence_pattern": "weekly:mon,thu:18:00",
+            "family_id": family_id
+        }
+    )
+    event_id = res.json()["id"]
+    
+    window = {"start": "2025-03-01T00:00:00", "end": "2025-03-15T00:00:00"}
+    occurrences = client.get("/api/events/", headers=headers, params=window).json()
+    assert [o["start_time"] for o in occurrences] == [
+        "2025-03-03T18:00:00", "2025-03-06T18:00:00", "2025-03-10T18:00:00", "2025-03-13T18:00:00"
+    ]
+    assert all(o["id"] == event_id and o["recurrence_id"] == o["start_time"] for o in occurrences)
+    
+    # Una fecha que no es ocurrencia de la regla no deja una excepción huérfana
+    res = client.post(
+        f"/api/events/{event_id}/complete",
+        headers=headers,
+        json={"occurrence_start": "2025-03-07T18:00:00"}
+    )
+    assert res.status_code == 422
+    assert session.exec(select(RecurrenceException)).all() == []
+    
+    # Completar una ocurrencia no clona el evento: se guarda una excepción
+    res = client.post(
+        f"/api/events/{event_id}/complete",
+        headers=headers,
+        json={"occurrence_start": "2025-03-06T18:00:00"}
+    )
+    assert res.status_code == 200
+    assert res.json()["status"] == "pending"
+    assert len(session.exec(select(Event)).all()) == 1
+    assert session.exec(select(RecurrenceException)).one().status == "completed"
+    
+    occurrences = client.get("/api/events/", headers=headers, params=window).json()
+    assert [o["status"] for o in occurrences] == ["pending", "completed", "pending", "pending"]
+    # Se programan notificaciones para la ocurrencia siguiente
+    assert mock_schedule.call_args.kwargs["occurrence_start"] == datetime(2025, 3, 10, 18, 0)
+
+def test_invalid_rrule_is_rejected_on_create(client: TestClient, session: Session):
+    headers, family_id = register(client, session, "bad-rrule@example.com")
+    event = {
+        "title": "Clase",
+        "start_time": "2025-01-06T18:00:00",
+        "end_time": "2025-01-06T19:00:00",
+        "is_recurring": True,
+        "family_id": family_id
+    }
+    
+    for pattern in ("FREQ=WEEKLY;BYDAY=XX", "FREQ=DAILY;COUNT=dos", "FREQ=SECONDLY"):
+        res = client.post("/api/events/", headers=headers, json={**event, "recurrence_pattern": pattern})
+        assert res.status_code == 422, pattern
+    
+    res = client.post("/api/events/", headers=headers, json={**event, "recurrence_pattern": "FREQ=DAILY"})
+    assert res.status_code == 201
+
+def test_invalid_rrule_is_rejected_on_update(client: TestClient, session: Session):
+    headers, family_id = register(client, session, "bad-rrule-update@example.com")
+    event_id = client.post("/api/events/", headers=headers, json={
+        "title": "Clase",
+        "start_time": "2025-01-06T18:00:00",
+        "end_time": "2025-01-06T19:00:00",
+        "family_id": family_id
+    }).json()["id"]
+    
+    for change in ({"is_recurring": True, "recurrence_pattern": "FREQ=HOURLY"},
+                   {"is_recurring": True, "recurrence_pattern": "FREQ=WEEKLY;BYDAY=XX"}):
+        res = client.patch(f"/api/events/{event_id}", headers=headers, json=change)
+        assert res.status_code == 422, change
+    assert session.get(Event, event_id).is_recurring is False
+    
+    res = client.patch(f"/api/events/{event_id}", headers=headers,
+                       json={"is_recurring": True, "recurrence_pattern": "FREQ=WEEKLY;BYDAY=MO"})
+    assert res.status_code == 200
+    assert res.json()["recurrence_pattern"] == "FREQ=WEEKLY;BYDAY=MO"
+
+def test_completing_a_recurring_occurrence_stays_in_budget(client: TestClient, session: Session):
+    headers, family_id = register(client, session, "recurrence-budget@example.com")
+    start = (datetime.utcnow() + timedelta(days=1)).replace(hour=18, minute=0, second=0, microsecond=0)
+    event_id = client.post("/api/events/", headers=headers, json={
+        "title": "Fútbol",
+        "start_time": start.isoformat(),
+        "end_time": (start + timedelta(hours=1)).isoformat(),
+        "is_recurring": True,
+        "recurrence_pattern": "FREQ=DAILY",
+        "family_id": family_id
+    }).json()["id"]
+    
+    # El plugin de presupuesto controla la ruta en el camino recurrente (excepción + próximas notificaciones)
+    res = client.post(f"/api/events/{event_id}/complete", headers=headers,
+                      json={"occurrence_start": start.isoformat()})
+    assert res.status_code == 200
+    assert session.exec(select(RecurrenceException)).one().original_start == start
+
+def test_modified_occurrences_follow_their_new_time():
+    master = Event(id=1, title="Yoga", start_time=datetime(2025, 1, 6, 18), end_time=datetime(2025, 1, 6, 19),
+                   owner_id=1, is_recurring=True, recurrence_pattern="FREQ=WEEKLY;BYDAY=MO")
+    moved_in = RecurrenceException(event_id=1, original_start=datetime(2025, 2, 24, 18), status="modified",
+                                   start_time=datetime(2025, 3, 4, 18), end_time=datetime(2025, 3, 4, 19))
+    moved_out = RecurrenceException(event_id=1, original_start=datetime(2025, 3, 10, 18), status="modified",
+                                    start_time=datetime(2025, 4, 1, 18), end_time=datetime(2025, 4, 1, 19))
+    exceptions = {e.original_start: e for e in (moved_in, moved_out)}
+    
+    from app.services.recurrence import expand_event
+    items = expand_event(master, exceptions, datetime(2025, 3, 1), datetime(2025, 3, 15))
+    # La del 24/2 se movió dentro de la ventana; la del 10/3 se movió fuera
+    assert sorted((i["start_time"], i["recurrence_id"]) for i in items) == [
+        (datetime(2025, 3, 3, 18), datetime(2025, 3, 3, 18)),
+        (datetime(2025, 3, 4, 18), datetime(2025, 2, 24, 18)),
+    ]
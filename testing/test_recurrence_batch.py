@@ -0,0 +1,106 @@
+import random
+from datetime import datetime, timedelta
+import pytest
+from sqlmodel import Session, select
+from app.models import Event, Family, NotificationLog, RecurrenceException, User
+from app.services import recurrence_batch
+from app.services.recurrence import next_occurrence, to_rrule
+from app.services.notification_scheduler import calculate_next_occurrence, parse_recurrence_pattern, roll_forward_recurring_events
+
+PATTERNS = [
+    "daily:18:00",
+    "weekly:mon,wed,fri:22:00",
+    "weekly:sun:07:30",
+    '{"frequency": "weekly", "daysOfWeek": [0, 6]}',
+    '{"frequency": "daily"}',
+    "FREQ=MONTHLY;BYMONTHDAY=15",  # No vectorizable: cae al motor RRULE
+]
+
+@pytest.mark.parametrize("use_numpy", [False, True])
+def test_batch_matches_rrule_engine(use_numpy, monkeypatch):
+    if use_numpy and recurrence_batch.np is None:
+        pytest.skip("NumPy no está instalado")
+    if not use_numpy:
+        monkeypatch.setattr(recurrence_batch, "np", None)
+    
+    rng = random.Random(42)
+    base = datetime(2024, 1, 1)
+    starts = [base + timedelta(minutes=rng.randrange(0, 60 * 24 * 400)) for _ in range(300)]
+    patterns = [rng.choice(PATTERNS) for _ in starts]
+    after = datetime(2024, 9, 17, 21, 15)
+    
+    result = recurrence_batch.next_occurrences(starts, patterns, after)
+    expected = [
+        next_occurrence(to_rrule(p), s, max(after, s - timedelta(microseconds=1)))
+        for s, p in zip(starts, patterns)
+    ]
+    assert result == expected
+
+def test_calculate_next_occurrence_keeps_previous_behavior():
+    pattern = parse_recurrence_pattern("weekly:mon,wed:22:00")
+    # Miércoles 10:00 -> lunes siguiente (el mismo día nunca cuenta)
+    assert calculate_next_occurrence(datetime(2025, 1, 8, 10, 0), pattern) == datetime(2025, 1, 13, 22, 0)
+    assert calculate_next_occurrence(datetime(2025, 1, 6, 22, 0), pattern) == datetime(2025, 1, 8, 22, 0)
+    assert calculate_next_occurrence(datetime(2025, 1, 6), {"frequency": "weekly", "days": []}) is None
+
+def test_roll_forward_schedules_next_occurrence_once(session: Session):
+    user = User(email="roll@example.com", full_name="Roll", hashed_password="x")
+    family = Family(name="Roll", invitation_code="ROLL0001")
+    session.add(user)
+    session.add(family)
+    session.commit()
+    
+    session.add(Event(
+        title="Basura",
+        start_time=datetime(2025, 1, 6, 21, 0),
+        end_time=datetime(2025, 1, 6, 21, 15),
+        is_recurring=True,
+        recurrence_pattern="weekly:mon,thu:21:00",
+        notification_config='{"pre": [15], "unit": "minutes"}',
+        owner_id=user.id,
+        family_id=family.id
+    ))
+    session.commit()
+    
+    now = datetime(2025, 3, 4, 12, 0)  # martes
+    assert roll_forward_recurring_events(session, now=now, batch_size=1) == 1
+    # Idempotente: una segunda pasada no duplica
+    assert roll_forward_recurring_events(session, now=now, batch_size=1) == 0
+    
+    log = session.exec(select(NotificationLog)).one()
+    assert log.scheduled_for == datetime(2025, 3, 6, 20, 45)
+    assert log.title == "Recordatorio: Basura"
+
+def test_roll_forward_skips_cancelled_and_completed_occurrences(session: Session):
+    user = User(email="roll-skip@example.com", full_name="Roll", hashed_password="x")
+    family = Family(name="Roll", invitation_code="ROLL0002")
+    session.add(user)
+    session.add(family)
+    session.commit()
+    
+    events = [
+        Event(
+            title=title, start_time=datetime(2025, 1, 6, 21, 0), end_time=datetime(2025, 1, 6, 21, 15),
+            is_recurring=True, recurrence_pattern="weekly:mon,thu:21:00",
+            notification_config='{"pre": [15], "unit": "minutes"}', owner_id=user.id, family_id=family.id
+        )
+        for title in ("Basura", "Reciclaje", "Riego")
+    ]
+    session.add_all(events)
+    session.commit()
+    # Basura: jueves 6 cancelado y lunes 10 completado; Reciclaje: jueves 6 movido a las 22:00
+    session.add_all([
+        RecurrenceException(event_id=events[0].id, original_start=datetime(2025, 3, 6, 21, 0), status="cancelled"),
+        RecurrenceException(event_id=events[0].id, original_start=datetime(2025, 3, 10, 21, 0), status="completed"),
+        RecurrenceException(event_id=events[1].id, original_start=datetime(2025, 3, 6, 21, 0), status="modified",
+                            start_time=datetime(2025, 3, 6, 22, 0), end_time=datetime(2025, 3, 6, 22, 15)),
+    ])
+    session.commit()
+    
+    assert roll_forward_recurring_events(session, now=datetime(2025, 3, 4, 12, 0)) == 3
+    scheduled = {log.title: log.scheduled_for for log in session.exec(select(NotificationLog))}
+    assert scheduled == {
+        "Recordatorio: Basura": datetime(2025, 3, 13, 20, 45),
+        "Recordatorio: Reciclaje": datetime(2025, 3, 6, 21, 45),
+        "Recordatorio: Riego": datetime(2025, 3, 6, 20, 45),
+    }
@@ -0,0 +1,86 @@
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.middleware import ReplicaRoutingMiddleware
+from app.models import Family
+from app.security import create_access_token, get_current_user_id
+from app.services.db_routing import RoutingSession, recent_writers
+
+@pytest.fixture
+def engines(tmp_path):
+    """Primario y réplica como dos archivos SQLite: la réplica "atrasada" no recibe las escrituras"""
+    primary = create_engine(f"sqlite:///{tmp_path / 'primary.db'}", connect_args={"check_same_thread": False})
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}", connect_args={"check_same_thread": False})
+    for engine, name in ((primary, "primario"), (replica, "réplica")):
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            session.add(Family(name=name, invitation_code=name))
+            session.commit()
+    recent_writers.clear()
+    yield primary, replica
+    recent_writers.clear()
+    primary.dispose()
+    replica.dispose()
+
+@pytest.fixture
+def routed_client(engines):
+    primary, replica = engines
+    app = FastAPI()
+    app.add_middleware(ReplicaRoutingMiddleware)
+
+    def get_session():
+        with RoutingSession(primary, replica, lagging=True) as session:
+            yield session
+
+    @app.get("/api/families")
+    def list_families(session: Session = Depends(get_session), user_id: int = Depends(get_current_user_id)):
+        return session.exec(select(Family.name).order_by(Family.id)).all()
+
+    @app.post("/api/families")
+    def create_family(name: str, session: Session = Depends(get_session), user_id: int = Depends(get_current_user_id)):
+        family = Family(name=name, invitation_code=name)
+        session.add(family)
+        session.commit()
+        session.refresh(family)  # Después del commit, en una request de escritura: primario
+        return family.name
+
+    @app.get("/api/integrations/google/callback")
+    @app.get("/api/tasks/")
+    def callback(session: Session = Depends(get_session)):
+        return session.exec(select(Family.name).order_by(Family.id)).all()
+
+    return TestClient(app)
+
+def auth(user_id: int):
+    return {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+
+def test_get_reads_from_replica_and_writes_go_to_primary(routed_client, engines):
+    primary, _ = engines
+    assert routed_client.get("/api/families", headers=auth(1)).json() == ["réplica"]
+
+    assert routed_client.post("/api/families?name=nueva", headers=auth(1)).json() == "nueva"
+    with Session(primary) as session:
+        assert session.exec(select(Family.name).order_by(Family.id)).all() == ["primario", "nueva"]
+
+def test_writer_reads_own_writes_within_window(routed_client, monkeypatch):
+    routed_client.post("/api/families?name=nueva", headers=auth(1))
+
+    # Quien escribió lee del primario durante la ventana; el resto sigue en la réplica
+    assert routed_client.get("/api/families", headers=auth(1)).json() == ["primario", "nueva"]
+    assert routed_client.get("/api/families", headers=auth(2)).json() == ["réplica"]
+
+    monkeypatch.setattr(recent_writers, "window", 0)
+    routed_client.post("/api/families?name=otra", headers=auth(1))
+    assert routed_client.get("/api/families", headers=auth(1)).json() == ["réplica"]
+
+def test_primary_only_routes_and_work_outside_requests(routed_client, engines):
+    primary, replica = engines
+    assert routed_client.get("/api/integrations/google/callback").json() == ["primario"]
+    # Lecturas con ETag (versiones del primario): el cuerpo no puede venir de una réplica atrasada
+    assert routed_client.get("/api/tasks/", headers=auth(2)).json() == ["primario"]
+
+    # Jobs del scheduler (sin request): siempre el primario
+    with RoutingSession(primary, replica, lagging=True) as session:
+        assert session.exec(select(Family.name)).all() == ["primario"]
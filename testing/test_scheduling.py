@@ -0,0 +1,101 @@
+from datetime import datetime, time, timedelta
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+from app.models import Event, EventShare, Family, FamilyMember, User
+from app.services.scheduling import find_free_slots, free_gaps, merge_intervals, working_windows
+from testing.test_events import get_auth_header
+
+def dt(day, hour, minute=0):
+    return datetime(2025, 3, day, hour, minute)
+
+def test_merge_intervals_with_buffer():
+    busy = [(dt(3, 10), dt(3, 11)), (dt(3, 11, 20), dt(3, 12)), (dt(3, 15), dt(3, 16))]
+    assert merge_intervals(busy, timedelta(minutes=15)) == [
+        (dt(3, 9, 45), dt(3, 12, 15)),
+        (dt(3, 14, 45), dt(3, 16, 15)),
+    ]
+
+def test_free_gaps_inside_working_windows():
+    windows = working_windows(dt(3, 0), dt(5, 0), time(9, 0), time(21, 0))
+    assert windows == [(dt(3, 9), dt(3, 21)), (dt(4, 9), dt(4, 21))]
+    busy = merge_intervals([(dt(3, 8), dt(3, 10)), (dt(3, 20), dt(4, 10)), (dt(4, 12), dt(4, 13))])
+    assert free_gaps(busy, windows) == [
+        (dt(3, 10), dt(3, 20)),
+        (dt(4, 10), dt(4, 12)),
+        (dt(4, 13), dt(4, 21)),
+    ]
+
+def test_working_windows_in_timezone():
+    # 09:00-21:00 en Buenos Aires (UTC-3) son 12:00-24:00 UTC
+    windows = working_windows(dt(3, 0), dt(4, 0), time(9, 0), time(21, 0), tz="America/Argentina/Buenos_Aires")
+    assert windows[0] == (dt(3, 12), dt(4, 0))
+
+def test_find_free_slots_merges_members_shared_and_recurring(session: Session):
+    mom = User(email="mom@slots.com", full_name="Mom", hashed_password="x")
+    kid = User(email="kid@slots.com", full_name="Kid", hashed_password="x")
+    home = Family(name="Casa", invitation_code="SLOTS001")
+    school = Family(name="Escuela", invitation_code="SLOTS002")
+    session.add_all([mom, kid, home, school])
+    session.commit()
+    session.add_all([
+        FamilyMember(family_id=home.id, user_id=mom.id),
+        FamilyMember(family_id=home.id, user_id=kid.id),
+    ])
+    # Agenda de la familia: todos los lunes de 9 a 12
+    session.add(Event(title="Trabajo", start_time=dt(3, 9), end_time=dt(3, 12), is_recurring=True,
+                      recurrence_pattern="weekly:mon:09:00", owner_id=mom.id, family_id=home.id))
+    # Evento de otra familia asignado al hijo: 12:30 a 14:00
+    session.add(Event(title="Acto", start_time=dt(10, 12, 30), end_time=dt(10, 14), owner_id=mom.id,
+                      assigned_to_id=kid.id, family_id=school.id))
+    # Evento ajeno compartido con la madre: 15:00 a 16:00
+    shared = Event(title="Cumple", start_time=dt(10, 15), end_time=dt(10, 16), owner_id=kid.id, family_id=school.id)
+    session.add(shared)
+    session.commit()
+    session.add(EventShare(event_id=shared.id, shared_with_user_id=mom.id))
+    session.commit()
+    
+    slots = find_free_slots(
+        session, home.id, timedelta(hours=1),
+        start=dt(10, 0), end=dt(11, 0), buffer=timedelta(minutes=15), limit=10
+    )
+    gaps = [(s.gap_start, s.gap_end) for s in slots]
+    assert sorted(gaps) == [(dt(10, 16, 15), dt(10, 21))]
+    
+    slots = find_free_slots(
+        session, home.id, timedelta(minutes=15),
+        start=dt(10, 0), end=dt(11, 0), buffer=timedelta(minutes=15), limit=10
+    )
+    assert sorted(s.start for s in slots) == [dt(10, 14, 15), dt(10, 16, 15)]
+
+@patch("app.routers.ai.AI_PROVIDER", None)
+def test_suggest_time_works_without_ai(client: TestClient, session: Session):
+    headers, family_id = get_auth_header(client, session, "slots@example.com")
+    response = client.post(
+        "/api/ai/suggest-time",
+        headers=headers,
+        json={"texto": "Reunión de padres", "duration_minutes": 45}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    start = datetime.fromisoformat(data["suggested_start"])
+    end = datetime.fromisoformat(data["suggested_end"])
+    assert end - start == timedelta(minutes=45)
+    assert data["reason_source"] == "local"
+
+@patch("app.routers.ai.AI_PROVIDER", "groq")
+@patch("app.routers.ai.call_groq_ai")
+def test_suggest_time_uses_ai_only_for_reason(mock_groq, client: TestClient, session: Session):
+    headers, family_id = get_auth_header(client, session, "slots2@example.com")
+    mock_groq.return_value = '{"reason": "Es un buen momento, sin otros compromisos."}'
+    response = client.post(
+        "/api/ai/suggest-time",
+        headers=headers,
+        json={"texto": "Reunión", "timezone": "Europe/Madrid"}
+    )
+    assert response.status_code == 200
+    assert response.json()["reason"] == "Es un buen momento, sin otros compromisos."
+    assert response.json()["reason_source"] == "ai"
+    
+    response = client.post("/api/ai/suggest-time", headers=headers, json={"texto": "x", "timezone": "Mars/Base"})
+    assert response.status_code == 400
@@ -0,0 +1,77 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from sqlmodel import Session, select
+
+from app.models import Event, NotificationLog
+from app.schemas import EventRead
+from app.services import serialization
+from app.services.serialization import (
+    DefaultResponse, EVENT_READ_COLUMNS, dump_json, event_list_adapter, notification_history_adapter
+)
+from testing.test_conditional import create_event
+from testing.test_events import get_auth_header
+
+def test_lean_event_list_matches_response_model_output(client, session: Session):
+    headers, family_id = get_auth_header(client, session, "lean@example.com")
+    create_event(client, headers, family_id, "Simple")
+    start = datetime(2030, 1, 7, 18, 0)
+    response = client.post("/api/events/", headers=headers, json={
+        "title": "Semanal", "start_time": start.isoformat(), "end_time": (start + timedelta(hours=1)).isoformat(),
+        "family_id": family_id, "is_recurring": True, "recurrence_pattern": "weekly:mon:18:00",
+    })
+    assert response.status_code == 201
+
+    # Misma salida que validar entidades contra EventRead y pasarlas por jsonable_encoder
+    entities = session.exec(select(Event).order_by(Event.id)).all()
+    expected = jsonable_encoder([EventRead.model_validate(e, from_attributes=True) for e in entities])
+    assert client.get("/api/events/", headers=headers).json() == expected
+
+    rows = session.exec(select(*EVENT_READ_COLUMNS).order_by(Event.id)).all()
+    assert dump_json(event_list_adapter, rows) == dump_json(event_list_adapter, entities)
+
+    window = client.get("/api/events/", headers=headers, params={
+        "start": "2030-01-01T00:00:00", "end": "2030-01-31T00:00:00"
+    }).json()
+    occurrences = [e for e in window if e["title"] == "Semanal"]
+    assert [e["recurrence_id"] for e in occurrences] == [
+        "2030-01-07T18:00:00", "2030-01-14T18:00:00", "2030-01-21T18:00:00", "2030-01-28T18:00:00"
+    ]
+
+def test_notification_history_shape(client, session: Session):
+    headers, family_id = get_auth_header(client, session, "history@example.com")
+    event = create_event(client, headers, family_id, "Con aviso")
+    session.add(NotificationLog(
+        event_id=event["id"], user_id=event["owner_id"], title="Recordatorio", body="Pronto",
+        scheduled_for=datetime(2030, 1, 1, 9, 0), sent_at=datetime(2030, 1, 1, 9, 0, 5),
+        status="sent", notification_type="pre_event",
+    ))
+    session.commit()
+
+    response = client.get("/api/notifications/history", headers=headers)
+    assert response.status_code == 200
+    assert response.json() == [{
+        "id": 1, "event_id": event["id"], "title": "Recordatorio", "body": "Pronto",
+        "sent_at": "2030-01-01T09:00:05", "status": "sent",
+    }]
+
+def test_notification_history_tolerates_legacy_rows():
+    # Filas de bases migradas desde antes de title/body/status: esas columnas pueden venir en NULL
+    legacy = {"id": 7, "event_id": 3, "title": None, "body": None,
+              "sent_at": datetime(2029, 12, 31, 9, 0, 0, 250000), "status": None}
+    # Con zona horaria se mantiene el formato de isoformat() ("+00:00", no "Z")
+    aware = {"id": 8, "event_id": 3, "title": "Aviso", "body": "",
+             "sent_at": datetime(2030, 1, 1, 9, 0, tzinfo=timezone.utc), "status": "sent"}
+
+    assert json.loads(dump_json(notification_history_adapter, [legacy, aware])) == [
+        {**legacy, "sent_at": "2029-12-31T09:00:00.250000"},
+        {**aware, "sent_at": "2030-01-01T09:00:00+00:00"},
+    ]
+
+def test_default_response_is_orjson_when_available(client):
+    if serialization.orjson is None:
+        pytest.skip("orjson no instalado")
+    assert DefaultResponse.__name__ == "ORJSONResponse"
+    assert client.app.router.default_response_class is DefaultResponse
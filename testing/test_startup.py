@@ -0,0 +1,15 @@
+import os
+import subprocess
+import sys
+
+LAZY_SDKS = ("groq", "google.generativeai", "google_auth_oauthlib", "firebase_admin")
+
+def test_importing_the_app_does_not_load_provider_sdks():
+    # Intérprete nuevo: en este proceso los tests pueden haber importado los SDKs
+    code = f"import sys, app.main; print([m for m in {LAZY_SDKS!r} if m in sys.modules])"
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env={"GROQ_API_KEY": "test", "DATABASE_URL": "sqlite://", "PATH": ""}
+    )
+    assert result.stdout.strip().splitlines()[-1] == "[]"
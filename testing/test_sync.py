@@ -0,0 +1,170 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+from sqlmodel import Session, select
+
+from app.models import Event, EventShare, FamilyMember, RecurrenceException, Task, Tombstone
+from app.services.delta_sync import encode_cursor
+from testing.test_conditional import create_event
+from testing.test_events import get_auth_header
+
+def create_task(client, headers, title):
+    response = client.post("/api/tasks/", headers=headers, json={
+        "title": title,
+        "due_date": (datetime.utcnow() + timedelta(days=1)).isoformat(),
+        "priority": "normal",
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def age_everything(session: Session, hours: int = 2):
+    """Simula datos viejos: los cursores de los tests quedan fuera de la ventana de solapamiento"""
+    old = datetime.utcnow() - timedelta(hours=hours)
+    for model in (Event, Task, RecurrenceException):
+        session.execute(update(model).values(updated_at=old))
+    session.execute(update(EventShare).values(updated_at=old, created_at=old))
+    session.execute(update(FamilyMember).values(updated_at=old, joined_at=old))
+    session.execute(update(Tombstone).values(deleted_at=old))
+    session.commit()
+
+def test_first_sync_returns_everything(client, session: Session):
+    headers, family_id = get_auth_header(client, session, "sync@example.com")
+    create_event(client, headers, family_id, "Partido")
+    create_task(client, headers, "Comprar pan")
+
+    response = client.get("/api/sync/", headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["reset"] is True
+    assert [e["title"] for e in data["events"]] == ["Partido"]
+    assert [t["title"] for t in data["tasks"]] == ["Comprar pan"]
+    assert [m["family_id"] for m in data["memberships"]] == [family_id]
+    assert data["deleted"] == []
+
+def test_delta_only_returns_changes_and_deletions(client, session: Session):
+    headers, family_id = get_auth_header(client, session, "delta@example.com")
+    kept = create_event(client, headers, family_id, "Sin cambios")
+    edited = create_event(client, headers, family_id, "Editado")
+    removed = create_event(client, headers, family_id, "Borrado")
+    task = create_task(client, headers, "Tarea")
+    age_everything(session)
+    cursor = encode_cursor(datetime.utcnow() - timedelta(hours=1))
+
+    assert client.patch(f"/api/events/{edited['id']}", headers=headers, json={"title": "Editado 2"}).status_code == 200
+    assert client.delete(f"/api/events/{removed['id']}", headers=headers).status_code == 204
+    assert client.delete(f"/api/tasks/{task['id']}", headers=headers).status_code == 200
+
+    data = client.get(f"/api/sync/?since={cursor}", headers=headers).json()
+    assert data["reset"] is False
+    assert [e["title"] for e in data["events"]] == ["Editado 2"]
+    assert data["tasks"] == [] and data["memberships"] == []
+    assert sorted((d["entity"], d["id"]) for d in data["deleted"]) == [
+        ("event", str(removed["id"])), ("task", str(task["id"]))
+    ]
+    assert kept["id"] not in [e["id"] for e in data["events"]]
+
+def test_tombstones_reach_share_recipients_and_former_members(client, session: Session):
+    owner_headers, family_id = get_auth_header(client, session, "sync-owner@example.com")
+    member_headers, _ = get_auth_header(client, session, "sync-member@example.com")
+    outsider = client.post("/api/auth/register", json={
+        "email": "sync-out@example.com", "password": "password123",
+        "full_name": "Afuera", "family_name": "Otra Familia",
+    }).json()
+    outsider_headers = {"Authorization": f"Bearer {outsider['access_token']}"}
+    outsider_id = client.get("/api/auth/me", headers=outsider_headers).json()["id"]
+    member_id = client.get("/api/auth/me", headers=member_headers).json()["id"]
+
+    event = create_event(client, owner_headers, family_id, "Compartido")
+    share = EventShare(event_id=event["id"], shared_with_user_id=outsider_id)
+    session.add(share)
+    session.commit()
+    age_everything(session)
+    cursor = encode_cursor(datetime.utcnow() - timedelta(hours=1))
+
+    session.delete(share)
+    membership = session.exec(
+        select(FamilyMember).where(FamilyMember.user_id == member_id)
+    ).one()
+    session.delete(membership)
+    session.commit()
+
+    # Quien recibía el share borra el share y el evento que ya no ve; el dueño, el share
+    outsider_data = client.get(f"/api/sync/?since={cursor}", headers=outsider_headers).json()
+    assert sorted((d["entity"], d["id"]) for d in outsider_data["deleted"]) == [
+        ("event", str(event["id"])), ("share", str(share.id))
+    ]
+    owner_data = client.get(f"/api/sync/?since={cursor}", headers=owner_headers).json()
+    assert sorted((d["entity"], d["id"]) for d in owner_data["deleted"]) == [
+        ("membership", f"{family_id}:{member_id}"), ("share", str(share.id))
+    ]
+
+    # Quien sale de la familia deja de ver todos sus datos: reset completo sin los de la familia
+    member_data = client.get(f"/api/sync/?since={cursor}", headers=member_headers).json()
+    assert member_data["reset"] is True
+    assert event["id"] not in [e["id"] for e in member_data["events"]]
+
+def test_new_share_and_new_membership_deliver_existing_rows(client, session: Session):
+    owner_headers, family_id = get_auth_header(client, session, "sync-visible@example.com")
+    outsider = client.post("/api/auth/register", json={
+        "email": "sync-newcomer@example.com", "password": "password123",
+        "full_name": "Recién llegado", "family_name": "Propia",
+    }).json()
+    outsider_headers = {"Authorization": f"Bearer {outsider['access_token']}"}
+    outsider_id = client.get("/api/auth/me", headers=outsider_headers).json()["id"]
+
+    shared = create_event(client, owner_headers, family_id, "Cumpleaños")
+    family_event = create_event(client, owner_headers, family_id, "Cena familiar")
+    task = create_task(client, owner_headers, "Regalo")
+    age_everything(session)
+    cursor = encode_cursor(datetime.utcnow() - timedelta(hours=1))
+
+    # Un share nuevo trae el evento aunque el evento no cambió
+    session.add(EventShare(event_id=shared["id"], shared_with_user_id=outsider_id))
+    session.commit()
+    data = client.get(f"/api/sync/?since={cursor}", headers=outsider_headers).json()
+    assert data["reset"] is False
+    assert [e["id"] for e in data["events"]] == [shared["id"]]
+
+    # Unirse a la familia trae sus eventos, tareas y miembros existentes
+    session.add(FamilyMember(family_id=family_id, user_id=outsider_id))
+    session.commit()
+    data = client.get(f"/api/sync/?since={cursor}", headers=outsider_headers).json()
+    assert sorted(e["id"] for e in data["events"]) == sorted([shared["id"], family_event["id"]])
+    assert [t["id"] for t in data["tasks"]] == [task["id"]]
+    assert {m["family_id"] for m in data["memberships"]} >= {family_id}
+
+def test_invalid_and_expired_cursors(client, session: Session):
+    headers, _ = get_auth_header(client, session, "cursor@example.com")
+    assert client.get("/api/sync/?since=ayer", headers=headers).status_code == 400
+    # Fuera del rango de timedelta y de datetime: también 400, no 500
+    too_large = client.get("/api/sync/?since=99999999999999999999999", headers=headers)
+    assert too_large.status_code == 400 and too_large.json()["detail"] == "Cursor inválido"
+    too_old = client.get("/api/sync/?since=-99999999999999999", headers=headers)
+    assert too_old.status_code == 400 and too_old.json()["detail"] == "Cursor inválido"
+
+    ancient = encode_cursor(datetime.utcnow() - timedelta(days=365))
+    assert client.get(f"/api/sync/?since={ancient}", headers=headers).json()["reset"] is True
+
+def test_completed_occurrence_is_part_of_the_delta(client, session: Session):
+    headers, family_id = get_auth_header(client, session, "sync-occurrence@example.com")
+    event_id = client.post("/api/events/", headers=headers, json={
+        "title": "Fútbol",
+        "start_time": "2025-01-06T18:00:00",
+        "end_time": "2025-01-06T19:00:00",
+        "is_recurring": True,
+        "recurrence_pattern": "weekly:mon,thu:18:00",
+        "family_id": family_id,
+    }).json()["id"]
+    age_everything(session)
+    cursor = encode_cursor(datetime.utcnow() - timedelta(hours=1))
+
+    response = client.post(f"/api/events/{event_id}/complete", headers=headers,
+                           json={"occurrence_start": "2025-03-06T18:00:00"})
+    assert response.status_code == 200, response.text
+
+    data = client.get(f"/api/sync/?since={cursor}", headers=headers).json()
+    # El evento maestro no cambió: solo llega la ocurrencia completada
+    assert data["events"] == []
+    assert [(o["event_id"], o["original_start"], o["status"]) for o in data["occurrences"]] == [
+        (event_id, "2025-03-06T18:00:00", "completed")
+    ]